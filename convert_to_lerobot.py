@@ -13,6 +13,8 @@ import torch
 from tqdm import tqdm
 from tqdm.contrib.concurrent import process_map
 
+from robocasa.utils.obs_adapter_utils import ObsAdapter, LEROBOT_STATE_SPEC
+
 
 AGENTVIEW_LEFT = "robot0_agentview_left.mp4"
 AGENTVIEW_RIGHT = "robot0_agentview_right.mp4"
@@ -119,13 +121,10 @@ def load_local_dataset(
 
     # Note: the state is downsampled by video_skip
     # state_pos = np.array(f["data/{}/states".format(demo_id)][::video_skip, 1:14])
-    state_joint_pos = np.array(
-        f["data/{}/obs/robot0_joint_pos".format(demo_id)][::video_skip]
-    )
-    state_gripper = np.array(
-        f["data/{}/obs/robot0_gripper_qpos".format(demo_id)][::video_skip, 0]
-    ).reshape(-1, 1)
-    states_value = np.hstack([state_joint_pos, state_gripper]).astype(np.float32)
+    state_adapter = ObsAdapter(LEROBOT_STATE_SPEC)
+    obs_grp = f["data/{}/obs".format(demo_id)]
+    obs = {k: obs_grp[k][::video_skip] for k in state_adapter.sources}
+    states_value = state_adapter(obs)["observation.state"]
     demo_len = states_value.shape[0]
     action_value = np.zeros((demo_len, 8))
     action_value[: demo_len - 1, :7] = np.array(
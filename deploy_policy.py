@@ -16,6 +16,7 @@ import robosuite
 from robocasa.scripts.dataset_scripts.playback_dataset import (
     get_env_metadata_from_dataset,
 )
+from robocasa.utils.obs_adapter_utils import ObsAdapter, DP_OBS_SPEC
 import sys
 
 current_file_path = os.path.abspath(__file__)
@@ -35,8 +36,8 @@ def playback_trajectory_with_env_multi_cam(
     verbose=False,
     camera_height=512,
     camera_width=512,
-    image_cam=None,
     model=None,
+    obs_adapter=None,
 ):
     """
     Helper function to playback a single trajectory using the simulator environment.
@@ -54,6 +55,8 @@ def playback_trajectory_with_env_multi_cam(
         camera_names (list): determines which camera(s) are used for rendering. Pass more than
             one to output a video with multiple camera views concatenated horizontally.
         first (bool): if True, only use the first frame of each episode.
+        model: policy with get_action and update_obs
+        obs_adapter (ObsAdapter): maps robocasa observables to the inputs of @model
     """
     write_video = video_writers is not None
     video_count = 0
@@ -71,6 +74,8 @@ def playback_trajectory_with_env_multi_cam(
     print(colored("Running episode...", "yellow"))
     step_lim = 20
     step_cnt = 0
+    # camera name -> last rendered (unflipped) frame
+    frames = dict()
 
     while step_cnt < step_lim:
         start = time.time()
@@ -82,18 +87,13 @@ def playback_trajectory_with_env_multi_cam(
         for cam_name, video_writer in zip(camera_names, video_writers):
             im = env.sim.render(
                 height=camera_height, width=camera_width, camera_name=cam_name
-            )[::-1]
-            video_writer.append_data(im)
-            image_cam[cam_name].append(im)
-        left_cam = np.moveaxis(image_cam["robot0_agentview_left"][0], -1, 0) / 255
-        # right_cam era = (np.moveaxis(image_cam['robot0_agentview_right'][0],-1,0) / 255)
-        # hand_camera = (np.moveaxis(image_cam['robot0_eye_in_hand'][0],-1,0) / 255)
-        observation = dict(
-            left_cam=left_cam,
-            # right_camera=right_camera,
-            # hand_camera=hand_camera
-        )
-        observation["agent_pos"] = env.sim.data.qpos[4:12]
+            )
+            video_writer.append_data(im[::-1])
+            frames[cam_name] = im
+        # the adapter flips the frames and converts them to the model layout
+        obs = env._get_observations(force_update=True)
+        obs["robot0_agentview_left_image"] = frames["robot0_agentview_left"]
+        observation = obs_adapter(obs)
         actions = model.get_action(observation)
 
         for action in actions[0:3]:
@@ -105,21 +105,11 @@ def playback_trajectory_with_env_multi_cam(
             for cam_name, video_writer in zip(camera_names, video_writers):
                 im = env.sim.render(
                     height=camera_height, width=camera_width, camera_name=cam_name
-                )[::-1]
-                video_writer.append_data(im)
-                image_cam[cam_name].append(im)
-            left_cam = np.moveaxis(image_cam["robot0_agentview_left"][0], -1, 0) / 255
-            # right_camera = (np.moveaxis(image_cam['robot0_agentview_right'][0],-1,0) / 255)
-            # hand_camera = (np.moveaxis(image_cam['robot0_eye_in_hand'][0],-1,0) / 255)
-            observation = dict(
-                left_cam=left_cam,
-                # right_camera=right_camera,
-                # hand_camera=hand_camera
-            )
-            observation["agent_pos"] = np.append(
-                obs["robot0_joint_pos"], obs["robot0_gripper_qpos"][0]
-            )
-            model.update_obs(observation)
+                )
+                video_writer.append_data(im[::-1])
+                frames[cam_name] = im
+            obs["robot0_agentview_left_image"] = frames["robot0_agentview_left"]
+            model.update_obs(obs_adapter(obs))
 
 
 def reset_to(env, state):
@@ -184,7 +174,13 @@ def reset_to(env, state):
 
 
 def playback_dataset(
-    hdf5_file, args, write_video: bool, src_path: str, processed_path: str, model
+    hdf5_file,
+    args,
+    write_video: bool,
+    src_path: str,
+    processed_path: str,
+    model,
+    obs_adapter,
 ):
     # create environment only if not playing back with observations
     idx, hdf5_file = hdf5_file
@@ -262,9 +258,6 @@ def playback_dataset(
             )
             video_writers.append(video_writer)
 
-        image_cam = dict()
-        for name in args.render_image_names:
-            image_cam[name] = []
         # prepare initial state to reload from
         states = f["data/{}/states".format(ep)][()]
         initial_state = dict(states=states[0])
@@ -285,8 +278,8 @@ def playback_dataset(
             verbose=args.debug,
             camera_height=args.camera_height,
             camera_width=args.camera_width,
-            image_cam=image_cam,
             model=model,
+            obs_adapter=obs_adapter,
         )
         for video_writer in video_writers:
             video_writer.close()
@@ -331,12 +324,16 @@ def main(args):
     # ckpt_path = "/workspace/IL/checkpoints/DP/bs-128/only_left_camera/OpenOven-robocasa-100-0/600.ckpt"
     ckpt_path = "/workspace/IL/robocasa/policy/DP/checkpoints/OpenOven-1-20-0/600.ckpt"
     model = DP(ckpt_path, n_obs_steps=n_obs_steps, n_action_steps=n_action_steps)
+    # the model keeps the last n_obs_steps observations, so they need their own buffers
+    obs_adapter = ObsAdapter(DP_OBS_SPEC, num_buffers=n_obs_steps + 1)
     # import pdb
     # pdb.set_trace()
     hdf5_files.sort()
     hdf5_files = enumerate(hdf5_files)
     for hdf5_file in tqdm(hdf5_files):
-        playback_dataset(hdf5_file, args, write_video, src_path, processed_path, model)
+        playback_dataset(
+            hdf5_file, args, write_video, src_path, processed_path, model, obs_adapter
+        )
 
 
 def get_playback_args():
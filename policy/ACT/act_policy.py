@@ -106,6 +106,62 @@ def kl_divergence(mu, logvar):
     return total_kld, dimension_wise_kld, mean_kld
 
 
+class TemporalEnsembler:
+    """
+    Temporal aggregation of overlapping action chunks, as in imitate_episodes.py,
+    backed by a ring buffer that only holds the last @chunk_size predicted chunks.
+
+    At step t, the action for t is the exponentially weighted average of the
+    predictions for t from every chunk predicted in (t - chunk_size, t], with the
+    oldest chunk getting the largest weight. Chunks are marked valid by the step they
+    were predicted at, so exact zeros in predicted actions are kept and the buffer
+    size does not depend on the episode length.
+    """
+
+    def __init__(self, chunk_size, action_dim, device, k=0.01):
+        self.chunk_size = chunk_size
+        self.action_dim = action_dim
+        self.device = device
+        self.buffer = torch.zeros([chunk_size, chunk_size, action_dim], device=device)
+        # step at which the chunk in each slot was predicted, -1 if the slot is empty
+        self.chunk_steps = torch.full([chunk_size], -1, dtype=torch.long, device=device)
+        self._arange = torch.arange(chunk_size, device=device)
+        # exp(-k * i) weight of the i-th oldest valid chunk, in float64 like the numpy weights
+        self._weight_table = torch.exp(
+            -k * torch.arange(chunk_size, dtype=torch.float64, device=device)
+        )
+
+    def reset(self):
+        self.buffer.zero_()
+        self.chunk_steps.fill_(-1)
+
+    def add(self, t, actions):
+        """
+        Stores the chunk @actions of shape [1, chunk_size, action_dim] predicted at step @t.
+        """
+        slot = t % self.chunk_size
+        self.buffer[slot] = actions[0, : self.chunk_size]
+        self.chunk_steps[slot] = t
+
+    def get_action(self, t):
+        """
+        Returns the aggregated action of shape [1, action_dim] for step @t.
+        """
+        n = min(t + 1, self.chunk_size)
+        # steps of all chunks that can cover step t, oldest first
+        steps = self._arange[:n] + (t - n + 1)
+        slots = steps % self.chunk_size
+        valid = self.chunk_steps[slots] == steps
+        actions = self.buffer[slots, t - steps]
+
+        rank = (torch.cumsum(valid, dim=0) - 1).clamp(min=0)
+        weights = torch.where(
+            valid, self._weight_table[rank], torch.zeros_like(self._weight_table[:n])
+        )
+        weights = weights / weights.sum()
+        return (actions * weights.unsqueeze(dim=1)).sum(dim=0, keepdim=True)
+
+
 class ACT:
     def __init__(self, args_override=None, RoboTwin_Config=None):
         if args_override is None:
@@ -124,20 +180,15 @@ class ACT:
         self.state_dim = (
             RoboTwin_Config.action_dim
         )  # Standard joint dimension for bimanual robot
-        self.max_timesteps = 3000  # Large enough for deployment
 
         # Set query frequency based on temporal_agg - matching imitate_episodes.py logic
         self.query_frequency = self.num_queries
         if self.temporal_agg:
             self.query_frequency = 1
-            # Initialize with zeros matching imitate_episodes.py format
-            self.all_time_actions = torch.zeros(
-                [
-                    self.max_timesteps,
-                    self.max_timesteps + self.num_queries,
-                    self.state_dim,
-                ]
-            ).to(self.device)
+            # Only the last num_queries chunks can contribute to the current step
+            self.ensembler = TemporalEnsembler(
+                self.num_queries, self.state_dim, self.device
+            )
             print(f"Temporal aggregation enabled with {self.num_queries} queries")
 
         self.t = 0  # Current timestep
@@ -167,6 +218,12 @@ class ACT:
         else:
             self.stats = None
 
+    def reset(self):
+        """Reset the timestep and the temporal aggregation state"""
+        self.t = 0
+        if self.temporal_agg:
+            self.ensembler.reset()
+
     def pre_process(self, qpos):
         """Normalize input joint positions"""
         if self.stats is not None:
@@ -203,25 +260,9 @@ class ACT:
                 self.all_actions = self.policy(qpos, curr_image)
 
             if self.temporal_agg:
-                # Match temporal aggregation exactly from imitate_episodes.py
-                self.all_time_actions[
-                    [self.t], self.t : self.t + self.num_queries
-                ] = self.all_actions
-                actions_for_curr_step = self.all_time_actions[:, self.t]
-                actions_populated = torch.all(actions_for_curr_step != 0, axis=1)
-                actions_for_curr_step = actions_for_curr_step[actions_populated]
-
-                # Use same weighting factor as in imitate_episodes.py
-                k = 0.01
-                exp_weights = np.exp(-k * np.arange(len(actions_for_curr_step)))
-                exp_weights = exp_weights / exp_weights.sum()
-                exp_weights = (
-                    torch.from_numpy(exp_weights).to(self.device).unsqueeze(dim=1)
-                )
-
-                raw_action = (actions_for_curr_step * exp_weights).sum(
-                    dim=0, keepdim=True
-                )
+                # Same weighting as the temporal aggregation in imitate_episodes.py
+                self.ensembler.add(self.t, self.all_actions)
+                raw_action = self.ensembler.get_action(self.t)
             else:
                 # Direct action selection, same as imitate_episodes.py
                 raw_action = self.all_actions[:, self.t % self.query_frequency]
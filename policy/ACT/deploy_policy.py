@@ -10,15 +10,14 @@ from datetime import datetime  # Add import for datetime formatting
 from .act_policy import ACT
 import copy
 from argparse import Namespace
+from robocasa.utils.obs_adapter_utils import ObsAdapter, ACT_CAMERA_SPEC
+
+# CHW float images in [0, 1], written into buffers reused across steps
+camera_adapter = ObsAdapter(ACT_CAMERA_SPEC)
 
 
 def encode_obs(observation):
-    head_cam = observation["observation"]["head_camera"]["rgb"]
-    left_cam = observation["observation"]["left_camera"]["rgb"]
-    right_cam = observation["observation"]["right_camera"]["rgb"]
-    head_cam = np.moveaxis(head_cam, -1, 0) / 255.0
-    left_cam = np.moveaxis(left_cam, -1, 0) / 255.0
-    right_cam = np.moveaxis(right_cam, -1, 0) / 255.0
+    cams = camera_adapter(observation)
     qpos = (
         observation["joint_action"]["left_arm"]
         + [observation["joint_action"]["left_gripper"]]
@@ -26,9 +25,9 @@ def encode_obs(observation):
         + [observation["joint_action"]["right_gripper"]]
     )
     return {
-        "head_cam": head_cam,
-        "left_cam": left_cam,
-        "right_cam": right_cam,
+        "head_cam": cams["head_cam"],
+        "left_cam": cams["left_cam"],
+        "right_cam": cams["right_cam"],
         "qpos": qpos,
     }
 
@@ -51,15 +50,6 @@ def eval(TASK_ENV, model, observation):
 
 def reset_model(model):
     # Reset temporal aggregation state if enabled
+    model.reset()
     if model.temporal_agg:
-        model.all_time_actions = torch.zeros(
-            [
-                model.max_timesteps,
-                model.max_timesteps + model.num_queries,
-                model.state_dim,
-            ]
-        ).to(model.device)
-        model.t = 0
         print("Reset temporal aggregation state")
-    else:
-        model.t = 0
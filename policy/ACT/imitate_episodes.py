@@ -122,7 +122,15 @@ def main(args):
         exit()
 
     train_dataloader, val_dataloader, stats, _ = load_data(
-        dataset_dir, num_episodes, camera_names, batch_size_train, batch_size_val
+        dataset_dir,
+        num_episodes,
+        camera_names,
+        batch_size_train,
+        batch_size_val,
+        chunk_size=args["chunk_size"] if policy_class == "ACT" else None,
+        sample_mode=args["sample_mode"],
+        cache_mode=args["cache_mode"],
+        num_workers=args["num_workers"],
     )
 
     # save dataset stats
@@ -502,6 +510,31 @@ if __name__ == "__main__":
     )
     parser.add_argument("--lr", action="store", type=float, help="lr", required=True)
 
+    # data loading
+    parser.add_argument(
+        "--sample_mode",
+        action="store",
+        type=str,
+        default="episode",
+        choices=["episode", "step"],
+        help="draw one timestep per episode per epoch, or every timestep once",
+    )
+    parser.add_argument(
+        "--cache_mode",
+        action="store",
+        type=str,
+        default="none",
+        choices=["none", "ram", "mmap"],
+        help="cache episodes in memory or as memory-mapped .npy files",
+    )
+    parser.add_argument(
+        "--num_workers",
+        action="store",
+        type=int,
+        default=None,
+        help="dataloader workers, defaults to min(8, cpu count)",
+    )
+
     # for ACT
     parser.add_argument(
         "--kl_weight", action="store", type=int, help="KL Weight", required=False
@@ -2,6 +2,8 @@ import numpy as np
 import torch
 import os
 import h5py
+import pickle
+import shutil
 from torch.utils.data import TensorDataset, DataLoader
 
 import IPython
@@ -9,9 +11,35 @@ import IPython
 e = IPython.embed
 
 
+def get_episode_path(dataset_dir, episode_id):
+    return os.path.join(dataset_dir, f"episode_{episode_id}.hdf5")
+
+
 class EpisodicDataset(torch.utils.data.Dataset):
+    """
+    Samples (images, qpos, action chunk, is_pad) from ACT episode hdf5 files.
+
+    sample_mode "episode" draws one random timestep per episode per epoch (the
+    original behavior). sample_mode "step" indexes every (episode, timestep) pair,
+    so an epoch covers every timestep once.
+
+    Each DataLoader worker keeps its own open file handles. Alternatively, episodes
+    can be cached in RAM (cache_mode "ram", loaded before the workers fork) or as
+    memory-mapped .npy files next to the data (cache_mode "mmap"), which are
+    rewritten when the size or modification time of the episode file changes.
+    """
+
     def __init__(
-        self, episode_ids, dataset_dir, camera_names, norm_stats, max_action_len
+        self,
+        episode_ids,
+        dataset_dir,
+        camera_names,
+        norm_stats,
+        max_action_len,
+        chunk_size=None,
+        episode_lens=None,
+        sample_mode="episode",
+        cache_mode="none",
     ):
         super(EpisodicDataset).__init__()
         self.episode_ids = episode_ids
@@ -19,50 +47,125 @@ class EpisodicDataset(torch.utils.data.Dataset):
         self.camera_names = camera_names
         self.norm_stats = norm_stats
         self.max_action_len = max_action_len  # 添加max_action_len属性
+        # only chunk_size actions are read and padded, the policy never uses more
+        self.action_len = chunk_size if chunk_size is not None else max_action_len
+        self.sample_mode = sample_mode
+        self.cache_mode = cache_mode
+        assert sample_mode in ("episode", "step")
+        assert cache_mode in ("none", "ram", "mmap")
         self.is_sim = None
-        self.__getitem__(0)  # initialize self.is_sim
+
+        if episode_lens is None:
+            episode_lens = dict()
+            for episode_id in episode_ids:
+                with h5py.File(get_episode_path(dataset_dir, episode_id), "r") as root:
+                    episode_lens[episode_id] = root["/action"].shape[0]
+        self.episode_lens = np.array([episode_lens[i] for i in episode_ids])
+        self.cumulative_lens = np.cumsum(self.episode_lens)
+
+        # per-process caches, reset when accessed from a new (worker) process
+        self._pid = None
+        self._files = dict()
+        self._episodes = dict()
+        if cache_mode != "none":
+            for episode_id in episode_ids:
+                self._episodes[episode_id] = self._load_episode(episode_id)
 
     def __len__(self):
+        if self.sample_mode == "step":
+            return int(self.cumulative_lens[-1])
         return len(self.episode_ids)
 
+    def __getstate__(self):
+        # open file handles cannot be shared with worker processes
+        state = self.__dict__.copy()
+        state["_files"] = dict()
+        state["_pid"] = None
+        return state
+
+    def _get_file(self, episode_id):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._files = dict()
+        if episode_id not in self._files:
+            self._files[episode_id] = h5py.File(
+                get_episode_path(self.dataset_dir, episode_id), "r"
+            )
+        return self._files[episode_id]
+
+    def _load_episode(self, episode_id):
+        keys = ["/observations/qpos", "/action"] + [
+            f"/observations/images/{cam_name}" for cam_name in self.camera_names
+        ]
+        with h5py.File(get_episode_path(self.dataset_dir, episode_id), "r") as root:
+            if self.cache_mode == "ram":
+                return {k: root[k][()] for k in keys}
+
+            cache_dir = os.path.join(
+                self.dataset_dir, ".cache", f"episode_{episode_id}"
+            )
+            # the .npy files are rewritten when the episode file changes
+            st = os.stat(get_episode_path(self.dataset_dir, episode_id))
+            signature = (st.st_size, st.st_mtime_ns)
+            signature_path = os.path.join(cache_dir, "signature.pkl")
+            cached_signature = None
+            if os.path.exists(signature_path):
+                with open(signature_path, "rb") as f:
+                    cached_signature = pickle.load(f)
+            if cached_signature != signature:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            os.makedirs(cache_dir, exist_ok=True)
+            episode = dict()
+            for k in keys:
+                npy_path = os.path.join(
+                    cache_dir, k.strip("/").replace("/", "_") + ".npy"
+                )
+                if not os.path.exists(npy_path):
+                    tmp_path = npy_path[:-4] + f".{os.getpid()}.tmp.npy"
+                    np.save(tmp_path, root[k][()])
+                    os.replace(tmp_path, npy_path)
+                episode[k] = np.load(npy_path, mmap_mode="r")
+            if cached_signature != signature:
+                with open(signature_path, "wb") as f:
+                    pickle.dump(signature, f)
+            return episode
+
+    def _get_episode(self, episode_id):
+        if self.cache_mode != "none":
+            return self._episodes[episode_id]
+        return self._get_file(episode_id)
+
     def __getitem__(self, index):
-        sample_full_episode = False
-
-        episode_id = self.episode_ids[index]
-        dataset_path = os.path.join(self.dataset_dir, f"episode_{episode_id}.hdf5")
-        with h5py.File(dataset_path, "r") as root:
-            is_sim = None
-            original_action_shape = root["/action"].shape
-            episode_len = original_action_shape[0]
-            if sample_full_episode:
-                start_ts = 0
-            else:
-                start_ts = np.random.choice(episode_len)
-            # get observation at start_ts only
-            qpos = root["/observations/qpos"][start_ts]
-            image_dict = dict()
-            for cam_name in self.camera_names:
-                image_dict[cam_name] = root[f"/observations/images/{cam_name}"][
-                    start_ts
-                ]
-            # get all actions after and including start_ts
-            if is_sim:
-                action = root["/action"][start_ts:]
-                action_len = episode_len - start_ts
-            else:
-                action = root["/action"][
-                    max(0, start_ts - 1) :
-                ]  # hack, to make timesteps more aligned
-                action_len = episode_len - max(
-                    0, start_ts - 1
-                )  # hack, to make timesteps more aligned
-
-        self.is_sim = is_sim
-        padded_action = np.zeros(
-            (self.max_action_len, action.shape[1]), dtype=np.float32
-        )  # 根据max_action_len初始化
+        if self.sample_mode == "step":
+            episode_idx = np.searchsorted(self.cumulative_lens, index, side="right")
+            start_ts = index - (
+                self.cumulative_lens[episode_idx] - self.episode_lens[episode_idx]
+            )
+        else:
+            episode_idx = index
+            start_ts = np.random.choice(self.episode_lens[episode_idx])
+        episode_id = self.episode_ids[episode_idx]
+        episode_len = self.episode_lens[episode_idx]
+
+        root = self._get_episode(episode_id)
+        is_sim = None
+        # get observation at start_ts only
+        qpos = root["/observations/qpos"][start_ts]
+        image_dict = dict()
+        for cam_name in self.camera_names:
+            image_dict[cam_name] = root[f"/observations/images/{cam_name}"][start_ts]
+        # get at most action_len actions after and including start_ts
+        if is_sim:
+            action_start = start_ts
+        else:
+            action_start = max(0, start_ts - 1)  # hack, to make timesteps more aligned
+        action_end = min(episode_len, action_start + self.action_len)
+        action = root["/action"][action_start:action_end]
+        action_len = action_end - action_start
+
+        padded_action = np.zeros((self.action_len, action.shape[1]), dtype=np.float32)
         padded_action[:action_len] = action
-        is_pad = np.ones(self.max_action_len, dtype=bool)  # 初始化为全1（True）
+        is_pad = np.ones(self.action_len, dtype=bool)  # 初始化为全1（True）
         is_pad[:action_len] = 0  # 前action_len个位置设置为0（False），表示非填充部分
 
         # new axis for different cameras
@@ -73,7 +176,7 @@ class EpisodicDataset(torch.utils.data.Dataset):
 
         # construct observations
         image_data = torch.from_numpy(all_cam_images)
-        qpos_data = torch.from_numpy(qpos).float()
+        qpos_data = torch.from_numpy(np.array(qpos)).float()
         action_data = torch.from_numpy(padded_action).float()
         is_pad = torch.from_numpy(is_pad).bool()
 
@@ -92,65 +195,98 @@ class EpisodicDataset(torch.utils.data.Dataset):
         return image_data, qpos_data, action_data, is_pad
 
 
-def get_norm_stats(dataset_dir, num_episodes):
-    all_qpos_data = []
-    all_action_data = []
+def get_dataset_signature(dataset_dir, num_episodes):
+    """Sizes and modification times of all episode files, to invalidate cached stats"""
+    signature = []
     for episode_idx in range(num_episodes):
-        dataset_path = os.path.join(dataset_dir, f"episode_{episode_idx}.hdf5")
-        with h5py.File(dataset_path, "r") as root:
-            qpos = root["/observations/qpos"][()]  # Assuming this is a numpy array
-            action = root["/action"][()]
-        all_qpos_data.append(torch.from_numpy(qpos))
-        all_action_data.append(torch.from_numpy(action))
-
-    # Pad all tensors to the maximum size
-    max_qpos_len = max(q.size(0) for q in all_qpos_data)
-    max_action_len = max(a.size(0) for a in all_action_data)
-
-    padded_qpos = []
-    for qpos in all_qpos_data:
-        current_len = qpos.size(0)
-        if current_len < max_qpos_len:
-            # Pad with the last element
-            pad = qpos[-1:].repeat(max_qpos_len - current_len, 1)
-            qpos = torch.cat([qpos, pad], dim=0)
-        padded_qpos.append(qpos)
-
-    padded_action = []
-    for action in all_action_data:
-        current_len = action.size(0)
-        if current_len < max_action_len:
-            pad = action[-1:].repeat(max_action_len - current_len, 1)
-            action = torch.cat([action, pad], dim=0)
-        padded_action.append(action)
-
-    all_qpos_data = torch.stack(padded_qpos)
-    all_action_data = torch.stack(padded_action)
-    all_action_data = all_action_data
-
-    # normalize action data
-    action_mean = all_action_data.mean(dim=[0, 1], keepdim=True)
-    action_std = all_action_data.std(dim=[0, 1], keepdim=True)
-    action_std = torch.clip(action_std, 1e-2, np.inf)  # clipping
-
-    # normalize qpos data
-    qpos_mean = all_qpos_data.mean(dim=[0, 1], keepdim=True)
-    qpos_std = all_qpos_data.std(dim=[0, 1], keepdim=True)
-    qpos_std = torch.clip(qpos_std, 1e-2, np.inf)  # clipping
-
-    stats = {
-        "action_mean": action_mean.numpy().squeeze(),
-        "action_std": action_std.numpy().squeeze(),
-        "qpos_mean": qpos_mean.numpy().squeeze(),
-        "qpos_std": qpos_std.numpy().squeeze(),
-        "example_qpos": qpos,
-    }
-
-    return stats, max_action_len
+        st = os.stat(get_episode_path(dataset_dir, episode_idx))
+        signature.append((st.st_size, st.st_mtime_ns))
+    return signature
+
+
+def get_norm_stats(dataset_dir, num_episodes, use_cache=True):
+    """
+    Computes qpos and action normalization stats in one streaming pass over the
+    episodes, without holding the whole dataset in memory.
+
+    As before, shorter episodes are treated as padded with their last element up to
+    the longest episode, and std is the unbiased estimate clipped at 1e-2. The stats
+    are cached in norm_stats.pkl next to the data and recomputed when any episode
+    file changes.
+
+    Returns:
+        stats (dict): normalization stats
+        max_action_len (int): length of the longest episode
+        episode_lens (dict): maps episode index to episode length
+    """
+    cache_path = os.path.join(dataset_dir, "norm_stats.pkl")
+    signature = get_dataset_signature(dataset_dir, num_episodes)
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            cache = pickle.load(f)
+        if cache.get("signature") == signature:
+            return cache["stats"], cache["max_action_len"], cache["episode_lens"]
+
+    sums = dict(qpos=0.0, action=0.0)
+    sq_sums = dict(qpos=0.0, action=0.0)
+    last_rows = dict(qpos=[], action=[])
+    lens = dict(qpos=[], action=[])
+    for episode_idx in range(num_episodes):
+        with h5py.File(get_episode_path(dataset_dir, episode_idx), "r") as root:
+            data = dict(
+                qpos=root["/observations/qpos"][()],  # Assuming this is a numpy array
+                action=root["/action"][()],
+            )
+        for k, v in data.items():
+            v64 = v.astype(np.float64)
+            sums[k] = sums[k] + v64.sum(axis=0)
+            sq_sums[k] = sq_sums[k] + (v64 * v64).sum(axis=0)
+            last_rows[k].append(v64[-1])
+            lens[k].append(v.shape[0])
+
+    stats = {}
+    for k in ["action", "qpos"]:
+        # account for padding every episode with its last element to the longest episode
+        max_len = max(lens[k])
+        pad_counts = max_len - np.array(lens[k], dtype=np.float64)
+        last = np.stack(last_rows[k])
+        total = sums[k] + (last * pad_counts[:, None]).sum(axis=0)
+        sq_total = sq_sums[k] + (last * last * pad_counts[:, None]).sum(axis=0)
+        n = max_len * num_episodes
+        mean = total / n
+        var = np.maximum(sq_total - n * mean * mean, 0.0) / max(n - 1, 1)
+        std = np.clip(np.sqrt(var), 1e-2, np.inf)  # clipping
+        stats[f"{k}_mean"] = mean.astype(data[k].dtype)
+        stats[f"{k}_std"] = std.astype(data[k].dtype)
+    stats["example_qpos"] = data["qpos"]
+
+    max_action_len = max(lens["action"])
+    episode_lens = {i: l for i, l in enumerate(lens["action"])}
+    if use_cache:
+        with open(cache_path, "wb") as f:
+            pickle.dump(
+                dict(
+                    signature=signature,
+                    stats=stats,
+                    max_action_len=max_action_len,
+                    episode_lens=episode_lens,
+                ),
+                f,
+            )
+
+    return stats, max_action_len, episode_lens
 
 
 def load_data(
-    dataset_dir, num_episodes, camera_names, batch_size_train, batch_size_val
+    dataset_dir,
+    num_episodes,
+    camera_names,
+    batch_size_train,
+    batch_size_val,
+    chunk_size=None,
+    sample_mode="episode",
+    cache_mode="none",
+    num_workers=None,
 ):
     print(f"\nData from: {dataset_dir}\n")
     # obtain train test split
@@ -160,31 +296,31 @@ def load_data(
     val_indices = shuffled_indices[int(train_ratio * num_episodes) :]
 
     # obtain normalization stats for qpos and action
-    norm_stats, max_action_len = get_norm_stats(dataset_dir, num_episodes)
+    norm_stats, max_action_len, episode_lens = get_norm_stats(dataset_dir, num_episodes)
 
     # construct dataset and dataloader
-    train_dataset = EpisodicDataset(
-        train_indices, dataset_dir, camera_names, norm_stats, max_action_len
-    )
-    val_dataset = EpisodicDataset(
-        val_indices, dataset_dir, camera_names, norm_stats, max_action_len
+    dataset_kwargs = dict(
+        dataset_dir=dataset_dir,
+        camera_names=camera_names,
+        norm_stats=norm_stats,
+        max_action_len=max_action_len,
+        chunk_size=chunk_size,
+        episode_lens=episode_lens,
+        sample_mode=sample_mode,
+        cache_mode=cache_mode,
     )
+    train_dataset = EpisodicDataset(train_indices, **dataset_kwargs)
+    val_dataset = EpisodicDataset(val_indices, **dataset_kwargs)
+
+    if num_workers is None:
+        num_workers = min(8, os.cpu_count() or 1)
+    loader_kwargs = dict(shuffle=True, pin_memory=True, num_workers=num_workers)
+    if num_workers > 0:
+        loader_kwargs.update(persistent_workers=True, prefetch_factor=2)
     train_dataloader = DataLoader(
-        train_dataset,
-        batch_size=batch_size_train,
-        shuffle=True,
-        pin_memory=True,
-        num_workers=1,
-        prefetch_factor=1,
-    )
-    val_dataloader = DataLoader(
-        val_dataset,
-        batch_size=batch_size_val,
-        shuffle=True,
-        pin_memory=True,
-        num_workers=1,
-        prefetch_factor=1,
+        train_dataset, batch_size=batch_size_train, **loader_kwargs
     )
+    val_dataloader = DataLoader(val_dataset, batch_size=batch_size_val, **loader_kwargs)
 
     return train_dataloader, val_dataloader, norm_stats, train_dataset.is_sim
 
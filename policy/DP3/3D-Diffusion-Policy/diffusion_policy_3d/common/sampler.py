@@ -1,4 +1,8 @@
 from typing import Optional
+import os
+import threading
+import collections
+import concurrent.futures
 import numpy as np
 import numba
 from diffusion_policy_3d.common.replay_buffer import ReplayBuffer
@@ -80,6 +84,115 @@ def downsample_mask(mask, max_n, seed=0):
     return train_mask
 
 
+class ChunkCache:
+    """
+    Reads an on-disk zarr array through an LRU cache of its chunks along the
+    first axis, so that each chunk is decompressed once rather than once for
+    every sequence that overlaps it. Chunks can be loaded ahead of time on a
+    thread pool with `prefetch`.
+    """
+
+    def __init__(self, array, max_bytes=1 << 30, num_prefetch_threads=4):
+        self.array = array
+        self.shape = array.shape
+        self.dtype = array.dtype
+        self.chunk_length = array.chunks[0]
+        chunk_bytes = (
+            self.chunk_length * int(np.prod(self.shape[1:])) * self.dtype.itemsize
+        )
+        self.max_chunks = max(1, max_bytes // max(chunk_bytes, 1))
+        self.num_prefetch_threads = num_prefetch_threads
+        self._chunks = collections.OrderedDict()
+        self._init_process_state()
+
+    def _init_process_state(self):
+        # Threads and locks do not survive a fork into a DataLoader worker
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._pending = dict()
+        self._executor = None
+
+    def _check_process(self):
+        if self._pid != os.getpid():
+            self._init_process_state()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _load_chunk(self, chunk_idx):
+        start = chunk_idx * self.chunk_length
+        chunk = self.array[start : start + self.chunk_length]
+        with self._lock:
+            self._chunks[chunk_idx] = chunk
+            self._chunks.move_to_end(chunk_idx)
+            while len(self._chunks) > self.max_chunks:
+                self._chunks.popitem(last=False)
+            self._pending.pop(chunk_idx, None)
+        return chunk
+
+    def get_chunk(self, chunk_idx):
+        self._check_process()
+        with self._lock:
+            chunk = self._chunks.get(chunk_idx)
+            if chunk is not None:
+                self._chunks.move_to_end(chunk_idx)
+                return chunk
+            future = self._pending.get(chunk_idx)
+        if future is not None:
+            return future.result()
+        return self._load_chunk(chunk_idx)
+
+    def prefetch(self, start, stop):
+        """Starts loading the chunks of rows [start, stop) in the background."""
+        self._check_process()
+        if self.num_prefetch_threads <= 0:
+            return
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                self.num_prefetch_threads, thread_name_prefix="chunk_prefetch"
+            )
+        first = start // self.chunk_length
+        last = (stop - 1) // self.chunk_length
+        with self._lock:
+            for chunk_idx in range(first, last + 1):
+                if chunk_idx in self._chunks or chunk_idx in self._pending:
+                    continue
+                self._pending[chunk_idx] = self._executor.submit(
+                    self._load_chunk, chunk_idx
+                )
+
+    def __getitem__(self, key):
+        assert isinstance(key, slice) and key.step in (None, 1)
+        start, stop, _ = key.indices(self.shape[0])
+        stop = max(start, stop)
+        first = start // self.chunk_length
+        last = (stop - 1) // self.chunk_length
+        if stop > start and first == last:
+            offset = first * self.chunk_length
+            return self.get_chunk(first)[start - offset : stop - offset].copy()
+        result = np.empty((stop - start,) + self.shape[1:], dtype=self.dtype)
+        for chunk_idx in range(first, last + 1):
+            offset = chunk_idx * self.chunk_length
+            lo = max(start, offset)
+            hi = min(stop, offset + self.chunk_length)
+            result[lo - start : hi - start] = self.get_chunk(chunk_idx)[
+                lo - offset : hi - offset
+            ]
+        return result
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("_lock", "_pending", "_executor"):
+            del state[key]
+        # Workers started with spawn begin with an empty cache
+        state["_chunks"] = collections.OrderedDict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_process_state()
+
+
 class SequenceSampler:
     def __init__(
         self,
@@ -90,10 +203,17 @@ class SequenceSampler:
         keys=None,
         key_first_k=dict(),
         episode_mask: Optional[np.ndarray] = None,
+        cache_bytes: Optional[int] = None,
+        num_prefetch_threads: int = 4,
     ):
         """
         key_first_k: dict str: int
             Only take first k data from these keys (to improve perf)
+        cache_bytes: int
+            For a zarr backed replay buffer, read every key through a ChunkCache
+            of this size instead of reading each sequence from the store
+        num_prefetch_threads: int
+            Threads per key that load the chunks passed to `prefetch`
         """
 
         super().__init__()
@@ -123,9 +243,39 @@ class SequenceSampler:
         self.replay_buffer = replay_buffer
         self.key_first_k = key_first_k
 
+        # the cache is shared between keys in proportion to their row sizes
+        row_bytes = {
+            key: int(np.prod(replay_buffer[key].shape[1:]))
+            * replay_buffer[key].dtype.itemsize
+            for key in self.keys
+        }
+        self.arrays = dict()
+        for key in self.keys:
+            array = replay_buffer[key]
+            if cache_bytes is not None and replay_buffer.backend == "zarr":
+                array = ChunkCache(
+                    array,
+                    max_bytes=cache_bytes * row_bytes[key] // sum(row_bytes.values()),
+                    num_prefetch_threads=num_prefetch_threads,
+                )
+            self.arrays[key] = array
+
     def __len__(self):
         return len(self.indices)
 
+    def prefetch(self, idxs):
+        """Starts loading the chunks of the sequences `idxs` in the background."""
+        for key, array in self.arrays.items():
+            if not isinstance(array, ChunkCache):
+                continue
+            for idx in idxs:
+                buffer_start_idx, buffer_end_idx = self.indices[idx][:2]
+                if key in self.key_first_k:
+                    buffer_end_idx = min(
+                        buffer_end_idx, buffer_start_idx + self.key_first_k[key]
+                    )
+                array.prefetch(buffer_start_idx, buffer_end_idx)
+
     def sample_sequence(self, idx):
         (
             buffer_start_idx,
@@ -135,7 +285,7 @@ class SequenceSampler:
         ) = self.indices[idx]
         result = dict()
         for key in self.keys:
-            input_arr = self.replay_buffer[key]
+            input_arr = self.arrays[key]
             # performance optimization, avoid small allocation if possible
             if key not in self.key_first_k:
                 sample = input_arr[buffer_start_idx:buffer_end_idx]
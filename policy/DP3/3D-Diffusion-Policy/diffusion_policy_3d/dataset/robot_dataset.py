@@ -35,15 +35,31 @@ class RobotDataset(BaseDataset):
         val_ratio=0.0,
         max_train_episodes=None,
         task_name=None,
+        load_to_memory=True,
+        cache_size_mb=512,
+        num_prefetch_threads=4,
     ):
         super().__init__()
         self.task_name = task_name
         current_file_path = os.path.abspath(__file__)
         parent_directory = os.path.dirname(current_file_path)
         zarr_path = os.path.join(parent_directory, zarr_path)
-        self.replay_buffer = ReplayBuffer.copy_from_path(
-            zarr_path, keys=["state", "action", "point_cloud"]
-        )  # 'img'
+        keys = ["state", "action", "point_cloud"]
+        if load_to_memory:
+            self.replay_buffer = ReplayBuffer.copy_from_path(zarr_path, keys=keys)
+            cache_bytes = None
+        else:
+            # read sequences from the zarr store through a chunk cache, for
+            # datasets that do not fit in memory. cache_size_mb is per process:
+            # every DataLoader worker (of the train and the val loader) fills
+            # its own cache, so the total is about num_workers * cache_size_mb
+            self.replay_buffer = ReplayBuffer.create_from_path(zarr_path, mode="r")
+            cache_bytes = int(cache_size_mb * 2**20)
+        self.sampler_kwargs = dict(
+            keys=keys,
+            cache_bytes=cache_bytes,
+            num_prefetch_threads=num_prefetch_threads,
+        )
         val_mask = get_val_mask(
             n_episodes=self.replay_buffer.n_episodes, val_ratio=val_ratio, seed=seed
         )
@@ -57,6 +73,7 @@ class RobotDataset(BaseDataset):
             pad_before=pad_before,
             pad_after=pad_after,
             episode_mask=train_mask,
+            **self.sampler_kwargs,
         )
         self.train_mask = train_mask
         self.horizon = horizon
@@ -71,11 +88,13 @@ class RobotDataset(BaseDataset):
             pad_before=self.pad_before,
             pad_after=self.pad_after,
             episode_mask=~self.train_mask,
+            **self.sampler_kwargs,
         )
         val_set.train_mask = ~self.train_mask
         return val_set
 
     def get_normalizer(self, mode="limits", **kwargs):
+        # zarr arrays of an on-disk replay buffer are fitted chunk by chunk
         data = {
             "action": self.replay_buffer["action"],
             "agent_pos": self.replay_buffer["state"][..., :],
@@ -110,3 +129,9 @@ class RobotDataset(BaseDataset):
         data = self._sample_to_data(sample)
         torch_data = dict_apply(data, torch.from_numpy)
         return torch_data
+
+    def __getitems__(self, idxs):
+        # the DataLoader passes the indices of a whole batch, so that their
+        # chunks can be loaded in parallel while the first samples are built
+        self.sampler.prefetch(idxs)
+        return [self[idx] for idx in idxs]
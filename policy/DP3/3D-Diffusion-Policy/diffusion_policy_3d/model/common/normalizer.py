@@ -206,25 +206,29 @@ def _fit(
     assert last_n_dims >= 0
     assert output_max > output_min
 
-    # convert data to torch and type
     if isinstance(data, zarr.Array):
-        data = data[:]
-    if isinstance(data, np.ndarray):
-        data = torch.from_numpy(data)
-    if dtype is not None:
-        data = data.type(dtype)
-
-    # convert shape
-    dim = 1
-    if last_n_dims > 0:
-        dim = np.prod(data.shape[-last_n_dims:])
-    data = data.reshape(-1, dim)
-
-    # compute input stats min max mean std
-    input_min, _ = data.min(axis=0)
-    input_max, _ = data.max(axis=0)
-    input_mean = data.mean(axis=0)
-    input_std = data.std(axis=0)
+        # on-disk arrays may not fit in memory, compute the stats chunk by chunk
+        input_min, input_max, input_mean, input_std = _streaming_stats(
+            data, last_n_dims=last_n_dims, dtype=dtype
+        )
+    else:
+        # convert data to torch and type
+        if isinstance(data, np.ndarray):
+            data = torch.from_numpy(data)
+        if dtype is not None:
+            data = data.type(dtype)
+
+        # convert shape
+        dim = 1
+        if last_n_dims > 0:
+            dim = np.prod(data.shape[-last_n_dims:])
+        data = data.reshape(-1, dim)
+
+        # compute input stats min max mean std
+        input_min, _ = data.min(axis=0)
+        input_max, _ = data.max(axis=0)
+        input_mean = data.mean(axis=0)
+        input_std = data.std(axis=0)
 
     # compute scale and offset
     if mode == "limits":
@@ -280,6 +284,43 @@ def _fit(
     return this_params
 
 
+def _streaming_stats(data: zarr.Array, last_n_dims=1, dtype=torch.float32):
+    """
+    Per-dimension min, max, mean and (unbiased) std of a zarr array, reading
+    one chunk of rows at a time and merging the moments in float64.
+    """
+    dim = 1
+    if last_n_dims > 0:
+        dim = int(np.prod(data.shape[-last_n_dims:]))
+    input_min = np.full(dim, np.inf)
+    input_max = np.full(dim, -np.inf)
+    mean = np.zeros(dim)
+    m2 = np.zeros(dim)
+    count = 0
+    chunk_length = data.chunks[0]
+    for start in range(0, data.shape[0], chunk_length):
+        x = data[start : start + chunk_length].astype(np.float64).reshape(-1, dim)
+        if len(x) == 0:
+            continue
+        input_min = np.minimum(input_min, x.min(axis=0))
+        input_max = np.maximum(input_max, x.max(axis=0))
+        x_mean = x.mean(axis=0)
+        x_m2 = np.square(x - x_mean).sum(axis=0)
+        # parallel variance update (Chan et al.)
+        delta = x_mean - mean
+        total = count + len(x)
+        mean = mean + delta * len(x) / total
+        m2 = m2 + x_m2 + np.square(delta) * count * len(x) / total
+        count = total
+    std = np.sqrt(m2 / max(count - 1, 1))
+
+    if dtype is None:
+        dtype = torch.from_numpy(np.zeros(0, dtype=data.dtype)).dtype
+    return tuple(
+        torch.from_numpy(x).type(dtype) for x in (input_min, input_max, mean, std)
+    )
+
+
 def _normalize(x, params, forward=True):
     assert "scale" in params
     if isinstance(x, np.ndarray):
@@ -5,6 +5,10 @@ import torch.nn as nn
 import torch.nn.functional as F
 from einops import rearrange, reduce
 from diffusers.schedulers.scheduling_ddpm import DDPMScheduler
+from diffusers.schedulers.scheduling_ddim import DDIMScheduler
+from diffusers.schedulers.scheduling_dpmsolver_multistep import (
+    DPMSolverMultistepScheduler,
+)
 from termcolor import cprint
 import copy
 import time
@@ -20,6 +24,32 @@ from diffusion_policy_3d.common.pytorch_util import dict_apply
 from diffusion_policy_3d.common.model_util import print_params
 from diffusion_policy_3d.model.vision.pointnet_extractor import DP3Encoder
 
+# Samplers that can replace the training scheduler at inference time. They are
+# built from the training scheduler's config, so they share its noise schedule
+# and prediction type and work with any trained checkpoint.
+INFERENCE_SCHEDULERS = {
+    "ddpm": lambda config: DDPMScheduler.from_config(config),
+    "ddim": lambda config: DDIMScheduler.from_config(config),
+    "dpmsolver++": lambda config: DPMSolverMultistepScheduler.from_config(
+        config, algorithm_type="dpmsolver++", solver_order=2
+    ),
+}
+
+
+def make_inference_scheduler(noise_scheduler, name=None):
+    """
+    Sampler named `name` (see INFERENCE_SCHEDULERS) with the noise schedule of
+    `noise_scheduler`, or a copy of `noise_scheduler` itself if `name` is None.
+    """
+    if name is None:
+        return copy.deepcopy(noise_scheduler)
+    if name not in INFERENCE_SCHEDULERS:
+        raise ValueError(
+            f"Unsupported inference scheduler {name}, "
+            f"choose from {list(INFERENCE_SCHEDULERS)}"
+        )
+    return INFERENCE_SCHEDULERS[name](noise_scheduler.config)
+
 
 class DP3(BasePolicy):
     def __init__(
@@ -30,6 +60,7 @@ class DP3(BasePolicy):
         n_action_steps,
         n_obs_steps,
         num_inference_steps=None,
+        inference_scheduler=None,
         obs_as_global_cond=True,
         diffusion_step_embed_dim=256,
         down_dims=(256, 512, 1024),
@@ -131,13 +162,23 @@ class DP3(BasePolicy):
         self.obs_as_global_cond = obs_as_global_cond
         self.kwargs = kwargs
 
-        if num_inference_steps is None:
-            num_inference_steps = noise_scheduler.config.num_train_timesteps
-        self.num_inference_steps = num_inference_steps
+        self.set_inference_scheduler(inference_scheduler, num_inference_steps)
 
         print_params(self)
 
     # ========= inference  ============
+    def set_inference_scheduler(self, name=None, num_inference_steps=None):
+        """
+        Sample actions with the `name` sampler in `num_inference_steps` steps
+        (all training timesteps if None), e.g. ("dpmsolver++", 5). Only affects
+        inference, so it can be changed on a trained policy without retraining.
+        """
+        if num_inference_steps is None:
+            num_inference_steps = self.noise_scheduler.config.num_train_timesteps
+        self.inference_scheduler = make_inference_scheduler(self.noise_scheduler, name)
+        self.inference_scheduler_name = name
+        self.num_inference_steps = num_inference_steps
+
     def conditional_sample(
         self,
         condition_data,
@@ -151,15 +192,16 @@ class DP3(BasePolicy):
         **kwargs,
     ):
         model = self.model
-        scheduler = self.noise_scheduler
+        scheduler = self.inference_scheduler
 
         trajectory = torch.randn(
             size=condition_data.shape,
             dtype=condition_data.dtype,
             device=condition_data.device,
+            generator=generator,
         )
 
-        # set step values
+        # set step values, this also resets the state of multistep samplers
         scheduler.set_timesteps(self.num_inference_steps)
 
         for t in scheduler.timesteps:
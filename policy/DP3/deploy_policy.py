@@ -59,6 +59,11 @@ def get_model(usr_args):
     cfg.expert_data_num = usr_args["expert_data_num"]
     cfg.raw_task_name = usr_args["task_name"]
     cfg.policy.use_pc_color = usr_args["use_rgb"]
+    # Few-step samplers can replace the training scheduler without retraining
+    if usr_args.get("inference_scheduler") is not None:
+        cfg.policy.inference_scheduler = usr_args["inference_scheduler"]
+    if usr_args.get("num_inference_steps") is not None:
+        cfg.policy.num_inference_steps = usr_args["num_inference_steps"]
     OmegaConf.set_struct(cfg, True)
 
     DP3_Model = DP3(cfg, usr_args)
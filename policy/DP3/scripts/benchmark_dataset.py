@@ -0,0 +1,173 @@
+"""
+Compare the in-memory and on-disk modes of RobotDataset.
+
+For every mode the script reports the time to open the dataset and fit the
+normalizer, the training throughput of a shuffled DataLoader and the peak
+resident memory. Each mode runs in its own process, so the memory of one does
+not count towards the other.
+
+Without --zarr_path a synthetic dataset with the layout of process_data.py is
+written first.
+
+Example:
+    python scripts/benchmark_dataset.py --num_episodes 200 --num_workers 8
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../3D-Diffusion-Policy"))
+
+from diffusion_policy_3d.common.replay_buffer import ReplayBuffer
+
+
+def write_synthetic_dataset(path, num_episodes, episode_length, num_points, seed):
+    rng = np.random.default_rng(seed)
+    replay_buffer = ReplayBuffer.create_from_path(path, mode="w")
+    chunks = {
+        "point_cloud": (100, num_points, 6),
+        "state": (100, 14),
+        "action": (100, 14),
+    }
+    for _ in range(num_episodes):
+        replay_buffer.add_episode(
+            {
+                "point_cloud": rng.standard_normal(
+                    (episode_length, num_points, 6), dtype=np.float32
+                ),
+                "state": rng.standard_normal((episode_length, 14), dtype=np.float32),
+                "action": rng.standard_normal((episode_length, 14), dtype=np.float32),
+            },
+            chunks=chunks,
+            compressors="disk",
+        )
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kB on Linux
+    usage = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return usage / 1024
+
+
+def run_mode(args, load_to_memory):
+    import torch
+    from torch.utils.data import DataLoader
+    from diffusion_policy_3d.dataset.robot_dataset import RobotDataset
+
+    torch.manual_seed(args.seed)
+    start = time.perf_counter()
+    dataset = RobotDataset(
+        zarr_path=os.path.abspath(args.zarr_path),
+        horizon=args.horizon,
+        pad_before=args.n_obs_steps - 1,
+        pad_after=args.n_action_steps - 1,
+        load_to_memory=load_to_memory,
+        cache_size_mb=args.cache_size_mb,
+        num_prefetch_threads=args.num_prefetch_threads,
+    )
+    open_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dataset.get_normalizer()
+    normalizer_time = time.perf_counter() - start
+
+    dataloader = DataLoader(
+        dataset,
+        batch_size=args.batch_size,
+        shuffle=True,
+        num_workers=args.num_workers,
+        persistent_workers=False,
+    )
+    num_samples = 0
+    start = None
+    for i, batch in enumerate(dataloader):
+        if i == args.num_warmup_batches:
+            # don't count worker startup
+            start = time.perf_counter()
+            num_samples = 0
+        num_samples += len(batch["action"])
+        if i == args.num_warmup_batches + args.num_batches:
+            break
+    throughput = num_samples / (time.perf_counter() - start)
+    return {
+        "open_s": open_time,
+        "normalizer_s": normalizer_time,
+        "samples_per_s": throughput,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark in-memory against on-disk RobotDataset."
+    )
+    parser.add_argument(
+        "--zarr_path", type=str, default=None, help="Dataset, synthetic if not given"
+    )
+    parser.add_argument("--num_episodes", type=int, default=100)
+    parser.add_argument("--episode_length", type=int, default=200)
+    parser.add_argument("--num_points", type=int, default=1024)
+    parser.add_argument("--horizon", type=int, default=8)
+    parser.add_argument("--n_obs_steps", type=int, default=3)
+    parser.add_argument("--n_action_steps", type=int, default=6)
+    parser.add_argument("--batch_size", type=int, default=256)
+    parser.add_argument("--num_workers", type=int, default=8)
+    parser.add_argument("--num_batches", type=int, default=50)
+    parser.add_argument("--num_warmup_batches", type=int, default=5)
+    parser.add_argument(
+        "--cache_size_mb",
+        type=float,
+        default=512,
+        help="chunk cache per dataloader worker, for the on-disk mode",
+    )
+    parser.add_argument("--num_prefetch_threads", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tmp_dir = None
+    if args.zarr_path is None:
+        tmp_dir = tempfile.mkdtemp()
+        args.zarr_path = os.path.join(tmp_dir, "synthetic.zarr")
+        print(f"Writing a synthetic dataset to {args.zarr_path}")
+        write_synthetic_dataset(
+            args.zarr_path,
+            args.num_episodes,
+            args.episode_length,
+            args.num_points,
+            args.seed,
+        )
+
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        results = {}
+        for name, load_to_memory in (("in-memory", True), ("on-disk", False)):
+            with ctx.Pool(1) as pool:
+                results[name] = pool.apply(run_mode, (args, load_to_memory))
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir)
+
+    print(
+        f"{'mode':<12}{'open s':>9}{'normalizer s':>14}{'samples/s':>12}"
+        f"{'peak rss MB':>13}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<12}{result['open_s']:>9.1f}{result['normalizer_s']:>14.1f}"
+            f"{result['samples_per_s']:>12.0f}{result['peak_rss_mb']:>13.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Compare few-step diffusion samplers against the full-step sampler of a DP3 policy.
+
+Every sampler is run on the same observations and the same initial noise as the
+reference, the training scheduler with all of its training timesteps. For each
+sampler the script reports the action error against the reference and the
+latency of a predict_action call, by default on CPU.
+
+Without --ckpt the policy keeps its random initialization and identity
+normalization, which is enough for latency but not for meaningful errors.
+Without --zarr_path the observations are random.
+
+Example:
+    python scripts/benchmark_samplers.py \
+        --ckpt ./checkpoints/beat_block_hammer-demo_clean-50_0/3000.ckpt \
+        --zarr_path ../../data/beat_block_hammer-demo_clean-50.zarr \
+        --samplers ddim:10 ddim:5 dpmsolver++:5 dpmsolver++:3
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import torch
+import dill
+import hydra
+from hydra import initialize_config_dir, compose
+from omegaconf import OmegaConf
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../3D-Diffusion-Policy"))
+
+from diffusion_policy_3d.common.replay_buffer import ReplayBuffer
+from diffusion_policy_3d.model.common.normalizer import SingleFieldLinearNormalizer
+
+OmegaConf.register_new_resolver("eval", eval, replace=True)
+
+CONFIG_DIR = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__), "../3D-Diffusion-Policy/diffusion_policy_3d/config"
+    )
+)
+
+
+def load_policy(config_name, task, ckpt, device):
+    with initialize_config_dir(config_dir=CONFIG_DIR, version_base="1.2"):
+        cfg = compose(config_name=config_name, overrides=[f"task={task}"])
+    if ckpt is not None:
+        payload = torch.load(open(ckpt, "rb"), pickle_module=dill, map_location="cpu")
+        cfg = payload["cfg"]
+    policy = hydra.utils.instantiate(cfg.policy)
+
+    if ckpt is not None:
+        state_dicts = payload["state_dicts"]
+        key = "ema_model" if "ema_model" in state_dicts else "model"
+        policy.load_state_dict(state_dicts[key])
+    else:
+        for key in list(cfg.shape_meta.obs.keys()) + ["action"]:
+            policy.normalizer[key] = SingleFieldLinearNormalizer.create_identity()
+    policy.eval().to(device)
+    return policy, cfg
+
+
+def get_observations(cfg, zarr_path, num_queries, seed):
+    """`num_queries` observation windows of n_obs_steps frames, as (1, To, ...) arrays."""
+    rng = np.random.default_rng(seed)
+    n_obs_steps = cfg.n_obs_steps
+    point_cloud_shape = tuple(cfg.shape_meta.obs.point_cloud.shape)
+    agent_pos_shape = tuple(cfg.shape_meta.obs.agent_pos.shape)
+
+    if zarr_path is None:
+        return [
+            {
+                "point_cloud": rng.standard_normal(
+                    (1, n_obs_steps) + point_cloud_shape
+                ).astype(np.float32),
+                "agent_pos": rng.standard_normal(
+                    (1, n_obs_steps) + agent_pos_shape
+                ).astype(np.float32),
+            }
+            for _ in range(num_queries)
+        ]
+
+    replay_buffer = ReplayBuffer.create_from_path(zarr_path, mode="r")
+    starts = rng.integers(0, replay_buffer.n_steps - n_obs_steps, num_queries)
+    observations = []
+    for start in starts:
+        window = slice(start, start + n_obs_steps)
+        observations.append(
+            {
+                "point_cloud": replay_buffer["point_cloud"][window][None],
+                "agent_pos": replay_buffer["state"][window][None],
+            }
+        )
+    return [{k: v.astype(np.float32) for k, v in obs.items()} for obs in observations]
+
+
+def run_sampler(policy, observations, seed, device):
+    """Predicted action chunks and predict_action latencies in seconds."""
+    actions, latencies = [], []
+    with torch.no_grad():
+        for i, obs in enumerate(observations):
+            obs = {k: torch.from_numpy(v).to(device) for k, v in obs.items()}
+            # Same initial noise for every sampler
+            torch.manual_seed(seed + i)
+            start = time.perf_counter()
+            action = policy.predict_action(obs)["action_pred"]
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            latencies.append(time.perf_counter() - start)
+            actions.append(action.cpu().numpy())
+    return np.concatenate(actions), np.asarray(latencies)
+
+
+def parse_sampler(spec):
+    """Parses name:steps, e.g. dpmsolver++:5 -> ("dpmsolver++", 5)."""
+    name, _, steps = spec.partition(":")
+    return name, int(steps) if steps else None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark few-step samplers against the full-step sampler."
+    )
+    parser.add_argument("--config_name", type=str, default="robot_dp3")
+    parser.add_argument("--task", type=str, default="demo_task")
+    parser.add_argument("--ckpt", type=str, default=None, help="Trained checkpoint")
+    parser.add_argument(
+        "--zarr_path", type=str, default=None, help="Dataset to draw observations from"
+    )
+    parser.add_argument(
+        "--samplers",
+        type=str,
+        nargs="+",
+        default=["ddim:10", "ddim:5", "dpmsolver++:10", "dpmsolver++:5"],
+        help="Samplers as name:steps",
+    )
+    parser.add_argument("--num_queries", type=int, default=20)
+    parser.add_argument("--num_warmup", type=int, default=2)
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    policy, cfg = load_policy(args.config_name, args.task, args.ckpt, device)
+    if args.ckpt is None:
+        print("No checkpoint given, errors of a randomly initialized policy")
+    observations = get_observations(cfg, args.zarr_path, args.num_queries, args.seed)
+    warmup = observations[: args.num_warmup]
+
+    num_train_timesteps = policy.noise_scheduler.config.num_train_timesteps
+    policy.set_inference_scheduler(None, num_train_timesteps)
+    run_sampler(policy, warmup, args.seed, device)
+    reference, reference_latencies = run_sampler(
+        policy, observations, args.seed, device
+    )
+
+    print(
+        f"{'sampler':<16}{'steps':>6}{'latency ms':>12}{'p90 ms':>10}"
+        f"{'speedup':>9}{'action rmse':>13}{'max abs err':>13}"
+    )
+
+    def report(name, steps, actions, latencies):
+        error = actions - reference
+        print(
+            f"{name:<16}{steps:>6}{1000 * latencies.mean():>12.1f}"
+            f"{1000 * np.percentile(latencies, 90):>10.1f}"
+            f"{reference_latencies.mean() / latencies.mean():>9.1f}"
+            f"{np.sqrt(np.mean(error**2)):>13.5f}{np.abs(error).max():>13.5f}"
+        )
+
+    report("reference", num_train_timesteps, reference, reference_latencies)
+    for spec in args.samplers:
+        name, steps = parse_sampler(spec)
+        policy.set_inference_scheduler(name, steps)
+        run_sampler(policy, warmup, args.seed, device)
+        actions, latencies = run_sampler(policy, observations, args.seed, device)
+        report(name, policy.num_inference_steps, actions, latencies)
+
+
+if __name__ == "__main__":
+    main()
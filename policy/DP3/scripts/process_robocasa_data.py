@@ -0,0 +1,296 @@
+"""
+Convert robomimic-format robocasa demos into the DP3 zarr layout, with point clouds.
+
+robocasa datasets contain no depth, so every demo is replayed from its
+simulator states: at every step the configured cameras render depth and RGB,
+which are back-projected into world-frame XYZRGB points, cropped to a workspace
+box and downsampled with farthest point sampling. Demos are processed in
+parallel worker processes (one environment each) and appended to the zarr
+ReplayBuffer one episode at a time, so the dataset never has to fit in memory.
+
+state is the 7 arm joint positions plus the first gripper joint, action is the
+next step's joint positions plus the gripper command, as in convert_to_lerobot.py.
+
+Example:
+    python scripts/process_robocasa_data.py \
+        --dataset ../../datasets/v0.1/single_stage/kitchen_pnp/PnPCounterToCab/demo.hdf5 \
+        --save_path ./data/PnPCounterToCab-robocasa.zarr \
+        --workspace -1.0 1.0 -1.0 1.0 0.7 2.0 --num_workers 8
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import multiprocessing
+
+import h5py
+import numpy as np
+from tqdm import tqdm
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../3D-Diffusion-Policy"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../.."))
+
+from diffusion_policy_3d.common.replay_buffer import ReplayBuffer
+
+CAMERA_NAMES = ["robot0_agentview_left", "robot0_agentview_right", "robot0_eye_in_hand"]
+
+
+def backproject_depth(depth, rgb, intrinsic, extrinsic):
+    """
+    Back-project a depth image into world-frame points.
+
+    depth: (H, W) depth in meters, rows from top to bottom
+    rgb: (H, W, 3) uint8 image aligned with depth
+    intrinsic: (3, 3) camera matrix
+    extrinsic: (4, 4) camera-to-world pose (camera looking along +z, y down)
+
+    Returns (H * W, 6) float32 XYZRGB points with RGB in [0, 1].
+    """
+    h, w = depth.shape
+    v, u = np.meshgrid(np.arange(h), np.arange(w), indexing="ij")
+    z = depth.reshape(-1)
+    x = (u.reshape(-1) - intrinsic[0, 2]) * z / intrinsic[0, 0]
+    y = (v.reshape(-1) - intrinsic[1, 2]) * z / intrinsic[1, 1]
+    points_cam = np.stack([x, y, z], axis=-1)
+    points_world = points_cam @ extrinsic[:3, :3].T + extrinsic[:3, 3]
+    colors = rgb.reshape(-1, 3).astype(np.float32) / 255.0
+    return np.concatenate([points_world, colors], axis=-1).astype(np.float32)
+
+
+def crop_to_workspace(points, workspace):
+    """Keep points inside the box (xmin, xmax, ymin, ymax, zmin, zmax)."""
+    lo = np.asarray(workspace[0::2], dtype=points.dtype)
+    hi = np.asarray(workspace[1::2], dtype=points.dtype)
+    mask = np.all((points[:, :3] >= lo) & (points[:, :3] <= hi), axis=1)
+    return points[mask]
+
+
+def select_candidates(points, num_candidates, rng):
+    """Randomly pick exactly `num_candidates` points, repeating points if there are too few."""
+    if len(points) == 0:
+        return np.zeros((num_candidates, points.shape[1]), dtype=points.dtype)
+    replace = len(points) < num_candidates
+    idx = rng.choice(len(points), num_candidates, replace=replace)
+    return points[idx]
+
+
+def farthest_point_sampling(points, num_samples):
+    """
+    Farthest point sampling for a batch of point clouds at once.
+
+    points: (B, N, 3) coordinates; duplicated points are allowed
+    Returns (B, num_samples) indices into the N points.
+    """
+    batch_size, num_points, _ = points.shape
+    # One contiguous (B, N) plane per axis keeps every iteration to a few in-place passes
+    coords = np.ascontiguousarray(points.transpose(2, 0, 1), dtype=np.float32)
+    indices = np.zeros((batch_size, num_samples), dtype=np.int64)
+    min_dist = np.full((batch_size, num_points), np.inf, dtype=np.float32)
+    dist = np.empty_like(min_dist)
+    tmp = np.empty_like(min_dist)
+    farthest = np.zeros(batch_size, dtype=np.int64)
+    batch = np.arange(batch_size)
+    for i in range(num_samples):
+        indices[:, i] = farthest
+        centroid = coords[:, batch, farthest]
+        np.subtract(coords[0], centroid[0][:, None], out=dist)
+        np.multiply(dist, dist, out=dist)
+        for axis in (1, 2):
+            np.subtract(coords[axis], centroid[axis][:, None], out=tmp)
+            np.multiply(tmp, tmp, out=tmp)
+            dist += tmp
+        np.minimum(min_dist, dist, out=min_dist)
+        farthest = np.argmax(min_dist, axis=1)
+    return indices
+
+
+def downsample_point_clouds(candidates, num_points, batch_size=64):
+    """Farthest point sampling of (T, N, C) candidates to (T, num_points, C), `batch_size` frames at a time."""
+    out = np.empty(
+        (len(candidates), num_points, candidates.shape[-1]), dtype=np.float32
+    )
+    for start in range(0, len(candidates), batch_size):
+        batch = candidates[start : start + batch_size]
+        idx = farthest_point_sampling(batch[..., :3], num_points)
+        out[start : start + batch_size] = np.take_along_axis(
+            batch, idx[..., None], axis=1
+        )
+    return out
+
+
+# Per-worker state, set up once by `init_worker`
+_worker = {}
+
+
+def init_worker(args):
+    import robosuite
+
+    from robocasa.scripts.dataset_scripts.playback_dataset import (
+        get_env_metadata_from_dataset,
+    )
+
+    env_meta = get_env_metadata_from_dataset(dataset_path=args.dataset)
+    env_kwargs = env_meta["env_kwargs"]
+    env_kwargs["env_name"] = env_meta["env_name"]
+    env_kwargs["has_renderer"] = False
+    env_kwargs["has_offscreen_renderer"] = True
+    env_kwargs["use_camera_obs"] = False
+
+    _worker["env"] = robosuite.make(**env_kwargs)
+    _worker["file"] = h5py.File(args.dataset, "r")
+    _worker["args"] = args
+
+
+def render_point_cloud(env, camera_names, height, width):
+    from robosuite.utils import camera_utils
+
+    clouds = []
+    for camera_name in camera_names:
+        rgb, depth = env.sim.render(
+            height=height, width=width, camera_name=camera_name, depth=True
+        )
+        # MuJoCo renders bottom-up
+        rgb, depth = rgb[::-1], depth[::-1]
+        depth = camera_utils.get_real_depth_map(env.sim, depth)
+        intrinsic = camera_utils.get_camera_intrinsic_matrix(
+            env.sim, camera_name, height, width
+        )
+        extrinsic = camera_utils.get_camera_extrinsic_matrix(env.sim, camera_name)
+        clouds.append(backproject_depth(depth, rgb, intrinsic, extrinsic))
+    return np.concatenate(clouds, axis=0)
+
+
+def process_demo(demo):
+    from robocasa.scripts.dataset_scripts.playback_dataset import reset_to
+
+    env, f, args = _worker["env"], _worker["file"], _worker["args"]
+    demo_grp = f[f"data/{demo}"]
+    states = demo_grp["states"][()]
+    joint_pos = demo_grp["obs/robot0_joint_pos"][()]
+    gripper_qpos = demo_grp["obs/robot0_gripper_qpos"][()]
+    actions = demo_grp["actions"][()]
+
+    reset_to(
+        env,
+        {
+            "states": states[0],
+            "model": demo_grp.attrs["model_file"],
+            "ep_meta": demo_grp.attrs.get("ep_meta", None),
+        },
+    )
+
+    # Like process_data.py, the last frame only provides the action of the one before it
+    num_steps = len(states) - 1
+    rng = np.random.default_rng(args.seed + int(demo.split("_")[-1]))
+    candidates = np.empty((num_steps, args.num_candidates, 6), dtype=np.float32)
+    for t in range(num_steps):
+        reset_to(env, {"states": states[t]})
+        points = render_point_cloud(
+            env, args.camera_names, args.camera_height, args.camera_width
+        )
+        if args.workspace is not None:
+            points = crop_to_workspace(points, args.workspace)
+        candidates[t] = select_candidates(points, args.num_candidates, rng)
+
+    point_cloud = downsample_point_clouds(candidates, args.num_points)
+    if args.xyz_only:
+        point_cloud = np.ascontiguousarray(point_cloud[..., :3])
+
+    state = np.concatenate([joint_pos, gripper_qpos[:, :1]], axis=1).astype(np.float32)
+    action = np.concatenate([joint_pos[1:], actions[:-1, 6:7]], axis=1).astype(
+        np.float32
+    )
+    return {
+        "point_cloud": point_cloud,
+        "state": state[:-1],
+        "action": action,
+    }
+
+
+def get_demos(dataset, filter_key=None, n=None):
+    with h5py.File(dataset, "r") as f:
+        if filter_key is not None:
+            demos = [elem.decode("utf-8") for elem in np.array(f[f"mask/{filter_key}"])]
+        else:
+            demos = list(f["data"].keys())
+    demos = sorted(demos, key=lambda demo: int(demo[5:]))
+    if n is not None:
+        demos = demos[:n]
+    return demos
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert robocasa demos to a DP3 zarr dataset."
+    )
+    parser.add_argument(
+        "--dataset", type=str, required=True, help="robomimic-format robocasa hdf5 file"
+    )
+    parser.add_argument(
+        "--save_path", type=str, required=True, help="Output .zarr directory"
+    )
+    parser.add_argument("--filter_key", type=str, default=None)
+    parser.add_argument(
+        "--n", type=int, default=None, help="Number of demos to convert"
+    )
+    parser.add_argument("--camera_names", type=str, nargs="+", default=CAMERA_NAMES)
+    parser.add_argument("--camera_height", type=int, default=128)
+    parser.add_argument("--camera_width", type=int, default=128)
+    parser.add_argument(
+        "--workspace",
+        type=float,
+        nargs=6,
+        default=None,
+        metavar=("XMIN", "XMAX", "YMIN", "YMAX", "ZMIN", "ZMAX"),
+        help="World-frame box to crop the point clouds to",
+    )
+    parser.add_argument("--num_points", type=int, default=1024)
+    parser.add_argument(
+        "--num_candidates",
+        type=int,
+        default=4096,
+        help="Points randomly kept per frame before farthest point sampling",
+    )
+    parser.add_argument(
+        "--xyz_only", action="store_true", help="Store XYZ instead of XYZRGB"
+    )
+    parser.add_argument(
+        "--chunk_length", type=int, default=100, help="zarr chunk length in steps"
+    )
+    parser.add_argument("--num_workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    demos = get_demos(args.dataset, args.filter_key, args.n)
+
+    if os.path.exists(args.save_path):
+        shutil.rmtree(args.save_path)
+    replay_buffer = ReplayBuffer.create_from_path(args.save_path, mode="w")
+
+    point_dim = 3 if args.xyz_only else 6
+    chunks = {
+        "point_cloud": (args.chunk_length, args.num_points, point_dim),
+        "state": (args.chunk_length, 8),
+        "action": (args.chunk_length, 8),
+    }
+    compressor = ReplayBuffer.resolve_compressor("disk")
+
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.num_workers, initializer=init_worker, initargs=(args,)) as pool:
+        # imap keeps the demo order while the workers run ahead
+        for episode in tqdm(
+            pool.imap(process_demo, demos), total=len(demos), desc="Converting demos"
+        ):
+            replay_buffer.add_episode(episode, chunks=chunks, compressors=compressor)
+
+    with open(os.path.join(args.save_path, "conversion_args.json"), "w") as f:
+        json.dump(vars(args), f, indent=2)
+    print(
+        f"Saved {replay_buffer.n_episodes} episodes ({replay_buffer.n_steps} steps) to {args.save_path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Measures the loading throughput of EpisodicDataset, in samples/sec in total and
+per DataLoader worker.
+
+The model's processor is replaced by a pass-through, so only reading, decoding
+and augmenting the samples is timed. Without --dataset_dir, synthetic episodes
+in the agilex layout are written to a temporary directory first.
+
+Example:
+    python data_utils/benchmark_dataset.py --num_workers 0 1 4 8
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from types import SimpleNamespace
+
+import cv2
+import h5py
+import numpy as np
+from torch.utils.data import DataLoader
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.dirname(__file__))
+
+from dataset import BatchSampler, EpisodicDataset, find_all_hdf5, get_norm_stats
+
+
+class PassThroughProcess:
+    def forward_process(self, sample, use_reasoning=True):
+        return {k: v for k, v in sample.items() if not isinstance(v, str)}
+
+
+def write_synthetic_episodes(
+    dataset_dir, num_episodes, episode_len, camera_names, compress, seed
+):
+    rng = np.random.default_rng(seed)
+    for i in range(num_episodes):
+        with h5py.File(os.path.join(dataset_dir, f"episode_{i}.hdf5"), "w") as root:
+            root.attrs["compress"] = compress
+            root["language_raw"] = np.bytes_(b"pick up the cup")
+            root["reasoning"] = np.array(
+                [f"step {t}".encode() for t in range(episode_len)]
+            )
+            root["/observations/qpos"] = rng.standard_normal(
+                (episode_len, 14), dtype=np.float32
+            )
+            root["/action"] = rng.standard_normal((episode_len, 14), dtype=np.float32)
+            for cam_name in camera_names:
+                images = rng.integers(0, 256, (episode_len, 480, 640, 3), np.uint8)
+                if compress:
+                    encoded = [cv2.imencode(".jpg", image)[1] for image in images]
+                    max_len = max(len(x) for x in encoded)
+                    images = np.zeros((episode_len, max_len), dtype=np.uint8)
+                    for t, x in enumerate(encoded):
+                        images[t, : len(x)] = x[:, 0]
+                root[f"/observations/images/{cam_name}"] = images
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark EpisodicDataset.")
+    parser.add_argument("--dataset_dir", type=str, default=None)
+    parser.add_argument(
+        "--camera_names", nargs="+", default=["cam_high", "cam_left_wrist"]
+    )
+    parser.add_argument("--num_episodes", type=int, default=8)
+    parser.add_argument("--episode_len", type=int, default=200)
+    parser.add_argument("--compress", action="store_true")
+    parser.add_argument("--chunk_size", type=int, default=50)
+    parser.add_argument("--action_dim", type=int, default=14)
+    parser.add_argument("--image_size_stable", type=str, default="(320,240)")
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument("--num_batches", type=int, default=50)
+    parser.add_argument("--num_workers", type=int, nargs="+", default=[0, 1, 4])
+    parser.add_argument(
+        "--gpu_image_augmentation",
+        action="store_true",
+        help="Only resize in the workers, as when the trainer augments on the device",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tmp_dir = None
+    if args.dataset_dir is None:
+        tmp_dir = tempfile.mkdtemp()
+        args.dataset_dir = tmp_dir
+        write_synthetic_episodes(
+            tmp_dir,
+            args.num_episodes,
+            args.episode_len,
+            args.camera_names,
+            args.compress,
+            args.seed,
+        )
+
+    try:
+        dataset_path_list = find_all_hdf5(args.dataset_dir, skip_mirrored_data=False)
+        norm_stats, episode_len = get_norm_stats(dataset_path_list, args.action_dim)
+        dataset = EpisodicDataset(
+            dataset_path_list,
+            args.camera_names,
+            norm_stats,
+            episode_ids=np.arange(len(dataset_path_list)),
+            episode_len=episode_len,
+            chunk_size=args.chunk_size,
+            policy_class="dit_diffusion_policy",
+            robot="aloha",
+            llava_pythia_process=PassThroughProcess(),
+            data_args=SimpleNamespace(
+                image_size_stable=args.image_size_stable,
+                history_images_length=1,
+                use_reasoning=True,
+                gpu_image_augmentation=args.gpu_image_augmentation,
+            ),
+            action_args=SimpleNamespace(action_dim=args.action_dim),
+        )
+
+        print(f"{'workers':>8}{'samples/s':>12}{'per worker':>12}")
+        for num_workers in args.num_workers:
+            np.random.seed(args.seed)
+            dataloader = DataLoader(
+                dataset,
+                batch_sampler=BatchSampler(args.batch_size, [episode_len], None),
+                num_workers=num_workers,
+                prefetch_factor=2 if num_workers > 0 else None,
+            )
+            iterator = iter(dataloader)
+            # the first batch includes starting the workers
+            next(iterator)
+            start = time.perf_counter()
+            for _ in range(args.num_batches):
+                next(iterator)
+            samples_per_s = args.num_batches * args.batch_size
+            samples_per_s /= time.perf_counter() - start
+            print(
+                f"{num_workers:>8}{samples_per_s:>12.1f}"
+                f"{samples_per_s / max(num_workers, 1):>12.1f}"
+            )
+            del iterator
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ import torchvision.transforms as transforms
 from torchvision.transforms.functional import to_pil_image, to_tensor
 import IPython
 import copy
+from collections import OrderedDict
 
 e = IPython.embed
 from aloha_scripts.utils import *
@@ -20,10 +21,10 @@ def flatten_list(l):
     return [item for sublist in l for item in sublist]
 
 
-import gc
-
-
 class EpisodicDataset(torch.utils.data.Dataset):
+    # h5py files kept open per process
+    max_open_files = 64
+
     def __init__(
         self,
         dataset_path_list,
@@ -54,6 +55,8 @@ class EpisodicDataset(torch.utils.data.Dataset):
         self.action_args = action_args
         self.robot = robot
         self.rank0_print = rank0_print
+        self._file_handles = OrderedDict()
+        self._file_pid = None
 
         original_size = (480, 640)
         new_size = eval(self.data_args.image_size_stable)  # 320, 240
@@ -72,6 +75,10 @@ class EpisodicDataset(torch.utils.data.Dataset):
             ),  # , hue=0.08)
             transforms.Resize(size=new_size, antialias=True),
         ]
+        if self.data_args.gpu_image_augmentation:
+            # the trainer augments the collated batches on the device, see
+            # data_utils/gpu_augmentation.py
+            self.transformations = [transforms.Resize(size=new_size, antialias=True)]
 
         self.rank0_print(
             f"########################Current Image Size is [{self.data_args.image_size_stable}]###################################"
@@ -80,6 +87,7 @@ class EpisodicDataset(torch.utils.data.Dataset):
             f"{RED}policy class: {self.policy_class}; augument: {True}{RESET}"
         )
         a = self.__getitem__(0)  # initialize self.is_sim and self.transformations
+        self.close()  # the DataLoader workers open their own files
         if len(self.camera_names) > 2:
             # self.rank0_print("%"*40)
             self.rank0_print(
@@ -88,124 +96,105 @@ class EpisodicDataset(torch.utils.data.Dataset):
         self.is_sim = False
 
     def __len__(self):
-        return sum(self.episode_len)
+        return int(self.cumulative_len[-1])
 
     def _locate_transition(self, index):
         assert index < self.cumulative_len[-1]
-        episode_index = np.argmax(
-            self.cumulative_len > index
-        )  # argmax returns first True index
+        # first episode whose cumulative length exceeds index
+        episode_index = np.searchsorted(self.cumulative_len, index, side="right")
         start_ts = index - (
             self.cumulative_len[episode_index] - self.episode_len[episode_index]
         )
         episode_id = self.episode_ids[episode_index]
         return episode_id, start_ts
 
+    def _get_file(self, dataset_path):
+        # h5py handles must not be shared with forked DataLoader workers, so each
+        # process opens its own and keeps the most recently used ones open
+        if self._file_pid != os.getpid():
+            self._file_handles = OrderedDict()
+            self._file_pid = os.getpid()
+        root = self._file_handles.get(dataset_path)
+        if root is None:
+            root = h5py.File(dataset_path, "r")
+            self._file_handles[dataset_path] = root
+            if len(self._file_handles) > self.max_open_files:
+                self._file_handles.popitem(last=False)[1].close()
+        else:
+            self._file_handles.move_to_end(dataset_path)
+        return root
+
+    def close(self):
+        for root in self._file_handles.values():
+            root.close()
+        self._file_handles = OrderedDict()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_file_handles"] = OrderedDict()
+        state["_file_pid"] = None
+        return state
+
     def load_from_h5(self, dataset_path, start_ts):
+        """
+        Reads only what one sample needs: the images, qpos and reasoning at
+        start_ts and at most chunk_size actions starting at start_ts - 1.
+        """
+        root = self._get_file(dataset_path)
+
+        compressed = root.attrs.get("compress", False)
+        raw_lang = root["language_raw"][()].decode("utf-8")
+        reasoning = root["reasoning"][start_ts].decode("utf-8")
+
+        # start one step earlier, hack, to make timesteps more aligned
+        action_start = max(0, start_ts - 1)
+        action_end = action_start + self.chunk_size
+        if "/observations/qpos" in root and isinstance(
+            root.get("/action"), h5py.Dataset
+        ):  # only used for agelix and franka
+            qpos = root["/observations/qpos"][start_ts]
+            action = root["/action"][action_start:action_end]
+        else:  # for mobile aloha, the action is the next joint position
+            left = root["/state/joint_position/left"]
+            right = root["/state/joint_position/right"]
+            episode_len = len(left) - 1
+            qpos = [left[start_ts], right[start_ts]]
+            action = [
+                left[action_start + 1 : action_end + 1],
+                right[action_start + 1 : action_end + 1],
+            ]
+            if "/state/base_vel" in root:
+                qpos.append(root["/state/base_vel"][start_ts])
+                action.append(
+                    root["/action/base_vel"][
+                        action_start : min(action_end, episode_len)
+                    ]
+                )
+            qpos = np.concatenate(qpos, axis=0)
+            action = np.concatenate(action, axis=1)
+
+        qpos = qpos[: self.action_args.action_dim]
+        action = action[:, : self.action_args.action_dim]
+
+        image_dict = dict()
+        for cam_name in self.camera_names:
+            image_dict[cam_name] = root[f"/observations/images/{cam_name}"][start_ts]
 
-        task_base_name = os.path.basename(dataset_path).replace(".hdf5", "")
-        task_dir_name = os.path.basename(os.path.dirname(dataset_path))
-
-        with h5py.File(dataset_path, "r") as root:
-
-            compressed = root.attrs.get("compress", False)
-            raw_lang = root["language_raw"][()].decode("utf-8")
-            reasonings = root["reasoning"][()]
-            reasoning = reasonings[start_ts].decode("utf-8")
-            # print(f"start_ts: {start_ts}")
-            # print(f"language_raw: {raw_lang}\n reasoning: {reasoning} \n")
-
-            try:  # only used for agelix and franka
-                qpos = root["/observations/qpos"][start_ts]
-                action = root["/action"][()][:, :]
-            except:  # for mobile aloha
-                if not root.get("/state/base_vel", None):
-                    qpos = np.concatenate(
-                        [
-                            root["/state/joint_position/left"][()][:-1],
-                            root["/state/joint_position/right"][()][:-1],
-                            # root['/state/base_vel'][()][:-1]
-                        ],
-                        axis=1,
-                    )[start_ts]
-                    action = np.concatenate(
-                        [
-                            root["/state/joint_position/left"][()][1:],
-                            root["/state/joint_position/right"][()][1:],
-                            # root['/action/base_vel'][()][:-1]
-                        ],
-                        axis=1,
-                    )
-                else:
-                    qpos = np.concatenate(
-                        [
-                            root["/state/joint_position/left"][()][:-1],
-                            root["/state/joint_position/right"][()][:-1],
-                            root["/state/base_vel"][()][:-1],
-                        ],
-                        axis=1,
-                    )[start_ts]
-                    action = np.concatenate(
-                        [
-                            root["/state/joint_position/left"][()][1:],
-                            root["/state/joint_position/right"][()][1:],
-                            root["/action/base_vel"][()][:-1],
-                        ],
-                        axis=1,
-                    )
-
-            # print(f'======debug qpos load h5: {qpos.shape}')
-            # print(f'======debug action load h5: {action.shape}')
-            qpos = qpos[: self.action_args.action_dim]
-            action = action[:, : self.action_args.action_dim]
-            # print(f'======debug qpos load h5 aft: {qpos.shape}')
-            # print(f'======debug action load h5 aft: {action.shape}')
-            original_action_shape = action.shape
-            episode_len = original_action_shape[0]
-            image_dict = dict()
-            for cam_name in self.camera_names:
-                image_dict[cam_name] = root[f"/observations/images/{cam_name}"][
-                    start_ts
-                ]
-
-            if compressed:
-                for cam_name in image_dict.keys():
-                    decompressed_image = cv2.imdecode(image_dict[cam_name], 1)
-                    image_dict[cam_name] = np.array(decompressed_image)
-
-            # get all actions after and including start_ts
-            # action = action[start_ts:]  # hack, to make timesteps more aligned
-            # action_len = episode_len - start_ts  # hack, to make timesteps more aligned
-            action = action[
-                max(0, start_ts - 1) :
-            ]  # hack, to make timesteps more aligned
-            action_len = episode_len - max(
-                0, start_ts - 1
-            )  # hack, to make timesteps more aligned
-        return (
-            original_action_shape,
-            action,
-            action_len,
-            image_dict,
-            qpos,
-            raw_lang,
-            reasoning,
-        )
+        if compressed:
+            for cam_name in image_dict.keys():
+                decompressed_image = cv2.imdecode(image_dict[cam_name], 1)
+                image_dict[cam_name] = np.array(decompressed_image)
+
+        return action, image_dict, qpos, raw_lang, reasoning
 
     def __getitem__(self, index):
         episode_id, start_ts = self._locate_transition(index)
         dataset_path = self.dataset_path_list[episode_id]
         # print(dataset_path)
         try:
-            (
-                original_action_shape,
-                action,
-                action_len,
-                image_dict,
-                qpos,
-                raw_lang,
-                reasoning,
-            ) = self.load_from_h5(dataset_path, start_ts)
+            action, image_dict, qpos, raw_lang, reasoning = self.load_from_h5(
+                dataset_path, start_ts
+            )
         except Exception as e:
             print(f"Read {dataset_path} happens {YELLOW}{e}{RESET}")
             try:
@@ -213,27 +202,19 @@ class EpisodicDataset(torch.utils.data.Dataset):
             except Exception as e:
                 dataset_path = self.dataset_path_list[episode_id - 1]
 
-            (
-                original_action_shape,
-                action,
-                action_len,
-                image_dict,
-                qpos,
-                raw_lang,
-                reasoning,
-            ) = self.load_from_h5(dataset_path, start_ts)
+            action, image_dict, qpos, raw_lang, reasoning = self.load_from_h5(
+                dataset_path, start_ts
+            )
 
         # self.is_sim = is_sim
+        action_len = len(action)
         padded_action = np.zeros(
-            (self.max_episode_len, original_action_shape[1]), dtype=np.float32
+            (min(self.chunk_size, self.max_episode_len), action.shape[1]),
+            dtype=np.float32,
         )
-
         padded_action[:action_len] = action
-        is_pad = np.zeros(self.max_episode_len)
-        is_pad[action_len:] = 1
-
-        padded_action = padded_action[: self.chunk_size]
-        is_pad = is_pad[: self.chunk_size]
+        is_pad = np.zeros(len(padded_action), dtype=bool)
+        is_pad[action_len:] = True
 
         # new axis for different cameras
         all_cam_images = []
@@ -252,13 +233,8 @@ class EpisodicDataset(torch.utils.data.Dataset):
             assert (
                 image_data.ndim == 4
             ), f"image_data's shape is {image_data.shape}, maybe the reason of adding historical images"
-            image_data = torch.stack(
-                [
-                    torch.from_numpy(cv2.cvtColor(img.numpy(), cv2.COLOR_BGR2RGB))
-                    for img in image_data
-                ],
-                dim=0,
-            )
+            # BGR to RGB
+            image_data = image_data.flip(-1)
 
         # channel last
         if image_data.ndim == 4:
@@ -289,14 +265,6 @@ class EpisodicDataset(torch.utils.data.Dataset):
         assert raw_lang is not None, ""
         if index == 0:
             self.rank0_print(reasoning)
-        del image_data
-        del qpos_data
-        del action_data
-        del is_pad
-        del raw_lang
-        del reasoning
-        gc.collect()
-        torch.cuda.empty_cache()
 
         return self.llava_pythia_process.forward_process(
             sample, use_reasoning=self.data_args.use_reasoning
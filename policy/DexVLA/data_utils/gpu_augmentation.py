@@ -0,0 +1,235 @@
+"""
+Batched image augmentation on the training device.
+
+By default EpisodicDataset augments every sample on the CPU in the DataLoader
+workers with a chain of torchvision transforms:
+
+    Resize(480, 640) -> RandomCrop(0.95) -> Resize(480, 640)
+    -> RandomRotation(-5, 5) -> ColorJitter(0.3, 0.4, 0.5) -> Resize(new_size)
+
+With `gpu_image_augmentation` the dataset only resizes, and the trainer applies
+the same distribution of transforms to the collated batch on the device. Every
+sample gets its own random parameters, shared by all of its cameras and
+history frames like the torchvision chain does. The crop, resize and rotation
+are one affine map of the 480x640 frame, so they are resampled only once and
+bilinearly; torchvision rotates with nearest-neighbour interpolation.
+
+Each policy directory is imported on its own, so `rgb_to_grayscale` and
+`BatchImageAugmentation` are duplicated in
+policy/TinyVLA/data_utils/gpu_augmentation.py. The two copies must stay in
+sync; the processor-specific wrapper classes below them differ.
+"""
+
+import math
+
+import torch
+import torch.nn.functional as F
+
+ORIGINAL_SIZE = (480, 640)
+
+
+def rgb_to_grayscale(images):
+    # same weights as torchvision
+    r, g, b = images.unbind(dim=-3)
+    return (0.2989 * r + 0.587 * g + 0.114 * b).unsqueeze(-3)
+
+
+class BatchImageAugmentation:
+    """
+    Random crop, rotation and color jitter of batches of images in [0, 1].
+
+    Images are (B, N, C, H, W) where the N images of a sample (cameras and
+    history frames) share its parameters. H and W can be any size: the images
+    are taken to show the whole `original_size` frame, and the crop and
+    rotation are applied in that frame.
+
+    seed: if set, parameters are drawn from a generator with this seed, so the
+    augmentation of a run is reproducible.
+    """
+
+    def __init__(
+        self,
+        original_size=ORIGINAL_SIZE,
+        crop_ratio=0.95,
+        degrees=(-5.0, 5.0),
+        brightness=0.3,
+        contrast=0.4,
+        saturation=0.5,
+        seed=None,
+    ):
+        self.original_size = original_size
+        self.crop_size = (
+            int(original_size[0] * crop_ratio),
+            int(original_size[1] * crop_ratio),
+        )
+        self.degrees = degrees
+        # same ranges as torchvision ColorJitter
+        self.brightness = (max(0.0, 1 - brightness), 1 + brightness)
+        self.contrast = (max(0.0, 1 - contrast), 1 + contrast)
+        self.saturation = (max(0.0, 1 - saturation), 1 + saturation)
+        self.generator = None
+        if seed is not None:
+            self.generator = torch.Generator().manual_seed(seed)
+
+    def _uniform(self, batch_size, low, high):
+        return torch.empty(batch_size).uniform_(low, high, generator=self.generator)
+
+    def sample_params(self, batch_size):
+        """Per-sample parameters, drawn like the get_params of the torchvision transforms."""
+        h, w = self.original_size
+        th, tw = self.crop_size
+        g = self.generator
+        return {
+            "top": torch.randint(0, h - th + 1, (batch_size,), generator=g),
+            "left": torch.randint(0, w - tw + 1, (batch_size,), generator=g),
+            "angle": self._uniform(batch_size, *self.degrees),
+            "brightness": self._uniform(batch_size, *self.brightness),
+            "contrast": self._uniform(batch_size, *self.contrast),
+            "saturation": self._uniform(batch_size, *self.saturation),
+            # ColorJitter applies its adjustments in a random order
+            "order": torch.argsort(torch.rand(batch_size, 3, generator=g), dim=1),
+        }
+
+    def _grids(self, params, height, width, device):
+        """
+        Sampling grid of the crop, resize and rotation, and the grid of the
+        rotation alone, which is zero-filled where it leaves the cropped image.
+        """
+        h, w = self.original_size
+        th, tw = self.crop_size
+        angle = torch.deg2rad(params["angle"].to(device=device, dtype=torch.float32))
+        cos, sin = torch.cos(angle), torch.sin(angle)
+        # torchvision rotates about the center in pixel units, which is not a
+        # rotation in normalized coordinates of a non-square frame
+        rotation = torch.zeros(len(angle), 2, 3, device=device)
+        rotation[:, 0, 0] = cos
+        rotation[:, 0, 1] = -sin * h / w
+        rotation[:, 1, 0] = sin * w / h
+        rotation[:, 1, 1] = cos
+        # resizing the crop back to the full frame maps it onto [-1, 1]
+        top = params["top"].to(device=device, dtype=torch.float32)
+        left = params["left"].to(device=device, dtype=torch.float32)
+        crop = torch.zeros(len(angle), 2, 3, device=device)
+        crop[:, 0, 0] = tw / w
+        crop[:, 1, 1] = th / h
+        crop[:, 0, 2] = (2 * left + tw) / w - 1
+        crop[:, 1, 2] = (2 * top + th) / h - 1
+        theta = crop[:, :, :2] @ rotation
+        theta[:, :, 2] = crop[:, :, 2]
+
+        size = (len(angle), 1, height, width)
+        grid = F.affine_grid(theta, size, align_corners=False)
+        rotation_grid = F.affine_grid(rotation, size, align_corners=False)
+        inside = (rotation_grid.abs() <= 1).all(dim=-1)
+        return grid, inside
+
+    def _color_jitter(self, images, params):
+        b = len(images)
+        view = (b,) + (1,) * (images.ndim - 1)
+        factors = [
+            params[name].to(images.device, images.dtype).view(view)
+            for name in ("brightness", "contrast", "saturation")
+        ]
+        order = params["order"].to(images.device)
+        for step in range(3):
+            # every sample is adjusted by the step-th op of its own order
+            adjusted = [
+                images * factors[0],
+                factors[1] * images
+                + (1 - factors[1])
+                * rgb_to_grayscale(images).mean(dim=(-3, -2, -1), keepdim=True),
+                factors[2] * images + (1 - factors[2]) * rgb_to_grayscale(images),
+            ]
+            op = order[:, step].view(view)
+            images = torch.where(
+                op == 0, adjusted[0], torch.where(op == 1, adjusted[1], adjusted[2])
+            ).clamp(0, 1)
+        return images
+
+    def __call__(self, images, params=None):
+        """Augments (B, N, C, H, W) images in [0, 1], returns the images at the same size."""
+        if params is None:
+            params = self.sample_params(len(images))
+        b, n, c, height, width = images.shape
+        grid, inside = self._grids(params, height, width, images.device)
+        grid = grid.to(images.dtype).repeat_interleave(n, dim=0)
+        inside = inside.repeat_interleave(n, dim=0)
+        flat = images.reshape(b * n, c, height, width)
+        flat = F.grid_sample(
+            flat, grid, mode="bilinear", padding_mode="zeros", align_corners=False
+        )
+        flat = flat * inside.unsqueeze(1).to(flat.dtype)
+        images = flat.reshape(b, n, c, height, width)
+        return self._color_jitter(images, params)
+
+
+class Qwen2VLBatchAugmentation:
+    """
+    Augments a collated DexVLA batch on its device: the Qwen2-VL patches in
+    `pixel_values` (or `pixel_values_videos`) are turned back into images,
+    augmented and patched again, and `raw_images` get the same parameters.
+    """
+
+    def __init__(self, augmentation, image_processor, num_cameras):
+        self.augmentation = augmentation
+        self.num_cameras = num_cameras
+        self.patch_size = image_processor.patch_size
+        self.merge_size = image_processor.merge_size
+        self.temporal_patch_size = image_processor.temporal_patch_size
+        self.image_mean = torch.tensor(image_processor.image_mean).view(1, 1, 3, 1, 1)
+        self.image_std = torch.tensor(image_processor.image_std).view(1, 1, 3, 1, 1)
+
+    def unpatchify(self, patches, grid_thw):
+        """(B, t * h * w, C * tp * p * p) patches of one camera to (B, t * tp, C, H, W) frames."""
+        b = len(patches)
+        t, h, w = (int(x) for x in grid_thw)
+        m, p, tp = self.merge_size, self.patch_size, self.temporal_patch_size
+        x = patches.reshape(b, t, h // m, w // m, m, m, -1, tp, p, p)
+        x = x.permute(0, 1, 7, 6, 2, 4, 8, 3, 5, 9)
+        return x.reshape(b, t * tp, -1, h * p, w * p)
+
+    def patchify(self, frames, grid_thw):
+        """Inverse of `unpatchify`, like the Qwen2-VL image processor."""
+        b = len(frames)
+        t, h, w = (int(x) for x in grid_thw)
+        m, p, tp = self.merge_size, self.patch_size, self.temporal_patch_size
+        x = frames.reshape(b, t, tp, -1, h // m, m, p, w // m, m, p)
+        x = x.permute(0, 1, 4, 7, 5, 8, 3, 2, 6, 9)
+        return x.reshape(b, t * h * w, -1)
+
+    def _augment_patches(self, pixel_values, grid_thw, batch_size, params):
+        grid_thw = grid_thw.reshape(batch_size, self.num_cameras, 3)[0].tolist()
+        pixel_values = pixel_values.reshape(batch_size, -1, pixel_values.shape[-1])
+        mean = self.image_mean.to(pixel_values.device, pixel_values.dtype)
+        std = self.image_std.to(pixel_values.device, pixel_values.dtype)
+        sizes = [t * h * w for t, h, w in grid_thw]
+        augmented = []
+        # cameras can have different sizes, but each has the same size in every sample
+        for patches, camera_grid in zip(pixel_values.split(sizes, dim=1), grid_thw):
+            frames = self.unpatchify(patches, camera_grid) * std + mean
+            frames = self.augmentation(frames.clamp(0, 1), params)
+            augmented.append(self.patchify((frames - mean) / std, camera_grid))
+        return torch.cat(augmented, dim=1).reshape(-1, pixel_values.shape[-1])
+
+    @torch.no_grad()
+    def __call__(self, inputs):
+        batch_size = len(inputs["actions"])
+        params = self.augmentation.sample_params(batch_size)
+        for pixel_key, grid_key in (
+            ("pixel_values", "image_grid_thw"),
+            ("pixel_values_videos", "video_grid_thw"),
+        ):
+            if inputs.get(pixel_key) is not None:
+                inputs[pixel_key] = self._augment_patches(
+                    inputs[pixel_key], inputs[grid_key], batch_size, params
+                )
+        raw_images = inputs.get("raw_images")
+        if raw_images is not None:
+            # (B, K, C, H, W) or (B, K, T, C, H, W) uint8
+            shape = raw_images.shape
+            frames = raw_images.reshape(batch_size, -1, *shape[-3:]).float() / 255
+            frames = self.augmentation(frames, params)
+            inputs["raw_images"] = (
+                (frames * 255).round().to(raw_images.dtype).reshape(shape)
+            )
+        return inputs
@@ -0,0 +1,174 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+torchvision = pytest.importorskip("torchvision")
+
+import torchvision.transforms as transforms
+import torchvision.transforms.functional as TF
+
+sys.path.append(os.path.dirname(__file__))
+
+from gpu_augmentation import BatchImageAugmentation, Qwen2VLBatchAugmentation
+
+
+def _smooth_images(batch_size, height, width):
+    yy, xx = torch.meshgrid(
+        torch.linspace(0, 1, height), torch.linspace(0, 1, width), indexing="ij"
+    )
+    images = []
+    for i in range(batch_size):
+        images.append(
+            torch.stack(
+                [
+                    0.5 + 0.5 * torch.sin(3 * xx + yy + i),
+                    0.5 + 0.5 * torch.cos(2 * yy - xx + i),
+                    xx * yy,
+                ]
+            )
+        )
+    return torch.stack(images)
+
+
+def test_sample_params_match_torchvision():
+    n = 20000
+    augmentation = BatchImageAugmentation(seed=0)
+    params = augmentation.sample_params(n)
+
+    torch.manual_seed(0)
+    image = torch.zeros(3, 480, 640)
+    crop = transforms.RandomCrop(augmentation.crop_size)
+    jitter = transforms.ColorJitter(brightness=0.3, contrast=0.4, saturation=0.5)
+    reference = {k: [] for k in params}
+    for _ in range(n):
+        top, left, _, _ = crop.get_params(image, augmentation.crop_size)
+        reference["top"].append(top)
+        reference["left"].append(left)
+        reference["angle"].append(transforms.RandomRotation.get_params([-5.0, 5.0]))
+        order, b, c, s, _ = jitter.get_params(
+            jitter.brightness, jitter.contrast, jitter.saturation, jitter.hue
+        )
+        reference["brightness"].append(b)
+        reference["contrast"].append(c)
+        reference["saturation"].append(s)
+        # hue is the fourth op, which is not used
+        reference["order"].append([op for op in order.tolist() if op != 3])
+
+    for key in ("top", "left", "angle", "brightness", "contrast", "saturation"):
+        ours = params[key].double()
+        theirs = torch.tensor(reference[key], dtype=torch.float64)
+        spread = theirs.max() - theirs.min()
+        assert ours.min() >= theirs.min() - 0.01 * spread, key
+        assert ours.max() <= theirs.max() + 0.01 * spread, key
+        assert abs(ours.mean() - theirs.mean()) < 0.02 * spread, key
+        assert abs(ours.std() - theirs.std()) < 0.02 * spread, key
+
+    # every order of the color ops is equally likely
+    def permutation_frequencies(orders):
+        codes = orders[:, 0] * 9 + orders[:, 1] * 3 + orders[:, 2]
+        return torch.bincount(codes, minlength=27).double() / len(orders)
+
+    ours = permutation_frequencies(params["order"])
+    theirs = permutation_frequencies(torch.tensor(reference["order"]))
+    assert torch.allclose(ours, theirs, atol=0.01)
+    assert (ours > 0).sum() == 6
+
+
+def test_seed_is_deterministic():
+    first = BatchImageAugmentation(seed=3).sample_params(8)
+    second = BatchImageAugmentation(seed=3).sample_params(8)
+    other = BatchImageAugmentation(seed=4).sample_params(8)
+    for key in first:
+        assert torch.equal(first[key], second[key])
+    assert not torch.equal(first["angle"], other["angle"])
+
+
+def test_geometry_matches_torchvision():
+    augmentation = BatchImageAugmentation(seed=0)
+    images = _smooth_images(4, 480, 640)
+    params = augmentation.sample_params(4)
+    for key in ("brightness", "contrast", "saturation"):
+        params[key].fill_(1.0)
+    augmented = augmentation(images[:, None], params)[:, 0]
+
+    th, tw = augmentation.crop_size
+    for i in range(4):
+        expected = TF.resized_crop(
+            images[i],
+            int(params["top"][i]),
+            int(params["left"][i]),
+            th,
+            tw,
+            [480, 640],
+            antialias=True,
+        )
+        expected = TF.rotate(
+            expected,
+            float(params["angle"][i]),
+            interpolation=transforms.InterpolationMode.BILINEAR,
+        )
+        # the borders differ by where the zero filling starts
+        error = (augmented[i] - expected).abs()[:, 40:-40, 40:-40]
+        assert error.max() < 1e-3
+
+
+def test_color_jitter_matches_torchvision():
+    augmentation = BatchImageAugmentation(seed=0)
+    images = torch.rand(16, 2, 3, 8, 8)
+    params = augmentation.sample_params(16)
+    augmented = augmentation._color_jitter(images, params)
+
+    ops = [TF.adjust_brightness, TF.adjust_contrast, TF.adjust_saturation]
+    names = ["brightness", "contrast", "saturation"]
+    for i in range(16):
+        expected = images[i]
+        for op in params["order"][i].tolist():
+            expected = ops[op](expected, float(params[names[op]][i]))
+        assert torch.allclose(augmented[i], expected, atol=1e-5)
+
+
+def test_qwen2_vl_patches_round_trip():
+    image_processor = SimpleNamespace(
+        patch_size=14,
+        merge_size=2,
+        temporal_patch_size=2,
+        image_mean=[0.48145466, 0.4578275, 0.40821073],
+        image_std=[0.26862954, 0.26130258, 0.27577711],
+    )
+    # without cropping, rotation or color changes the batch comes back unchanged
+    identity = BatchImageAugmentation(
+        crop_ratio=1.0, degrees=(0.0, 0.0), brightness=0, contrast=0, saturation=0
+    )
+    augmentation = Qwen2VLBatchAugmentation(identity, image_processor, num_cameras=2)
+
+    batch_size = 3
+    # a 224x308 camera and a 56x56 wrist camera
+    grids = [(1, 16, 22), (1, 4, 4)]
+    frames = [torch.rand(batch_size, 2, 3, h * 14, w * 14) for _, h, w in grids]
+    mean = augmentation.image_mean
+    std = augmentation.image_std
+    patches = torch.cat(
+        [
+            augmentation.patchify((x - mean) / std, grid)
+            for x, grid in zip(frames, grids)
+        ],
+        dim=1,
+    )
+    for x, grid in zip(frames, grids):
+        restored = augmentation.unpatchify(augmentation.patchify(x, grid), grid)
+        assert torch.equal(restored, x)
+
+    inputs = {
+        "actions": torch.zeros(batch_size, 50, 14),
+        "pixel_values": patches.reshape(-1, patches.shape[-1]),
+        "image_grid_thw": torch.tensor(grids * batch_size),
+        "raw_images": torch.randint(0, 256, (batch_size, 2, 3, 24, 32)).byte(),
+    }
+    expected_raw_images = inputs["raw_images"].clone()
+    expected_pixel_values = inputs["pixel_values"].clone()
+    outputs = augmentation(inputs)
+    assert torch.allclose(outputs["pixel_values"], expected_pixel_values, atol=1e-4)
+    assert torch.equal(outputs["raw_images"], expected_raw_images)
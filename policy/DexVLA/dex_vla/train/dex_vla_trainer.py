@@ -250,9 +250,18 @@ def _is_peft_model(model):
 
 
 class DexVLATrainer(Trainer):
-    def __init__(self, sampler_params, prefetch_factor=0, *args, **kwargs):
+    def __init__(
+        self,
+        sampler_params,
+        prefetch_factor=0,
+        image_augmentation=None,
+        *args,
+        **kwargs,
+    ):
         self.sampler_params = sampler_params
         self.prefetch_factor = prefetch_factor
+        # applied to the training batches once they are on the device
+        self.image_augmentation = image_augmentation
         self.lora_module = kwargs["args"].lora_module
         self.lang_type = (
             "model"
@@ -544,6 +553,8 @@ class DexVLATrainer(Trainer):
         """
         model.train()
         inputs = self._prepare_inputs(inputs)
+        if self.image_augmentation is not None:
+            inputs = self.image_augmentation(inputs)
 
         if is_sagemaker_mp_enabled():
             loss_mb = smp_forward_backward(
@@ -11,6 +11,7 @@ os.environ["WANDB_DISABLED"] = "true"
 
 from data_utils.dataset import load_data  # data functions
 from data_utils.dataset import compute_dict_mean, set_seed  # helper functions
+from data_utils.gpu_augmentation import BatchImageAugmentation, Qwen2VLBatchAugmentation
 from policy_heads import *
 
 # from data_utils.lerobot_dataset import load_data
@@ -106,6 +107,10 @@ class DataArguments:
     image_size_stable: str = "480"  # default 270 x 480 and pretrain may be 180 x 320
     image_size_wrist: str = "56"  # specify the image size of wrist camera
     history_images_length: int = 1
+    # augment the collated batches on the training device instead of every
+    # sample in the DataLoader workers, see data_utils/gpu_augmentation.py
+    gpu_image_augmentation: bool = False
+    augmentation_seed: Optional[int] = None  # offset by the process index
     home_lerobot: str = "/media/rl/HDD/data/data/aloha_data/lerobot"
 
 
@@ -357,6 +362,17 @@ def train_bc(
     #     del batch
     #     gc.collect()
     # # exit(0)
+    image_augmentation = None
+    if config["data_args"].gpu_image_augmentation:
+        seed = config["data_args"].augmentation_seed
+        if seed is not None:
+            seed += config["training_args"].process_index
+        image_augmentation = Qwen2VLBatchAugmentation(
+            BatchImageAugmentation(seed=seed),
+            processor.image_processor,
+            num_cameras=len(config["camera_names"]),
+        )
+
     model.config.use_cache = True
     model.config.save_pretrained(config["training_args"].output_dir)
     data_module = dict(
@@ -369,6 +385,7 @@ def train_bc(
         tokenizer=tokenizer,
         args=config["training_args"],
         sampler_params=sampler_params,
+        image_augmentation=image_augmentation,
         **data_module,
     )
 
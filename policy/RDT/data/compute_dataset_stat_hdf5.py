@@ -13,7 +13,6 @@ from data.hdf5_vla_dataset import HDF5VLADataset
 
 
 def process_hdf5_dataset(vla_dataset):
-    EPS = 1e-8
     episode_cnt = 0
     state_sum = 0
     state_sum_sq = 0
@@ -24,31 +23,27 @@ def process_hdf5_dataset(vla_dataset):
     state_max = None
     state_min = None
     for i in tqdm(range(len(vla_dataset))):
-        episode = vla_dataset.get_item(i, state_only=True)
+        # The per-episode sums are precomputed in the episode index
+        stat = vla_dataset.get_episode_stat(i)
         episode_cnt += 1
 
-        states = episode["state"]
-
-        # Zero the values that are close to zero
-        z_states = states.copy()
-        z_states[np.abs(states) <= EPS] = 0
         # Compute the non-zero count
         if nz_state_cnt is None:
-            nz_state_cnt = np.zeros(states.shape[1])
-        nz_state_cnt += np.sum(np.abs(states) > EPS, axis=0)
+            nz_state_cnt = np.zeros(stat["nz_cnt"].shape[0])
+        nz_state_cnt += stat["nz_cnt"]
 
         # Update statistics
-        state_sum += np.sum(states, axis=0)
-        state_sum_sq += np.sum(states**2, axis=0)
-        z_state_sum += np.sum(z_states, axis=0)
-        z_state_sum_sq += np.sum(z_states**2, axis=0)
-        state_cnt += states.shape[0]
+        state_sum += stat["sum"]
+        state_sum_sq += stat["sum_sq"]
+        z_state_sum += stat["z_sum"]
+        z_state_sum_sq += stat["z_sum_sq"]
+        state_cnt += stat["cnt"]
         if state_max is None:
-            state_max = np.max(states, axis=0)
-            state_min = np.min(states, axis=0)
+            state_max = stat["max"]
+            state_min = stat["min"]
         else:
-            state_max = np.maximum(state_max, np.max(states, axis=0))
-            state_min = np.minimum(state_min, np.min(states, axis=0))
+            state_max = np.maximum(state_max, stat["max"])
+            state_min = np.minimum(state_min, stat["min"])
 
     # Add one to avoid division by zero
     nz_state_cnt = np.maximum(nz_state_cnt, np.ones_like(nz_state_cnt))
@@ -84,6 +79,11 @@ if __name__ == "__main__":
         default="configs/dataset_stat.json",
         help="JSON file path to save the dataset statistics.",
     )
+    parser.add_argument(
+        "--rebuild_index",
+        action="store_true",
+        help="Whether to rebuild the cached episode index.",
+    )
     parser.add_argument(
         "--skip_exist",
         action="store_true",
@@ -91,7 +91,9 @@ if __name__ == "__main__":
     )
     args = parser.parse_args()
 
-    vla_dataset = HDF5VLADataset(f"model_config/{args.task_name}.yml")
+    vla_dataset = HDF5VLADataset(
+        f"model_config/{args.task_name}.yml", rebuild_index=args.rebuild_index
+    )
     dataset_name = vla_dataset.get_dataset_name()
 
     try:
@@ -0,0 +1,164 @@
+"""
+Persisted per-episode metadata for the HDF5 datasets.
+
+Building the metadata of an episode needs its full `qpos`, so it is done once per
+episode file and cached in `episode_index.json` next to the data. An entry is rebuilt
+only when the size or modification time of its episode file or of one of its
+instruction files changes, or when instruction files are added or removed.
+"""
+
+import os
+import json
+
+import h5py
+import numpy as np
+
+INDEX_FILENAME = "episode_index.json"
+INDEX_VERSION = 2
+
+# Threshold of the qpos delta to find the first moving step
+MOTION_EPS = 1e-2
+# Threshold below which a state value is treated as zero in the dataset statistics
+STAT_EPS = 1e-8
+
+
+def get_file_signature(file_path):
+    st = os.stat(file_path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def get_episode_signature(file_path):
+    """
+    Signature of the episode file and of the instruction files next to it.
+    """
+    instructions = [
+        [path] + get_file_signature(os.path.join(os.path.dirname(file_path), path))
+        for path in get_instruction_paths(file_path)
+    ]
+    return {"episode": get_file_signature(file_path), "instructions": instructions}
+
+
+def get_image_encoding(dataset):
+    """
+    "jpeg" for episodes storing encoded image bytes, "raw" for uint8 image arrays.
+    """
+    if dataset.dtype.kind in ("S", "O"):
+        return "jpeg"
+    return "raw"
+
+
+def get_instruction_paths(file_path):
+    """
+    Precomputed language embeddings in the `instructions` folder next to the episode,
+    relative to the episode's folder.
+    """
+    instructions_path = os.path.join(os.path.dirname(file_path), "instructions")
+    if not os.path.isdir(instructions_path):
+        return []
+    return sorted(
+        os.path.join("instructions", filename)
+        for filename in os.listdir(instructions_path)
+        if filename.endswith(".pt")
+    )
+
+
+def build_episode_meta(file_path):
+    """
+    Reads an episode once and summarizes everything the samplers need.
+
+    Args:
+        file_path (str): the path to the hdf5 file
+
+    Returns:
+        dict: the episode metadata. The statistics are over the raw qpos dimensions,
+            "state_*" over the whole episode and "stat_*" over the states from the
+            step before the first motion, as used by the dataset statistics.
+    """
+    with h5py.File(file_path, "r") as f:
+        qpos = f["observations"]["qpos"][:]
+        left_arm_dim = int(f["observations"]["left_arm_dim"][0])
+        right_arm_dim = int(f["observations"]["right_arm_dim"][0])
+        image_encodings = {
+            key: get_image_encoding(dataset)
+            for key, dataset in f["observations"]["images"].items()
+        }
+
+    # Get the idx of the first qpos whose delta exceeds the threshold
+    qpos_delta = np.abs(qpos - qpos[0:1])
+    indices = np.where(np.any(qpos_delta > MOTION_EPS, axis=1))[0]
+    first_idx = int(indices[0]) if len(indices) > 0 else None
+
+    meta = {
+        "signature": get_episode_signature(file_path),
+        "num_steps": int(qpos.shape[0]),
+        "first_idx": first_idx,
+        "left_arm_dim": left_arm_dim,
+        "right_arm_dim": right_arm_dim,
+        "state_mean": np.mean(qpos, axis=0).tolist(),
+        "state_std": np.std(qpos, axis=0).tolist(),
+        "state_norm": np.sqrt(np.mean(qpos**2, axis=0)).tolist(),
+        "instructions": get_instruction_paths(file_path),
+        "image_encodings": image_encodings,
+    }
+    if first_idx is not None:
+        states = qpos[first_idx - 1 :].astype(np.float64)
+        z_states = states.copy()
+        z_states[np.abs(states) <= STAT_EPS] = 0
+        meta.update(
+            {
+                "stat_cnt": int(states.shape[0]),
+                "stat_sum": np.sum(states, axis=0).tolist(),
+                "stat_sum_sq": np.sum(states**2, axis=0).tolist(),
+                "stat_z_sum": np.sum(z_states, axis=0).tolist(),
+                "stat_z_sum_sq": np.sum(z_states**2, axis=0).tolist(),
+                "stat_nz_cnt": np.sum(np.abs(states) > STAT_EPS, axis=0).tolist(),
+                "stat_min": np.min(states, axis=0).tolist(),
+                "stat_max": np.max(states, axis=0).tolist(),
+            }
+        )
+    return meta
+
+
+def load_episode_index(index_dir, file_paths, rebuild=False):
+    """
+    Loads the episode index of @file_paths from @index_dir, (re)building the entries
+    of new or modified episodes and saving the index if anything changed.
+
+    Returns:
+        list: the metadata of each episode, in the order of @file_paths
+    """
+    index_path = os.path.join(index_dir, INDEX_FILENAME)
+    index = {}
+    if not rebuild and os.path.exists(index_path):
+        try:
+            with open(index_path, "r") as f:
+                saved = json.load(f)
+            if saved.get("version") == INDEX_VERSION:
+                index = saved["episodes"]
+        except (OSError, ValueError, KeyError):
+            index = {}
+
+    changed = False
+    metas = []
+    for file_path in file_paths:
+        key = os.path.relpath(file_path, index_dir)
+        meta = index.get(key)
+        if meta is None or meta["signature"] != get_episode_signature(file_path):
+            meta = build_episode_meta(file_path)
+            index[key] = meta
+            changed = True
+        # the index stores paths relative to the episode, so the data can be moved
+        meta = dict(meta)
+        meta["instructions"] = [
+            os.path.join(os.path.dirname(file_path), path)
+            for path in meta["instructions"]
+        ]
+        metas.append(meta)
+
+    if changed:
+        # write to a temporary file first so readers never see a partial index
+        tmp_path = index_path + f".{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": INDEX_VERSION, "episodes": index}, f)
+        os.replace(tmp_path, index_path)
+    return metas
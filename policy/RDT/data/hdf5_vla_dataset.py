@@ -8,6 +8,7 @@ import cv2
 import numpy as np
 
 from configs.state_vec import STATE_VEC_IDX_MAPPING
+from data.hdf5_episode_index import load_episode_index
 
 
 class HDF5VLADataset:
@@ -16,7 +17,7 @@ class HDF5VLADataset:
     stored in HDF5.
     """
 
-    def __init__(self, model_config_path) -> None:
+    def __init__(self, model_config_path, rebuild_index=False) -> None:
         # [Modify] The path to the HDF5 dataset directory
         # Each HDF5 file contains one episode
         with open(model_config_path, "r") as f:
@@ -29,6 +30,7 @@ class HDF5VLADataset:
             for filename in fnmatch.filter(files, "*.hdf5"):
                 file_path = os.path.join(root, filename)
                 self.file_paths.append(file_path)
+        self.file_paths.sort()
 
         # Load the config
         with open("configs/base.yaml", "r") as file:
@@ -37,11 +39,17 @@ class HDF5VLADataset:
         self.IMG_HISORY_SIZE = config["common"]["img_history_size"]
         self.STATE_DIM = config["common"]["state_dim"]
 
+        # Per-episode lengths, first moving steps, state stats and instruction paths,
+        # built once and cached next to the data
+        self.episode_metas = load_episode_index(
+            HDF5_DIR, self.file_paths, rebuild=rebuild_index
+        )
+
         # Get each episode's len
         episode_lens = []
-        for file_path in self.file_paths:
-            valid, res = self.parse_hdf5_file_state_only(file_path)
-            _len = res["state"].shape[0] if valid else 0
+        for meta in self.episode_metas:
+            valid = meta["first_idx"] is not None
+            _len = meta["num_steps"] - meta["first_idx"] + 1 if valid else 0
             episode_lens.append(_len)
         self.episode_sample_weights = np.array(episode_lens) / np.sum(episode_lens)
 
@@ -66,27 +74,77 @@ class HDF5VLADataset:
         """
         while True:
             if index is None:
-                file_path = np.random.choice(
-                    self.file_paths, p=self.episode_sample_weights
+                index = np.random.choice(
+                    len(self.file_paths), p=self.episode_sample_weights
                 )
-            else:
-                file_path = self.file_paths[index]
+            file_path = self.file_paths[index]
             valid, sample = (
-                self.parse_hdf5_file(file_path)
+                self.parse_hdf5_file(file_path, index)
                 if not state_only
-                else self.parse_hdf5_file_state_only(file_path)
+                else self.parse_hdf5_file_state_only(file_path, index)
             )
             if valid:
                 return sample
             else:
                 index = np.random.randint(0, len(self.file_paths))
 
-    def parse_hdf5_file(self, file_path):
+    def get_episode_meta(self, file_path, index=None):
+        if index is None:
+            index = self.file_paths.index(file_path)
+        meta = self.episode_metas[index]
+        if meta["first_idx"] is None:
+            raise ValueError("Found no qpos that exceeds the threshold.")
+        return meta
+
+    def get_qpos_scale(self, meta):
+        # Rescale gripper to [0, 1]
+        return np.array(
+            [[1 for i in range(meta["left_arm_dim"] + 1 + meta["right_arm_dim"] + 1)]]
+        )
+
+    def fill_in_state(self, values, meta):
+        """Fill the state/action into the unified vector"""
+        # Target indices corresponding to your state space
+        # In this example: 6 joints + 1 gripper for each arm
+        UNI_STATE_INDICES = (
+            [
+                STATE_VEC_IDX_MAPPING[f"left_arm_joint_{i}_pos"]
+                for i in range(meta["left_arm_dim"])
+            ]
+            + [STATE_VEC_IDX_MAPPING["left_gripper_open"]]
+            + [
+                STATE_VEC_IDX_MAPPING[f"right_arm_joint_{i}_pos"]
+                for i in range(meta["right_arm_dim"])
+            ]
+            + [STATE_VEC_IDX_MAPPING["right_gripper_open"]]
+        )
+        uni_vec = np.zeros(values.shape[:-1] + (self.STATE_DIM,))
+        uni_vec[..., UNI_STATE_INDICES] = values
+        return uni_vec
+
+    def get_episode_stat(self, index):
+        """Get the state statistics of an episode from the episode index,
+            without reading the episode.
+
+        Returns:
+            dict: the count, sums, sums of squares, non-zero counts, min and max of
+                the episode's states in the unified vector, as accumulated by
+                `compute_dataset_stat_hdf5.py`.
+        """
+        meta = self.get_episode_meta(self.file_paths[index], index)
+        stat = {"cnt": meta["stat_cnt"]}
+        for key in ["sum", "sum_sq", "z_sum", "z_sum_sq", "nz_cnt", "min", "max"]:
+            stat[key] = self.fill_in_state(np.array(meta[f"stat_{key}"]), meta)
+        return stat
+
+    def parse_hdf5_file(self, file_path, index=None):
         """[Modify] Parse a hdf5 file to generate a training sample at
             a random timestep.
 
         Args:
             file_path (str): the path to the hdf5 file
+            index (int, optional): the index of the episode in the dataset, used to
+                look up its metadata. Defaults to the index of @file_path.
 
         Returns:
             valid (bool): whether the episode is valid, which is useful for filtering.
@@ -120,177 +178,127 @@ class HDF5VLADataset:
                     "cam_right_wrist_mask": ndarray
                 } or None if the episode is invalid.
         """
+        meta = self.get_episode_meta(file_path, index)
+        num_steps = meta["num_steps"]
+        # [Optional] We drop too-short episode
+        # if num_steps < 128:
+        #     return False, None
+
+        # [Optional] We skip the first few still steps
+        first_idx = meta["first_idx"]
+
+        # We randomly sample a timestep
+        step_id = np.random.randint(first_idx - 1, num_steps)
+
+        # Load the instruction
+        # You can also use precomputed language embeddings (recommended)
+        # instruction = "path/to/lang_embed.pt"
+        instruction = np.random.choice(meta["instructions"])
+        # print(f"choose {instruction} file as instruction.")
+        # Assemble the meta
+        sample_meta = {
+            "dataset_name": self.DATASET_NAME,
+            "#steps": num_steps,
+            "step_id": step_id,
+            "instruction": instruction,
+        }
+
+        qpos_scale = self.get_qpos_scale(meta)
+        img_start = max(step_id - self.IMG_HISORY_SIZE + 1, 0)
         with h5py.File(file_path, "r") as f:
-            qpos = f["observations"]["qpos"][:]
-            left_arm_dim = f["observations"]["left_arm_dim"][:]
-            right_arm_dim = f["observations"]["right_arm_dim"][:]
-            num_steps = qpos.shape[0]
-            action_dim = qpos
-            # [Optional] We drop too-short episode
-            # if num_steps < 128:
-            #     return False, None
-
-            # [Optional] We skip the first few still steps
-            EPS = 1e-2
-            # Get the idx of the first qpos whose delta exceeds the threshold
-            qpos_delta = np.abs(qpos - qpos[0:1])
-            indices = np.where(np.any(qpos_delta > EPS, axis=1))[0]
-            if len(indices) > 0:
-                first_idx = indices[0]
-            else:
-                raise ValueError("Found no qpos that exceeds the threshold.")
-
-            # We randomly sample a timestep
-            step_id = np.random.randint(first_idx - 1, num_steps)
-
-            # Load the instruction
-            dir_path = os.path.dirname(file_path)
-
-            # with open(os.path.join(dir_path, 'instruction.json'), 'r') as f_instr:
-            #     instruction_dict = json.load(f_instr)
-            # # We have 1/3 prob to use original instruction,
-            # # 1/3 to use simplified instruction,
-            # # and 1/3 to use expanded instruction.
-            # instruction_type = np.random.choice([
-            #     'instruction', 'expanded_instruction'])
-            # instruction = instruction_dict[instruction_type]
-            # if isinstance(instruction, list):
-            #    instruction = np.random.choice(instruction)
-
-            # You can also use precomputed language embeddings (recommended)
-            # instruction = "path/to/lang_embed.pt"
-            instructions_path = os.path.join(dir_path, "instructions")
-            instructions_names = []
-
-            for filename in os.listdir(instructions_path):
-                # 检查文件名是否以.pt结尾
-                if filename.endswith(".pt"):
-                    instructions_names.append(os.path.join(instructions_path, filename))
-            instruction = np.random.choice(instructions_names)
-            # print(f"choose {instruction} file as instruction.")
-            # Assemble the meta
-            meta = {
-                "dataset_name": self.DATASET_NAME,
-                "#steps": num_steps,
-                "step_id": step_id,
-                "instruction": instruction,
+            # Only read the state row, action chunk and image window of this step
+            state = f["observations"]["qpos"][step_id : step_id + 1] / qpos_scale
+            actions = f["action"][step_id : step_id + self.CHUNK_SIZE] / qpos_scale
+            images = {
+                key: f["observations"]["images"][key][img_start : step_id + 1]
+                for key in ["cam_high", "cam_left_wrist", "cam_right_wrist"]
             }
 
-            # Rescale gripper to [0, 1]
-            qpos = qpos / np.array(
-                [[1 for i in range(left_arm_dim[0] + 1 + right_arm_dim[0] + 1)]]
-            )
-            target_qpos = f["action"][step_id : step_id + self.CHUNK_SIZE] / np.array(
-                [[1 for i in range(left_arm_dim[0] + 1 + right_arm_dim[0] + 1)]]
+        # Parse the state and action
+        state_std = np.array(meta["state_std"]) / qpos_scale[0]
+        state_mean = np.array(meta["state_mean"]) / qpos_scale[0]
+        state_norm = np.array(meta["state_norm"]) / qpos_scale[0]
+        if actions.shape[0] < self.CHUNK_SIZE:
+            # Pad the actions using the last action
+            actions = np.concatenate(
+                [
+                    actions,
+                    np.tile(actions[-1:], (self.CHUNK_SIZE - actions.shape[0], 1)),
+                ],
+                axis=0,
             )
 
-            # Parse the state and action
-            state = qpos[step_id : step_id + 1]
-            state_std = np.std(qpos, axis=0)
-            state_mean = np.mean(qpos, axis=0)
-            state_norm = np.sqrt(np.mean(qpos**2, axis=0))
-            actions = target_qpos
-            if actions.shape[0] < self.CHUNK_SIZE:
-                # Pad the actions using the last action
-                actions = np.concatenate(
+        state = self.fill_in_state(state, meta)
+        state_indicator = self.fill_in_state(np.ones_like(state_std), meta)
+        state_std = self.fill_in_state(state_std, meta)
+        state_mean = self.fill_in_state(state_mean, meta)
+        state_norm = self.fill_in_state(state_norm, meta)
+        # If action's format is different from state's,
+        # you may implement fill_in_action()
+        actions = self.fill_in_state(actions, meta)
+
+        # Parse the images
+        def parse_img(key):
+            if meta["image_encodings"][key] == "jpeg":
+                imgs = [
+                    cv2.imdecode(np.frombuffer(img_bits, np.uint8), cv2.IMREAD_COLOR)
+                    for img_bits in images[key]
+                ]
+                imgs = np.stack(imgs)
+            else:
+                imgs = images[key]
+            if imgs.shape[0] < self.IMG_HISORY_SIZE:
+                # Pad the images using the first image
+                imgs = np.concatenate(
                     [
-                        actions,
-                        np.tile(actions[-1:], (self.CHUNK_SIZE - actions.shape[0], 1)),
+                        np.tile(
+                            imgs[:1],
+                            (self.IMG_HISORY_SIZE - imgs.shape[0], 1, 1, 1),
+                        ),
+                        imgs,
                     ],
                     axis=0,
                 )
-
-            # Fill the state/action into the unified vector
-
-            def fill_in_state(values):
-                # Target indices corresponding to your state space
-                # In this example: 6 joints + 1 gripper for each arm
-                UNI_STATE_INDICES = (
-                    [
-                        STATE_VEC_IDX_MAPPING[f"left_arm_joint_{i}_pos"]
-                        for i in range(left_arm_dim[0])
-                    ]
-                    + [STATE_VEC_IDX_MAPPING["left_gripper_open"]]
-                    + [
-                        STATE_VEC_IDX_MAPPING[f"right_arm_joint_{i}_pos"]
-                        for i in range(right_arm_dim[0])
-                    ]
-                    + [STATE_VEC_IDX_MAPPING["right_gripper_open"]]
-                )
-                uni_vec = np.zeros(values.shape[:-1] + (self.STATE_DIM,))
-                uni_vec[..., UNI_STATE_INDICES] = values
-                return uni_vec
-
-            state = fill_in_state(state)
-            state_indicator = fill_in_state(np.ones_like(state_std))
-            state_std = fill_in_state(state_std)
-            state_mean = fill_in_state(state_mean)
-            state_norm = fill_in_state(state_norm)
-            # If action's format is different from state's,
-            # you may implement fill_in_action()
-            actions = fill_in_state(actions)
-
-            # Parse the images
-            def parse_img(key):
-                imgs = []
-                for i in range(max(step_id - self.IMG_HISORY_SIZE + 1, 0), step_id + 1):
-                    img_bits = f["observations"]["images"][key][i]
-                    img = cv2.imdecode(
-                        np.frombuffer(img_bits, np.uint8), cv2.IMREAD_COLOR
-                    )
-                    imgs.append(img)
-                imgs = np.stack(imgs)
-                if imgs.shape[0] < self.IMG_HISORY_SIZE:
-                    # Pad the images using the first image
-                    imgs = np.concatenate(
-                        [
-                            np.tile(
-                                imgs[:1],
-                                (self.IMG_HISORY_SIZE - imgs.shape[0], 1, 1, 1),
-                            ),
-                            imgs,
-                        ],
-                        axis=0,
-                    )
-                return imgs
-
-            # `cam_high` is the external camera image
-            cam_high = parse_img("cam_high")
-            # For step_id = first_idx - 1, the valid_len should be one
-            valid_len = min(step_id - (first_idx - 1) + 1, self.IMG_HISORY_SIZE)
-            cam_high_mask = np.array(
-                [False] * (self.IMG_HISORY_SIZE - valid_len) + [True] * valid_len
-            )
-            cam_left_wrist = parse_img("cam_left_wrist")
-            cam_left_wrist_mask = cam_high_mask.copy()
-            cam_right_wrist = parse_img("cam_right_wrist")
-            cam_right_wrist_mask = cam_high_mask.copy()
-
-            # Return the resulting sample
-            # For unavailable images, return zero-shape arrays, i.e., (IMG_HISORY_SIZE, 0, 0, 0)
-            # E.g., return np.zeros((self.IMG_HISORY_SIZE, 0, 0, 0)) for the key "cam_left_wrist",
-            # if the left-wrist camera is unavailable on your robot
-            return True, {
-                "meta": meta,
-                "state": state,
-                "state_std": state_std,
-                "state_mean": state_mean,
-                "state_norm": state_norm,
-                "actions": actions,
-                "state_indicator": state_indicator,
-                "cam_high": cam_high,
-                "cam_high_mask": cam_high_mask,
-                "cam_left_wrist": cam_left_wrist,
-                "cam_left_wrist_mask": cam_left_wrist_mask,
-                "cam_right_wrist": cam_right_wrist,
-                "cam_right_wrist_mask": cam_right_wrist_mask,
-            }
-
-    def parse_hdf5_file_state_only(self, file_path):
+            return imgs
+
+        # `cam_high` is the external camera image
+        cam_high = parse_img("cam_high")
+        # For step_id = first_idx - 1, the valid_len should be one
+        valid_len = min(step_id - (first_idx - 1) + 1, self.IMG_HISORY_SIZE)
+        cam_high_mask = np.array(
+            [False] * (self.IMG_HISORY_SIZE - valid_len) + [True] * valid_len
+        )
+        cam_left_wrist = parse_img("cam_left_wrist")
+        cam_left_wrist_mask = cam_high_mask.copy()
+        cam_right_wrist = parse_img("cam_right_wrist")
+        cam_right_wrist_mask = cam_high_mask.copy()
+
+        # Return the resulting sample
+        # For unavailable images, return zero-shape arrays, i.e., (IMG_HISORY_SIZE, 0, 0, 0)
+        # E.g., return np.zeros((self.IMG_HISORY_SIZE, 0, 0, 0)) for the key "cam_left_wrist",
+        # if the left-wrist camera is unavailable on your robot
+        return True, {
+            "meta": sample_meta,
+            "state": state,
+            "state_std": state_std,
+            "state_mean": state_mean,
+            "state_norm": state_norm,
+            "actions": actions,
+            "state_indicator": state_indicator,
+            "cam_high": cam_high,
+            "cam_high_mask": cam_high_mask,
+            "cam_left_wrist": cam_left_wrist,
+            "cam_left_wrist_mask": cam_left_wrist_mask,
+            "cam_right_wrist": cam_right_wrist,
+            "cam_right_wrist_mask": cam_right_wrist_mask,
+        }
+
+    def parse_hdf5_file_state_only(self, file_path, index=None):
         """[Modify] Parse a hdf5 file to generate a state trajectory.
 
         Args:
             file_path (str): the path to the hdf5 file
+            index (int, optional): the index of the episode in the dataset.
 
         Returns:
             valid (bool): whether the episode is valid, which is useful for filtering.
@@ -301,63 +309,25 @@ class HDF5VLADataset:
                     "action": ndarray,          # action[:], (T, STATE_DIM).
                 } or None if the episode is invalid.
         """
-        with h5py.File(file_path, "r") as f:
-            qpos = f["observations"]["qpos"][:]
-            left_arm_dim = f["observations"]["left_arm_dim"][:]
-            right_arm_dim = f["observations"]["right_arm_dim"][:]
-
-            num_steps = qpos.shape[0]
-            # [Optional] We drop too-short episode
-            # if num_steps < 128:
-            # return False, None
-
-            # [Optional] We skip the first few still steps
-            EPS = 1e-2
-            # Get the idx of the first qpos whose delta exceeds the threshold
-            qpos_delta = np.abs(qpos - qpos[0:1])
-            indices = np.where(np.any(qpos_delta > EPS, axis=1))[0]
-            if len(indices) > 0:
-                first_idx = indices[0]
-            else:
-                raise ValueError("Found no qpos that exceeds the threshold.")
+        meta = self.get_episode_meta(file_path, index)
+        # [Optional] We drop too-short episode
+        # if num_steps < 128:
+        # return False, None
 
-            # Rescale gripper to [0, 1]
-            qpos = qpos / np.array(
-                [[1 for i in range(left_arm_dim[0] + right_arm_dim[0] + 2)]]
-            )
-            target_qpos = f["action"][:] / np.array(
-                [[1 for i in range(left_arm_dim[0] + right_arm_dim[0] + 2)]]
-            )
+        # [Optional] We skip the first few still steps
+        first_idx = meta["first_idx"]
 
+        qpos_scale = self.get_qpos_scale(meta)
+        with h5py.File(file_path, "r") as f:
             # Parse the state and action
-            state = qpos[first_idx - 1 :]
-            action = target_qpos[first_idx - 1 :]
-
-            # Fill the state/action into the unified vector
-            def fill_in_state(values):
-                # Target indices corresponding to your state space
-                # In this example: 6 joints + 1 gripper for each arm
-                UNI_STATE_INDICES = (
-                    [
-                        STATE_VEC_IDX_MAPPING[f"left_arm_joint_{i}_pos"]
-                        for i in range(left_arm_dim[0])
-                    ]
-                    + [STATE_VEC_IDX_MAPPING["left_gripper_open"]]
-                    + [
-                        STATE_VEC_IDX_MAPPING[f"right_arm_joint_{i}_pos"]
-                        for i in range(right_arm_dim[0])
-                    ]
-                    + [STATE_VEC_IDX_MAPPING["right_gripper_open"]]
-                )
-                uni_vec = np.zeros(values.shape[:-1] + (self.STATE_DIM,))
-                uni_vec[..., UNI_STATE_INDICES] = values
-                return uni_vec
+            state = f["observations"]["qpos"][first_idx - 1 :] / qpos_scale
+            action = f["action"][first_idx - 1 :] / qpos_scale
 
-            state = fill_in_state(state)
-            action = fill_in_state(action)
+        state = self.fill_in_state(state, meta)
+        action = self.fill_in_state(action, meta)
 
-            # Return the resulting sample
-            return True, {"state": state, "action": action}
+        # Return the resulting sample
+        return True, {"state": state, "action": action}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+"""
+A store of precomputed language embeddings, packed into one memory-mapped file.
+
+All unique instruction embeddings are concatenated along the token axis in
+`lang_embeds.npy` of shape (num_tokens, lang_token_dim). `lang_embeds_index.json`
+holds the offset and length of each embedding, and maps the instruction texts and the
+per-episode `.pt` embedding files it was built from to embedding ids. Embeddings
+are deduplicated by text, and `.pt` files by content.
+"""
+
+import os
+import json
+import hashlib
+
+import numpy as np
+import torch
+
+EMBEDS_FILENAME = "lang_embeds.npy"
+INDEX_FILENAME = "lang_embeds_index.json"
+
+
+def _normalize_path(path):
+    return os.path.realpath(path)
+
+
+class LangEmbedStore:
+    """
+    Serves language embeddings by id, instruction text or source `.pt` path.
+    The embeddings file is memory-mapped lazily, so the store can be shared with
+    DataLoader workers.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, INDEX_FILENAME), "r") as f:
+            index = json.load(f)
+        self.entries = index["entries"]
+        self.text_to_id = index["texts"]
+        self.path_to_id = index["paths"]
+        self._embeds = None
+
+    @property
+    def embeds(self):
+        if self._embeds is None:
+            self._embeds = np.load(
+                os.path.join(self.store_dir, EMBEDS_FILENAME), mmap_mode="r"
+            )
+        return self._embeds
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_embeds"] = None
+        return state
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return self.get_id(key) is not None
+
+    def get_id(self, key):
+        """
+        Get the embedding id of an instruction text or a `.pt` embedding path,
+        None if it is not in the store.
+        """
+        if isinstance(key, (int, np.integer)):
+            return int(key)
+        if key in self.text_to_id:
+            return self.text_to_id[key]
+        return self.path_to_id.get(_normalize_path(key))
+
+    def get(self, key):
+        """
+        Get the embedding of an id, instruction text or `.pt` path as a
+        (num_tokens, lang_token_dim) tensor.
+        """
+        embed_id = self.get_id(key)
+        if embed_id is None:
+            raise KeyError(f"Instruction {key} is not in the language embedding store.")
+        entry = self.entries[embed_id]
+        offset, length = entry["offset"], entry["length"]
+        return torch.from_numpy(np.array(self.embeds[offset : offset + length]))
+
+
+class LangEmbedStoreBuilder:
+    """
+    Collects unique embeddings and writes them as a LangEmbedStore.
+    """
+
+    def __init__(self):
+        self.embeds = []
+        self.entries = []
+        self.texts = {}
+        self.paths = {}
+        self._hashes = {}
+
+    def has_text(self, text):
+        return text in self.texts
+
+    def _add(self, embed, text=None):
+        embed = embed.detach().cpu()
+        if embed.dtype == torch.bfloat16:
+            embed = embed.float()
+        embed = embed.numpy()
+        digest = hashlib.sha1(
+            str((embed.shape, embed.dtype.str)).encode() + embed.tobytes()
+        ).hexdigest()
+        if digest in self._hashes:
+            embed_id = self._hashes[digest]
+        else:
+            embed_id = len(self.entries)
+            self._hashes[digest] = embed_id
+            self.entries.append({"length": int(embed.shape[0]), "text": text})
+            self.embeds.append(embed)
+        if text is not None:
+            self.texts.setdefault(text, embed_id)
+            if self.entries[embed_id]["text"] is None:
+                self.entries[embed_id]["text"] = text
+        return embed_id
+
+    def add_embed(self, embed, text=None, path=None):
+        """
+        Add an embedding of shape (num_tokens, lang_token_dim), optionally keyed by
+        its instruction text and the `.pt` file it was loaded from.
+        """
+        embed_id = self._add(embed, text)
+        if path is not None:
+            self.paths[_normalize_path(path)] = embed_id
+        return embed_id
+
+    def add_embed_file(self, path):
+        """
+        Add a `.pt` file holding an embedding tensor, or a dict with "embeddings"
+        and "instruction" as saved by deployment.
+        """
+        embed = torch.load(path, map_location="cpu")
+        text = None
+        if isinstance(embed, dict):
+            text = embed.get("instruction")
+            embed = embed["embeddings"]
+        if embed.dim() == 3:
+            embed = embed[0]
+        return self.add_embed(embed, text=text, path=path)
+
+    def encode_texts(self, texts, tokenizer, text_encoder, device, batch_size=32):
+        """
+        Encode the instruction texts that are not in the store yet, each one once.
+        """
+        texts = sorted(set(t for t in texts if not self.has_text(t)))
+        for i in range(0, len(texts), batch_size):
+            batch = texts[i : i + batch_size]
+            tokenized_res = tokenizer(
+                batch, return_tensors="pt", padding="longest", truncation=True
+            )
+            tokens = tokenized_res["input_ids"].to(device)
+            attn_mask = tokenized_res["attention_mask"].to(device)
+            with torch.no_grad():
+                text_embeds = text_encoder(input_ids=tokens, attention_mask=attn_mask)[
+                    "last_hidden_state"
+                ].cpu()
+            attn_mask = attn_mask.cpu().bool()
+            for j, text in enumerate(batch):
+                self.add_embed(text_embeds[j][attn_mask[j]], text=text)
+        return len(texts)
+
+    def save(self, store_dir, dtype=None):
+        """
+        Write the packed embeddings and the index to @store_dir.
+        """
+        if len(self.embeds) == 0:
+            raise ValueError("No language embeddings to save.")
+        os.makedirs(store_dir, exist_ok=True)
+        dim = self.embeds[0].shape[1]
+        dtype = np.dtype(dtype) if dtype is not None else self.embeds[0].dtype
+        num_tokens = sum(e.shape[0] for e in self.embeds)
+        packed = np.lib.format.open_memmap(
+            os.path.join(store_dir, EMBEDS_FILENAME),
+            mode="w+",
+            dtype=dtype,
+            shape=(num_tokens, dim),
+        )
+        offset = 0
+        for entry, embed in zip(self.entries, self.embeds):
+            assert embed.shape[1] == dim, "All embeddings must have the same dim."
+            packed[offset : offset + embed.shape[0]] = embed
+            entry["offset"] = offset
+            offset += embed.shape[0]
+        packed.flush()
+        del packed
+
+        with open(os.path.join(store_dir, INDEX_FILENAME), "w") as f:
+            json.dump(
+                {"entries": self.entries, "texts": self.texts, "paths": self.paths},
+                f,
+                indent=1,
+            )
+        return num_tokens
@@ -14,6 +14,7 @@ import yaml
 
 from data.vla_dataset import VLADataset
 from data.filelock import FileLock
+from data.shm_buffer import ShmSampleBuffer, SAMPLE_ARRAY_KEYS
 
 # Producer does not need GPU
 tf.config.set_visible_devices([], "GPU")
@@ -29,6 +30,10 @@ if BUF_NUM_CHUNKS < 1:
 BUF_CHUNK_SIZE = config["dataset"]["buf_chunk_size"]
 if BUF_CHUNK_SIZE < 1:
     raise ValueError("Config `buf_chunk_size` must be at least 1.")
+BUF_BACKEND = config["dataset"].get("buf_backend", "file")
+BUF_SHM_NAME = config["dataset"].get("buf_shm_name", "rdt_sample_buffer")
+BUF_SHM_NUM_SLOTS = config["dataset"].get("buf_shm_num_slots", 1024)
+BUF_SHM_SLOT_MB = config["dataset"].get("buf_shm_slot_mb", 8)
 
 
 def get_dirty_item(chunk_dir):
@@ -97,6 +102,13 @@ def read_dirty_bit(chunk_dir):
     return np.ones(BUF_CHUNK_SIZE, dtype=np.uint8)
 
 
+def get_sample_arrays(step_dict):
+    """
+    Get the tensors of a sample as numpy arrays.
+    """
+    return {key: step_dict[key].numpy() for key in SAMPLE_ARRAY_KEYS}
+
+
 def save_sample(step_dict, chunk_dir, chunk_item_idx):
     """
     Save a sample to the chunk directory.
@@ -120,34 +132,7 @@ def save_sample(step_dict, chunk_dir, chunk_item_idx):
             locks.append(lock)
             lock.acquire_write_lock()
             with open(file_path, "wb") as file:
-                np.savez(
-                    file,
-                    step_id=step_dict["step_id"].numpy(),
-                    state_chunk=step_dict["state_chunk"].numpy(),
-                    state_chunk_time_mask=step_dict["state_chunk_time_mask"].numpy(),
-                    action_chunk=step_dict["action_chunk"].numpy(),
-                    action_chunk_time_mask=step_dict["action_chunk_time_mask"].numpy(),
-                    state_vec_mask=step_dict["state_vec_mask"].numpy(),
-                    past_frames_0=step_dict["past_frames_0"].numpy(),
-                    past_frames_0_time_mask=step_dict[
-                        "past_frames_0_time_mask"
-                    ].numpy(),
-                    past_frames_1=step_dict["past_frames_1"].numpy(),
-                    past_frames_1_time_mask=step_dict[
-                        "past_frames_1_time_mask"
-                    ].numpy(),
-                    past_frames_2=step_dict["past_frames_2"].numpy(),
-                    past_frames_2_time_mask=step_dict[
-                        "past_frames_2_time_mask"
-                    ].numpy(),
-                    past_frames_3=step_dict["past_frames_3"].numpy(),
-                    past_frames_3_time_mask=step_dict[
-                        "past_frames_3_time_mask"
-                    ].numpy(),
-                    state_std=step_dict["state_std"].numpy(),
-                    state_mean=step_dict["state_mean"].numpy(),
-                    state_norm=step_dict["state_norm"].numpy(),
-                )
+                np.savez(file, **get_sample_arrays(step_dict))
             lock.release_lock()
             return
         except KeyboardInterrupt:
@@ -262,6 +247,34 @@ def run_producer(seed, num_workers, worker_id, fill_up, clean_dirty, dataset_typ
                     )
 
 
+def run_producer_shm(seed, num_workers, worker_id, dataset_type, buf_name):
+    """
+    Run the producer on the shared-memory buffer.
+    Each worker owns a contiguous range of slots and keeps writing new samples
+    into the slots that have been read by the consumers.
+    """
+    vla_dataset = VLADataset(seed=seed, dataset_type=dataset_type)
+    buffer = ShmSampleBuffer(buf_name)
+    slot_start_idx = worker_id * buffer.num_slots // num_workers
+    slot_end_idx = (worker_id + 1) * buffer.num_slots // num_workers
+    slots = range(slot_start_idx, slot_end_idx)
+    print(f"Worker {worker_id}: Start filling slots {slot_start_idx}-{slot_end_idx}...")
+
+    num_written = 0
+    time_stmp = time.time()
+    for episode_steps in vla_dataset:
+        for step in episode_steps:
+            buffer.write(step["json_content"], get_sample_arrays(step), slots=slots)
+            num_written += 1
+            if time.time() - time_stmp > 10.0:
+                ready_ratio = buffer.num_ready() / buffer.num_slots
+                print(
+                    f"Worker {worker_id}: Written {num_written} samples, "
+                    f"Ready Ratio: {ready_ratio:.2f}"
+                )
+                time_stmp = time.time()
+
+
 if __name__ == "__main__":
     # Args: n_workers, fill_up
     parser = argparse.ArgumentParser()
@@ -287,6 +300,13 @@ if __name__ == "__main__":
         default=None,
         help="Random seed. If not set, the seed will be randomly generated.",
     )
+    parser.add_argument(
+        "--buf_backend",
+        type=str,
+        default=BUF_BACKEND,
+        choices=["file", "shm"],
+        help="Whether to write the samples to the buffer directory or to a shared-memory buffer.",
+    )
     parser.add_argument(
         "--dataset_type",
         type=str,
@@ -304,27 +324,56 @@ if __name__ == "__main__":
     process_seeds = [random.randint(0, 2**32) for _ in range(args.n_workers)]
     print(f"Process seeds: {process_seeds}")
 
+    buffer = None
+    if args.buf_backend == "shm":
+        # The launcher owns the shared-memory buffer, the workers attach to it
+        buffer = ShmSampleBuffer.create(
+            BUF_SHM_NAME, BUF_SHM_NUM_SLOTS, int(BUF_SHM_SLOT_MB * 1024 * 1024)
+        )
+        print(
+            f"Created shared-memory buffer {BUF_SHM_NAME} with "
+            f"{BUF_SHM_NUM_SLOTS} slots of {BUF_SHM_SLOT_MB} MB"
+        )
+
     def signal_handler(sig, frame):
         print("Ctrl+C received. Terminating child processes...")
         for p in processes:
             p.terminate()
+        if buffer is not None:
+            buffer.close()
+            buffer.unlink()
         sys.exit(0)
 
     signal.signal(signal.SIGINT, signal_handler)
     for worker_id in range(args.n_workers):
-        p = Process(
-            target=run_producer,
-            args=(
-                process_seeds[worker_id],
-                args.n_workers,
-                worker_id,
-                args.fill_up,
-                args.clean_dirty,
-                args.dataset_type,
-            ),
-        )
+        if args.buf_backend == "shm":
+            p = Process(
+                target=run_producer_shm,
+                args=(
+                    process_seeds[worker_id],
+                    args.n_workers,
+                    worker_id,
+                    args.dataset_type,
+                    BUF_SHM_NAME,
+                ),
+            )
+        else:
+            p = Process(
+                target=run_producer,
+                args=(
+                    process_seeds[worker_id],
+                    args.n_workers,
+                    worker_id,
+                    args.fill_up,
+                    args.clean_dirty,
+                    args.dataset_type,
+                ),
+            )
         p.start()
         processes.append(p)
 
     for p in processes:
         p.join()
+    if buffer is not None:
+        buffer.close()
+        buffer.unlink()
@@ -0,0 +1,275 @@
+"""
+A shared-memory ring buffer of training samples, as an alternative to the file-based
+buffer in `buf_path`.
+
+The producers and the consumers (training DataLoader workers) on one machine attach to
+a single shared-memory segment holding `num_slots` fixed-size slots. Each slot stores a
+small pickled header (the json content and the array layout) followed by the raw
+arrays, so writing a sample is one copy into the slot and reading it returns NumPy
+views of the slot without any decoding.
+
+Slots are claimed with non-blocking byte-range locks on the segment's backing file
+in `/dev/shm`, one byte per slot, so only processes touching the same slot contend
+and nothing is written to disk. The locks are per process: do not share one
+attached buffer between threads.
+"""
+
+import os
+import time
+import pickle
+import fcntl
+from contextlib import contextmanager
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+# Arrays of a sample, in the order the consumer unpacks them
+SAMPLE_ARRAY_KEYS = [
+    "step_id",
+    "state_chunk",
+    "state_chunk_time_mask",
+    "action_chunk",
+    "action_chunk_time_mask",
+    "state_vec_mask",
+    "past_frames_0",
+    "past_frames_0_time_mask",
+    "past_frames_1",
+    "past_frames_1_time_mask",
+    "past_frames_2",
+    "past_frames_2_time_mask",
+    "past_frames_3",
+    "past_frames_3_time_mask",
+    "state_std",
+    "state_mean",
+    "state_norm",
+]
+
+SLOT_FREE = 0
+SLOT_READY = 1
+
+_MAGIC = 0x52445442  # "RDTB"
+_HEADER_BYTES = 64
+_ALIGN = 64
+
+
+# Segments created by this process (or inherited by forking from their creator)
+_CREATED = set()
+
+
+def _align(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class ShmSampleBuffer:
+    """
+    A fixed-size ring of sample slots in shared memory.
+
+    Create it once with `ShmSampleBuffer.create` (usually in the producer launcher)
+    and attach to it by name from every other process with `ShmSampleBuffer(name)`.
+    """
+
+    def __init__(self, name, _shm=None):
+        if _shm is None:
+            _shm = shared_memory.SharedMemory(name=name)
+            # Only the creator owns the segment. Unrelated processes attaching to it
+            # must not let their resource tracker unlink it when they exit.
+            if name not in _CREATED:
+                resource_tracker.unregister(_shm._name, "shared_memory")
+        self.shm = _shm
+        self.name = name
+        header = np.ndarray((4,), dtype=np.int64, buffer=self.shm.buf)
+        if header[0] != _MAGIC:
+            raise ValueError(f"Shared memory segment {name} is not a sample buffer.")
+        self.num_slots = int(header[1])
+        self.slot_bytes = int(header[2])
+
+        # slot states and the number of samples written to each slot
+        self.states = np.ndarray(
+            (self.num_slots,), dtype=np.uint8, buffer=self.shm.buf, offset=_HEADER_BYTES
+        )
+        self._seq_offset = _HEADER_BYTES + _align(self.num_slots)
+        self.write_counts = np.ndarray(
+            (self.num_slots,),
+            dtype=np.int64,
+            buffer=self.shm.buf,
+            offset=self._seq_offset,
+        )
+        self._data_offset = self._seq_offset + _align(8 * self.num_slots)
+        self._lock_fd = None
+        self._lock_pid = None
+
+    @classmethod
+    def create(cls, name, num_slots, slot_bytes, exist_ok=True):
+        """
+        Creates a buffer of @num_slots slots of @slot_bytes bytes each. An existing
+        segment with the same name is replaced if @exist_ok.
+        """
+        slot_bytes = _align(slot_bytes)
+        size = (
+            _HEADER_BYTES + _align(num_slots) + _align(8 * num_slots)
+        ) + num_slots * slot_bytes
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            if not exist_ok:
+                raise
+            old = shared_memory.SharedMemory(name=name)
+            old.close()
+            old.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _CREATED.add(name)
+        header = np.ndarray((4,), dtype=np.int64, buffer=shm.buf)
+        header[:] = [_MAGIC, num_slots, slot_bytes, 0]
+        buffer = cls(name, _shm=shm)
+        buffer.states[:] = SLOT_FREE
+        buffer.write_counts[:] = 0
+        return buffer
+
+    def close(self):
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        # drop the views before closing the mapping
+        self.states = None
+        self.write_counts = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+    def __getstate__(self):
+        # DataLoader workers re-attach by name
+        return {"name": self.name}
+
+    def __setstate__(self, state):
+        self.__init__(state["name"])
+
+    # Slot locks
+
+    def _get_lock_fd(self):
+        # fcntl locks are not inherited across fork, reopen in each process
+        if self._lock_pid != os.getpid():
+            self._lock_fd = os.open(
+                os.path.join("/dev/shm", self.shm._name.lstrip("/")), os.O_RDWR
+            )
+            self._lock_pid = os.getpid()
+        return self._lock_fd
+
+    def _try_lock(self, slot):
+        try:
+            fcntl.lockf(self._get_lock_fd(), fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+            return True
+        except (BlockingIOError, PermissionError):
+            return False
+
+    def _unlock(self, slot):
+        fcntl.lockf(self._get_lock_fd(), fcntl.LOCK_UN, 1, slot)
+
+    # Sample layout
+
+    def _slot_view(self, slot):
+        start = self._data_offset + slot * self.slot_bytes
+        return self.shm.buf[start : start + self.slot_bytes]
+
+    def _write_slot(self, slot, json_content, arrays):
+        layout = []
+        offset = 0
+        for key, value in arrays.items():
+            value = np.ascontiguousarray(value)
+            layout.append((key, value.dtype.str, value.shape, offset))
+            offset = _align(offset + value.nbytes)
+        header = pickle.dumps((json_content, layout))
+        data_start = _align(8 + len(header))
+        if data_start + offset > self.slot_bytes:
+            raise ValueError(
+                f"Sample of {data_start + offset} bytes does not fit in a "
+                f"{self.slot_bytes}-byte slot, increase `buf_shm_slot_mb`."
+            )
+
+        view = self._slot_view(slot)
+        np.ndarray((1,), dtype=np.int64, buffer=view)[0] = len(header)
+        view[8 : 8 + len(header)] = header
+        for (key, dtype, shape, array_offset), value in zip(layout, arrays.values()):
+            np.ndarray(
+                shape, dtype=dtype, buffer=view, offset=data_start + array_offset
+            )[...] = value
+
+    def _read_slot(self, slot):
+        view = self._slot_view(slot)
+        header_len = int(np.ndarray((1,), dtype=np.int64, buffer=view)[0])
+        json_content, layout = pickle.loads(view[8 : 8 + header_len])
+        data_start = _align(8 + header_len)
+        arrays = {
+            key: np.ndarray(shape, dtype=dtype, buffer=view, offset=data_start + offset)
+            for key, dtype, shape, offset in layout
+        }
+        return json_content, arrays
+
+    # Producer / consumer API
+
+    def write(self, json_content, arrays, slots=None, timeout=None, poll=0.01):
+        """
+        Writes a sample into a free slot, waiting until one is available.
+
+        Args:
+            json_content (dict): the json-serializable part of the sample
+            arrays (dict): name -> ndarray
+            slots (range, optional): the slots this producer may write to
+            timeout (float, optional): give up after this many seconds
+
+        Returns:
+            slot (int): the slot written to, or None on timeout
+        """
+        slots = range(self.num_slots) if slots is None else slots
+        start = time.time()
+        while True:
+            for slot in slots:
+                if self.states[slot] != SLOT_FREE or not self._try_lock(slot):
+                    continue
+                try:
+                    if self.states[slot] != SLOT_FREE:
+                        continue
+                    self._write_slot(slot, json_content, arrays)
+                    self.write_counts[slot] += 1
+                    self.states[slot] = SLOT_READY
+                    return slot
+                finally:
+                    self._unlock(slot)
+            if timeout is not None and time.time() - start > timeout:
+                return None
+            time.sleep(poll)
+
+    @contextmanager
+    def claim(self, start_slot=0, poll=0.01):
+        """
+        Claims a ready sample, waiting until one is available, and yields
+        (json_content, arrays) where the arrays are views into shared memory. The
+        views are only valid inside the context; the slot is freed for the producers
+        on exit.
+        """
+        while True:
+            for i in range(self.num_slots):
+                slot = (start_slot + i) % self.num_slots
+                if self.states[slot] != SLOT_READY or not self._try_lock(slot):
+                    continue
+                if self.states[slot] != SLOT_READY:
+                    self._unlock(slot)
+                    continue
+                try:
+                    yield self._read_slot(slot)
+                finally:
+                    self.states[slot] = SLOT_FREE
+                    self._unlock(slot)
+                return
+            time.sleep(poll)
+
+    def read(self, start_slot=0):
+        """
+        Claims a ready sample and returns (json_content, arrays) with the arrays
+        copied out of shared memory.
+        """
+        with self.claim(start_slot) as (json_content, arrays):
+            return json_content, {k: v.copy() for k, v in arrays.items()}
+
+    def num_ready(self):
+        return int(np.count_nonzero(self.states == SLOT_READY))
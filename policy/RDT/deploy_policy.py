@@ -28,6 +28,7 @@ def get_model(usr_args):  # keep
         left_arm_dim,
         right_arm_dim,
         rdt_step,
+        lang_embed_store=usr_args.get("lang_embed_store"),
     )
     return rdt
 
@@ -183,6 +183,15 @@ def parse_args(input_args=None):
         default=False,
         help="Whether or not to use precomputed language embeddings.",
     )
+    parser.add_argument(
+        "--lang_embed_store",
+        type=str,
+        default=None,
+        help=(
+            "Directory of a packed language embedding store built by scripts/build_lang_embed_store.py. "
+            "If set, precomputed embeddings are served from it instead of loading one .pt file per sample."
+        ),
+    )
     parser.add_argument(
         "--scale_lr",
         action="store_true",
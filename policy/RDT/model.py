@@ -48,6 +48,7 @@ class RDT:
         left_arm_dim,
         right_arm_dim,
         rdt_step,
+        lang_embed_store=None,
     ):
         # set path
         current_file = Path(__file__)
@@ -81,7 +82,15 @@ class RDT:
         self.task_name = task_name
         self.observation_window = None
         self.img_size = (640, 480)
-        self.set_language_embed()
+        # Instructions are served from the precomputed store or encoded once and
+        # cached, the T5 encoder is only loaded for instructions missing from both
+        self.lang_embed_store = None
+        if lang_embed_store is not None:
+            from data.lang_embed_store import LangEmbedStore
+
+            self.lang_embed_store = LangEmbedStore(lang_embed_store)
+        self.lang_embed_cache = {}
+        self.tokenizer, self.text_encoder = None, None
         self.rdt_step = rdt_step
 
     # set img_size
@@ -115,7 +124,18 @@ class RDT:
     ):
         assert ((save_dir is None) ^ (task_name is None)) == False, "input error"
 
-        if os.path.isfile(language_instruction):
+        if language_instruction in self.lang_embed_cache:
+            self.lang_embeddings = self.lang_embed_cache[language_instruction]
+        elif (
+            self.lang_embed_store is not None
+            and language_instruction in self.lang_embed_store
+        ):
+            self.lang_embeddings = self.lang_embed_store.get(
+                language_instruction
+            ).unsqueeze(0)
+            self.lang_embed_cache[language_instruction] = self.lang_embeddings
+            print("loading instruction from language embedding store")
+        elif os.path.isfile(language_instruction):
             lang_dict = torch.load(language_instruction)
             print(
                 f"Running with instruction: \"{lang_dict['instruction']}\" from \"{lang_dict['name']}\""
@@ -123,6 +143,8 @@ class RDT:
             self.lang_embeddings = lang_dict["embeddings"]
             print("loading instruction from pre-embed path")
         else:
+            if self.text_encoder is None:
+                self.set_language_embed()
             device = next(self.text_encoder.parameters()).device
             with torch.no_grad():
                 tokens = self.tokenizer(
@@ -149,6 +171,7 @@ class RDT:
             del tokens, output
             torch.cuda.empty_cache()
             self.lang_embeddings = pred
+            self.lang_embed_cache[language_instruction] = pred
 
         print(f"successfully set instruction: {language_instruction}")
 
@@ -0,0 +1,123 @@
+"""
+Build a packed language embedding store (see data/lang_embed_store.py).
+
+Packs the per-episode `instructions/*.pt` embeddings found under --data_path
+(no text encoder needed), and encodes every unique instruction of the RoboTwin
+instruction files matched by --instruction_files once with T5.
+
+Example:
+    python scripts/build_lang_embed_store.py \
+        --data_path processed_data/beat_block_hammer-demo_clean-50 \
+        --instruction_files "../../data/beat_block_hammer/demo_clean/instructions/*.json" \
+        --save_dir processed_data/beat_block_hammer-demo_clean-50/lang_embed_store
+"""
+
+import os
+import sys
+import glob
+import json
+import argparse
+
+import torch
+import yaml
+from tqdm import tqdm
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from data.lang_embed_store import LangEmbedStoreBuilder
+
+GPU = 0
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "../../weights/RDT/t5-v1_1-xxl")
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "../configs/base.yaml")
+
+
+def collect_instruction_texts(instruction_files, desc_types):
+    texts = set()
+    for file_path in instruction_files:
+        with open(file_path, "r") as f_instr:
+            instruction_dict = json.load(f_instr)
+        for desc_type in desc_types:
+            instructions = instruction_dict.get(desc_type, [])
+            if isinstance(instructions, str):
+                instructions = [instructions]
+            texts.update(instructions)
+    return sorted(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--data_path",
+        type=str,
+        default=None,
+        help="Directory of processed episodes whose `instructions/*.pt` files are packed.",
+    )
+    parser.add_argument(
+        "--instruction_files",
+        type=str,
+        nargs="*",
+        default=[],
+        help="Glob patterns of instruction json files to encode.",
+    )
+    parser.add_argument(
+        "--desc_types",
+        type=str,
+        nargs="+",
+        default=["seen", "unseen"],
+        help="Which instruction lists of the json files to encode.",
+    )
+    parser.add_argument("--save_dir", type=str, required=True)
+    parser.add_argument(
+        "--dtype",
+        type=str,
+        default=None,
+        help="Storage dtype of the embeddings, e.g. float16. Defaults to the encoder output dtype.",
+    )
+    parser.add_argument("--batch_size", type=int, default=32)
+    args = parser.parse_args()
+
+    builder = LangEmbedStoreBuilder()
+
+    if args.data_path is not None:
+        pt_files = sorted(
+            glob.glob(
+                os.path.join(args.data_path, "**", "instructions", "*.pt"),
+                recursive=True,
+            )
+        )
+        for pt_file in tqdm(pt_files, desc="Packing embeddings"):
+            builder.add_embed_file(pt_file)
+        print(f"Packed {len(pt_files)} files into {len(builder.entries)} embeddings")
+
+    instruction_files = sorted(
+        set(f for pattern in args.instruction_files for f in glob.glob(pattern))
+    )
+    if len(instruction_files) > 0:
+        texts = collect_instruction_texts(instruction_files, args.desc_types)
+        texts = [t for t in texts if not builder.has_text(t)]
+        if len(texts) > 0:
+            from models.multimodal_encoder.t5_encoder import T5Embedder
+
+            with open(CONFIG_PATH, "r") as fp:
+                config = yaml.safe_load(fp)
+            device = torch.device(f"cuda:{GPU}")
+            text_embedder = T5Embedder(
+                from_pretrained=MODEL_PATH,
+                model_max_length=config["dataset"]["tokenizer_max_length"],
+                device=device,
+                use_offload_folder=None,
+            )
+            tokenizer, text_encoder = text_embedder.tokenizer, text_embedder.model
+            num_encoded = builder.encode_texts(
+                texts, tokenizer, text_encoder, device, batch_size=args.batch_size
+            )
+            print(f"Encoded {num_encoded} unique instructions")
+
+    num_tokens = builder.save(args.save_dir, dtype=args.dtype)
+    print(
+        f"Saved {len(builder.entries)} embeddings ({num_tokens} tokens) to {args.save_dir}"
+    )
+
+
+if __name__ == "__main__":
+    main()
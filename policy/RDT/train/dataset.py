@@ -14,6 +14,8 @@ from PIL import Image
 import transformers
 
 from data.filelock import FileLock
+from data.shm_buffer import ShmSampleBuffer
+from data.lang_embed_store import LangEmbedStore
 from data.hdf5_vla_dataset import HDF5VLADataset
 from train.image_corrupt import image_corrupt
 
@@ -96,6 +98,7 @@ class VLAConsumerDataset(Dataset):
         state_noise_snr=None,
         use_hdf5=False,
         use_precomp_lang_embed=False,
+        lang_embed_store=None,
     ):
         super(VLAConsumerDataset, self).__init__()
 
@@ -119,6 +122,10 @@ class VLAConsumerDataset(Dataset):
         self.buffer_dir = config["buf_path"]
         self.num_chunks = config["buf_num_chunks"]
         self.chunk_size = config["buf_chunk_size"]
+        self.buf_backend = config.get("buf_backend", "file")
+        self.buf_shm_name = config.get("buf_shm_name", "rdt_sample_buffer")
+        # Attached lazily, so that each DataLoader worker maps the buffer itself
+        self.shm_buffer = None
         self.tokenizer_max_length = config["tokenizer_max_length"]
         self.image_aspect_ratio = config["image_aspect_ratio"]
         self.state_noise_snr = state_noise_snr
@@ -133,6 +140,10 @@ class VLAConsumerDataset(Dataset):
         self.use_precomp_lang_embed = use_precomp_lang_embed
         if use_precomp_lang_embed:
             self.empty_lang_embed = torch.load("data/empty_lang_embed.pt")
+        # Packed, memory-mapped embeddings served by instruction text or .pt path
+        self.lang_embed_store = (
+            LangEmbedStore(lang_embed_store) if lang_embed_store is not None else None
+        )
 
         # Load dataset stat
         with open("configs/dataset_stat.json", "r") as f:
@@ -199,6 +210,18 @@ class VLAConsumerDataset(Dataset):
         else:
             return self.num_chunks * self.chunk_size
 
+    def _safe_load_shm(self, index):
+        if self.shm_buffer is None:
+            self.shm_buffer = ShmSampleBuffer(self.buf_shm_name)
+        # Start searching from the slot of the index, waits until a sample is ready
+        with self.shm_buffer.claim(index % self.shm_buffer.num_slots) as (
+            content,
+            arrays,
+        ):
+            # Copy out of the slot before it is handed back to the producers
+            meta = tuple(np.array(v) for v in arrays.values())
+        return (content, *meta)
+
     def _safe_load(self, index):
         read_chunk_item_indices = []
         # Start searching from a random chunk
@@ -280,7 +303,11 @@ class VLAConsumerDataset(Dataset):
                         state_std,
                         state_mean,
                         state_norm,
-                    ) = self._safe_load(index)
+                    ) = (
+                        self._safe_load_shm(index)
+                        if self.buf_backend == "shm"
+                        else self._safe_load(index)
+                    )
 
                 data_dict = {}
                 data_dict["dataset_name"] = content["dataset_name"]
@@ -410,11 +437,17 @@ class VLAConsumerDataset(Dataset):
                 if self.use_precomp_lang_embed:
                     if content["instruction"][-1] == ".":
                         content["instruction"] = content["instruction"][:-1]
-                    data_dict["lang_embed"] = (
-                        torch.load(content["instruction"])
-                        if random.random() > self.cond_mask_prob
-                        else self.empty_lang_embed
-                    )
+                    if random.random() <= self.cond_mask_prob:
+                        data_dict["lang_embed"] = self.empty_lang_embed
+                    elif (
+                        self.lang_embed_store is not None
+                        and content["instruction"] in self.lang_embed_store
+                    ):
+                        data_dict["lang_embed"] = self.lang_embed_store.get(
+                            content["instruction"]
+                        )
+                    else:
+                        data_dict["lang_embed"] = torch.load(content["instruction"])
                 else:
                     instruction = (
                         content["instruction"]
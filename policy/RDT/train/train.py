@@ -275,6 +275,7 @@ def train(args, logger):
         state_noise_snr=args.state_noise_snr,
         use_hdf5=args.load_from_hdf5,
         use_precomp_lang_embed=args.precomp_lang_embed,
+        lang_embed_store=args.lang_embed_store,
     )
     sample_dataset = VLAConsumerDataset(
         model_config_path=args.model_config_path,  # TODO
@@ -290,6 +291,7 @@ def train(args, logger):
         state_noise_snr=None,
         use_hdf5=args.load_from_hdf5,
         use_precomp_lang_embed=args.precomp_lang_embed,
+        lang_embed_store=args.lang_embed_store,
     )
 
     data_collator = DataCollatorForVLAConsumerDataset(tokenizer)
@@ -71,6 +71,10 @@ class EpisodicDataset(torch.utils.data.Dataset):
             ),  # , hue=0.08)
             transforms.Resize(size=new_size, antialias=True),
         ]
+        if self.data_args.gpu_image_augmentation:
+            # the trainer augments the collated batches on the device, see
+            # data_utils/gpu_augmentation.py
+            self.transformations = [transforms.Resize(size=new_size, antialias=True)]
 
         self.rank0_print(
             f"{RED}policy class: {self.policy_class}; augument: {self.augment_images}{RESET}"
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+sys.path.append(os.path.dirname(__file__))
+
+from gpu_augmentation import (
+    IMAGENET_MEAN,
+    IMAGENET_STD,
+    BatchImageAugmentation,
+    InternVLBatchAugmentation,
+)
+
+MEAN = torch.tensor(IMAGENET_MEAN).view(1, 1, 3, 1, 1)
+STD = torch.tensor(IMAGENET_STD).view(1, 1, 3, 1, 1)
+
+
+def _inputs(frames, dtype=torch.float32):
+    return {
+        "input_ids": torch.zeros(len(frames), 16, dtype=torch.long),
+        "pixel_values": ((frames - MEAN) / STD).to(dtype),
+    }
+
+
+def test_internvl_identity_round_trip():
+    # without cropping, rotation or color changes the batch comes back unchanged
+    identity = BatchImageAugmentation(
+        crop_ratio=1.0, degrees=(0.0, 0.0), brightness=0, contrast=0, saturation=0
+    )
+    augmentation = InternVLBatchAugmentation(identity, num_cameras=3)
+
+    frames = torch.rand(2, 3, 3, 448, 448)
+    inputs = _inputs(frames)
+    expected_pixel_values = inputs["pixel_values"].clone()
+    expected_input_ids = inputs["input_ids"].clone()
+    outputs = augmentation(inputs)
+    assert outputs["pixel_values"].dtype == torch.float32
+    assert torch.allclose(outputs["pixel_values"], expected_pixel_values, atol=1e-3)
+    assert torch.equal(outputs["input_ids"], expected_input_ids)
+
+    outputs = augmentation(_inputs(frames, dtype=torch.bfloat16))
+    assert outputs["pixel_values"].dtype == torch.bfloat16
+    assert torch.allclose(
+        outputs["pixel_values"].float(), expected_pixel_values, atol=5e-2
+    )
+
+
+def test_internvl_augments_unnormalized_frames():
+    frames = torch.rand(4, 2, 3, 448, 448)
+    augmentation = InternVLBatchAugmentation(
+        BatchImageAugmentation(seed=0), num_cameras=2
+    )
+    outputs = augmentation(_inputs(frames))
+    assert outputs["pixel_values"].shape == frames.shape
+
+    # same as augmenting the frames in [0, 1] and normalizing them afterwards
+    expected = BatchImageAugmentation(seed=0)(frames)
+    restored = outputs["pixel_values"] * STD + MEAN
+    assert torch.allclose(restored, expected, atol=1e-5)
+    assert restored.min() >= -1e-5 and restored.max() <= 1 + 1e-5
+    assert not torch.allclose(restored, frames, atol=1e-2)
+
+
+def test_internvl_checks_num_cameras():
+    augmentation = InternVLBatchAugmentation(BatchImageAugmentation(), num_cameras=3)
+    with pytest.raises(AssertionError):
+        augmentation(_inputs(torch.rand(2, 2, 3, 448, 448)))
@@ -16,6 +16,10 @@ from aloha_scripts.utils import *
 from aloha_scripts.constants import TASK_CONFIGS
 from transformers import AutoConfig, AutoProcessor, AutoTokenizer
 from data_utils.data_collator import DataCollatorForSupervisedDataset
+from data_utils.gpu_augmentation import (
+    BatchImageAugmentation,
+    InternVLBatchAugmentation,
+)
 from data_utils.robot_data_processor import InternVL3Process
 from dataclasses import dataclass, field, asdict
 
@@ -48,6 +52,10 @@ class DataArguments:
     task_name: str = field(default="stack_cube_2024_6_2")
     skip_mirrored_data: bool = field(default=False)
     chunk_size: int = field(default=16)
+    # augment the collated batches on the training device instead of every
+    # sample in the DataLoader workers, see data_utils/gpu_augmentation.py
+    gpu_image_augmentation: bool = False
+    augmentation_seed: Optional[int] = None  # offset by the process index
 
 
 @dataclass
@@ -147,13 +155,27 @@ def train_bc(train_dataset=None, model=None, config=None, tokenizer=None):
         computed_type=compute_dtype, tokenizer=tokenizer
     )
 
+    image_augmentation = None
+    if config["data_args"].gpu_image_augmentation:
+        seed = config["data_args"].augmentation_seed
+        if seed is not None:
+            seed += config["training_args"].process_index
+        camera_names = TASK_CONFIGS[config["data_args"].task_name]["camera_names"]
+        image_augmentation = InternVLBatchAugmentation(
+            BatchImageAugmentation(seed=seed), num_cameras=len(camera_names)
+        )
+
     model.config.use_cache = True
     if not isinstance(model.config.policy_head_config, dict):
         model.config.policy_head_config = model.config.policy_head_config.to_dict()
     model.config.save_pretrained(config["training_args"].output_dir)
     data_module = dict(train_dataset=train_dataset, data_collator=data_collator)
     trainer = VLATrainer(
-        model=model, tokenizer=tokenizer, args=config["training_args"], **data_module
+        model=model,
+        tokenizer=tokenizer,
+        args=config["training_args"],
+        image_augmentation=image_augmentation,
+        **data_module,
     )
 
     trainer.train(resume_from_checkpoint=config["training_args"].resume_from_checkpoint)
@@ -61,8 +61,10 @@ def _is_peft_model(model):
 
 
 class VLATrainer(Trainer):
-    def __init__(self, prefetch_factor=2, *args, **kwargs):
+    def __init__(self, prefetch_factor=2, image_augmentation=None, *args, **kwargs):
         self.prefetch_factor = prefetch_factor
+        # applied to the training batches once they are on the device
+        self.image_augmentation = image_augmentation
         self.lora_module = kwargs["args"].lora_module
         self.local_rank = kwargs["args"].local_rank
         self.resume_from_checkpoint = kwargs["args"].resume_from_checkpoint
@@ -96,6 +98,11 @@ class VLATrainer(Trainer):
             dataloader_params["prefetch_factor"] = self.prefetch_factor
         return self.accelerator.prepare(DataLoader(train_dataset, **dataloader_params))
 
+    def training_step(self, model, inputs, *args, **kwargs):
+        if self.image_augmentation is not None:
+            inputs = self.image_augmentation(self._prepare_inputs(inputs))
+        return super().training_step(model, inputs, *args, **kwargs)
+
     def _get_train_sampler(self) -> Optional[torch.utils.data.Sampler]:
         if self.train_dataset is None or not has_length(self.train_dataset):
             return None
@@ -9,6 +9,7 @@ from experiments.robot.openvla_utils import (
     get_action_head,
     get_proprio_projector,
     get_vla_action,
+    get_vla_actions,
 )
 
 
@@ -23,6 +24,7 @@ class InferenceConfig:
     load_in_4bit: bool = False
     num_images_in_input: int = 3
     center_crop: bool = True
+    emulate_jpeg: bool = True
     unnorm_key: str = ""
     num_open_loop_steps: int = NUM_ACTIONS_CHUNK
     lora_rank: int = 32
@@ -67,6 +69,19 @@ class Model:
         )
         return actions
 
+    def get_actions(self, observations: list) -> list:
+        obs_list = [encode_obs(observation) for observation in observations]
+        return get_vla_actions(
+            cfg=self.cfg,
+            vla=self.vla,
+            processor=self.processor,
+            observations=obs_list,
+            task_labels=[obs["instruction"] for obs in obs_list],
+            action_head=self.action_head,
+            proprio_projector=self.proprio_projector,
+            use_film=self.cfg.use_film,
+        )
+
 
 def get_model(usr_args: dict):
     config_args = {
@@ -79,6 +94,7 @@ def get_model(usr_args: dict):
         "load_in_4bit": usr_args.get("load_in_4bit", False),
         "num_images_in_input": usr_args.get("num_images_in_input", 3),
         "center_crop": usr_args.get("center_crop", True),
+        "emulate_jpeg": usr_args.get("emulate_jpeg", True),
         "unnorm_key": usr_args["unnorm_key"],
         "num_open_loop_steps": usr_args.get("num_open_loop_steps", NUM_ACTIONS_CHUNK),
         "lora_rank": usr_args.get("lora_rank", 32),
@@ -132,6 +148,13 @@ def eval(TASK_ENV, model: Model, observation: dict):
         observation = TASK_ENV.get_obs()
 
 
+def get_actions(model: Model, observations: list, instructions: list) -> list:
+    # 批量推理：每个环境一个观测，返回每个环境的动作序列
+    for observation, instruction in zip(observations, instructions):
+        observation["language"] = instruction
+    return model.get_actions(observations)
+
+
 # def eval(TASK_ENV, model: Model, observation: dict):
 #     # 添加语言指令
 #     observation["language"] = TASK_ENV.get_instruction()
@@ -28,7 +28,10 @@ from experiments.robot.aloha.aloha_utils import (
 )
 from experiments.robot.openvla_utils import (
     get_action_from_server,
-    resize_image_for_policy,
+    get_actions_from_server,
+    latency_tracing,
+    msgpack_numpy,
+    resize_images_for_policy,
 )
 from experiments.robot.robot_utils import (
     DATE_TIME,
@@ -55,10 +58,15 @@ class GenerateConfig:
     model_family: str = "openvla"                    # Model family
 
     center_crop: bool = True                         # Center crop? (if trained w/ random crop image aug)
+    emulate_jpeg: bool = True                        # JPEG round trip before resizing? (as in the RLDS dataset builder)
     num_open_loop_steps: int = 25                    # Number of actions to execute open-loop before requerying policy
 
     use_vla_server: bool = True                      # Whether to query remote VLA server for actions
     vla_server_url: Union[str, Path] = ""            # Remote VLA server URL (set to 127.0.0.1 if on same machine)
+    server_transport: str = "json"                   # How to send observations: json | msgpack (binary, needs `openpi_client`)
+    server_timeout_s: Optional[float] = None         # Deadline of each server request in seconds (None waits forever)
+    server_max_retries: int = 0                      # Number of retries after a timed out or refused server request
+    trace_latency: bool = False                      # Record per-episode latency percentiles (needs `openpi_client`)
 
     #################################################################################################################
     # ALOHA environment-specific parameters
@@ -83,6 +91,16 @@ def validate_config(cfg: GenerateConfig) -> None:
     assert (
         cfg.use_vla_server
     ), "Must use VLA server (server-client interface) to query model and get actions! Please set --use_vla_server=True"
+    assert (
+        not cfg.trace_latency or latency_tracing is not None
+    ), "Latency tracing requires `openpi_client`! Install it from policy/pi0/packages/openpi-client"
+    assert cfg.server_transport in (
+        "json",
+        "msgpack",
+    ), f"Unsupported server transport: {cfg.server_transport}"
+    assert (
+        cfg.server_transport != "msgpack" or msgpack_numpy is not None
+    ), "The msgpack transport requires `openpi_client`! Install it from policy/pi0/packages/openpi-client"
 
 
 def setup_logging(cfg: GenerateConfig):
@@ -113,19 +131,25 @@ def log_message(message: str, log_file=None):
 def get_server_endpoint(cfg: GenerateConfig):
     """Get the server endpoint for remote inference."""
     ip_address = socket.gethostbyname(cfg.vla_server_url)
+    if cfg.server_transport == "msgpack":
+        return f"http://{ip_address}:8777/act_batch"
     return f"http://{ip_address}:8777/act"
 
 
-def prepare_observation(obs, resize_size):
+def prepare_observation(obs, resize_size, emulate_jpeg=True):
     """Prepare observation for policy input."""
     # Get preprocessed images
     img = get_aloha_image(obs)
     left_wrist_img, right_wrist_img = get_aloha_wrist_images(obs)
 
     # Resize images to size expected by model
-    img_resized = resize_image_for_policy(img, resize_size)
-    left_wrist_img_resized = resize_image_for_policy(left_wrist_img, resize_size)
-    right_wrist_img_resized = resize_image_for_policy(right_wrist_img, resize_size)
+    (
+        img_resized,
+        left_wrist_img_resized,
+        right_wrist_img_resized,
+    ) = resize_images_for_policy(
+        [img, left_wrist_img, right_wrist_img], resize_size, emulate_jpeg
+    )
 
     # Prepare observations dict
     observation = {
@@ -145,6 +169,7 @@ def run_episode(
     server_endpoint: str,
     resize_size,
     log_file=None,
+    tracer=None,
 ):
     """Run a single episode in the ALOHA environment."""
     # Define control frequency
@@ -196,7 +221,7 @@ def run_episode(
                     img_resized,
                     left_wrist_resized,
                     right_wrist_resized,
-                ) = prepare_observation(obs, resize_size)
+                ) = prepare_observation(obs, resize_size, cfg.emulate_jpeg)
                 observation["instruction"] = task_description
 
                 # Save processed images for replay
@@ -207,7 +232,22 @@ def run_episode(
                 # Query model to get action
                 log_message("Requerying model...", log_file)
                 model_query_start_time = time.time()
-                actions = get_action_from_server(observation, server_endpoint)
+                if cfg.server_transport == "msgpack":
+                    actions = get_actions_from_server(
+                        [observation],
+                        server_endpoint,
+                        timeout_s=cfg.server_timeout_s,
+                        max_retries=cfg.server_max_retries,
+                        tracer=tracer,
+                    )[0]
+                else:
+                    actions = get_action_from_server(
+                        observation,
+                        server_endpoint,
+                        timeout_s=cfg.server_timeout_s,
+                        max_retries=cfg.server_max_retries,
+                        tracer=tracer,
+                    )
                 actions = actions[: cfg.num_open_loop_steps]
                 total_model_query_time += time.time() - model_query_start_time
                 action_queue.extend(actions)
@@ -260,6 +300,8 @@ def run_episode(
         "model_query_time": total_model_query_time,
         "episode_duration": episode_end_time - episode_start_time,
     }
+    if tracer is not None:
+        episode_stats["latency"] = tracer.end_episode()
 
     return (
         episode_stats,
@@ -337,6 +379,7 @@ def eval_aloha(cfg: GenerateConfig) -> None:
 
     # Get server endpoint for remote inference
     server_endpoint = get_server_endpoint(cfg)
+    tracer = latency_tracing.LatencyTracer() if cfg.trace_latency else None
 
     # Initialize task description
     task_description = ""
@@ -359,7 +402,7 @@ def eval_aloha(cfg: GenerateConfig) -> None:
             replay_images_left_wrist,
             replay_images_right_wrist,
         ) = run_episode(
-            cfg, env, task_description, server_endpoint, resize_size, log_file
+            cfg, env, task_description, server_endpoint, resize_size, log_file, tracer
         )
 
         # Update counters
@@ -394,6 +437,13 @@ def eval_aloha(cfg: GenerateConfig) -> None:
             f"Total episode elapsed time: {episode_stats['episode_duration']:.2f} sec",
             log_file,
         )
+        if tracer is not None:
+            for phase, stats in episode_stats["latency"]["phases_ms"].items():
+                log_message(
+                    f"Latency {phase}: p50 {stats['p50']:.1f} ms, "
+                    f"p90 {stats['p90']:.1f} ms, p99 {stats['p99']:.1f} ms",
+                    log_file,
+                )
 
     # Calculate final success rate
     final_success_rate = (
@@ -411,6 +461,11 @@ def eval_aloha(cfg: GenerateConfig) -> None:
         log_file,
     )
 
+    if tracer is not None:
+        latency_filepath = os.path.join(cfg.local_log_dir, run_id + "-latency.jsonl")
+        tracer.export(latency_filepath)
+        log_message(f"Saved latency summaries to {latency_filepath}", log_file)
+
     # Close log file
     if log_file:
         log_file.close()
@@ -5,7 +5,6 @@ import os
 
 import imageio
 import numpy as np
-import tensorflow as tf
 from libero.libero import get_libero_path
 from libero.libero.envs import OffScreenRenderEnv
 
@@ -36,7 +36,7 @@ from experiments.robot.openvla_utils import (
     get_noisy_action_projector,
     get_processor,
     get_proprio_projector,
-    resize_image_for_policy,
+    resize_images_for_policy,
 )
 from experiments.robot.robot_utils import (
     DATE_TIME,
@@ -97,6 +97,7 @@ class GenerateConfig:
     use_proprio: bool = True                         # Whether to include proprio state in input
 
     center_crop: bool = True                         # Center crop? (if trained w/ random crop image aug)
+    emulate_jpeg: bool = True                        # JPEG round trip before resizing? (as in the RLDS dataset builder)
     num_open_loop_steps: int = 8                     # Number of actions to execute open-loop before requerying policy
 
     lora_rank: int = 32                              # Rank of LoRA weight matrix (MAKE SURE THIS MATCHES TRAINING!)
@@ -253,15 +254,16 @@ def load_initial_states(cfg: GenerateConfig, task_suite, task_id: int, log_file=
         return initial_states, None
 
 
-def prepare_observation(obs, resize_size):
+def prepare_observation(obs, resize_size, emulate_jpeg=True):
     """Prepare observation for policy input."""
     # Get preprocessed images
     img = get_libero_image(obs)
     wrist_img = get_libero_wrist_image(obs)
 
     # Resize images to size expected by model
-    img_resized = resize_image_for_policy(img, resize_size)
-    wrist_img_resized = resize_image_for_policy(wrist_img, resize_size)
+    img_resized, wrist_img_resized = resize_images_for_policy(
+        [img, wrist_img], resize_size, emulate_jpeg
+    )
 
     # Prepare observations dict
     observation = {
@@ -345,7 +347,7 @@ def run_episode(
                 continue
 
             # Prepare observation
-            observation, img = prepare_observation(obs, resize_size)
+            observation, img = prepare_observation(obs, resize_size, cfg.emulate_jpeg)
             replay_images.append(img)
 
             # If action queue is empty, requery model
@@ -1,18 +1,19 @@
 """Utils for evaluating OpenVLA or fine-tuned OpenVLA policies."""
 
 import filecmp
+import io
 import json
 import os
 import shutil
 import time
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import json_numpy
 import numpy as np
 import requests
-import tensorflow as tf
 import torch
 from huggingface_hub import HfApi, hf_hub_download
 from PIL import Image
@@ -38,14 +39,27 @@ from prismatic.models.projectors import NoisyActionProjector, ProprioProjector
 from prismatic.vla.constants import (
     ACTION_DIM,
     ACTION_PROPRIO_NORMALIZATION_TYPE,
+    NormalizationType,
 )
-from prismatic.vla.datasets.rlds.utils.data_utils import NormalizationType
+
+try:
+    # Only needed to trace the latency of remote inference calls, and for the binary
+    # transports of the VLA server.
+    from openpi_client import (
+        latency_tracing,
+        local_client_policy,
+        msgpack_numpy,
+        shm_transport,
+    )
+except ImportError:
+    latency_tracing = local_client_policy = msgpack_numpy = shm_transport = None
 
 # Initialize important constants
 DATE = time.strftime("%Y_%m_%d")
 DATE_TIME = time.strftime("%Y_%m_%d-%H_%M_%S")
 DEVICE = torch.device("cuda:0") if torch.cuda.is_available() else torch.device("cpu")
 OPENVLA_IMAGE_SIZE = 224  # Standard image size expected by OpenVLA
+MSGPACK_CONTENT_TYPE = "application/msgpack"
 
 # Configure NumPy print settings
 np.set_printoptions(formatter={"float": lambda x: "{0:0.3f}".format(x)})
@@ -557,91 +571,156 @@ def get_action_head(
     return action_head
 
 
-def resize_image_for_policy(
-    img: np.ndarray, resize_size: Union[int, Tuple[int, int]]
-) -> np.ndarray:
+def jpeg_round_trip(img: np.ndarray, quality: int = 95) -> np.ndarray:
     """
-    Resize an image to match the policy's expected input size.
+    Encode an image as JPEG and decode it again.
 
-    Uses the same resizing scheme as in the training data pipeline for distribution matching.
+    Emulates the compression artifacts of the images stored by the RLDS dataset builder,
+    with the same quality and chroma subsampling as tf.image.encode_jpeg.
 
     Args:
         img: Numpy array containing the image
+        quality: JPEG quality
+
+    Returns:
+        np.ndarray: The decoded image
+    """
+    buffer = io.BytesIO()
+    Image.fromarray(img).save(
+        buffer, format="JPEG", quality=quality, subsampling="4:2:0"
+    )
+    return np.asarray(Image.open(buffer).convert("RGB"))
+
+
+def _lanczos3(x: np.ndarray) -> np.ndarray:
+    x = np.abs(x)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights = (
+            3 * np.sin(np.pi * x) * np.sin(np.pi * x / 3) / (np.pi * np.pi * x * x)
+        )
+    return np.where(x <= 1e-3, 1.0, np.where(x > 3, 0.0, weights))
+
+
+@lru_cache(maxsize=None)
+def _lanczos3_matrix(in_size: int, out_size: int) -> np.ndarray:
+    """
+    Weights of tf.image.resize(method="lanczos3", antialias=True) along one axis.
+
+    Returns:
+        np.ndarray: (out_size, in_size) matrix mapping input to output pixels
+    """
+    scale = out_size / in_size
+    # Antialiasing stretches the kernel when downsampling
+    kernel_scale = max(1 / scale, 1.0)
+    radius = 3 * kernel_scale
+    sample = (np.arange(out_size) + 0.5) / scale
+    start = np.clip(np.ceil(sample - radius - 0.5), 0, in_size - 1)
+    end = np.clip(np.floor(sample + radius - 0.5), 0, in_size - 1) + 1
+    source = np.arange(in_size)
+    weights = _lanczos3((source + 0.5 - sample[:, None]) / kernel_scale)
+    weights *= (source >= start[:, None]) & (source < end[:, None])
+    weights /= weights.sum(axis=1, keepdims=True)
+    return weights.astype(np.float32)
+
+
+def resize_images_for_policy(
+    images: Sequence[np.ndarray],
+    resize_size: Union[int, Tuple[int, int]],
+    emulate_jpeg: bool = True,
+) -> np.ndarray:
+    """
+    Resize a batch of images to match the policy's expected input size.
+
+    Reproduces the resizing scheme of the training data pipeline for distribution matching
+    (JPEG round trip, then an antialiased lanczos3 resize as tf.image.resize) without
+    TensorFlow. Images of the same size are resized together.
+
+    Args:
+        images: Images as numpy arrays of shape (H, W, 3), possibly of different sizes
         resize_size: Target size as int (square) or (height, width) tuple
+        emulate_jpeg: Whether to JPEG-encode and decode the images first, as the RLDS dataset builder does
 
     Returns:
-        np.ndarray: The resized image
+        np.ndarray: The resized images, of shape (N, height, width, 3)
     """
     assert isinstance(resize_size, int) or isinstance(resize_size, tuple)
     if isinstance(resize_size, int):
         resize_size = (resize_size, resize_size)
 
-    # Resize using the same pipeline as in RLDS dataset builder
-    img = tf.image.encode_jpeg(img)  # Encode as JPEG
-    img = tf.io.decode_image(
-        img, expand_animations=False, dtype=tf.uint8
-    )  # Decode back
-    img = tf.image.resize(img, resize_size, method="lanczos3", antialias=True)
-    img = tf.cast(tf.clip_by_value(tf.round(img), 0, 255), tf.uint8)
+    if emulate_jpeg:
+        images = [jpeg_round_trip(img) for img in images]
 
-    return img.numpy()
+    resized = np.empty((len(images), *resize_size, 3), dtype=np.uint8)
+    shapes = [img.shape for img in images]
+    for shape in set(shapes):
+        idx = [i for i, other in enumerate(shapes) if other == shape]
+        height, width = shape[:2]
+        # (N, 3, H, W), so that both passes are batched matrix products
+        batch = np.stack([images[i] for i in idx]).transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch).astype(np.float32)
+        batch = batch @ _lanczos3_matrix(width, resize_size[1]).T
+        batch = _lanczos3_matrix(height, resize_size[0]) @ batch
+        resized[idx] = np.clip(np.round(batch), 0, 255).transpose(0, 2, 3, 1)
+    return resized
 
 
-def crop_and_resize(image: tf.Tensor, crop_scale: float, batch_size: int) -> tf.Tensor:
+def resize_image_for_policy(
+    img: np.ndarray, resize_size: Union[int, Tuple[int, int]]
+) -> np.ndarray:
     """
-    Center-crop an image and resize it back to original dimensions.
+    Resize an image to match the policy's expected input size.
 
-    Uses the same logic as in the training data pipeline for distribution matching.
+    Uses the same resizing scheme as in the training data pipeline for distribution matching.
 
     Args:
-        image: TF Tensor of shape (batch_size, H, W, C) or (H, W, C) with values in [0,1]
-        crop_scale: Area of center crop relative to original image
-        batch_size: Batch size
+        img: Numpy array containing the image
+        resize_size: Target size as int (square) or (height, width) tuple
 
     Returns:
-        tf.Tensor: The cropped and resized image
-    """
-    # Handle 3D inputs by adding batch dimension if needed
-    assert image.shape.ndims in (3, 4), "Image must be 3D or 4D tensor"
-    expanded_dims = False
-    if image.shape.ndims == 3:
-        image = tf.expand_dims(image, axis=0)
-        expanded_dims = True
-
-    # Calculate crop dimensions (note: we use sqrt(crop_scale) for h/w)
-    new_heights = tf.reshape(
-        tf.clip_by_value(tf.sqrt(crop_scale), 0, 1), shape=(batch_size,)
-    )
-    new_widths = tf.reshape(
-        tf.clip_by_value(tf.sqrt(crop_scale), 0, 1), shape=(batch_size,)
-    )
+        np.ndarray: The resized image
+    """
+    return resize_images_for_policy([img], resize_size)[0]
 
-    # Create bounding box for the crop
-    height_offsets = (1 - new_heights) / 2
-    width_offsets = (1 - new_widths) / 2
-    bounding_boxes = tf.stack(
-        [
-            height_offsets,
-            width_offsets,
-            height_offsets + new_heights,
-            width_offsets + new_widths,
-        ],
-        axis=1,
-    )
 
-    # Apply crop and resize
-    image = tf.image.crop_and_resize(
-        image,
-        bounding_boxes,
-        tf.range(batch_size),
-        (OPENVLA_IMAGE_SIZE, OPENVLA_IMAGE_SIZE),
-    )
+def center_crop_images(images: np.ndarray, crop_scale: float = 0.9) -> np.ndarray:
+    """
+    Center-crop a batch of images and resize them back to their original size.
 
-    # Remove batch dimension if it was added
-    if expanded_dims:
-        image = image[0]
+    Same bilinear sampling and dtype conversions as tf.image.crop_and_resize in the training
+    data pipeline, for distribution matching.
+
+    Args:
+        images: uint8 images of shape (N, H, W, 3)
+        crop_scale: Area of center crop relative to original image
 
-    return image
+    Returns:
+        np.ndarray: The cropped and resized uint8 images, of shape (N, H, W, 3)
+    """
+    _, height, width, _ = images.shape
+    # Note: we use sqrt(crop_scale) for h/w
+    size = np.clip(np.sqrt(np.float32(crop_scale)), 0, 1)
+    offset = (1 - size) / 2
+
+    def sample_coordinates(in_size: int, out_size: int):
+        scale = size * (in_size - 1) / (out_size - 1)
+        coords = offset * (in_size - 1) + np.arange(out_size, dtype=np.float32) * scale
+        low = np.floor(coords).astype(np.int64)
+        high = np.ceil(coords).astype(np.int64)
+        return low, high, (coords - low).astype(np.float32)
+
+    top, bottom, y_lerp = sample_coordinates(height, height)
+    left, right, x_lerp = sample_coordinates(width, width)
+
+    # Interpolate along x, then y, on (N, 3, H, W) images
+    images = images.transpose(0, 3, 1, 2).astype(np.float32) * np.float32(1 / 255)
+    images = images[..., left] + (images[..., right] - images[..., left]) * x_lerp
+    images = (
+        images[:, :, top] + (images[:, :, bottom] - images[:, :, top]) * y_lerp[:, None]
+    )
+
+    # Same conversion back to uint8 as tf.image.convert_image_dtype(saturate=True)
+    images = (np.clip(images, 0, 1) * np.float32(255.5)).astype(np.uint8)
+    return images.transpose(0, 2, 3, 1)
 
 
 def center_crop_image(image: Union[np.ndarray, Image.Image]) -> Image.Image:
@@ -654,27 +733,8 @@ def center_crop_image(image: Union[np.ndarray, Image.Image]) -> Image.Image:
     Returns:
         Image.Image: Cropped PIL Image
     """
-    batch_size = 1
-    crop_scale = 0.9
-
-    # Convert to TF Tensor if needed
-    if not isinstance(image, tf.Tensor):
-        image = tf.convert_to_tensor(np.array(image))
-
-    orig_dtype = image.dtype
-
-    # Convert to float32 in range [0,1]
-    image = tf.image.convert_image_dtype(image, tf.float32)
-
-    # Apply center crop and resize
-    image = crop_and_resize(image, crop_scale, batch_size)
-
-    # Convert back to original data type
-    image = tf.clip_by_value(image, 0, 1)
-    image = tf.image.convert_image_dtype(image, orig_dtype, saturate=True)
-
-    # Convert to PIL Image
-    return Image.fromarray(image.numpy()).convert("RGB")
+    image = np.asarray(image)
+    return Image.fromarray(center_crop_images(image[None])[0]).convert("RGB")
 
 
 def check_image_format(image: Any) -> None:
@@ -734,10 +794,51 @@ def normalize_proprio(proprio: np.ndarray, norm_stats: Dict[str, Any]) -> np.nda
     return normalized_proprio
 
 
+def prepare_image_batch_for_vla(images: Sequence[np.ndarray], cfg: Any) -> np.ndarray:
+    """
+    Resize and crop images for VLA input as needed, as a single batch.
+
+    Args:
+        images: Input images as numpy arrays of shape (H, W, 3)
+        cfg: Configuration object with parameters
+
+    Returns:
+        np.ndarray: Processed uint8 images of shape (N, 224, 224, 3)
+    """
+    # Validate format
+    for image in images:
+        check_image_format(image)
+
+    # Resize if needed
+    to_resize = [
+        i
+        for i, image in enumerate(images)
+        if image.shape != (OPENVLA_IMAGE_SIZE, OPENVLA_IMAGE_SIZE, 3)
+    ]
+    images = list(images)
+    if to_resize:
+        resized = resize_images_for_policy(
+            [images[i] for i in to_resize],
+            OPENVLA_IMAGE_SIZE,
+            emulate_jpeg=cfg.emulate_jpeg,
+        )
+        for i, image in zip(to_resize, resized):
+            images[i] = image
+    images = np.stack(images)
+
+    # Apply center crop if configured
+    if cfg.center_crop:
+        images = center_crop_images(images)
+
+    return images
+
+
 def prepare_images_for_vla(images: List[np.ndarray], cfg: Any) -> List[Image.Image]:
     """
     Prepare images for VLA input by resizing and cropping as needed.
 
+    All images are resized and cropped together in a single batch.
+
     Args:
         images: List of input images as numpy arrays
         cfg: Configuration object with parameters
@@ -745,26 +846,79 @@ def prepare_images_for_vla(images: List[np.ndarray], cfg: Any) -> List[Image.Ima
     Returns:
         List[Image.Image]: Processed images ready for the model
     """
-    processed_images = []
+    return [
+        Image.fromarray(image) for image in prepare_image_batch_for_vla(images, cfg)
+    ]
+
+
+@lru_cache(maxsize=None)
+def _pixel_normalization(
+    image_processor: PrismaticImageProcessor, device: torch.device
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Channel-stacked mean and std of all vision backbones, as (3 * num_backbones, 1, 1) tensors."""
+    mean = [
+        x for params in image_processor.tvf_normalize_params for x in params["mean"]
+    ]
+    std = [x for params in image_processor.tvf_normalize_params for x in params["std"]]
+    return (
+        torch.tensor(mean, device=device).view(-1, 1, 1),
+        torch.tensor(std, device=device).view(-1, 1, 1),
+    )
 
-    for image in images:
-        # Validate format
-        check_image_format(image)
 
-        # Resize if needed
-        if image.shape != (OPENVLA_IMAGE_SIZE, OPENVLA_IMAGE_SIZE, 3):
-            image = resize_image_for_policy(image, OPENVLA_IMAGE_SIZE)
+def get_pixel_values(
+    images: np.ndarray, image_processor: PrismaticImageProcessor
+) -> torch.Tensor:
+    """
+    Normalize a batch of images for the vision backbone on the device.
 
-        # Convert to PIL image
-        pil_image = Image.fromarray(image).convert("RGB")
+    Images already at the input size of the vision backbone(s) are only scaled and
+    normalized, which is all the image processor does to them. They are moved to the
+    device as uint8 in a single transfer and normalized there. Images of other sizes
+    go through the image processor.
 
-        # Apply center crop if configured
-        if cfg.center_crop:
-            pil_image = center_crop_image(pil_image)
+    Args:
+        images: uint8 images of shape (N, H, W, 3)
+        image_processor: The processor's image processor
 
-        processed_images.append(pil_image)
+    Returns:
+        torch.Tensor: Pixel values of shape (N, 3 * num_backbones, H, W) on the device
+    """
+    input_sizes = {tuple(size[-2:]) for size in image_processor.input_sizes}
+    if input_sizes != {images.shape[1:3]}:
+        pixel_values = image_processor(
+            [Image.fromarray(image) for image in images], return_tensors="pt"
+        )["pixel_values"]
+        return pixel_values.to(DEVICE, dtype=torch.bfloat16)
+
+    mean, std = _pixel_normalization(image_processor, DEVICE)
+    pixel_values = torch.from_numpy(images).to(DEVICE)
+    pixel_values = pixel_values.permute(0, 3, 1, 2).float() / 255
+    # Fused backbones expect the image once per backbone, stacked along channels
+    pixel_values = pixel_values.repeat(1, len(image_processor.input_sizes), 1, 1)
+    return ((pixel_values - mean) / std).to(torch.bfloat16)
+
+
+@lru_cache(maxsize=256)
+def tokenize_task_label(
+    tokenizer: Any, task_label: str
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Build and tokenize the VLA prompt for a task, cached per task label.
 
-    return processed_images
+    The returned tensors are on the device and shared between calls, so they must
+    not be modified in place.
+
+    Args:
+        tokenizer: The processor's tokenizer
+        task_label: Text description of the task
+
+    Returns:
+        Tuple[torch.Tensor, torch.Tensor]: Input ids and attention mask, each of shape (1, L)
+    """
+    prompt = f"In: What action should the robot take to {task_label.lower()}?\nOut:"
+    inputs = tokenizer(prompt, return_tensors="pt")
+    return inputs["input_ids"].to(DEVICE), inputs["attention_mask"].to(DEVICE)
 
 
 def get_vla_action(
@@ -795,73 +949,176 @@ def get_vla_action(
     Returns:
         List[np.ndarray]: Predicted actions
     """
+    return get_vla_actions(
+        cfg,
+        vla,
+        processor,
+        [obs],
+        [task_label],
+        action_head=action_head,
+        proprio_projector=proprio_projector,
+        noisy_action_projector=noisy_action_projector,
+        use_film=use_film,
+    )[0]
+
+
+def get_vla_actions(
+    cfg: Any,
+    vla: torch.nn.Module,
+    processor: Any,
+    observations: Sequence[Dict[str, Any]],
+    task_labels: Sequence[str],
+    action_head: Optional[torch.nn.Module] = None,
+    proprio_projector: Optional[torch.nn.Module] = None,
+    noisy_action_projector: Optional[torch.nn.Module] = None,
+    use_film: bool = False,
+) -> List[List[np.ndarray]]:
+    """
+    Generate action predictions with the VLA policy for a batch of observations, e.g.
+    from several environments.
+
+    The camera images of all observations are preprocessed together and moved to the
+    device at once. Observations whose prompts have the same number of tokens (e.g. the
+    same task) go through the model in one forward pass.
+
+    Args:
+        cfg: Configuration object with parameters
+        vla: The VLA model
+        processor: Model processor for inputs
+        observations: Observation dictionaries
+        task_labels: Text description of the task of each observation
+        action_head: Optional action head for continuous actions
+        proprio_projector: Optional proprioception projector
+        noisy_action_projector: Optional noisy action projector for diffusion
+        use_film: Whether to use FiLM
+
+    Returns:
+        List[List[np.ndarray]]: Predicted actions of each observation
+    """
+    assert len(observations) == len(task_labels)
     with torch.inference_mode():
 
-        # Collect all input images
-        all_images = [obs["full_image"]]
-        if cfg.num_images_in_input > 1:
-            all_images.extend([obs[k] for k in obs.keys() if "wrist" in k])
-
-        # Process images
-        all_images = prepare_images_for_vla(all_images, cfg)
-
-        # Extract primary image and additional images
-        primary_image = all_images.pop(0)
-
-        # Build VLA prompt
-        prompt = f"In: What action should the robot take to {task_label.lower()}?\nOut:"
-
-        # Process primary image
-        inputs = processor(prompt, primary_image).to(DEVICE, dtype=torch.bfloat16)
-
-        # Process additional wrist images if any
-        if all_images:
-            all_wrist_inputs = [
-                processor(prompt, image_wrist).to(DEVICE, dtype=torch.bfloat16)
-                for image_wrist in all_images
-            ]
-            # Concatenate all images
-            primary_pixel_values = inputs["pixel_values"]
-            all_wrist_pixel_values = [
-                wrist_inputs["pixel_values"] for wrist_inputs in all_wrist_inputs
-            ]
-            inputs["pixel_values"] = torch.cat(
-                [primary_pixel_values] + all_wrist_pixel_values, dim=1
-            )
+        # Collect the input images of all observations: primary image first, then wrist images
+        all_images = []
+        for obs in observations:
+            all_images.append(obs["full_image"])
+            if cfg.num_images_in_input > 1:
+                all_images.extend([obs[k] for k in obs.keys() if "wrist" in k])
+
+        # Process images, then stack the images of each observation along channels
+        images = prepare_image_batch_for_vla(all_images, cfg)
+        pixel_values = get_pixel_values(images, processor.image_processor)
+        pixel_values = pixel_values.reshape(
+            len(observations), -1, *pixel_values.shape[-2:]
+        )
 
         # Process proprioception data if used
         proprio = None
         if cfg.use_proprio:
-            proprio = obs["state"]
             proprio_norm_stats = vla.norm_stats[cfg.unnorm_key]["proprio"]
-            obs["state"] = normalize_proprio(proprio, proprio_norm_stats)
-            proprio = obs["state"]
-
-        # Generate action
-        if action_head is None:
-            # Standard VLA output (single-image inputs, discrete actions)
-            action, _ = vla.predict_action(
-                **inputs, unnorm_key=cfg.unnorm_key, do_sample=False
-            )
-        else:
-            # Custom action head for continuous actions
-            action, _ = vla.predict_action(
-                **inputs,
-                unnorm_key=cfg.unnorm_key,
-                do_sample=False,
-                proprio=proprio,
-                proprio_projector=proprio_projector,
-                noisy_action_projector=noisy_action_projector,
-                action_head=action_head,
-                use_film=use_film,
+            for obs in observations:
+                obs["state"] = normalize_proprio(obs["state"], proprio_norm_stats)
+            proprio = np.stack([obs["state"] for obs in observations])
+
+        # Group observations by prompt length, so that each group is one batch
+        prompts = [
+            tokenize_task_label(processor.tokenizer, task_label)
+            for task_label in task_labels
+        ]
+        groups = {}
+        for i, (input_ids, _) in enumerate(prompts):
+            groups.setdefault(input_ids.shape[-1], []).append(i)
+
+        actions = [None] * len(observations)
+        for idx in groups.values():
+            inputs = {
+                "input_ids": torch.cat([prompts[i][0] for i in idx]),
+                "attention_mask": torch.cat([prompts[i][1] for i in idx]),
+                "pixel_values": pixel_values[idx],
+            }
+
+            # Generate action
+            if action_head is None:
+                # Standard VLA output (single-image inputs, discrete actions)
+                action, _ = vla.predict_action(
+                    **inputs, unnorm_key=cfg.unnorm_key, do_sample=False
+                )
+            else:
+                # Custom action head for continuous actions
+                action, _ = vla.predict_action(
+                    **inputs,
+                    unnorm_key=cfg.unnorm_key,
+                    do_sample=False,
+                    proprio=None if proprio is None else proprio[idx],
+                    proprio_projector=proprio_projector,
+                    noisy_action_projector=noisy_action_projector,
+                    action_head=action_head,
+                    use_film=use_film,
+                )
+
+            # (len(idx), NUM_ACTIONS_CHUNK, ACTION_DIM)
+            action = action.reshape(len(idx), -1, action.shape[-1])
+            for i, chunk in zip(idx, action):
+                actions[i] = chunk
+
+    # Return each action chunk as list of actions
+    return [[chunk[t] for t in range(len(chunk))] for chunk in actions]
+
+
+def _post_to_server(
+    server_endpoint: str,
+    encode: Callable[[], bytes],
+    content_type: str,
+    decode: Callable[[requests.Response], Any],
+    timeout_s: Optional[float],
+    max_retries: int,
+    backoff_s: float,
+    tracer,
+) -> Any:
+    """POST a request to the inference server, retrying timed out or refused requests."""
+    attempt = 0
+    while True:
+        trace = latency_tracing.RequestTrace() if tracer is not None else None
+        try:
+            data = encode()
+            if trace is not None:
+                trace.mark("serialize")
+            response = requests.post(
+                server_endpoint,
+                data=data,
+                headers={"Content-Type": content_type},
+                timeout=timeout_s,
             )
-
-    # Return action chunk as list of actions
-    return [action[i] for i in range(len(action))]
+            if trace is not None:
+                trace.mark("round_trip")
+            result = decode(response)
+            if trace is not None:
+                trace.mark("deserialize")
+                server_timing = latency_tracing.parse_server_timing(
+                    response.headers.get("Server-Timing")
+                )
+                trace.split("round_trip", server_timing)
+                tracer.record(trace.phases)
+            return result
+        except (requests.Timeout, requests.ConnectionError) as e:
+            if attempt >= max_retries:
+                if tracer is not None:
+                    tracer.record_failure()
+                raise
+            print(f"Request to {server_endpoint} failed ({e!r}), retrying...")
+            if tracer is not None:
+                tracer.record_retry()
+            time.sleep(min(backoff_s * 2**attempt, 10.0))
+            attempt += 1
 
 
 def get_action_from_server(
-    observation: Dict[str, Any], server_endpoint: str = "http://0.0.0.0:8777/act"
+    observation: Dict[str, Any],
+    server_endpoint: str = "http://0.0.0.0:8777/act",
+    timeout_s: Optional[float] = None,
+    max_retries: int = 0,
+    backoff_s: float = 0.5,
+    tracer=None,
 ) -> Dict[str, Any]:
     """
     Get VLA action from remote inference server.
@@ -869,12 +1126,74 @@ def get_action_from_server(
     Args:
         observation: Observation data to send to server
         server_endpoint: URL of the inference server
+        timeout_s: Deadline of each attempt in seconds (None waits forever)
+        max_retries: Number of retries after a timed out or refused request
+        backoff_s: Initial delay between retries, doubled after every retry
+        tracer: Optional `openpi_client.latency_tracing.LatencyTracer` recording the request phases
 
     Returns:
         Dict[str, Any]: Action response from server
     """
-    response = requests.post(
+    return _post_to_server(
+        server_endpoint,
+        lambda: json.dumps(observation),
+        "application/json",
+        lambda response: response.json(),
+        timeout_s,
+        max_retries,
+        backoff_s,
+        tracer,
+    )
+
+
+def get_actions_from_server(
+    observations: Sequence[Dict[str, Any]],
+    server_endpoint: str = "http://0.0.0.0:8777/act_batch",
+    local_client=None,
+    timeout_s: Optional[float] = None,
+    max_retries: int = 0,
+    backoff_s: float = 0.5,
+    tracer=None,
+) -> np.ndarray:
+    """
+    Get VLA actions for a batch of observations (e.g. from several environments) from the
+    remote inference server, which runs them together.
+
+    Observations and actions are sent as msgpack with raw array buffers instead of JSON. With
+    a `local_client`, they are passed through shared memory instead of HTTP. Needs `openpi_client`.
+
+    Args:
+        observations: Observations to send to server, each with its "instruction"
+        server_endpoint: URL of the batching endpoint of the inference server
+        local_client: Optional `openpi_client.local_client_policy.LocalClientPolicy` connected to
+            the `local_socket_path` of a server on this host
+        timeout_s: Deadline of each HTTP attempt in seconds (None waits forever)
+        max_retries: Number of retries after a timed out or refused HTTP request
+        backoff_s: Initial delay between retries, doubled after every retry
+        tracer: Optional `openpi_client.latency_tracing.LatencyTracer` recording the HTTP request phases
+
+    Returns:
+        np.ndarray: Action chunks of shape (len(observations), NUM_ACTIONS_CHUNK, ACTION_DIM)
+    """
+    assert (
+        msgpack_numpy is not None
+    ), "Binary transports require `openpi_client`! Install it from policy/pi0/packages/openpi-client"
+    payload = {"observations": list(observations)}
+    if local_client is not None:
+        return local_client.infer(payload)["actions"]
+
+    def decode(response: requests.Response) -> np.ndarray:
+        if not response.ok:
+            raise RuntimeError(f"Error in inference server:\n{response.text}")
+        return msgpack_numpy.unpackb(response.content)["actions"]
+
+    return _post_to_server(
         server_endpoint,
-        json=observation,
+        lambda: msgpack_numpy.packb(payload),
+        MSGPACK_CONTENT_TYPE,
+        decode,
+        timeout_s,
+        max_retries,
+        backoff_s,
+        tracer,
     )
-    return response.json()
@@ -0,0 +1,147 @@
+"""
+test_image_preprocessing.py
+
+Checks the TensorFlow-free image preprocessing in `openvla_utils.py` against the original TensorFlow implementation.
+Skipped when TensorFlow or the dependencies of `openvla_utils.py` are not installed.
+
+The resampling matches to within rounding (1 level). The JPEG round trip may differ by a few levels, because
+tf.io.decode_image uses the fast integer IDCT of libjpeg and PIL the accurate one.
+
+Usage:
+    pytest experiments/robot/test_image_preprocessing.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+for module in ["torch", "transformers", "huggingface_hub", "json_numpy"]:
+    pytest.importorskip(module)
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from experiments.robot.openvla_utils import (
+    OPENVLA_IMAGE_SIZE,
+    center_crop_images,
+    jpeg_round_trip,
+    resize_images_for_policy,
+)
+
+# Max abs pixel diff of the resampling, and of the steps that include a JPEG round trip
+TOLERANCE = 1
+JPEG_TOLERANCE = 8
+
+
+def tf_resize_image_for_policy(img, resize_size, emulate_jpeg=True):
+    """Original TensorFlow implementation of `resize_image_for_policy`."""
+    if isinstance(resize_size, int):
+        resize_size = (resize_size, resize_size)
+    if emulate_jpeg:
+        img = tf.image.encode_jpeg(img)
+        img = tf.io.decode_image(img, expand_animations=False, dtype=tf.uint8)
+    img = tf.image.resize(img, resize_size, method="lanczos3", antialias=True)
+    img = tf.cast(tf.clip_by_value(tf.round(img), 0, 255), tf.uint8)
+    return img.numpy()
+
+
+def tf_center_crop_image(image, crop_scale=0.9):
+    """Original TensorFlow implementation of `center_crop_image`, on a numpy array."""
+    image = tf.convert_to_tensor(image)
+    orig_dtype = image.dtype
+    image = tf.image.convert_image_dtype(image, tf.float32)[None]
+    new_heights = tf.reshape(tf.clip_by_value(tf.sqrt(crop_scale), 0, 1), shape=(1,))
+    new_widths = tf.reshape(tf.clip_by_value(tf.sqrt(crop_scale), 0, 1), shape=(1,))
+    height_offsets = (1 - new_heights) / 2
+    width_offsets = (1 - new_widths) / 2
+    bounding_boxes = tf.stack(
+        [
+            height_offsets,
+            width_offsets,
+            height_offsets + new_heights,
+            width_offsets + new_widths,
+        ],
+        axis=1,
+    )
+    image = tf.image.crop_and_resize(
+        image, bounding_boxes, tf.range(1), (OPENVLA_IMAGE_SIZE, OPENVLA_IMAGE_SIZE)
+    )[0]
+    image = tf.clip_by_value(image, 0, 1)
+    return tf.image.convert_image_dtype(image, orig_dtype, saturate=True).numpy()
+
+
+def make_images(num_images, height, width, seed):
+    """Smooth images with some texture, closer to camera frames than uniform noise."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.meshgrid(
+        np.linspace(0, 1, height), np.linspace(0, 1, width), indexing="ij"
+    )
+    images = []
+    for _ in range(num_images):
+        freq = rng.uniform(2, 20, size=(3, 2))
+        phase = rng.uniform(0, 2 * np.pi, size=3)
+        channels = [
+            np.sin(freq[c, 0] * xx + freq[c, 1] * yy + phase[c]) for c in range(3)
+        ]
+        image = 127.5 + 100 * np.stack(channels, axis=-1)
+        image += rng.normal(0, 10, size=image.shape)
+        images.append(np.clip(image, 0, 255).astype(np.uint8))
+    return images
+
+
+def assert_close(ours, theirs, tolerance):
+    assert ours.shape == theirs.shape
+    diff = np.abs(ours.astype(np.int16) - theirs.astype(np.int16))
+    assert diff.max() <= tolerance, f"max abs diff {diff.max()}, mean {diff.mean():.4f}"
+
+
+@pytest.fixture(
+    params=[(480, 640), (256, 256)], ids=lambda size: f"{size[0]}x{size[1]}"
+)
+def images(request):
+    height, width = request.param
+    return make_images(3, height, width, seed=height)
+
+
+def test_resize(images):
+    ours = resize_images_for_policy(images, OPENVLA_IMAGE_SIZE, emulate_jpeg=False)
+    theirs = np.stack(
+        [
+            tf_resize_image_for_policy(img, OPENVLA_IMAGE_SIZE, emulate_jpeg=False)
+            for img in images
+        ]
+    )
+    assert_close(ours, theirs, TOLERANCE)
+
+
+def test_jpeg_round_trip(images):
+    ours = np.stack([jpeg_round_trip(img) for img in images])
+    theirs = np.stack(
+        [
+            tf.io.decode_image(tf.image.encode_jpeg(img), dtype=tf.uint8).numpy()
+            for img in images
+        ]
+    )
+    assert_close(ours, theirs, JPEG_TOLERANCE)
+
+
+def test_center_crop(images):
+    resized = np.stack(
+        [tf_resize_image_for_policy(img, OPENVLA_IMAGE_SIZE) for img in images]
+    )
+    ours = center_crop_images(resized)
+    theirs = np.stack([tf_center_crop_image(img) for img in resized])
+    assert_close(ours, theirs, TOLERANCE)
+
+
+def test_full_pipeline(images):
+    ours = center_crop_images(resize_images_for_policy(images, OPENVLA_IMAGE_SIZE))
+    theirs = np.stack(
+        [
+            tf_center_crop_image(tf_resize_image_for_policy(img, OPENVLA_IMAGE_SIZE))
+            for img in images
+        ]
+    )
+    assert_close(ours, theirs, JPEG_TOLERANCE)
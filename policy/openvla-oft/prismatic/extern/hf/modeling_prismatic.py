@@ -859,7 +859,6 @@ class OpenVLAForActionPrediction(PrismaticForConditionalGeneration):
         input_ids = torch.cat([input_ids, stop_token_id], dim=-1)
 
         # Extend the attention mask to fit the new shape of input
-        # Note: Only batch size == 1 supported right now
         mask_extension = (
             torch.ones(
                 (
@@ -951,6 +950,8 @@ class OpenVLAForActionPrediction(PrismaticForConditionalGeneration):
             )  # (B, llm_dim)
             diffusion_timestep_embeddings = diffusion_timestep_embeddings.unsqueeze(
                 1
+            ).expand(
+                orig_projected_patch_embeddings.shape[0], -1, -1
             )  # (B, 1, llm_dim)
 
             # [Diffusion] Replace the embeddings of the action tokens with noisy actions
@@ -1016,7 +1017,9 @@ class OpenVLAForActionPrediction(PrismaticForConditionalGeneration):
                 noise_pred, t, curr_noisy_actions
             ).prev_sample
 
-        curr_noisy_actions = curr_noisy_actions.reshape(NUM_ACTIONS_CHUNK, ACTION_DIM)
+        curr_noisy_actions = curr_noisy_actions.reshape(
+            -1, NUM_ACTIONS_CHUNK, ACTION_DIM
+        )
 
         # Return final actions
         return curr_noisy_actions.float().cpu().detach().numpy(), actions_hidden_states
@@ -1075,7 +1078,7 @@ class OpenVLAForActionPrediction(PrismaticForConditionalGeneration):
             # L1 regression prediction
             normalized_actions = action_head.predict_action(actions_hidden_states)
             normalized_actions = normalized_actions.reshape(
-                NUM_ACTIONS_CHUNK, ACTION_DIM
+                -1, NUM_ACTIONS_CHUNK, ACTION_DIM
             )
             normalized_actions = normalized_actions.float().cpu().detach().numpy()
         else:
@@ -1098,7 +1101,7 @@ class OpenVLAForActionPrediction(PrismaticForConditionalGeneration):
             )
             normalized_actions = self.bin_centers[discretized_actions]
             normalized_actions = normalized_actions.reshape(
-                NUM_ACTIONS_CHUNK, ACTION_DIM
+                -1, NUM_ACTIONS_CHUNK, ACTION_DIM
             )
 
         return normalized_actions, actions_hidden_states
@@ -1127,7 +1130,10 @@ class OpenVLAForActionPrediction(PrismaticForConditionalGeneration):
             **kwargs: Additional arguments including pixel_values and attention_mask
 
         Returns:
-            Tuple of (unnormalized_actions, action_hidden_states)
+            Tuple of (unnormalized_actions, action_hidden_states). The actions have shape
+            (NUM_ACTIONS_CHUNK, ACTION_DIM) for a single input sequence, and
+            (B, NUM_ACTIONS_CHUNK, ACTION_DIM) for a batch of them. Batched prompts must all
+            have the same number of tokens.
         """
         # If the special empty token ('') does not already appear after the colon (':') token in the prompt
         # (after "OUT:" or "ASSISTANT:"), insert it to match the inputs seen at training time
@@ -1135,8 +1141,11 @@ class OpenVLAForActionPrediction(PrismaticForConditionalGeneration):
             input_ids = torch.cat(
                 (
                     input_ids,
-                    torch.unsqueeze(torch.Tensor([29871]).long(), dim=0).to(
-                        input_ids.device
+                    torch.full(
+                        (input_ids.shape[0], 1),
+                        29871,
+                        dtype=input_ids.dtype,
+                        device=input_ids.device,
                     ),
                 ),
                 dim=1,
@@ -1205,7 +1214,7 @@ class OpenVLAForActionPrediction(PrismaticForConditionalGeneration):
         if use_diffusion:
             # Sample random noise with shape equal to output action, used as the starting state for reverse diffusion
             noise = torch.randn(
-                size=(1, NUM_ACTIONS_CHUNK, ACTION_DIM),
+                size=(input_ids.shape[0], NUM_ACTIONS_CHUNK, ACTION_DIM),
                 device=input_embeddings.device,
                 dtype=input_embeddings.dtype,
             )
@@ -1239,6 +1248,10 @@ class OpenVLAForActionPrediction(PrismaticForConditionalGeneration):
                 action_head,
             )
 
+        # A single input sequence keeps the unbatched (NUM_ACTIONS_CHUNK, ACTION_DIM) shape
+        if len(normalized_actions) == 1:
+            normalized_actions = normalized_actions[0]
+
         # Unnormalize predicted actions
         actions = self._unnormalize_actions(normalized_actions, unnorm_key)
 
@@ -13,25 +13,33 @@ json_numpy.patch()
 import json
 import logging
 import numpy as np
+import os
+import socketserver
+import threading
+import time
 import traceback
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 import draccus
 import torch
 import uvicorn
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 from PIL import Image
+from starlette.concurrency import run_in_threadpool
 from transformers import AutoModelForVision2Seq, AutoProcessor
 
 from experiments.robot.openvla_utils import (
+    MSGPACK_CONTENT_TYPE,
     get_vla,
-    get_vla_action,
+    get_vla_actions,
     get_action_head,
     get_processor,
     get_proprio_projector,
+    msgpack_numpy,
+    shm_transport,
 )
 from experiments.robot.robot_utils import (
     get_image_resize_size,
@@ -55,9 +63,15 @@ class OpenVLAServer:
     def __init__(self, cfg) -> Path:
         """
         A simple server for OpenVLA models; exposes `/act` to predict an action for a given observation + instruction.
+
+        `/act_batch` takes the observations of several environments as msgpack, runs them together and returns
+        their action chunks. Clients on the same host can pass them through shared memory instead, see `serve_local`.
         """
         self.cfg = cfg
 
+        # Inference is serialized across the HTTP and local socket handlers
+        self.lock = threading.Lock()
+
         # Load model
         self.vla = get_vla(cfg)
 
@@ -93,23 +107,17 @@ class OpenVLAServer:
                 payload = json.loads(payload["encoded"])
 
             observation = payload
-            instruction = observation["instruction"]
 
-            action = get_vla_action(
-                self.cfg,
-                self.vla,
-                self.processor,
-                observation,
-                instruction,
-                action_head=self.action_head,
-                proprio_projector=self.proprio_projector,
-                use_film=self.cfg.use_film,
-            )
+            start_time = time.perf_counter()
+            action = list(self.predict_actions([observation])[0])
 
+            # Lets clients tell inference apart from network time (see `get_action_from_server`)
+            infer_ms = 1000 * (time.perf_counter() - start_time)
+            headers = {"Server-Timing": f"infer;dur={infer_ms:.3f}"}
             if double_encode:
-                return JSONResponse(json_numpy.dumps(action))
+                return JSONResponse(json_numpy.dumps(action), headers=headers)
             else:
-                return JSONResponse(action)
+                return JSONResponse(action, headers=headers)
         except:  # noqa: E722
             logging.error(traceback.format_exc())
             logging.warning(
@@ -118,9 +126,111 @@ class OpenVLAServer:
             )
             return "error"
 
-    def run(self, host: str = "0.0.0.0", port: int = 8777) -> None:
-        self.app = FastAPI()
-        self.app.post("/act")(self.get_server_action)
+    def predict_actions(self, observations: List[Dict[str, Any]]) -> np.ndarray:
+        """Runs a batch of observations together; returns their (B, chunk_len, action_dim) action chunks."""
+        with self.lock:
+            actions = get_vla_actions(
+                self.cfg,
+                self.vla,
+                self.processor,
+                observations,
+                [observation["instruction"] for observation in observations],
+                action_head=self.action_head,
+                proprio_projector=self.proprio_projector,
+                use_film=self.cfg.use_film,
+            )
+        return np.stack([np.stack(chunk) for chunk in actions])
+
+    async def get_server_actions(self, request: Request) -> Response:
+        """
+        `/act_batch`: {"observations": [observation, ...]} -> {"actions": (B, chunk_len, action_dim) array}.
+
+        Requests and responses are msgpack with raw array buffers (Content-Type `application/msgpack`), or
+        `json_numpy`-encoded JSON otherwise.
+        """
+        use_msgpack = request.headers.get("content-type") == MSGPACK_CONTENT_TYPE
+        try:
+            body = await request.body()
+            payload = msgpack_numpy.unpackb(body) if use_msgpack else json.loads(body)
+
+            start_time = time.perf_counter()
+            actions = await run_in_threadpool(
+                self.predict_actions, payload["observations"]
+            )
+
+            infer_ms = 1000 * (time.perf_counter() - start_time)
+            headers = {"Server-Timing": f"infer;dur={infer_ms:.3f}"}
+            if use_msgpack:
+                return Response(
+                    msgpack_numpy.packb({"actions": actions}),
+                    media_type=MSGPACK_CONTENT_TYPE,
+                    headers=headers,
+                )
+            return JSONResponse({"actions": actions}, headers=headers)
+        except Exception:
+            logging.error(traceback.format_exc())
+            return Response(traceback.format_exc(), status_code=500)
+
+    def serve_local(self, socket_path: str) -> socketserver.BaseServer:
+        """
+        Serves clients on this host at the Unix socket `socket_path`, in a background thread.
+
+        Speaks the protocol of `openpi_client.local_client_policy.LocalClientPolicy`: the observations and actions
+        of each {"observations": [...]} -> {"actions": ...} request are passed through shared memory, and only small
+        control frames go through the socket. See `get_actions_from_server`.
+        """
+        assert (
+            shm_transport is not None
+        ), "The local transport requires `openpi_client`! Install it from policy/pi0/packages/openpi-client"
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                obs_reader = shm_transport.SharedArrayReader()
+                action_writer = shm_transport.SharedArrayWriter()
+                try:
+                    shm_transport.send_frame(self.request, msgpack_numpy.packb({}))
+                    while True:
+                        try:
+                            frame = shm_transport.recv_frame(self.request)
+                        except ConnectionError:
+                            break
+                        try:
+                            # Views into the client's region, which it does not touch until it gets the response
+                            payload = obs_reader.unpack(frame)
+                            actions = server.predict_actions(payload["observations"])
+                            response = action_writer.pack({"actions": actions})
+                        except Exception:
+                            logging.error(traceback.format_exc())
+                            response = shm_transport.pack_error(traceback.format_exc())
+                        shm_transport.send_frame(self.request, response)
+                finally:
+                    obs_reader.close()
+                    action_writer.close()
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        local_server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+        local_server.daemon_threads = True
+        threading.Thread(target=local_server.serve_forever, daemon=True).start()
+        logging.info(f"Serving local clients at {socket_path}")
+        return local_server
+
+    def build_app(self) -> FastAPI:
+        app = FastAPI()
+        app.post("/act")(self.get_server_action)
+        app.post("/act_batch")(self.get_server_actions)
+        return app
+
+    def run(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 8777,
+        local_socket_path: Optional[str] = None,
+    ) -> None:
+        self.app = self.build_app()
+        if local_socket_path is not None:
+            self.serve_local(local_socket_path)
         uvicorn.run(self.app, host=host, port=port)
 
 
@@ -131,6 +241,7 @@ class DeployConfig:
     # Server Configuration
     host: str = "0.0.0.0"                                               # Host IP Address
     port: int = 8777                                                    # Host Port
+    local_socket_path: Optional[str] = None                             # Unix socket for shared-memory clients on this host (needs `openpi_client`)
 
     #################################################################################################################
     # Model-specific parameters
@@ -147,6 +258,7 @@ class DeployConfig:
     use_proprio: bool = True                         # Whether to include proprio state in input
 
     center_crop: bool = True                         # Center crop? (if trained w/ random crop image aug)
+    emulate_jpeg: bool = True                        # JPEG round trip before resizing? (as in the RLDS dataset builder)
 
     lora_rank: int = 32                              # Rank of LoRA weight matrix (MAKE SURE THIS MATCHES TRAINING!)
 
@@ -166,7 +278,7 @@ class DeployConfig:
 @draccus.wrap()
 def deploy(cfg: DeployConfig) -> None:
     server = OpenVLAServer(cfg)
-    server.run(cfg.host, port=cfg.port)
+    server.run(cfg.host, port=cfg.port, local_socket_path=cfg.local_socket_path)
 
 
 if __name__ == "__main__":
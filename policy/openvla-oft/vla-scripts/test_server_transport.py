@@ -0,0 +1,142 @@
+"""
+test_server_transport.py
+
+Runs the VLA server of `deploy.py` on the CPU with a stand-in for the model, and checks that its transports return
+the same action chunks: `/act` with JSON (one request per environment), `/act_batch` with msgpack, and the
+shared-memory local socket. Skipped when the server dependencies or `openpi_client` are not installed.
+
+Usage:
+    pytest vla-scripts/test_server_transport.py
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+for module in [
+    "torch",
+    "transformers",
+    "draccus",
+    "fastapi",
+    "uvicorn",
+    "json_numpy",
+    "openpi_client",
+]:
+    pytest.importorskip(module)
+
+import uvicorn
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(os.path.dirname(__file__))
+
+from deploy import DeployConfig, OpenVLAServer
+from experiments.robot.openvla_utils import (
+    get_action_from_server,
+    get_actions_from_server,
+    local_client_policy,
+)
+from prismatic.vla.constants import ACTION_DIM, NUM_ACTIONS_CHUNK
+
+
+def stand_in_actions(observation):
+    """Action chunk that depends on every image and the state of the observation."""
+    image_means = [
+        observation[k].mean(dtype=np.float64)
+        for k in sorted(observation)
+        if "image" in k
+    ]
+    state = np.resize(np.asarray(observation["state"], dtype=np.float64), ACTION_DIM)
+    steps = np.arange(NUM_ACTIONS_CHUNK)[:, None] * 0.01
+    return (steps + state + sum(image_means) / 1000).astype(np.float32)
+
+
+class StandInServer(OpenVLAServer):
+    """OpenVLAServer without a model, whose actions are a known function of the observation."""
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.lock = threading.Lock()
+
+    def predict_actions(self, observations):
+        with self.lock:
+            return np.stack([stand_in_actions(obs) for obs in observations])
+
+
+def make_observations(num_envs, height, width, seed):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "full_image": rng.integers(0, 256, (height, width, 3), dtype=np.uint8),
+            "left_wrist_image": rng.integers(
+                0, 256, (height, width, 3), dtype=np.uint8
+            ),
+            "right_wrist_image": rng.integers(
+                0, 256, (height, width, 3), dtype=np.uint8
+            ),
+            "state": rng.standard_normal(ACTION_DIM).astype(np.float32),
+            "instruction": f"task {i % 2}",
+        }
+        for i in range(num_envs)
+    ]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def servers():
+    server = StandInServer(DeployConfig())
+    port = free_port()
+    http_server = uvicorn.Server(
+        uvicorn.Config(
+            server.build_app(), host="127.0.0.1", port=port, log_level="warning"
+        )
+    )
+    threading.Thread(target=http_server.run, daemon=True).start()
+    while not http_server.started:
+        time.sleep(0.01)
+    socket_path = os.path.join(tempfile.mkdtemp(), "openvla_server.sock")
+    local_server = server.serve_local(socket_path)
+    local_client = local_client_policy.LocalClientPolicy(socket_path)
+    try:
+        yield f"http://127.0.0.1:{port}", local_client
+    finally:
+        local_client.close()
+        local_server.shutdown()
+        local_server.server_close()
+        http_server.should_exit = True
+
+
+def query_json(observations, url, local_client):
+    return np.stack(
+        [np.stack(get_action_from_server(obs, f"{url}/act")) for obs in observations]
+    )
+
+
+def query_msgpack(observations, url, local_client):
+    return get_actions_from_server(observations, f"{url}/act_batch")
+
+
+def query_shm(observations, url, local_client):
+    return get_actions_from_server(observations, local_client=local_client)
+
+
+@pytest.mark.parametrize("query", [query_json, query_msgpack, query_shm])
+def test_transports_match(servers, query):
+    url, local_client = servers
+    observations = make_observations(num_envs=4, height=64, width=80, seed=0)
+    expected = np.stack([stand_in_actions(obs) for obs in observations])
+
+    actions = query(observations, url, local_client)
+    assert actions.shape == expected.shape
+    assert np.allclose(actions, expected, atol=1e-6)
@@ -19,6 +19,9 @@ class Args:
     seed: int = 0
 
     action_horizon: int = 10
+    # Start the next inference this many steps before the current action chunk runs out, so that the simulation
+    # keeps running while the policy is queried. 0 queries the policy only when the chunk is exhausted.
+    prefetch_steps: int = 0
 
     host: str = "0.0.0.0"
     port: int = 8000
@@ -33,12 +36,13 @@ def main(args: Args) -> None:
             seed=args.seed,
         ),
         agent=_policy_agent.PolicyAgent(
-            policy=action_chunk_broker.ActionChunkBroker(
+            policy=action_chunk_broker.PrefetchingActionChunkBroker(
                 policy=_websocket_client_policy.WebsocketClientPolicy(
                     host=args.host,
                     port=args.port,
                 ),
                 action_horizon=args.action_horizon,
+                prefetch_steps=args.prefetch_steps,
             )
         ),
         subscribers=[
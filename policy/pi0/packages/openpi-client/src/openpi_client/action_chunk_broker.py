@@ -1,3 +1,5 @@
+import concurrent.futures
+import time
 from typing import Dict
 
 import numpy as np
@@ -45,3 +47,147 @@ class ActionChunkBroker(_base_policy.BasePolicy):
         self._policy.reset()
         self._last_results = None
         self._cur_step = 0
+
+
+class PrefetchingActionChunkBroker(_base_policy.BasePolicy):
+    """Wraps a policy to return action chunks one-at-a-time, running the next inference in the background.
+
+    Assumes that the first dimension of all action fields is the chunk size.
+
+    When `prefetch_steps` actions of the current chunk are left, a new inference call to the inner policy is started
+    on a worker thread with the latest observation, so that the environment keeps stepping while the policy runs. The
+    new chunk is switched to as soon as it is ready, or once the current chunk is exhausted, in which case the
+    environment waits for it. Since the new chunk starts at the observation it was computed from, the actions for the
+    steps executed since then are skipped.
+
+    If `blend_steps` is set, the first actions after a switch are linearly blended with the remaining actions of the
+    previous chunk for the same steps. Only floating point fields are blended.
+
+    With `prefetch_steps=0` this behaves like ActionChunkBroker.
+    """
+
+    def __init__(
+        self,
+        policy: _base_policy.BasePolicy,
+        action_horizon: int,
+        prefetch_steps: int = 0,
+        blend_steps: int = 0,
+    ):
+        if not 0 <= prefetch_steps < action_horizon:
+            raise ValueError(
+                f"prefetch_steps must be in [0, {action_horizon}), got {prefetch_steps}"
+            )
+        self._policy = policy
+        self._action_horizon = action_horizon
+        self._prefetch_steps = prefetch_steps
+        self._blend_steps = blend_steps
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="prefetch"
+        )
+
+        self._chunk: Dict[str, np.ndarray] | None = None
+        self._cur_step: int = 0
+        self._pending: concurrent.futures.Future | None = None
+        self._steps_since_request: int = 0
+        self._blend_chunk: Dict[str, np.ndarray] | None = None
+        self._blend_start: int = 0
+        self._blend_len: int = 0
+
+        self._num_chunks = 0
+        self._num_waits = 0
+        self._wait_time_s = 0.0
+
+    @property
+    def stats(self) -> Dict:  # noqa: UP006
+        """How often and how long the environment had to wait for a prefetched chunk."""
+        return {
+            "num_chunks": self._num_chunks,
+            "num_waits": self._num_waits,
+            "wait_fraction": self._num_waits / max(self._num_chunks - 1, 1),
+            "mean_wait_ms": 1000 * self._wait_time_s / max(self._num_waits, 1),
+        }
+
+    @override
+    def infer(self, obs: Dict) -> Dict:  # noqa: UP006
+        if self._chunk is None:
+            self._chunk = self._policy.infer(obs)
+            self._cur_step = 0
+            self._num_chunks += 1
+        else:
+            if (
+                self._pending is None
+                and self._action_horizon - self._cur_step <= self._prefetch_steps
+            ):
+                self._request(obs)
+            if self._pending is not None:
+                exhausted = self._cur_step >= self._action_horizon
+                if exhausted or self._pending.done():
+                    self._switch(wait=exhausted)
+
+        results = self._action_at(self._cur_step)
+        self._cur_step += 1
+        self._steps_since_request += 1
+        return results
+
+    @override
+    def reset(self) -> None:
+        if self._pending is not None:
+            concurrent.futures.wait([self._pending])
+            self._pending = None
+        self._policy.reset()
+        self._chunk = None
+        self._cur_step = 0
+        self._blend_chunk = None
+        self._blend_len = 0
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _request(self, obs: Dict) -> None:  # noqa: UP006
+        # The environment may reuse its observation buffers while the inference is running.
+        obs = tree.map_structure(
+            lambda x: x.copy() if isinstance(x, np.ndarray) else x, obs
+        )
+        self._pending = self._executor.submit(self._policy.infer, obs)
+        self._steps_since_request = 0
+
+    def _switch(self, wait: bool) -> None:
+        # A failed request is raised once and dropped, so that the next call requests a new chunk.
+        pending, self._pending = self._pending, None
+        if wait:
+            start = time.monotonic()
+            new_chunk = pending.result()
+            self._num_waits += 1
+            self._wait_time_s += time.monotonic() - start
+        else:
+            new_chunk = pending.result()
+        self._num_chunks += 1
+
+        # The new chunk starts at the observation it was requested with.
+        new_step = min(self._steps_since_request, self._action_horizon - 1)
+        old_len = min(len(x) for x in tree.flatten(self._chunk))
+        self._blend_len = max(0, min(self._blend_steps, old_len - self._cur_step))
+        if self._blend_len > 0:
+            old_step = self._cur_step
+            self._blend_chunk = tree.map_structure(
+                lambda x: x[old_step : old_step + self._blend_len], self._chunk
+            )
+            self._blend_start = new_step
+
+        self._chunk = new_chunk
+        self._cur_step = new_step
+
+    def _action_at(self, step: int) -> Dict:  # noqa: UP006
+        results = tree.map_structure(lambda x: x[step, ...], self._chunk)
+        i = step - self._blend_start
+        if self._blend_chunk is None or not 0 <= i < self._blend_len:
+            return results
+
+        weight = (i + 1) / (self._blend_steps + 1)
+
+        def blend(new, old):
+            if not np.issubdtype(new.dtype, np.floating):
+                return new
+            return (weight * new + (1 - weight) * old[i]).astype(new.dtype)
+
+        return tree.map_structure(blend, results, self._blend_chunk)
@@ -0,0 +1,128 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from openpi_client import action_chunk_broker
+from openpi_client import base_policy as _base_policy
+
+
+class CountingPolicy(_base_policy.BasePolicy):
+    """Returns a chunk whose actions are the observed step plus their index in the chunk."""
+
+    def __init__(self, chunk_size: int = 8, infer_time_s: float = 0.0):
+        self.chunk_size = chunk_size
+        self.infer_time_s = infer_time_s
+        self.num_calls = 0
+        self.thread_names = set()
+
+    def infer(self, obs: dict) -> dict:
+        self.num_calls += 1
+        self.thread_names.add(threading.current_thread().name)
+        time.sleep(self.infer_time_s)
+        actions = obs["step"] + np.arange(self.chunk_size, dtype=np.float32)
+        return {"actions": actions[:, None].repeat(2, axis=1)}
+
+
+def _run(broker, num_steps: int, step_time_s: float = 0.0) -> np.ndarray:
+    actions = []
+    for step in range(num_steps):
+        actions.append(
+            broker.infer({"step": np.array(step, dtype=np.float32)})["actions"]
+        )
+        time.sleep(step_time_s)
+    return np.stack(actions)
+
+
+def test_no_prefetch_matches_broker():
+    expected = _run(
+        action_chunk_broker.ActionChunkBroker(CountingPolicy(), action_horizon=4), 12
+    )
+    broker = action_chunk_broker.PrefetchingActionChunkBroker(
+        CountingPolicy(), action_horizon=4
+    )
+    np.testing.assert_array_equal(_run(broker, 12), expected)
+    assert broker.stats["num_chunks"] == 3
+
+
+def test_prefetch_is_time_aligned():
+    policy = CountingPolicy(infer_time_s=0.02)
+    broker = action_chunk_broker.PrefetchingActionChunkBroker(
+        policy, action_horizon=6, prefetch_steps=3
+    )
+
+    actions = _run(broker, 30, step_time_s=0.02)
+
+    # Every chunk starts at the step it was requested in, so the executed action always equals the current step.
+    np.testing.assert_array_equal(actions[:, 0], np.arange(30))
+    assert any(name.startswith("prefetch") for name in policy.thread_names)
+    assert broker.stats["num_chunks"] > 30 // 6
+    broker.close()
+
+
+def test_slow_policy_waits():
+    policy = CountingPolicy(infer_time_s=0.05)
+    broker = action_chunk_broker.PrefetchingActionChunkBroker(
+        policy, action_horizon=4, prefetch_steps=1
+    )
+
+    actions = _run(broker, 12)
+
+    np.testing.assert_array_equal(actions[:, 0], np.arange(12))
+    stats = broker.stats
+    assert stats["num_waits"] == stats["num_chunks"] - 1
+    assert stats["mean_wait_ms"] > 0
+    broker.close()
+
+
+def test_blend():
+    class ShiftingPolicy(CountingPolicy):
+        def infer(self, obs: dict) -> dict:
+            result = super().infer(obs)
+            result["actions"] += 100 * self.num_calls
+            return result
+
+    broker = action_chunk_broker.PrefetchingActionChunkBroker(
+        ShiftingPolicy(infer_time_s=0.05),
+        action_horizon=4,
+        prefetch_steps=1,
+        blend_steps=3,
+    )
+    actions = _run(broker, 6)[:, 0]
+
+    # The second chunk is offset by 100 and blended in over 3 steps, starting at step 4.
+    np.testing.assert_allclose(actions[:4], [100, 101, 102, 103])
+    np.testing.assert_allclose(actions[4:6], [104 + 100 * 1 / 4, 105 + 100 * 2 / 4])
+
+
+def test_failed_prefetch_is_raised_once():
+    class FailingPolicy(CountingPolicy):
+        def infer(self, obs: dict) -> dict:
+            if self.num_calls == 1:
+                self.num_calls += 1
+                time.sleep(self.infer_time_s)
+                raise RuntimeError("inference failed")
+            return super().infer(obs)
+
+    # The prefetch requested at step 3 is still running when the chunk runs out at step 4.
+    policy = FailingPolicy(infer_time_s=0.05)
+    broker = action_chunk_broker.PrefetchingActionChunkBroker(
+        policy, action_horizon=4, prefetch_steps=1
+    )
+    _run(broker, 4)
+    with pytest.raises(RuntimeError, match="inference failed"):
+        broker.infer({"step": np.array(4, dtype=np.float32)})
+
+    # The next call requests a new chunk instead of raising the same error again.
+    action = broker.infer({"step": np.array(5, dtype=np.float32)})["actions"]
+    np.testing.assert_array_equal(action, [5, 5])
+    assert policy.num_calls == 3
+    broker.close()
+
+
+def test_invalid_prefetch_steps():
+    with pytest.raises(ValueError, match="prefetch_steps"):
+        action_chunk_broker.PrefetchingActionChunkBroker(
+            CountingPolicy(), action_horizon=4, prefetch_steps=4
+        )
@@ -1,5 +1,5 @@
 import abc
-from typing import Dict
+from typing import Dict, List
 
 
 class BasePolicy(abc.ABC):
@@ -7,6 +7,14 @@ class BasePolicy(abc.ABC):
     def infer(self, obs: Dict) -> Dict:
         """Infer actions from observations."""
 
+    def infer_batch(self, obs_batch: List[Dict]) -> List[Dict]:
+        """Infer actions for a list of observations.
+
+        Policies that can run several observations at once should override this; by default each observation is
+        inferred separately.
+        """
+        return [self.infer(obs) for obs in obs_batch]
+
     def reset(self) -> None:
         """Reset the policy to its initial state."""
         pass
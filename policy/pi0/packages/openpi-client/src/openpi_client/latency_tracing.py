@@ -0,0 +1,143 @@
+"""Client-side latency tracing for remote policy calls.
+
+A RequestTrace timestamps the phases of one request (e.g. serialization, the round trip and deserialization). Servers
+that report their own queueing and inference time let the round trip be split further into network and server time.
+A LatencyTracer collects the traces and summarizes them per episode as percentiles in milliseconds.
+
+Only depends on the standard library and NumPy, so that clients of other policy servers can use it as well.
+"""
+
+import collections
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Observation key with which a client asks the server to report its timing, and response key it is reported under.
+TIMING_KEY = "__timing__"
+
+_PERCENTILES = (50, 90, 99)
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a policy call did not finish within its deadline, including all retries."""
+
+
+class RequestTrace:
+    """Timestamps the consecutive phases of one request."""
+
+    def __init__(self) -> None:
+        self.phases: Dict[str, float] = {}
+        self._start = time.perf_counter()
+        self._last = self._start
+
+    def mark(self, phase: str) -> None:
+        """Ends @phase, which started when the previous phase ended."""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def split(self, phase: str, server_timing: Dict[str, float]) -> None:
+        """Splits the round trip @phase into the server phases of @server_timing (in ms) and the rest, the network."""
+        if phase not in self.phases:
+            return
+        server_s = 0.0
+        for name, ms in server_timing.items():
+            self.phases[f"server_{name}"] = ms / 1000
+            server_s += ms / 1000
+        self.phases["network"] = max(self.phases.pop(phase) - server_s, 0.0)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+
+class LatencyTracer:
+    """Collects request traces and summarizes them per episode.
+
+    Call `record` for every request and `end_episode` at the end of every episode. The summaries of all episodes are
+    kept and can be exported as JSON lines.
+    """
+
+    def __init__(self, log_summaries: bool = True) -> None:
+        self._log_summaries = log_summaries
+        self._phases: Dict[str, List[float]] = collections.defaultdict(list)
+        self._num_retries = 0
+        self._num_failures = 0
+        self.episodes: List[Dict] = []
+
+    def record(self, phases: Dict[str, float]) -> None:
+        """Records the phase durations of one request, in seconds."""
+        for name, seconds in phases.items():
+            self._phases[name].append(seconds)
+        self._phases["total"].append(sum(phases.values()))
+
+    def record_retry(self) -> None:
+        self._num_retries += 1
+
+    def record_failure(self) -> None:
+        self._num_failures += 1
+
+    def summary(self) -> Dict:
+        """Percentiles and mean of every phase of the current episode, in ms."""
+        phases = {}
+        for name, values in self._phases.items():
+            ms = 1000 * np.asarray(values)
+            phases[name] = {
+                **{f"p{p}": float(np.percentile(ms, p)) for p in _PERCENTILES},
+                "mean": float(ms.mean()),
+                "max": float(ms.max()),
+            }
+        return {
+            "num_requests": len(self._phases.get("total", [])),
+            "num_retries": self._num_retries,
+            "num_failures": self._num_failures,
+            "phases_ms": phases,
+        }
+
+    def end_episode(self) -> Dict:
+        """Finishes the current episode and returns its summary."""
+        summary = self.summary()
+        summary["episode"] = len(self.episodes)
+        self.episodes.append(summary)
+        if self._log_summaries and summary["num_requests"] > 0:
+            total = summary["phases_ms"]["total"]
+            logging.info(
+                f"Episode {summary['episode']}: {summary['num_requests']} requests, "
+                f"p50 {total['p50']:.1f} ms, p99 {total['p99']:.1f} ms, {summary['num_retries']} retries"
+            )
+        self._phases.clear()
+        self._num_retries = 0
+        self._num_failures = 0
+        return summary
+
+    def export(self, path: str) -> None:
+        """Writes the summaries of all finished episodes to @path, one JSON object per line."""
+        with open(path, "w") as f:
+            for summary in self.episodes:
+                f.write(json.dumps(summary) + "\n")
+
+
+def backoff_delay(attempt: int, backoff_s: float, max_backoff_s: float = 10.0) -> float:
+    """Exponential backoff before retry number @attempt (starting at 0)."""
+    return min(backoff_s * 2**attempt, max_backoff_s)
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Parses an HTTP `Server-Timing` header like `queue;dur=1.2, infer;dur=30.5` into {name: ms}."""
+    timing = {}
+    if not header:
+        return timing
+    for metric in header.split(","):
+        name, *params = (part.strip() for part in metric.split(";"))
+        for param in params:
+            if param.startswith("dur="):
+                timing[name] = float(param[len("dur=") :])
+    return timing
+
+
+def format_server_timing(timing: Dict[str, float]) -> str:
+    """Inverse of parse_server_timing."""
+    return ", ".join(f"{name};dur={ms:.3f}" for name, ms in timing.items())
@@ -0,0 +1,125 @@
+import logging
+import os
+import socket
+import time
+from typing import Dict, Optional
+
+from typing_extensions import override
+
+from openpi_client import base_policy as _base_policy
+from openpi_client import msgpack_numpy
+from openpi_client import shm_transport
+from openpi_client import websocket_client_policy
+
+_LOCAL_HOSTS = ("localhost", "127.0.0.1", "0.0.0.0", "::1")
+
+
+class LocalClientPolicy(_base_policy.BasePolicy):
+    """Implements the Policy interface for a server on the same host.
+
+    Observations and actions are passed through shared memory, only small control frames go through the Unix socket
+    at `socket_path`. See WebsocketPolicyServer(local_socket_path=...) for the server side.
+
+    The constructor waits for the server to come up, retrying every `retry_interval_s`. If `connect_timeout_s` is set,
+    it raises TimeoutError once that much time has passed without connecting and reading the server metadata.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        *,
+        connect_timeout_s: Optional[float] = None,
+        retry_interval_s: float = 5.0,
+    ) -> None:
+        self._socket_path = socket_path
+        self._connect_timeout_s = connect_timeout_s
+        self._retry_interval_s = retry_interval_s
+        self._obs_writer = shm_transport.SharedArrayWriter()
+        self._action_reader = shm_transport.SharedArrayReader()
+        try:
+            self._sock, self._server_metadata = self._wait_for_server()
+        except BaseException:
+            self._action_reader.close()
+            self._obs_writer.close()
+            raise
+
+    def get_server_metadata(self) -> Dict:
+        return self._server_metadata
+
+    def _wait_for_server(self):
+        logging.info(f"Waiting for server at {self._socket_path}...")
+        deadline = None
+        if self._connect_timeout_s is not None:
+            deadline = time.monotonic() + self._connect_timeout_s
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                if deadline is not None:
+                    sock.settimeout(max(deadline - time.monotonic(), 0.0))
+                sock.connect(self._socket_path)
+                metadata = msgpack_numpy.unpackb(shm_transport.recv_frame(sock))
+                sock.settimeout(None)
+                return sock, metadata
+            except (ConnectionRefusedError, FileNotFoundError):
+                sock.close()
+            except BaseException:
+                sock.close()
+                raise
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"No server at {self._socket_path} after {self._connect_timeout_s}s"
+                )
+            logging.info("Still waiting for server...")
+            delay = self._retry_interval_s
+            if deadline is not None:
+                delay = min(delay, max(deadline - time.monotonic(), 0.0))
+            time.sleep(delay)
+
+    @override
+    def infer(self, obs: Dict) -> Dict:  # noqa: UP006
+        shm_transport.send_frame(self._sock, self._obs_writer.pack(obs))
+        response = shm_transport.recv_frame(self._sock)
+        # The server reuses its region on the next call, so copy the (small) actions out.
+        return self._action_reader.unpack(response, copy=True)
+
+    @override
+    def reset(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self._sock.close()
+        self._action_reader.close()
+        self._obs_writer.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:  # noqa: S110
+            pass
+
+
+def create_client_policy(
+    host: str = "0.0.0.0",
+    port: int = 8000,
+    local_socket_path: Optional[str] = None,
+    local_connect_timeout_s: float = 5.0,
+) -> _base_policy.BasePolicy:
+    """Connects to a policy server, through shared memory if it runs on this host and serves `local_socket_path`,
+    otherwise through websockets. Falls back to websockets if the local socket does not answer within
+    `local_connect_timeout_s`, e.g. when it was left behind by a server that is gone."""
+    if (
+        local_socket_path is not None
+        and host in _LOCAL_HOSTS
+        and os.path.exists(local_socket_path)
+    ):
+        try:
+            return LocalClientPolicy(
+                local_socket_path,
+                connect_timeout_s=local_connect_timeout_s,
+                retry_interval_s=min(0.5, local_connect_timeout_s),
+            )
+        except TimeoutError:
+            logging.warning(
+                f"No server at {local_socket_path}, falling back to websockets"
+            )
+    return websocket_client_policy.WebsocketClientPolicy(host=host, port=port)
@@ -0,0 +1,71 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pytest
+import websockets.sync.server
+
+from openpi_client import local_client_policy
+from openpi_client import msgpack_numpy
+from openpi_client import websocket_client_policy
+
+
+def _stale_socket(socket_path: str) -> None:
+    # A socket file left behind by a server that is gone refuses connections.
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(socket_path)
+    sock.close()
+
+
+def test_missing_socket_times_out():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            local_client_policy.LocalClientPolicy(
+                os.path.join(tmp_dir, "policy.sock"),
+                connect_timeout_s=0.3,
+                retry_interval_s=0.05,
+            )
+        assert time.monotonic() - start < 2.0
+
+
+def test_silent_server_times_out():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        socket_path = os.path.join(tmp_dir, "policy.sock")
+        # Accepts connections but never sends the metadata.
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(socket_path)
+        server.listen()
+        with pytest.raises(TimeoutError):
+            local_client_policy.LocalClientPolicy(socket_path, connect_timeout_s=0.3)
+        server.close()
+
+
+def test_stale_socket_falls_back_to_websockets():
+    def handler(websocket):
+        websocket.send(msgpack_numpy.packb({"name": "stand-in"}))
+        for message in websocket:
+            websocket.send(message)
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = websockets.sync.server.serve(handler, "127.0.0.1", port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        socket_path = os.path.join(tmp_dir, "policy.sock")
+        _stale_socket(socket_path)
+        client = local_client_policy.create_client_policy(
+            host="127.0.0.1",
+            port=port,
+            local_socket_path=socket_path,
+            local_connect_timeout_s=0.3,
+        )
+    assert isinstance(client, websocket_client_policy.WebsocketClientPolicy)
+    state = np.arange(14, dtype=np.float32)
+    np.testing.assert_array_equal(client.infer({"state": state})["state"], state)
+    server.shutdown()
@@ -0,0 +1,190 @@
+"""Moves nested dicts of NumPy arrays between processes on the same host through shared memory.
+
+Each side of a connection owns one shared-memory region that it writes its messages into. Sending a message copies
+every array into the sender's region once and produces a small msgpack control frame with the region name and the
+offset, dtype and shape of each array; everything that is not an array is packed into the control frame as usual.
+The receiver maps the sender's region and gets the arrays back as views into it, without another copy. The views
+stay valid until the sender writes its next message.
+
+Control frames are length-prefixed and sent over a Unix socket, see LocalClientPolicy and WebsocketPolicyServer.
+"""
+
+import struct
+import uuid
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from openpi_client import msgpack_numpy
+
+_ALIGN = 64
+_FRAME_HEADER = struct.Struct("!I")
+
+# Regions created by this process. Only their creator may unlink them.
+_CREATED = set()
+
+
+def _align(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _is_shm_array(obj):
+    return isinstance(obj, np.ndarray) and obj.dtype.kind not in ("V", "O", "c")
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers the region with the resource tracker, which would unlink it when this
+        # process exits.
+        shm = shared_memory.SharedMemory(name=name)
+        if name not in _CREATED:
+            resource_tracker.unregister(shm._name, "shared_memory")  # noqa: SLF001
+        return shm
+
+
+class SharedArrayWriter:
+    """Packs messages into a shared-memory region owned by this side of the connection."""
+
+    def __init__(self, initial_size=1 << 20):
+        self._shm = None
+        self._size = 0
+        self._ensure_size(initial_size)
+
+    def _ensure_size(self, size):
+        if size <= self._size:
+            return
+        new_size = max(_align(size), 2 * self._size)
+        self.close()
+        name = "openpi_" + uuid.uuid4().hex[:16]
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=new_size)
+        _CREATED.add(name)
+        self._size = new_size
+
+    def pack(self, data):
+        """Copies the arrays of @data into the region and returns the control frame."""
+        arrays = []
+
+        def collect(obj):
+            if _is_shm_array(obj):
+                arrays.append(obj)
+            elif isinstance(obj, dict):
+                for v in obj.values():
+                    collect(v)
+            elif isinstance(obj, (list, tuple)):
+                for v in obj:
+                    collect(v)
+
+        collect(data)
+        offsets = []
+        total = 0
+        for array in arrays:
+            offsets.append(total)
+            total = _align(total + array.nbytes)
+        self._ensure_size(total)
+
+        descriptors = {}
+        for array, offset in zip(arrays, offsets):
+            view = np.ndarray(
+                array.shape, dtype=array.dtype, buffer=self._shm.buf, offset=offset
+            )
+            view[...] = array
+            descriptors[id(array)] = {
+                b"__shm__": True,
+                b"offset": offset,
+                b"dtype": array.dtype.str,
+                b"shape": array.shape,
+            }
+
+        def encode(obj):
+            if _is_shm_array(obj):
+                return descriptors[id(obj)]
+            if isinstance(obj, dict):
+                return {k: encode(v) for k, v in obj.items()}
+            if isinstance(obj, (list, tuple)):
+                return [encode(v) for v in obj]
+            return obj
+
+        return msgpack_numpy.packb({"shm": self._shm.name, "data": encode(data)})
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            _CREATED.discard(self._shm.name)
+            self._shm = None
+            self._size = 0
+
+
+class SharedArrayReader:
+    """Unpacks control frames from the other side, mapping its shared-memory region."""
+
+    def __init__(self):
+        self._shm = None
+
+    def unpack(self, frame, copy=False):
+        """Returns the message of a control frame, with its arrays as views into shared memory unless @copy."""
+        message = msgpack_numpy.unpackb(frame)
+        if "error" in message:
+            raise RuntimeError(f"Error in inference server:\n{message['error']}")
+        if self._shm is None or self._shm.name != message["shm"]:
+            self.close()
+            self._shm = _attach(message["shm"])
+        buf = self._shm.buf
+
+        def decode(obj):
+            if isinstance(obj, dict):
+                if b"__shm__" in obj:
+                    array = np.ndarray(
+                        tuple(obj[b"shape"]),
+                        dtype=np.dtype(obj[b"dtype"]),
+                        buffer=buf,
+                        offset=obj[b"offset"],
+                    )
+                    return array.copy() if copy else array
+                return {k: decode(v) for k, v in obj.items()}
+            if isinstance(obj, list):
+                return [decode(v) for v in obj]
+            return obj
+
+        return decode(message["data"])
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+
+def pack_error(message):
+    return msgpack_numpy.packb({"error": message})
+
+
+def send_frame(sock, payload):
+    sock.sendall(_FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(sock):
+    (length,) = _FRAME_HEADER.unpack(_recv_exactly(sock, _FRAME_HEADER.size))
+    return _recv_exactly(sock, length)
+
+
+async def write_frame_async(writer, payload):
+    writer.write(_FRAME_HEADER.pack(len(payload)) + payload)
+    await writer.drain()
+
+
+async def read_frame_async(reader):
+    (length,) = _FRAME_HEADER.unpack(await reader.readexactly(_FRAME_HEADER.size))
+    return await reader.readexactly(length)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import tree
+
+from openpi_client import shm_transport
+
+
+def _check(expected, actual):
+    if isinstance(expected, np.ndarray):
+        assert expected.shape == actual.shape
+        assert expected.dtype == actual.dtype
+        assert np.array_equal(expected, actual, equal_nan=expected.dtype.kind == "f")
+    else:
+        assert expected == actual
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"key": "value", "number": 1, "float": 1.0},  # no arrays
+        {"state": np.arange(14, dtype=np.float32), "prompt": "do something"},
+        {
+            "images": {
+                "cam_high": np.random.randint(0, 256, (3, 224, 224), dtype=np.uint8),
+                "cam_left_wrist": np.zeros((3, 224, 224), dtype=np.uint8),
+            },
+            "state": np.array([np.nan, np.inf, -np.inf]),
+        },  # nested dict with arrays
+        {"arrays": [np.array([1, 2]), np.array([3, 4])]},  # list of arrays
+        {"scalar": np.float32(1.5), "zero_d": np.array(2.0)},  # numpy scalars
+        {"strings": np.array(["asdf", "qwer"])},  # string array
+        {"transposed": np.arange(12).reshape(3, 4).T},  # non-contiguous array
+    ],
+)
+def test_round_trip(data):
+    writer = shm_transport.SharedArrayWriter(initial_size=64)
+    reader = shm_transport.SharedArrayReader()
+    try:
+        # Twice, to also cover reusing the mapped region.
+        for _ in range(2):
+            tree.map_structure(
+                _check, data, reader.unpack(writer.pack(data), copy=True)
+            )
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_region_grows():
+    writer = shm_transport.SharedArrayWriter(initial_size=64)
+    reader = shm_transport.SharedArrayReader()
+    try:
+        small = {"a": np.ones(4, dtype=np.float32)}
+        large = {"a": np.arange(100_000, dtype=np.float64)}
+        tree.map_structure(_check, small, reader.unpack(writer.pack(small)))
+        tree.map_structure(_check, large, reader.unpack(writer.pack(large), copy=True))
+        tree.map_structure(_check, small, reader.unpack(writer.pack(small), copy=True))
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_error_frame():
+    reader = shm_transport.SharedArrayReader()
+    with pytest.raises(RuntimeError, match="boom"):
+        reader.unpack(shm_transport.pack_error("boom"))
@@ -1,11 +1,13 @@
 import logging
 import time
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 
+import websockets.exceptions
 import websockets.sync.client
 from typing_extensions import override
 
 from openpi_client import base_policy as _base_policy
+from openpi_client import latency_tracing
 from openpi_client import msgpack_numpy
 
 
@@ -13,11 +15,32 @@ class WebsocketClientPolicy(_base_policy.BasePolicy):
     """Implements the Policy interface by communicating with a server over websocket.
 
     See WebsocketPolicyServer for a corresponding server implementation.
+
+    `attempt_timeout_s` bounds each attempt of a call: reconnecting (opening the connection and reading the server
+    metadata) and waiting for the response. An attempt that times out, or whose connection drops or is refused, is
+    retried on a new connection up to `max_retries` times, with exponential backoff starting at `backoff_s`. After the
+    last attempt DeadlineExceededError is raised (or the connection error, if no attempt timed out), so a call takes at
+    most (max_retries + 1) * 2 * attempt_timeout_s plus the backoff. Only the constructor keeps waiting for a server
+    that refuses connections, until it comes up. If a `tracer` is given, the phases of every call are recorded in
+    it, with the server's queueing and inference time reported separately.
     """
 
-    def __init__(self, host: str = "0.0.0.0", port: int = 8000) -> None:
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        *,
+        attempt_timeout_s: Optional[float] = None,
+        max_retries: int = 0,
+        backoff_s: float = 0.5,
+        tracer: Optional[latency_tracing.LatencyTracer] = None,
+    ) -> None:
         self._uri = f"ws://{host}:{port}"
         self._packer = msgpack_numpy.Packer()
+        self._attempt_timeout_s = attempt_timeout_s
+        self._max_retries = max_retries
+        self._backoff_s = backoff_s
+        self._tracer = tracer
         self._ws, self._server_metadata = self._wait_for_server()
 
     def get_server_metadata(self) -> Dict:
@@ -27,24 +50,84 @@ class WebsocketClientPolicy(_base_policy.BasePolicy):
         logging.info(f"Waiting for server at {self._uri}...")
         while True:
             try:
-                conn = websockets.sync.client.connect(
-                    self._uri, compression=None, max_size=None
-                )
-                metadata = msgpack_numpy.unpackb(conn.recv())
-                return conn, metadata
+                return self._connect()
             except ConnectionRefusedError:
                 logging.info("Still waiting for server...")
                 time.sleep(5)
 
+    def _connect(self) -> Tuple[websockets.sync.client.ClientConnection, Dict]:
+        """Opens one connection and reads the server metadata, both bounded by the attempt timeout."""
+        conn = websockets.sync.client.connect(
+            self._uri,
+            compression=None,
+            max_size=None,
+            open_timeout=self._attempt_timeout_s,
+            close_timeout=self._attempt_timeout_s,
+        )
+        try:
+            metadata = msgpack_numpy.unpackb(conn.recv(timeout=self._attempt_timeout_s))
+        except BaseException:
+            conn.close()
+            raise
+        return conn, metadata
+
     @override
     def infer(self, obs: Dict) -> Dict:  # noqa: UP006
+        attempt = 0
+        timed_out = False
+        while True:
+            try:
+                if self._ws is None:
+                    self._ws, self._server_metadata = self._connect()
+                return self._infer_once(obs)
+            except (
+                TimeoutError,
+                OSError,
+                websockets.exceptions.WebSocketException,
+            ) as e:
+                # A late response would be read by the next call, so a failed connection is never reused.
+                self._close()
+                timed_out |= isinstance(e, TimeoutError)
+                if attempt >= self._max_retries:
+                    if self._tracer is not None:
+                        self._tracer.record_failure()
+                    if timed_out:
+                        raise latency_tracing.DeadlineExceededError(
+                            f"No response from {self._uri} within {self._attempt_timeout_s} s per attempt "
+                            f"after {attempt + 1} attempts"
+                        ) from e
+                    raise
+                logging.warning(f"Policy call failed ({e!r}), retrying...")
+                if self._tracer is not None:
+                    self._tracer.record_retry()
+                time.sleep(latency_tracing.backoff_delay(attempt, self._backoff_s))
+                attempt += 1
+
+    def _infer_once(self, obs: Dict) -> Dict:  # noqa: UP006
+        trace = latency_tracing.RequestTrace()
+        if self._tracer is not None:
+            obs = {**obs, latency_tracing.TIMING_KEY: True}
         data = self._packer.pack(obs)
+        trace.mark("serialize")
         self._ws.send(data)
-        response = self._ws.recv()
+        response = self._ws.recv(timeout=self._attempt_timeout_s)
+        trace.mark("round_trip")
         if isinstance(response, str):
             # we're expecting bytes; if the server sends a string, it's an error.
             raise RuntimeError(f"Error in inference server:\n{response}")
-        return msgpack_numpy.unpackb(response)
+        result = msgpack_numpy.unpackb(response)
+        trace.mark("deserialize")
+        if self._tracer is not None:
+            server_timing = result.pop(latency_tracing.TIMING_KEY, None)
+            if server_timing is not None:
+                trace.split("round_trip", server_timing)
+            self._tracer.record(trace.phases)
+        return result
+
+    def _close(self) -> None:
+        if self._ws is not None:
+            self._ws.close()
+            self._ws = None
 
     @override
     def reset(self) -> None:
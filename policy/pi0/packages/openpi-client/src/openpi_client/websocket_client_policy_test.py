@@ -0,0 +1,183 @@
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+import websockets.sync.server
+
+from openpi_client import latency_tracing
+from openpi_client import msgpack_numpy
+from openpi_client import websocket_client_policy
+
+
+class StandInServer:
+    """Answers every request with the observed state, after the delay for that request."""
+
+    def __init__(self, delays_s=(), server_timing=None, stall_after_connections=None):
+        self.delays_s = list(delays_s)
+        self.stall_after_connections = stall_after_connections
+        self.server_timing = server_timing
+        self.num_requests = 0
+        self.num_connections = 0
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self._server = websockets.sync.server.serve(
+            self._handler, "127.0.0.1", self.port
+        )
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def _handler(self, websocket):
+        self.num_connections += 1
+        if (
+            self.stall_after_connections is not None
+            and self.num_connections > self.stall_after_connections
+        ):
+            # Accept the connection but never send the metadata.
+            time.sleep(1.0)
+            return
+        websocket.send(msgpack_numpy.packb({"name": "stand-in"}))
+        for message in websocket:
+            obs = msgpack_numpy.unpackb(message)
+            delay = (
+                self.delays_s[self.num_requests]
+                if self.num_requests < len(self.delays_s)
+                else 0.0
+            )
+            self.num_requests += 1
+            time.sleep(delay)
+            result = {"actions": obs["state"]}
+            if obs.get(latency_tracing.TIMING_KEY) and self.server_timing is not None:
+                result[latency_tracing.TIMING_KEY] = self.server_timing
+            try:
+                websocket.send(msgpack_numpy.packb(result))
+            except websockets.exceptions.ConnectionClosed:
+                return
+
+    def shutdown(self):
+        self._server.shutdown()
+
+
+def _obs(value=1.0):
+    return {"state": np.full(14, value, dtype=np.float32)}
+
+
+def test_trace_phases():
+    server = StandInServer(
+        delays_s=[0.02] * 5, server_timing={"queue": 1.0, "infer": 15.0}
+    )
+    tracer = latency_tracing.LatencyTracer()
+    client = websocket_client_policy.WebsocketClientPolicy(
+        port=server.port, tracer=tracer
+    )
+
+    for i in range(5):
+        np.testing.assert_array_equal(
+            client.infer(_obs(i))["actions"], _obs(i)["state"]
+        )
+
+    summary = tracer.end_episode()
+    assert summary["num_requests"] == 5
+    phases = summary["phases_ms"]
+    assert set(phases) == {
+        "serialize",
+        "network",
+        "server_queue",
+        "server_infer",
+        "deserialize",
+        "total",
+    }
+    assert phases["server_infer"]["p50"] == pytest.approx(15.0)
+    assert phases["total"]["p50"] >= 20.0
+    # The stand-in's sleep is not part of its reported timing, so it shows up as network time.
+    assert phases["network"]["p50"] >= 20.0 - 16.0
+    assert tracer.summary()["num_requests"] == 0
+    server.shutdown()
+
+
+def test_timeout_retries_on_new_connection():
+    server = StandInServer(delays_s=[0.5, 0.0])
+    tracer = latency_tracing.LatencyTracer()
+    client = websocket_client_policy.WebsocketClientPolicy(
+        port=server.port,
+        attempt_timeout_s=0.1,
+        max_retries=2,
+        backoff_s=0.01,
+        tracer=tracer,
+    )
+
+    np.testing.assert_array_equal(client.infer(_obs(3))["actions"], _obs(3)["state"])
+    # The late response to the first attempt must not be returned for the next call.
+    np.testing.assert_array_equal(client.infer(_obs(4))["actions"], _obs(4)["state"])
+
+    assert server.num_connections == 2
+    summary = tracer.end_episode()
+    assert summary["num_retries"] == 1
+    assert summary["num_requests"] == 2
+    server.shutdown()
+
+
+def test_deadline_exceeded():
+    server = StandInServer(delays_s=[0.3, 0.3])
+    tracer = latency_tracing.LatencyTracer()
+    client = websocket_client_policy.WebsocketClientPolicy(
+        port=server.port,
+        attempt_timeout_s=0.05,
+        max_retries=1,
+        backoff_s=0.01,
+        tracer=tracer,
+    )
+
+    with pytest.raises(latency_tracing.DeadlineExceededError):
+        client.infer(_obs())
+    assert tracer.summary()["num_failures"] == 1
+    server.shutdown()
+
+
+def test_stalled_server_reconnect_is_bounded():
+    server = StandInServer(delays_s=[1.0], stall_after_connections=1)
+    tracer = latency_tracing.LatencyTracer()
+    client = websocket_client_policy.WebsocketClientPolicy(
+        port=server.port,
+        attempt_timeout_s=0.1,
+        max_retries=2,
+        backoff_s=0.01,
+        tracer=tracer,
+    )
+
+    start = time.monotonic()
+    with pytest.raises(latency_tracing.DeadlineExceededError):
+        client.infer(_obs())
+    # 3 attempts of at most 2 timeouts each, plus the backoff.
+    assert time.monotonic() - start < 3 * 2 * 0.1 + 0.5
+    assert server.num_connections == 3
+    summary = tracer.summary()
+    assert summary["num_retries"] == 2
+    assert summary["num_failures"] == 1
+    server.shutdown()
+
+
+def test_server_down_raises():
+    server = StandInServer()
+    client = websocket_client_policy.WebsocketClientPolicy(
+        port=server.port, attempt_timeout_s=0.1, max_retries=1, backoff_s=0.01
+    )
+    np.testing.assert_array_equal(client.infer(_obs(2))["actions"], _obs(2)["state"])
+    server.shutdown()
+
+    start = time.monotonic()
+    with pytest.raises((OSError, websockets.exceptions.WebSocketException)):
+        client.infer(_obs())
+    assert time.monotonic() - start < 1.0
+
+
+def test_server_timing_header():
+    timing = {"queue": 1.5, "infer": 30.25}
+    assert (
+        latency_tracing.parse_server_timing(
+            latency_tracing.format_server_timing(timing)
+        )
+        == timing
+    )
+    assert latency_tracing.parse_server_timing(None) == {}
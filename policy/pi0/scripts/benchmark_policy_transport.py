@@ -0,0 +1,99 @@
+"""Compares the per-call latency of the websocket and the shared-memory local policy transports.
+
+Serves a dummy policy that returns an action chunk without doing any work, so the measured time is the transport
+overhead alone, and queries it with an ALOHA-sized observation (three 224x224 cameras).
+"""
+
+import asyncio
+import dataclasses
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from openpi_client import base_policy as _base_policy
+from openpi_client import local_client_policy
+from openpi_client import websocket_client_policy
+import tyro
+
+from openpi.serving import websocket_policy_server
+
+
+class _ConstantPolicy(_base_policy.BasePolicy):
+    def __init__(self, action_horizon: int, action_dim: int) -> None:
+        self._actions = np.zeros((action_horizon, action_dim), dtype=np.float32)
+
+    def infer(self, obs: dict) -> dict:
+        return {"actions": self._actions}
+
+
+@dataclasses.dataclass
+class Args:
+    port: int = 8765
+    num_steps: int = 500
+    num_warmup_steps: int = 20
+    num_cameras: int = 3
+    image_size: int = 224
+    action_horizon: int = 50
+    action_dim: int = 14
+
+
+def _make_obs(args: Args) -> dict:
+    rng = np.random.default_rng(0)
+    return {
+        "images": {
+            f"cam_{i}": rng.integers(
+                0, 256, (3, args.image_size, args.image_size), dtype=np.uint8
+            )
+            for i in range(args.num_cameras)
+        },
+        "state": rng.standard_normal(args.action_dim).astype(np.float32),
+        "prompt": "fold the towel",
+    }
+
+
+def _benchmark(policy: _base_policy.BasePolicy, obs: dict, args: Args) -> np.ndarray:
+    for _ in range(args.num_warmup_steps):
+        policy.infer(obs)
+    latencies = []
+    for _ in range(args.num_steps):
+        start = time.perf_counter()
+        policy.infer(obs)
+        latencies.append(time.perf_counter() - start)
+    return 1000 * np.array(latencies)
+
+
+def main(args: Args) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        socket_path = os.path.join(tmp_dir, "policy.sock")
+        server = websocket_policy_server.WebsocketPolicyServer(
+            _ConstantPolicy(args.action_horizon, args.action_dim),
+            host="127.0.0.1",
+            port=args.port,
+            local_socket_path=socket_path,
+        )
+        threading.Thread(target=lambda: asyncio.run(server.run()), daemon=True).start()
+        while not os.path.exists(socket_path):
+            time.sleep(0.01)
+
+        obs = _make_obs(args)
+        clients = {
+            "websocket": websocket_client_policy.WebsocketClientPolicy(
+                host="127.0.0.1", port=args.port
+            ),
+            "local": local_client_policy.LocalClientPolicy(socket_path),
+        }
+        for name, client in clients.items():
+            latencies = _benchmark(client, obs, args)
+            print(
+                f"{name:>10}: mean {latencies.mean():.3f} ms, p50 {np.percentile(latencies, 50):.3f} ms, "
+                f"p99 {np.percentile(latencies, 99):.3f} ms"
+            )
+        clients["local"].close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main(tyro.cli(Args))
@@ -51,6 +51,14 @@ class Args:
     # Record the policy's behavior for debugging.
     record: bool = False
 
+    # Maximum number of observations from concurrent clients to run in one batched inference.
+    max_batch_size: int = 1
+    # Maximum time to wait for a batch to fill up, in milliseconds.
+    max_wait_ms: float = 0.0
+    # If provided, clients on this host can also connect through this Unix socket and exchange arrays through
+    # shared memory (see openpi_client.local_client_policy).
+    local_socket_path: str | None = None
+
     # Specifies how to load the policy. If not provided, the default policy for the environment will be used.
     policy: Checkpoint | Default = dataclasses.field(default_factory=Default)
 
@@ -119,6 +127,9 @@ def main(args: Args) -> None:
         host="0.0.0.0",
         port=args.port,
         metadata=policy_metadata,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        local_socket_path=args.local_socket_path,
     )
     server.serve_forever()
 
@@ -57,6 +57,33 @@ class Policy(BasePolicy):
         outputs = jax.tree.map(lambda x: np.asarray(x[0, ...]), outputs)
         return self._output_transform(outputs)
 
+    @override
+    def infer_batch(self, obs_batch: list[dict]) -> list[dict]:  # type: ignore[misc]
+        # Make a copy since transformations may modify the inputs in place.
+        inputs = [
+            self._input_transform(jax.tree.map(lambda x: x, obs)) for obs in obs_batch
+        ]
+        batch_size = len(inputs)
+        # Pad to the next power of two by repeating the last element, to bound the number of compiled batch sizes.
+        padded_size = 1 << (batch_size - 1).bit_length()
+        inputs += [inputs[-1]] * (padded_size - batch_size)
+        inputs = jax.tree.map(lambda *xs: jnp.asarray(np.stack(xs)), *inputs)
+
+        self._rng, sample_rng = jax.random.split(self._rng)
+        outputs = {
+            "state": inputs["state"],
+            "actions": self._sample_actions(
+                sample_rng, _model.Observation.from_dict(inputs), **self._sample_kwargs
+            ),
+        }
+
+        # Unbatch, drop the padding and convert to np.ndarray.
+        outputs = jax.tree.map(lambda x: np.asarray(x[:batch_size]), outputs)
+        return [
+            self._output_transform(jax.tree.map(lambda x: x[i], outputs))  # noqa: B023
+            for i in range(batch_size)
+        ]
+
     @property
     def metadata(self) -> dict[str, Any]:
         return self._metadata
@@ -85,3 +112,17 @@ class PolicyRecorder(_base_policy.BasePolicy):
 
         np.save(output_path, np.asarray(data))
         return results
+
+    @override
+    def infer_batch(self, obs_batch: list[dict]) -> list[dict]:  # type: ignore[misc]
+        results = self._policy.infer_batch(obs_batch)
+
+        for obs, result in zip(obs_batch, results, strict=True):
+            data = {"inputs": obs, "outputs": result}
+            data = flax.traverse_util.flatten_dict(data, sep="/")
+
+            output_path = self._record_dir / f"step_{self._record_step}"
+            self._record_step += 1
+
+            np.save(output_path, np.asarray(data))
+        return results
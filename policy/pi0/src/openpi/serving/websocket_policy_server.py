@@ -1,17 +1,60 @@
 import asyncio
+import collections
+import concurrent.futures
 import logging
+import os
+import time
 import traceback
 
 from openpi_client import base_policy as _base_policy
+from openpi_client import latency_tracing
 from openpi_client import msgpack_numpy
+from openpi_client import shm_transport
 import websockets.asyncio.server
 import websockets.frames
 
 
+class ServerStats:
+    """Queue depth and batch size histograms of a WebsocketPolicyServer."""
+
+    def __init__(self) -> None:
+        self.batch_sizes: collections.Counter[int] = collections.Counter()
+        self.queue_depths: collections.Counter[int] = collections.Counter()
+        self.num_requests = 0
+        self.infer_time_s = 0.0
+
+    def record(self, batch_size: int, queue_depth: int, infer_time_s: float) -> None:
+        self.batch_sizes[batch_size] += 1
+        self.queue_depths[queue_depth] += 1
+        self.num_requests += batch_size
+        self.infer_time_s += infer_time_s
+
+    def as_dict(self) -> dict:
+        num_batches = sum(self.batch_sizes.values())
+        return {
+            "num_requests": self.num_requests,
+            "num_batches": num_batches,
+            "mean_batch_size": self.num_requests / max(num_batches, 1),
+            "mean_infer_ms": 1000 * self.infer_time_s / max(num_batches, 1),
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "queue_depths": dict(sorted(self.queue_depths.items())),
+        }
+
+
 class WebsocketPolicyServer:
     """Serves a policy using the websocket protocol. See websocket_client_policy.py for a client implementation.
 
     Currently only implements the `load` and `infer` methods.
+
+    Inference runs on a single worker thread, so a slow inference does not block the event loop. Requests from all
+    connections are queued and collected into batches of up to `max_batch_size` observations, waiting at most
+    `max_wait_ms` for a batch to fill. Batches of more than one observation are run with one `infer_batch` call.
+
+    If `local_socket_path` is set, clients on the same host can also connect through that Unix socket with
+    LocalClientPolicy, which passes observations and actions through shared memory instead of websocket frames.
+
+    Requests that contain `latency_tracing.TIMING_KEY` get the time they spent queued and in inference back under the
+    same key, see latency_tracing.LatencyTracer.
     """
 
     def __init__(
@@ -20,25 +63,62 @@ class WebsocketPolicyServer:
         host: str = "0.0.0.0",
         port: int = 8000,
         metadata: dict | None = None,
+        *,
+        max_batch_size: int = 1,
+        max_wait_ms: float = 0.0,
+        stats_interval_s: float = 60.0,
+        local_socket_path: str | None = None,
     ) -> None:
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, got {max_batch_size}")
         self._policy = policy
         self._host = host
         self._port = port
         self._metadata = metadata or {}
+        self._max_batch_size = max_batch_size
+        self._max_wait_s = max_wait_ms / 1000
+        self._stats_interval_s = stats_interval_s
+        self._local_socket_path = local_socket_path
+        self._stats = ServerStats()
+        self._queue: asyncio.Queue | None = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="policy"
+        )
         logging.getLogger("websockets.server").setLevel(logging.INFO)
 
+    @property
+    def stats(self) -> dict:
+        return self._stats.as_dict()
+
     def serve_forever(self) -> None:
         asyncio.run(self.run())
 
     async def run(self):
-        async with websockets.asyncio.server.serve(
-            self._handler,
-            self._host,
-            self._port,
-            compression=None,
-            max_size=None,
-        ) as server:
-            await server.serve_forever()
+        self._queue = asyncio.Queue()
+        batcher = asyncio.create_task(self._batch_loop())
+        local_server = None
+        if self._local_socket_path is not None:
+            if os.path.exists(self._local_socket_path):
+                os.remove(self._local_socket_path)
+            local_server = await asyncio.start_unix_server(
+                self._local_handler, path=self._local_socket_path
+            )
+            logging.info(f"Serving local clients at {self._local_socket_path}")
+        try:
+            async with websockets.asyncio.server.serve(
+                self._handler,
+                self._host,
+                self._port,
+                compression=None,
+                max_size=None,
+            ) as server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if local_server is not None:
+                local_server.close()
+                if os.path.exists(self._local_socket_path):
+                    os.remove(self._local_socket_path)
 
     async def _handler(self, websocket: websockets.asyncio.server.ServerConnection):
         logging.info(f"Connection from {websocket.remote_address} opened")
@@ -49,7 +129,7 @@ class WebsocketPolicyServer:
         while True:
             try:
                 obs = msgpack_numpy.unpackb(await websocket.recv())
-                action = self._policy.infer(obs)
+                action = await self._submit(obs)
                 await websocket.send(packer.pack(action))
             except websockets.ConnectionClosed:
                 logging.info(f"Connection from {websocket.remote_address} closed")
@@ -61,3 +141,104 @@ class WebsocketPolicyServer:
                     reason="Internal server error. Traceback included in previous frame.",
                 )
                 raise
+
+    async def _local_handler(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        logging.info("Local connection opened")
+        obs_reader = shm_transport.SharedArrayReader()
+        action_writer = shm_transport.SharedArrayWriter()
+        try:
+            await shm_transport.write_frame_async(
+                writer, msgpack_numpy.packb(self._metadata)
+            )
+            while True:
+                try:
+                    frame = await shm_transport.read_frame_async(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    logging.info("Local connection closed")
+                    break
+                try:
+                    # The observation arrays are views into the client's region, which it does not touch until it
+                    # gets the response.
+                    obs = obs_reader.unpack(frame)
+                    action = await self._submit(obs)
+                    response = action_writer.pack(action)
+                except Exception:
+                    await shm_transport.write_frame_async(
+                        writer, shm_transport.pack_error(traceback.format_exc())
+                    )
+                    raise
+                await shm_transport.write_frame_async(writer, response)
+        finally:
+            writer.close()
+            obs_reader.close()
+            action_writer.close()
+
+    async def _submit(self, obs: dict) -> dict:
+        report_timing = obs.pop(latency_tracing.TIMING_KEY, False)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put((obs, future, loop.time()))
+        action, timing = await future
+        if report_timing:
+            action = {**action, latency_tracing.TIMING_KEY: timing}
+        return action
+
+    async def _next_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self._max_wait_s
+        while len(batch) < self._max_batch_size:
+            # Take everything that is already queued, then wait for more until the deadline.
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except TimeoutError:
+                break
+        return batch
+
+    def _infer(self, obs_batch: list[dict]) -> list[dict]:
+        if len(obs_batch) == 1:
+            return [self._policy.infer(obs_batch[0])]
+        return self._policy.infer_batch(obs_batch)
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        last_log = time.monotonic()
+        while True:
+            batch = await self._next_batch()
+            # Any failure is reported to the requests of this batch, so that one bad batch does not stop the batcher.
+            try:
+                queue_depth = self._queue.qsize()
+                start = time.monotonic()
+                infer_start = loop.time()
+                results = await loop.run_in_executor(
+                    self._executor, self._infer, [obs for obs, _, _ in batch]
+                )
+                infer_time_s = time.monotonic() - start
+                self._stats.record(len(batch), queue_depth, infer_time_s)
+
+                for (_, future, submit_time), result in zip(
+                    batch, results, strict=True
+                ):
+                    if not future.done():
+                        timing = {
+                            "queue": 1000 * (infer_start - submit_time),
+                            "infer": 1000 * infer_time_s,
+                        }
+                        future.set_result((result, timing))
+
+                if time.monotonic() - last_log > self._stats_interval_s:
+                    logging.info(f"Policy server stats: {self.stats}")
+                    last_log = time.monotonic()
+            except Exception as e:
+                logging.exception(f"Batch of {len(batch)} requests failed")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
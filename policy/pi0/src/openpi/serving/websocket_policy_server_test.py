@@ -0,0 +1,159 @@
+import asyncio
+import concurrent.futures
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pytest
+from openpi_client import base_policy as _base_policy
+from openpi_client import latency_tracing
+from openpi_client import local_client_policy
+from openpi_client import websocket_client_policy
+
+from openpi.serving import websocket_policy_server
+
+
+class DummyPolicy(_base_policy.BasePolicy):
+    def __init__(self, infer_time_s: float = 0.05):
+        self.infer_time_s = infer_time_s
+        self.batch_sizes = []
+
+    def infer(self, obs: dict) -> dict:
+        return self.infer_batch([obs])[0]
+
+    def infer_batch(self, obs_batch: list[dict]) -> list[dict]:
+        self.batch_sizes.append(len(obs_batch))
+        time.sleep(self.infer_time_s)
+        return [
+            {"actions": obs["state"] * 2, "client": obs["client"]} for obs in obs_batch
+        ]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(policy, **kwargs):
+    port = _free_port()
+    server = websocket_policy_server.WebsocketPolicyServer(
+        policy, host="127.0.0.1", port=port, **kwargs
+    )
+    threading.Thread(target=lambda: asyncio.run(server.run()), daemon=True).start()
+    return server, port
+
+
+def _run_client(port: int, client_id: int, num_steps: int) -> None:
+    client = websocket_client_policy.WebsocketClientPolicy(host="127.0.0.1", port=port)
+    for step in range(num_steps):
+        state = np.full((14,), client_id * 100 + step, dtype=np.float32)
+        result = client.infer({"state": state, "client": client_id})
+        assert result["client"] == client_id
+        np.testing.assert_array_equal(result["actions"], state * 2)
+
+
+def _run_clients(port: int, num_clients: int, num_steps: int) -> None:
+    with concurrent.futures.ThreadPoolExecutor(num_clients) as executor:
+        futures = [
+            executor.submit(_run_client, port, i, num_steps) for i in range(num_clients)
+        ]
+        for future in futures:
+            future.result()
+
+
+def test_batched_inference():
+    policy = DummyPolicy()
+    server, port = _start_server(policy, max_batch_size=4, max_wait_ms=20)
+
+    _run_clients(port, num_clients=4, num_steps=5)
+
+    stats = server.stats
+    assert stats["num_requests"] == 20
+    assert max(policy.batch_sizes) > 1
+    assert max(policy.batch_sizes) <= 4
+    assert sum(size * count for size, count in stats["batch_sizes"].items()) == 20
+    assert sum(stats["queue_depths"].values()) == stats["num_batches"]
+
+
+def test_unbatched_inference_does_not_block_event_loop():
+    policy = DummyPolicy(infer_time_s=0.2)
+    server, port = _start_server(policy)
+
+    # A slow inference must not stop the server from accepting and answering other connections.
+    start = time.monotonic()
+    _run_clients(port, num_clients=3, num_steps=1)
+    assert time.monotonic() - start < 3.0
+
+    assert policy.batch_sizes == [1, 1, 1]
+    assert server.stats["batch_sizes"] == {1: 3}
+
+
+def test_timing_reported():
+    policy = DummyPolicy(infer_time_s=0.05)
+    server, port = _start_server(policy)
+    tracer = latency_tracing.LatencyTracer()
+    client = websocket_client_policy.WebsocketClientPolicy(
+        host="127.0.0.1", port=port, tracer=tracer
+    )
+
+    result = client.infer({"state": np.zeros(14, dtype=np.float32), "client": 0})
+    assert latency_tracing.TIMING_KEY not in result
+
+    phases = tracer.end_episode()["phases_ms"]
+    assert phases["server_infer"]["p50"] >= 50
+    assert "server_queue" in phases
+    assert "network" in phases
+
+
+def test_batch_failure_does_not_stop_batcher():
+    policy = DummyPolicy(infer_time_s=0.0)
+    server, port = _start_server(policy)
+    record = server._stats.record
+    failures = []
+
+    def record_once_failing(*args):
+        if not failures:
+            failures.append(args)
+            raise ValueError("stats error")
+        record(*args)
+
+    # A failure outside the policy call is reported to the client of that batch.
+    server._stats.record = record_once_failing
+    client = websocket_client_policy.WebsocketClientPolicy(host="127.0.0.1", port=port)
+    with pytest.raises(RuntimeError, match="stats error"):
+        client.infer({"state": np.zeros(14, dtype=np.float32), "client": 0})
+
+    # The batcher keeps serving later requests.
+    _run_clients(port, num_clients=2, num_steps=2)
+    assert server.stats["num_requests"] == 4
+
+
+def test_local_transport():
+    policy = DummyPolicy(infer_time_s=0.0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        socket_path = os.path.join(tmp_dir, "policy.sock")
+        server, port = _start_server(policy, local_socket_path=socket_path)
+        while not os.path.exists(socket_path):
+            time.sleep(0.01)
+
+        client = local_client_policy.create_client_policy(
+            host="127.0.0.1", port=port, local_socket_path=socket_path
+        )
+        assert isinstance(client, local_client_policy.LocalClientPolicy)
+        for step in range(3):
+            image = np.full((3, 224, 224), step, dtype=np.uint8)
+            state = np.arange(14, dtype=np.float32) + step
+            result = client.infer({"state": state, "image": image, "client": 7})
+            assert result["client"] == 7
+            np.testing.assert_array_equal(result["actions"], state * 2)
+        client.close()
+
+        # Remote hosts fall back to websockets.
+        client = local_client_policy.create_client_policy(
+            host="127.0.0.1", port=port, local_socket_path=None
+        )
+        assert isinstance(client, websocket_client_policy.WebsocketClientPolicy)
@@ -29,6 +29,7 @@ from termcolor import colored
 
 import robocasa
 import robocasa.macros as macros
+import robocasa.utils.dataset_storage_utils as StorageUtils
 from robocasa.models.fixtures import FixtureType
 from robocasa.utils.robomimic.robomimic_dataset_utils import convert_to_robomimic_format
 
@@ -200,6 +201,7 @@ def gather_demonstrations_as_hdf5(
     successful_episodes=None,
     verbose=False,
     out_name="demo.hdf5",
+    storage=None,
 ):
     """
     Gathers the demonstrations saved in @directory into a
@@ -221,6 +223,8 @@ def gather_demonstrations_as_hdf5(
         out_dir (str): Path to where to store the hdf5 file.
         env_info (str): JSON-encoded string containing environment information,
             including controller and robot info
+        storage (StorageUtils.StorageOptions): codec and chunking for written
+            datasets. If None, datasets are written uncompressed.
     """
 
     hdf5_path = os.path.join(out_dir, out_name)
@@ -289,11 +293,13 @@ def gather_demonstrations_as_hdf5(
             ep_data_grp.attrs["ep_meta"] = ep_meta
 
         # write datasets for states and actions
-        ep_data_grp.create_dataset("states", data=np.array(states))
-        ep_data_grp.create_dataset("actions", data=np.array(actions))
+        StorageUtils.create_dataset(ep_data_grp, "states", states, storage=storage)
+        StorageUtils.create_dataset(ep_data_grp, "actions", actions, storage=storage)
         if len(actions_abs) > 0:
             print(np.array(actions_abs).shape)
-            ep_data_grp.create_dataset("actions_abs", data=np.array(actions_abs))
+            StorageUtils.create_dataset(
+                ep_data_grp, "actions_abs", actions_abs, storage=storage
+            )
 
         # else:
         #     pass
@@ -402,7 +408,9 @@ if __name__ == "__main__":
     parser.add_argument("--layout", type=int, nargs="+", default=None)
     parser.add_argument("--style", type=int, nargs="+", default=None)
     parser.add_argument("--generative_textures", action="store_true")
+    StorageUtils.add_storage_args(parser)
     args = parser.parse_args()
+    storage = StorageUtils.get_storage_options_from_args(args)
 
     # Get controller config
     # controller_config = load_controller_config(default_controller=args.controller)
@@ -572,6 +580,7 @@ if __name__ == "__main__":
                     env_info,
                     successful_episodes=[ep_directory.split("/")[-1]],
                     out_name="ep_demo.hdf5",
+                    storage=storage,
                 )
 
             print("Episode success:", not discard_traj)
@@ -583,6 +592,7 @@ if __name__ == "__main__":
                     env_info,
                     successful_episodes=successful_episodes,
                     verbose=True,
+                    storage=storage,
                 )
                 if hdf5_path is not None:
                     convert_to_robomimic_format(hdf5_path)
@@ -595,6 +605,7 @@ if __name__ == "__main__":
                 env_info,
                 successful_episodes=successful_episodes,
                 verbose=True,
+                storage=storage,
             )
             if hdf5_path is not None:
                 convert_to_robomimic_format(hdf5_path)
@@ -0,0 +1,227 @@
+"""
+Benchmark hdf5 storage options (codec and chunking) for robomimic-format datasets.
+
+For every codec, the demos are re-written to a temporary file and the script reports
+write throughput, read throughput for random training windows and the file size.
+
+Args:
+    dataset (str): path to a robomimic hdf5 dataset to benchmark with. If not provided,
+        a synthetic dataset with image and low-dim observations is generated.
+
+    codecs (str or [str]): codec specs to compare (see robocasa/utils/dataset_storage_utils.py)
+
+    chunk_lens (int or [int]): chunk lengths (in timesteps) to compare. 0 lets h5py decide.
+
+    window (int): length of the training windows read in the read benchmark
+
+    num_windows (int): number of random windows to read per setting
+
+    n (int): number of demos to use from @dataset
+
+Example usage:
+
+    # compare gzip, lzf and blosc/zstd on a real dataset, chunks aligned to 16-step windows
+    python benchmark_dataset_storage.py --dataset /path/to/image.hdf5 \
+        --codecs none gzip lzf blosc:zstd:5 --chunk_lens 0 16 --window 16
+
+    # synthetic dataset
+    python benchmark_dataset_storage.py --codecs none gzip:1 gzip:4 lzf
+"""
+import os
+import time
+import argparse
+import tempfile
+
+import h5py
+import numpy as np
+
+import robocasa.utils.dataset_storage_utils as StorageUtils
+
+
+def load_demos(dataset, n=None):
+    """
+    Loads all datasets of the first @n demos in @dataset into memory.
+
+    Returns:
+        demos ([dict]): for each demo, a dictionary mapping dataset path to array
+    """
+    demos = []
+    with h5py.File(dataset, "r") as f:
+        demo_keys = sorted(f["data"].keys(), key=lambda k: int(k.split("_")[-1]))
+        if n is not None:
+            demo_keys = demo_keys[:n]
+        for ep in demo_keys:
+            arrays = dict()
+
+            def visit(name, obj):
+                if isinstance(obj, h5py.Dataset):
+                    arrays[name] = obj[()]
+
+            f["data/{}".format(ep)].visititems(visit)
+            demos.append(arrays)
+    return demos
+
+
+def make_synthetic_demos(num_demos=20, demo_len=300, image_size=128, seed=0):
+    """
+    Generates smooth synthetic demos with camera images and low-dim observations.
+    """
+    rng = np.random.default_rng(seed)
+    demos = []
+    for _ in range(num_demos):
+        t = np.linspace(0, 1, demo_len)[:, None]
+        arrays = dict(
+            actions=rng.uniform(-1, 1, size=(demo_len, 12)).astype(np.float32),
+            states=np.cumsum(rng.normal(size=(demo_len, 80)), axis=0),
+        )
+        arrays["obs/robot0_eef_pos"] = np.sin(t * rng.uniform(1, 5, size=(1, 3)))
+        for cam in ["robot0_agentview_left", "robot0_eye_in_hand"]:
+            # low-frequency texture, closer to rendered frames than white noise
+            block = image_size // 8
+            base = (
+                rng.integers(0, 255, size=(8, 8, 3)).repeat(block, 0).repeat(block, 1)
+            )
+            shift = (t[:, 0] * 20).astype(int)
+            frames = np.stack([np.roll(base, s, axis=1) for s in shift])
+            arrays["obs/{}_image".format(cam)] = frames.astype(np.uint8)
+        demos.append(arrays)
+    return demos
+
+
+def write_demos(path, demos, storage):
+    """
+    Writes @demos to @path and returns the elapsed time in seconds.
+    """
+    t = time.time()
+    with h5py.File(path, "w") as f:
+        data_grp = f.create_group("data")
+        for i, arrays in enumerate(demos):
+            ep_grp = data_grp.create_group("demo_{}".format(i))
+            for k, v in arrays.items():
+                StorageUtils.create_dataset(ep_grp, k, v, storage=storage)
+    return time.time() - t
+
+
+def read_windows(path, keys, window, num_windows, seed=0):
+    """
+    Reads @num_windows random windows of length @window for all @keys.
+
+    Returns:
+        elapsed (float): elapsed time in seconds
+        num_bytes (int): number of bytes read
+    """
+    rng = np.random.default_rng(seed)
+    num_bytes = 0
+    with h5py.File(path, "r") as f:
+        demo_grps = [f["data/{}".format(ep)] for ep in f["data"]]
+        lengths = [grp["actions"].shape[0] for grp in demo_grps]
+        t = time.time()
+        for _ in range(num_windows):
+            i = rng.integers(len(demo_grps))
+            start = rng.integers(max(lengths[i] - window, 0) + 1)
+            for k in keys:
+                num_bytes += demo_grps[i][k][start : start + window].nbytes
+        elapsed = time.time() - t
+    return elapsed, num_bytes
+
+
+def benchmark_storage(args):
+    if args.dataset is not None:
+        demos = load_demos(args.dataset, n=args.n)
+    else:
+        demos = make_synthetic_demos()
+    raw_bytes = sum(v.nbytes for arrays in demos for v in arrays.values())
+    keys = [k for k in demos[0] if k.startswith("obs/") or k == "actions"]
+
+    print(
+        "Benchmarking {} demos ({:.1f} MB raw), reading windows of {} steps".format(
+            len(demos), raw_bytes / 1e6, args.window
+        )
+    )
+    header = "{:<20} {:>6} {:>12} {:>12} {:>12} {:>10}".format(
+        "codec", "chunk", "write MB/s", "read MB/s", "windows/s", "size MB"
+    )
+    print(header)
+    print("-" * len(header))
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for codec in args.codecs:
+            for chunk_len in args.chunk_lens:
+                storage = StorageUtils.StorageOptions(
+                    default=codec, chunk_len=chunk_len if chunk_len > 0 else None
+                )
+                path = os.path.join(tmp_dir, "bench.hdf5")
+                write_time = write_demos(path, demos, storage)
+                size = os.path.getsize(path)
+                # first pass warms up the OS page cache, so that we only measure decoding
+                read_windows(path, keys, args.window, args.num_windows)
+                read_time, read_bytes = read_windows(
+                    path, keys, args.window, args.num_windows
+                )
+                os.remove(path)
+
+                res = dict(
+                    codec=codec,
+                    chunk_len=chunk_len,
+                    write_mb_per_sec=raw_bytes / 1e6 / write_time,
+                    read_mb_per_sec=read_bytes / 1e6 / read_time,
+                    windows_per_sec=args.num_windows / read_time,
+                    size_mb=size / 1e6,
+                )
+                results.append(res)
+                print(
+                    "{:<20} {:>6} {:>12.1f} {:>12.1f} {:>12.1f} {:>10.1f}".format(
+                        codec,
+                        chunk_len if chunk_len > 0 else "auto",
+                        res["write_mb_per_sec"],
+                        res["read_mb_per_sec"],
+                        res["windows_per_sec"],
+                        res["size_mb"],
+                    )
+                )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--dataset",
+        type=str,
+        default=None,
+        help="(optional) path to robomimic hdf5 dataset. If not provided, use synthetic data",
+    )
+    parser.add_argument(
+        "--n",
+        type=int,
+        default=20,
+        help="(optional) number of demos to use from the dataset",
+    )
+    parser.add_argument(
+        "--codecs",
+        type=str,
+        nargs="+",
+        default=["none", "gzip", "lzf"],
+        help="codec specs to compare, e.g. none gzip:1 lzf blosc:zstd:5 zstd:3",
+    )
+    parser.add_argument(
+        "--chunk_lens",
+        type=int,
+        nargs="+",
+        default=[0, 16],
+        help="chunk lengths in timesteps to compare. 0 lets h5py choose the chunk shape",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=16,
+        help="length of the training windows to read",
+    )
+    parser.add_argument(
+        "--num_windows",
+        type=int,
+        default=500,
+        help="number of random windows to read per setting",
+    )
+    args = parser.parse_args()
+    benchmark_storage(args)
@@ -32,6 +32,25 @@ Args:
     procs_per_gpu (int or [int]): Number of processes to allocate to each GPU. Must have 
         same length as gpu_ids and sum must equal num_procs.
 
+    scene_key (str): how demos are grouped into scenes for scheduling. One of "layout",
+        "scene" (layout and style), "objects" (scene and object models) or "xml" (model xml).
+
+    no_compress (bool): if provided, write all datasets without compression
+
+    compression (str): codec for obs and next_obs datasets (default gzip). One of none,
+        gzip[:level], lzf, blosc[:cname:clevel] or zstd[:level]
+
+    low_dim_compression (str): codec for actions, states, rewards, dones and action_dict
+        (default none)
+
+    compression_keys (str or [str]): per-key codecs as <pattern>=<codec>, matched against
+        the dataset path inside each demo, e.g. obs/*_image=blosc:zstd:5
+
+    chunk_len (int): number of timesteps per hdf5 chunk, ideally the training window length
+
+    no_scene_affinity (bool): if provided, hand out demos to processes in dataset order
+        instead of assigning each scene group to a single process.
+
 Example usage:
     
     # extract low-dimensional observations with 4 processes
@@ -60,6 +79,10 @@ Example usage:
         --done_mode 2 --camera_names agentview robot0_eye_in_hand --camera_height 84 --camera_width 84 \
         --num_procs 8 --gpu_ids 0 1 2 3 --procs_per_gpu 3 2 2 1
 
+    # store images with blosc/zstd in chunks of 16 timesteps, low-dim data with lzf
+    python dataset_states_to_obs_mp.py --dataset /path/to/demo.hdf5 --output_name image.hdf5 \
+        --done_mode 2 --compression lzf --compression_keys "obs/*_image=blosc:zstd:5" --chunk_len 16
+
     # extract with 6 processes: 4 on GPU 0, 2 on GPU 1
     python dataset_states_to_obs_mp.py --dataset /path/to/demo.hdf5 --output_name image.hdf5 \
         --done_mode 2 --camera_names agentview robot0_eye_in_hand --camera_height 84 --camera_width 84 \
@@ -85,6 +108,8 @@ import robomimic.utils.file_utils as FileUtils
 import robocasa.utils.robomimic.robomimic_env_utils as EnvUtils
 import robocasa.utils.robomimic.robomimic_tensor_utils as TensorUtils
 import robocasa.utils.robomimic.robomimic_dataset_utils as DatasetUtils
+import robocasa.utils.scheduler_utils as SchedulerUtils
+import robocasa.utils.dataset_storage_utils as StorageUtils
 
 
 try:
@@ -193,16 +218,16 @@ def extract_trajectory(
 
 
 def process_demo_batch(
-    process_id, args, env_meta, work_queue, result_queue, progress_queue, gpu_id=None
+    process_id, args, env_meta, scheduler, result_queue, progress_queue, gpu_id=None
 ):
     """
-    Process demonstrations from a work queue until the queue is empty.
+    Process demonstrations handed out by the scheduler until there is no work left.
 
     Args:
         process_id (int): ID of this worker process
         args: Script arguments
         env_meta: Environment metadata
-        work_queue (mp.Queue): Queue containing work items (demos to process)
+        scheduler (SchedulerUtils.DemoScheduler): scheduler handing out demos to process
         result_queue (mp.Queue): Queue to store results
         progress_queue (mp.Queue): Queue to report progress
         gpu_id (int, optional): GPU ID to use for this process
@@ -232,6 +257,9 @@ def process_demo_batch(
     # print(json.dumps(env.serialize(), indent=4))
     # print("")
 
+    # codec and chunking for every written dataset
+    storage = get_storage_options(args)
+
     # Open input file in read mode
     f = h5py.File(args.dataset, "r")
 
@@ -245,18 +273,18 @@ def process_demo_batch(
     success = True
     retries = 0
 
-    # Process demos until the queue is empty
+    # Process demos until the scheduler runs out of work
     while True:
         try:
-            # Get next demo from queue with timeout
+            # Get next demo from the scheduler
             if success or retries > MAX_RETRIES:
-                ep = work_queue.get(timeout=1)
+                ep = scheduler.next_demo(process_id)
                 success = False
                 retries = 0
             else:
                 retries += 1
 
-            if ep is None:  # Poison pill
+            if ep is None:  # No work left
                 break
 
             # prepare states to reload from
@@ -289,34 +317,19 @@ def process_demo_batch(
             # IMPORTANT: keep name of group the same as source file, to make sure that filter keys are
             #            consistent as well
             ep_data_grp = data_grp.create_group(ep)
-            ep_data_grp.create_dataset("actions", data=np.array(traj["actions"]))
-            # ep_data_grp.create_dataset("actions_abs", data=np.array(traj["actions_abs"]))
-            ep_data_grp.create_dataset("states", data=np.array(traj["states"]))
-            ep_data_grp.create_dataset("rewards", data=np.array(traj["rewards"]))
-            ep_data_grp.create_dataset("dones", data=np.array(traj["dones"]))
+            for k in ["actions", "states", "rewards", "dones"]:
+                StorageUtils.create_dataset(ep_data_grp, k, traj[k], storage=storage)
             for k in traj["obs"]:
-                if args.no_compress:
-                    ep_data_grp.create_dataset(
-                        "obs/{}".format(k), data=np.array(traj["obs"][k])
-                    )
-
-                else:
-                    ep_data_grp.create_dataset(
-                        "obs/{}".format(k),
-                        data=np.array(traj["obs"][k]),
-                        compression="gzip",
-                    )
+                StorageUtils.create_dataset(
+                    ep_data_grp, "obs/{}".format(k), traj["obs"][k], storage=storage
+                )
                 if args.include_next_obs:
-                    if args.no_compress:
-                        ep_data_grp.create_dataset(
-                            "next_obs/{}".format(k), data=np.array(traj["next_obs"][k])
-                        )
-                    else:
-                        ep_data_grp.create_dataset(
-                            "next_obs/{}".format(k),
-                            data=np.array(traj["next_obs"][k]),
-                            compression="gzip",
-                        )
+                    StorageUtils.create_dataset(
+                        ep_data_grp,
+                        "next_obs/{}".format(k),
+                        traj["next_obs"][k],
+                        storage=storage,
+                    )
 
             # episode metadata
             ep_data_grp.attrs["model_file"] = traj["initial_state_dict"]["model"]
@@ -334,9 +347,6 @@ def process_demo_batch(
             print("Error processing demo index {}: {}".format(ep, e))
             print(traceback.format_exc())
             print("_" * 50)
-            # Queue is empty, check if we should continue waiting
-            if work_queue.empty():
-                break
             del env
             env = EnvUtils.create_env_for_data_processing(  # when it errors, it like blows up the environment for some reason
                 env_meta=env_meta,
@@ -354,7 +364,24 @@ def process_demo_batch(
     f_out.close()
 
     # Put result in result queue
-    result_queue.put((temp_output, total_samples, processed_demos))
+    result_queue.put(
+        (temp_output, total_samples, processed_demos, scheduler.get_stats())
+    )
+
+
+def get_storage_options(args):
+    """
+    Builds the storage options used to write extracted datasets.
+
+    Args:
+        args: Script arguments
+
+    Returns:
+        StorageUtils.StorageOptions: codec and chunking for every dataset key
+    """
+    if args.no_compress:
+        return StorageUtils.StorageOptions(default="none", chunk_len=args.chunk_len)
+    return StorageUtils.get_storage_options_from_args(args)
 
 
 def get_gpu_allocation(num_procs, gpu_ids, procs_per_gpu=None):
@@ -425,6 +452,13 @@ def dataset_states_to_obs_mp(args):
         demos = list(f["data"].keys())
         inds = np.argsort([int(elem[5:]) for elem in demos])
         demos = [demos[i] for i in inds]
+        # Maybe reduce number of demonstrations
+        if args.n is not None:
+            demos = demos[: args.n]
+        # scene keys only need episode attributes, not the datasets
+        scene_keys = SchedulerUtils.get_scene_keys_from_hdf5(
+            f, demos, mode=args.scene_key
+        )
 
     # Store original demo names for merging
     original_demos = demos.copy()
@@ -446,11 +480,6 @@ def dataset_states_to_obs_mp(args):
                     image_suffix
                 )
 
-    # Maybe reduce number of demonstrations
-    if args.n is not None:
-        demos = demos[: args.n]
-        original_demos = original_demos[: args.n]
-
     if len(demos) == 0:
         raise ValueError("No demonstrations to process after applying start/n filters")
 
@@ -463,17 +492,22 @@ def dataset_states_to_obs_mp(args):
         )
 
     # Initialize multiprocessing queues
-    work_queue = mp.Queue()
     result_queue = mp.Queue()
     progress_queue = mp.Queue()
 
-    # Fill work queue with demos
-    for demo in demos:
-        work_queue.put(demo)
-
-    # Add poison pills to signal processes to terminate
-    for _ in range(num_processes):
-        work_queue.put(None)
+    # Group demos by scene and assign each group to one process
+    scheduler = SchedulerUtils.DemoScheduler(
+        demos,
+        scene_keys,
+        num_workers=num_processes,
+        affinity=not args.no_scene_affinity,
+        max_group_size=args.max_scene_group_size,
+    )
+    if scheduler.affinity:
+        print(
+            f"Scheduling {len(set(scene_keys))} scenes (scene key: {args.scene_key}) "
+            f"with {scheduler.num_groups} groups per process"
+        )
 
     # Handle GPU allocation
     gpu_allocation = None
@@ -519,7 +553,7 @@ def dataset_states_to_obs_mp(args):
                     i,
                     args,
                     env_meta,
-                    work_queue,
+                    scheduler,
                     result_queue,
                     progress_queue,
                     gpu_id,
@@ -553,10 +587,12 @@ def dataset_states_to_obs_mp(args):
 
         # Collect results
         results = []
+        scheduler_stats = {}
         demo_locations = {}  # Maps demo name to temp file location
         while not result_queue.empty():
-            temp_output, total_samples, processed_demos = result_queue.get()
+            temp_output, total_samples, processed_demos, stats = result_queue.get()
             results.append((temp_output, total_samples))
+            scheduler_stats[temp_output] = stats
             # Record which demos are in which temp files
             for demo in processed_demos:
                 demo_locations[demo] = temp_output
@@ -567,6 +603,15 @@ def dataset_states_to_obs_mp(args):
             if p.is_alive():
                 p.terminate()
 
+    print("\nPer-process scheduling stats:")
+    for temp_output in sorted(scheduler_stats):
+        stats = scheduler_stats[temp_output]
+        print(
+            f"  {os.path.basename(temp_output)}: {stats['demos']} demos, "
+            f"{stats['num_scenes']} scenes, {stats['scene_switches']} scene switches, "
+            f"{stats['steals']} stolen groups"
+        )
+
     # Merge results in the original demo order
     output_path = os.path.join(os.path.dirname(args.dataset), output_name)
 
@@ -604,44 +649,13 @@ def dataset_states_to_obs_mp(args):
 
         data_grp.attrs["total"] = total_samples
 
-    DatasetUtils.extract_action_dict(dataset=output_path)
+    DatasetUtils.extract_action_dict(
+        dataset=output_path, storage=get_storage_options(args)
+    )
     DatasetUtils.make_demo_ids_contiguous(dataset=output_path)
-    for num_demos in [
-        10,
-        20,
-        30,
-        40,
-        50,
-        60,
-        70,
-        75,
-        80,
-        90,
-        100,
-        125,
-        150,
-        200,
-        250,
-        300,
-        400,
-        500,
-        600,
-        700,
-        800,
-        900,
-        1000,
-        1500,
-        2000,
-        2500,
-        3000,
-        4000,
-        5000,
-        10000,
-    ]:
-        DatasetUtils.filter_dataset_size(
-            output_path,
-            num_demos=num_demos,
-        )
+    DatasetUtils.filter_dataset_sizes(
+        output_path, num_demos=DatasetUtils.DEFAULT_FILTER_NUM_DEMOS
+    )
 
     print("\nCleaning up temporary files...")
     for (
@@ -664,6 +678,7 @@ def dataset_states_to_obs_mp(args):
         mem_usage=f"{mem_usage} MB",
         num_processes=num_processes,
         gpu_allocation=gpu_allocation if gpu_allocation else "no GPU allocation",
+        scene_switches=sum(s["scene_switches"] for s in scheduler_stats.values()),
     )
     return important_stats
 
@@ -758,12 +773,17 @@ if __name__ == "__main__":
         action="store_true",
     )
 
-    # flag to compress observations with gzip option in hdf5
+    # flag to write all datasets without compression
     parser.add_argument(
         "--no_compress",
         action="store_true",
     )
 
+    # codec and chunking for written datasets
+    StorageUtils.add_storage_args(
+        parser, default_codec="gzip", default_low_dim_codec="none"
+    )
+
     # flag for using generative textures
     parser.add_argument(
         "--generative-textures",
@@ -804,6 +824,28 @@ if __name__ == "__main__":
         help="(optional) Number of processes to allocate to each GPU. Must have same length as --gpu_ids. Example: --procs_per_gpu 3 2 2 1",
     )
 
+    # Add scene scheduling arguments
+    parser.add_argument(
+        "--scene_key",
+        type=str,
+        default="scene",
+        choices=SchedulerUtils.SCENE_KEY_MODES,
+        help="(optional) how demos are grouped into scenes for scheduling: layout, scene (layout and style), objects (scene and object models) or xml (model xml)",
+    )
+
+    parser.add_argument(
+        "--no_scene_affinity",
+        action="store_true",
+        help="(optional) hand out demos in dataset order instead of assigning each scene group to a single process",
+    )
+
+    parser.add_argument(
+        "--max_scene_group_size",
+        type=int,
+        default=16,
+        help="(optional) split scene groups into chunks of at most this many demos, so idle processes can steal work",
+    )
+
     args = parser.parse_args()
     res_str = "finished run successfully!"
     important_stats = None
@@ -66,10 +66,9 @@ if __name__ == "__main__":
     # seed to make sure results are consistent
     np.random.seed(0)
 
-    for n in args.num_demos:
-        DatasetUtils.filter_dataset_size(
-            args.dataset,
-            input_filter_key=args.input_filter_key,
-            num_demos=n,
-            output_filter_key=args.output_filter_key,
-        )
+    DatasetUtils.filter_dataset_sizes(
+        args.dataset,
+        num_demos=args.num_demos,
+        input_filter_key=args.input_filter_key,
+        output_filter_key=args.output_filter_key,
+    )
@@ -0,0 +1,180 @@
+"""
+Evaluates a policy from policy/ on robocasa kitchen tasks, with several envs running
+in worker processes. Policies that expose get_actions are queried once per step for
+all running envs; other policies run one episode at a time through their eval().
+Writes the per-episode results and a summary per task and scene to a json file.
+
+Example:
+    python robocasa/scripts/eval_policy.py --policy openvla-oft \
+        --config policy/openvla-oft/deploy_policy.yml --envs OpenSingleDoor \
+        --layout_and_style_ids 1 1 2 2 --num_episodes 10 --num_envs 8
+
+    # CPU-only smoke test with a dummy policy and dummy envs
+    python robocasa/scripts/eval_policy.py --dummy --envs OpenSingleDoor
+"""
+import os
+import sys
+import json
+import argparse
+import importlib
+from functools import partial
+
+import yaml
+from termcolor import colored
+
+import robocasa.utils.policy_eval_utils as PolicyEvalUtils
+
+POLICY_ROOT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "policy"
+)
+
+
+def load_policy(policy_name, policy_root=POLICY_ROOT):
+    """
+    Imports policy/<policy_name> the way RoboTwin does: as a package, with the policy
+    directory also on the path for its own absolute imports.
+    """
+    policy_root = os.path.abspath(policy_root)
+    for path in [policy_root, os.path.join(policy_root, policy_name)]:
+        if path not in sys.path:
+            sys.path.append(path)
+    return importlib.import_module(policy_name)
+
+
+def main(args):
+    if args.layout_and_style_ids is None:
+        layout_and_style_ids = [(None, None)]
+    else:
+        assert len(args.layout_and_style_ids) % 2 == 0
+        ids = args.layout_and_style_ids
+        layout_and_style_ids = list(zip(ids[0::2], ids[1::2]))
+    episodes = PolicyEvalUtils.make_episodes(
+        args.envs, layout_and_style_ids, args.num_episodes, seed=args.seed
+    )
+
+    if args.dummy:
+        policy = PolicyEvalUtils.DummyPolicy()
+        usr_args = dict()
+        env_cls = PolicyEvalUtils.DummyTaskEnv
+    else:
+        policy = load_policy(args.policy)
+        with open(args.config, "r") as f:
+            usr_args = yaml.safe_load(f)
+        env_cls = PolicyEvalUtils.KitchenTaskEnv
+    env_fn = partial(
+        env_cls,
+        camera_height=args.camera_height,
+        camera_width=args.camera_width,
+        step_lim=args.step_lim,
+    )
+    model = policy.get_model(usr_args)
+
+    def log_fn(result):
+        color = "green" if result["success"] else "red"
+        print(
+            colored(
+                "{env_name} layout {layout_id} style {style_id} seed {seed}: "
+                "success {success} in {steps} steps".format(**result),
+                color,
+            )
+        )
+
+    results, stats = PolicyEvalUtils.evaluate_policy(
+        policy,
+        model,
+        env_fn,
+        episodes,
+        num_envs=args.num_envs,
+        batch=False if args.no_batch else None,
+        log_fn=log_fn,
+    )
+    summary = PolicyEvalUtils.summarize_results(results)
+
+    for (env_name, layout_id, style_id), info in summary.items():
+        print(
+            "{} layout {} style {}: success rate {:.2f} over {} episodes, "
+            "{:.1f} steps, env {:.2f}s, policy {:.2f}s per episode".format(
+                env_name,
+                layout_id,
+                style_id,
+                info["success_rate"],
+                info["num_episodes"],
+                info["steps"],
+                info["env_time"],
+                info["policy_time"],
+            )
+        )
+    print(
+        colored(
+            "success rate {success_rate:.2f}, {num_policy_calls} policy calls, "
+            "{steps_per_sec:.1f} steps/s".format(**stats),
+            "yellow",
+        )
+    )
+
+    if args.output is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(
+                dict(
+                    stats=stats,
+                    summary=[
+                        dict(
+                            env_name=scene[0],
+                            layout_id=scene[1],
+                            style_id=scene[2],
+                            **info,
+                        )
+                        for scene, info in summary.items()
+                    ],
+                    episodes=results,
+                ),
+                f,
+                indent=4,
+            )
+        print(colored("Saved results to {}".format(args.output), "green"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--policy", type=str, default=None, help="policy directory under policy/"
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        default=None,
+        help="usr_args of the policy, defaults to policy/<policy>/deploy_policy.yml",
+    )
+    parser.add_argument(
+        "--dummy",
+        action="store_true",
+        help="use the dummy policy and dummy envs (CPU only)",
+    )
+    parser.add_argument("--envs", type=str, nargs="+", required=True)
+    parser.add_argument(
+        "--layout_and_style_ids",
+        type=int,
+        nargs="+",
+        default=None,
+        help="flat list of layout and style id pairs, e.g. 1 1 2 2",
+    )
+    parser.add_argument("--num_episodes", type=int, default=10)
+    parser.add_argument("--num_envs", type=int, default=4)
+    parser.add_argument(
+        "--no_batch",
+        action="store_true",
+        help="run the policy through its eval() even if it supports batching",
+    )
+    parser.add_argument("--step_lim", type=int, default=500)
+    parser.add_argument("--camera_height", type=int, default=240)
+    parser.add_argument("--camera_width", type=int, default=320)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    if not args.dummy:
+        assert args.policy is not None, "--policy is required without --dummy"
+        if args.config is None:
+            args.config = os.path.join(POLICY_ROOT, args.policy, "deploy_policy.yml")
+    main(args)
@@ -0,0 +1,542 @@
+"""
+Storage options for hdf5 dataset writers.
+
+All dataset writers (demo collection, states-to-obs extraction, post-processing) go
+through @create_dataset with a @StorageOptions instance, which picks a compression
+codec and chunk shape for each dataset key.
+
+Codecs are given as short spec strings:
+
+    "none"                      no compression
+    "gzip" / "gzip:<level>"     deflate, level 0-9 (default 4)
+    "lzf"                       fast lzf filter shipped with h5py
+    "blosc" / "blosc:<cname>:<clevel>"
+                                blosc (via hdf5plugin), cname in blosclz, lz4, lz4hc,
+                                zlib, zstd (default lz4:5, byte shuffle)
+    "zstd" / "zstd:<level>"     zstd (via hdf5plugin, default level 3)
+
+Image streams of shape [T, H, W, C] can also be encoded instead of stored as raw
+frame stacks:
+
+    "jpeg" / "jpeg:<quality>"   per-frame JPEG bytes (lossy, default quality 95)
+    "png" / "png:<level>"       per-frame PNG bytes (lossless for uint8 and uint16 frames,
+                                meant for masks and depth). Float frames, such as the
+                                normalized depth maps of robosuite, must lie in [0, 1]
+                                and are quantized to 16 bit fixed point (error at most
+                                1 / (2 * @PNG_FLOAT_SCALE)), then decoded back to floats
+    "video" / "video:<codec>:<crf>:<segment_len>"
+                                in-file video blobs (via PyAV, default h264:18:16). Frames
+                                are split into independently decodable segments of
+                                @segment_len frames, so a window only decodes the
+                                segments it overlaps.
+
+Encoded streams are stored as variable-length uint8 datasets with one entry per frame
+(or per segment) and an "encoding" attribute. Use @read_frames (or
+robomimic_dataset_utils.read_obs_window) to decode a window of frames.
+
+Per-key codecs are given as "<pattern>=<codec>" where pattern is a glob over the
+dataset path inside a demo group, e.g. "obs/*_image=blosc:zstd:5", "obs/*_image=jpeg:90"
+or "actions=none".
+
+From the command line (@add_storage_args), --compression applies to every dataset,
+unless the script also registers --low_dim_compression (as states-to-obs extraction
+does). Then --compression only applies to observation datasets (@OBS_KEYS), and
+low-dim datasets such as actions, states, rewards, dones and action_dict, which are
+small and read in full, use --low_dim_compression (default "none").
+
+Chunks span @chunk_len consecutive timesteps (and the full extent of every other
+axis), so that reading a training window of that many steps touches a single chunk.
+"""
+import io
+import fnmatch
+
+import h5py
+import numpy as np
+
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
+try:
+    import av
+except ImportError:
+    av = None
+
+CODECS = ("none", "gzip", "lzf", "blosc", "zstd")
+# dataset paths that --compression applies to, everything else is low-dim
+OBS_KEYS = ("obs/*", "next_obs/*")
+IMAGE_ENCODINGS = ("jpeg", "png", "video")
+
+# float frames are stored in png as uint16 fixed point with this scale
+PNG_FLOAT_SCALE = 65535
+
+# keep chunks below the 1MB default size of the hdf5 chunk cache
+MAX_CHUNK_BYTES = 1 << 20
+
+
+def parse_codec(spec):
+    """
+    Parses a codec spec string into h5py create_dataset keyword arguments.
+
+    Args:
+        spec (str): codec spec, see module docstring
+
+    Returns:
+        kwargs (dict): compression keyword arguments for h5py create_dataset
+    """
+    if spec is None:
+        return dict()
+    parts = spec.lower().split(":")
+    name, params = parts[0], parts[1:]
+    if name in IMAGE_ENCODINGS:
+        # encoded image streams are stored as opaque bytes, without hdf5 filters
+        parse_image_encoding(spec)
+        return dict()
+    if name not in CODECS:
+        raise ValueError(
+            "Unknown codec {}. Must be one of {}".format(
+                spec, ", ".join(CODECS + IMAGE_ENCODINGS)
+            )
+        )
+
+    if name == "none":
+        return dict()
+    if name == "gzip":
+        level = int(params[0]) if len(params) > 0 else 4
+        return dict(compression="gzip", compression_opts=level)
+    if name == "lzf":
+        return dict(compression="lzf")
+
+    if hdf5plugin is None:
+        raise ImportError(
+            "Codec {} requires hdf5plugin. Install with: pip install hdf5plugin".format(
+                spec
+            )
+        )
+    if name == "blosc":
+        cname = params[0] if len(params) > 0 else "lz4"
+        clevel = int(params[1]) if len(params) > 1 else 5
+        return dict(
+            hdf5plugin.Blosc(
+                cname=cname, clevel=clevel, shuffle=hdf5plugin.Blosc.SHUFFLE
+            )
+        )
+    # zstd
+    clevel = int(params[0]) if len(params) > 0 else 3
+    return dict(hdf5plugin.Zstd(clevel=clevel))
+
+
+def parse_image_encoding(spec):
+    """
+    Parses an image encoding spec string.
+
+    Args:
+        spec (str): image encoding spec, see module docstring
+
+    Returns:
+        encoding (dict): encoding name and parameters, or None if @spec is not an
+            image encoding
+    """
+    if spec is None:
+        return None
+    parts = spec.lower().split(":")
+    name, params = parts[0], parts[1:]
+    if name == "jpeg":
+        return dict(name=name, quality=int(params[0]) if len(params) > 0 else 95)
+    if name == "png":
+        return dict(name=name, level=int(params[0]) if len(params) > 0 else 3)
+    if name == "video":
+        if av is None:
+            raise ImportError(
+                "Image encoding {} requires PyAV. Install with: pip install av".format(
+                    spec
+                )
+            )
+        return dict(
+            name=name,
+            codec=params[0] if len(params) > 0 else "h264",
+            crf=int(params[1]) if len(params) > 1 else 18,
+            segment_len=int(params[2]) if len(params) > 2 else 16,
+        )
+    return None
+
+
+def _encode_image(frame, encoding):
+    """
+    Encodes a single [H, W, C] frame to JPEG or PNG bytes.
+    """
+    import cv2
+
+    if frame.shape[-1] == 3:
+        # cv2 expects BGR
+        frame = frame[..., ::-1]
+    if encoding["name"] == "jpeg":
+        params = [cv2.IMWRITE_JPEG_QUALITY, encoding["quality"]]
+        ok, buf = cv2.imencode(".jpg", frame, params)
+    else:
+        params = [cv2.IMWRITE_PNG_COMPRESSION, encoding["level"]]
+        ok, buf = cv2.imencode(".png", frame, params)
+    assert ok, "failed to encode frame with {}".format(encoding["name"])
+    return buf.reshape(-1)
+
+
+def _decode_image(buf, frame_shape, dtype):
+    """
+    Decodes JPEG or PNG bytes into a [H, W, C] frame.
+    """
+    import cv2
+
+    frame = cv2.imdecode(np.asarray(buf), cv2.IMREAD_UNCHANGED)
+    if frame_shape[-1] == 3:
+        frame = frame[..., ::-1]
+    return frame.reshape(frame_shape).astype(dtype, copy=False)
+
+
+def _encode_video_segment(frames, encoding, fps=20):
+    """
+    Encodes [N, H, W, 3] uint8 frames into an in-memory mp4 blob.
+    """
+    buf = io.BytesIO()
+    with av.open(buf, mode="w", format="mp4") as container:
+        stream = container.add_stream(encoding["codec"], rate=fps)
+        stream.width = frames.shape[2]
+        stream.height = frames.shape[1]
+        stream.pix_fmt = "yuv420p"
+        stream.options = dict(crf=str(encoding["crf"]))
+        for frame in frames:
+            packet = stream.encode(av.VideoFrame.from_ndarray(frame, format="rgb24"))
+            container.mux(packet)
+        container.mux(stream.encode())
+    return np.frombuffer(buf.getvalue(), dtype=np.uint8)
+
+
+def _decode_video_segment(blob):
+    """
+    Decodes an mp4 blob written by @_encode_video_segment into [N, H, W, 3] frames.
+    """
+    with av.open(io.BytesIO(np.asarray(blob).tobytes()), mode="r") as container:
+        frames = [f.to_ndarray(format="rgb24") for f in container.decode(video=0)]
+    return np.stack(frames)
+
+
+def encode_frames(frames, spec):
+    """
+    Encodes an image stream with the image encoding @spec.
+
+    Args:
+        frames (np.array): frames of shape [T, H, W, C]
+        spec (str): image encoding spec, see module docstring
+
+    Returns:
+        entries ([np.array]): encoded bytes for each frame (or each video segment)
+        attrs (dict): attributes needed to decode the entries
+    """
+    encoding = parse_image_encoding(spec)
+    assert encoding is not None, "{} is not an image encoding".format(spec)
+    frames = np.asarray(frames)
+    if frames.ndim == 3:
+        frames = frames[..., None]
+    if frames.ndim != 4 or frames.shape[-1] not in (1, 3, 4):
+        raise ValueError(
+            "Image encoding {} expects frames of shape [T, H, W, C] with 1, 3 or 4 "
+            "channels, got {}".format(spec, frames.shape)
+        )
+
+    attrs = dict(
+        encoding=encoding["name"],
+        num_frames=frames.shape[0],
+        frame_shape=frames.shape[1:],
+        dtype=frames.dtype.str,
+    )
+    if encoding["name"] == "jpeg":
+        if frames.dtype != np.uint8 or frames.shape[-1] == 4:
+            raise ValueError("jpeg encoding requires uint8 frames with 1 or 3 channels")
+        entries = [_encode_image(frame, encoding) for frame in frames]
+    elif encoding["name"] == "png":
+        if np.issubdtype(frames.dtype, np.floating):
+            if frames.size > 0 and not (
+                np.all(np.isfinite(frames)) and frames.min() >= 0 and frames.max() <= 1
+            ):
+                raise ValueError(
+                    "png encoding quantizes float frames to 16 bit in [0, 1], but the "
+                    "frames span [{}, {}]. Store them with a lossless codec such as "
+                    "gzip instead".format(frames.min(), frames.max())
+                )
+            frames = np.round(frames * PNG_FLOAT_SCALE).astype(np.uint16)
+            attrs["scale"] = PNG_FLOAT_SCALE
+        elif frames.dtype not in (np.uint8, np.uint16):
+            raise ValueError(
+                "png encoding requires uint8, uint16 or float frames, got {}. Store "
+                "other dtypes with a lossless codec such as gzip instead".format(
+                    frames.dtype
+                )
+            )
+        entries = [_encode_image(frame, encoding) for frame in frames]
+    else:
+        if frames.dtype != np.uint8 or frames.shape[-1] != 3:
+            raise ValueError("video encoding requires uint8 frames with 3 channels")
+        if frames.shape[1] % 2 != 0 or frames.shape[2] % 2 != 0:
+            raise ValueError("video encoding requires even frame height and width")
+        seg = encoding["segment_len"]
+        entries = [
+            _encode_video_segment(frames[i : i + seg], encoding)
+            for i in range(0, frames.shape[0], seg)
+        ]
+        attrs["segment_len"] = seg
+    return entries, attrs
+
+
+def write_encoded_frames(grp, key, frames, spec):
+    """
+    Encodes @frames with image encoding @spec and writes them to @grp[@key].
+
+    Returns:
+        dataset (h5py.Dataset): created dataset
+    """
+    entries, attrs = encode_frames(frames, spec)
+    ds = grp.create_dataset(
+        key, shape=(len(entries),), dtype=h5py.vlen_dtype(np.dtype(np.uint8))
+    )
+    for i, entry in enumerate(entries):
+        ds[i] = entry
+    for k, v in attrs.items():
+        ds.attrs[k] = v
+    return ds
+
+
+def is_encoded(ds):
+    """
+    Returns True if hdf5 dataset @ds holds an encoded image stream.
+    """
+    return "encoding" in ds.attrs
+
+
+def get_num_frames(ds):
+    """
+    Returns the number of frames in hdf5 dataset @ds, encoded or not.
+    """
+    if is_encoded(ds):
+        return int(ds.attrs["num_frames"])
+    return ds.shape[0]
+
+
+def read_frames(ds, start=0, end=None):
+    """
+    Reads frames [@start, @end) from hdf5 dataset @ds. Encoded image streams are
+    decoded, only touching the frames (or video segments) that overlap the window.
+    Raw datasets are sliced directly.
+
+    Args:
+        ds (h5py.Dataset): dataset to read from
+        start (int): first frame
+        end (int): end frame (exclusive). If None, read until the last frame.
+
+    Returns:
+        frames (np.array): frames of shape [end - start, H, W, C]
+    """
+    if not is_encoded(ds):
+        return ds[start:end]
+
+    num_frames = int(ds.attrs["num_frames"])
+    end = num_frames if end is None else min(end, num_frames)
+    frame_shape = tuple(ds.attrs["frame_shape"])
+    dtype = np.dtype(ds.attrs["dtype"])
+    if end <= start:
+        return np.zeros((0,) + frame_shape, dtype=dtype)
+
+    if ds.attrs["encoding"] == "video":
+        seg = int(ds.attrs["segment_len"])
+        first_seg, last_seg = start // seg, (end - 1) // seg
+        frames = np.concatenate(
+            [_decode_video_segment(blob) for blob in ds[first_seg : last_seg + 1]]
+        )
+        offset = start - first_seg * seg
+        return frames[offset : offset + end - start].reshape((-1,) + frame_shape)
+
+    out = np.empty((end - start,) + frame_shape, dtype=dtype)
+    for i, buf in enumerate(ds[start:end]):
+        out[i] = _decode_image(buf, frame_shape, dtype)
+    if "scale" in ds.attrs:
+        # float frames quantized by png
+        out /= ds.attrs["scale"]
+    return out
+
+
+class StorageOptions:
+    """
+    Chooses codec and chunk shape for every dataset written to an hdf5 file.
+    """
+
+    def __init__(self, default="none", per_key=None, chunk_len=None):
+        """
+        Args:
+            default (str): codec spec used for keys that match no pattern in @per_key
+
+            per_key (dict or [str]): maps dataset path patterns to codec specs. Can also
+                be given as a list of "<pattern>=<codec>" strings. Patterns are matched
+                in order, first match wins.
+
+            chunk_len (int): number of timesteps per chunk. If None, h5py picks the
+                chunk shape (only for compressed datasets).
+        """
+        if per_key is None:
+            per_key = dict()
+        elif not isinstance(per_key, dict):
+            per_key = dict(self.parse_key_spec(s) for s in per_key)
+        self.default = default
+        self.per_key = per_key
+        self.chunk_len = chunk_len
+
+        # validate codecs early, so that bad specs fail before any data is written
+        for spec in [default] + list(per_key.values()):
+            parse_codec(spec)
+
+    @staticmethod
+    def parse_key_spec(spec):
+        """
+        Splits a "<pattern>=<codec>" string into (pattern, codec).
+        """
+        if "=" not in spec:
+            raise ValueError(
+                "Per-key codec {} must be of the form <pattern>=<codec>".format(spec)
+            )
+        pattern, codec = spec.rsplit("=", 1)
+        return pattern, codec
+
+    def get_codec(self, key):
+        """
+        Returns the codec spec used for dataset path @key.
+        """
+        for pattern, codec in self.per_key.items():
+            if fnmatch.fnmatchcase(key, pattern):
+                return codec
+        return self.default
+
+    def get_chunks(self, shape, dtype):
+        """
+        Returns the chunk shape for a dataset of shape @shape, or None to let h5py decide.
+        """
+        if self.chunk_len is None or len(shape) == 0 or shape[0] == 0:
+            return None
+        row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * np.dtype(dtype).itemsize
+        max_len = max(1, MAX_CHUNK_BYTES // max(row_bytes, 1))
+        chunk_len = max(1, min(self.chunk_len, shape[0], max_len))
+        return (chunk_len,) + tuple(shape[1:])
+
+    def get_kwargs(self, key, shape, dtype):
+        """
+        Returns h5py create_dataset keyword arguments for dataset path @key.
+
+        Args:
+            key (str): dataset path relative to the demo group, e.g. "obs/robot0_eef_pos"
+            shape (tuple): dataset shape
+            dtype (np.dtype): dataset dtype
+
+        Returns:
+            kwargs (dict): keyword arguments for h5py create_dataset
+        """
+        kwargs = parse_codec(self.get_codec(key))
+        # scalar datasets cannot be chunked or filtered
+        if len(shape) == 0:
+            return dict()
+        chunks = self.get_chunks(shape, dtype)
+        if chunks is not None:
+            kwargs["chunks"] = chunks
+        # byte shuffling makes multi-byte values (floats) much more compressible
+        if (
+            kwargs.get("compression") in ("gzip", "lzf")
+            and np.dtype(dtype).itemsize > 1
+        ):
+            kwargs["shuffle"] = True
+        return kwargs
+
+    def __repr__(self):
+        return "StorageOptions(default={}, per_key={}, chunk_len={})".format(
+            self.default, self.per_key, self.chunk_len
+        )
+
+
+def create_dataset(grp, key, data, storage=None):
+    """
+    Writes @data to @grp[@key] using the codec and chunking chosen by @storage.
+
+    Args:
+        grp (h5py.Group): group to write to, usually a demo group
+        key (str): dataset path relative to @grp
+        data (np.array): data to write
+        storage (StorageOptions): storage options. If None, data is written uncompressed.
+
+    Returns:
+        dataset (h5py.Dataset): created dataset
+    """
+    data = np.asarray(data)
+    if storage is None:
+        return grp.create_dataset(key, data=data)
+    codec = storage.get_codec(key)
+    if parse_image_encoding(codec) is not None:
+        return write_encoded_frames(grp, key, data, codec)
+    return grp.create_dataset(
+        key, data=data, **storage.get_kwargs(key, data.shape, data.dtype)
+    )
+
+
+def add_storage_args(parser, default_codec="none", default_low_dim_codec=None):
+    """
+    Adds command line arguments for storage options to an argparse parser.
+
+    Args:
+        parser (argparse.ArgumentParser): parser to add the arguments to
+        default_codec (str): default of --compression
+        default_low_dim_codec (str): if not None, also adds --low_dim_compression with
+            this default, and --compression only applies to observation datasets
+    """
+    parser.add_argument(
+        "--compression",
+        type=str,
+        default=default_codec,
+        help="(optional) codec for {} datasets: none, gzip[:level], lzf, blosc[:cname:clevel] or zstd[:level]. Image streams can also use jpeg[:quality], png[:level] or video[:codec:crf:segment_len]".format(
+            "all" if default_low_dim_codec is None else "observation"
+        ),
+    )
+    if default_low_dim_codec is not None:
+        parser.add_argument(
+            "--low_dim_compression",
+            type=str,
+            default=default_low_dim_codec,
+            help="(optional) codec for all other datasets (actions, states, rewards, dones, action_dict)",
+        )
+    parser.add_argument(
+        "--compression_keys",
+        type=str,
+        nargs="*",
+        default=[],
+        help="(optional) per-key codecs as <pattern>=<codec>, e.g. obs/*_image=jpeg:90 obs/*_depth=png actions=none",
+    )
+    parser.add_argument(
+        "--chunk_len",
+        type=int,
+        default=None,
+        help="(optional) number of timesteps per hdf5 chunk, ideally the training window length",
+    )
+
+
+def get_storage_options_from_args(args):
+    """
+    Builds StorageOptions from arguments added by @add_storage_args. Patterns from
+    --compression_keys take precedence over the observation and low-dim codecs.
+    """
+    if getattr(args, "low_dim_compression", None) is None:
+        return StorageOptions(
+            default=args.compression,
+            per_key=args.compression_keys,
+            chunk_len=args.chunk_len,
+        )
+    per_key = dict(StorageOptions.parse_key_spec(s) for s in args.compression_keys)
+    for pattern in OBS_KEYS:
+        per_key.setdefault(pattern, args.compression)
+    return StorageOptions(
+        default=args.low_dim_compression,
+        per_key=per_key,
+        chunk_len=args.chunk_len,
+    )
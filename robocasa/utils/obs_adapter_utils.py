@@ -0,0 +1,260 @@
+"""
+Declarative observation adapters between robocasa observables and policy inputs.
+
+An adapter is built once per policy from a spec that maps each output key to a
+short field expression:
+
+    "<source> + <source>[<index>] + ... | <op> | <op> ..."
+
+Sources are observation keys, concatenated along the last axis. Nested dicts (and
+h5py groups) are addressed with "/", e.g. "observation/head_camera/rgb". An index in
+brackets selects entries of the last axis: "[0]", "[:1]" or "[4:12]".
+
+Ops, in any order (images are resized, then flipped, then transposed):
+
+    "flip"                  flip images vertically (robosuite renders upside down)
+    "chw"                   move the channel axis of images to the front
+    "resize:<h>x<w>"        resize images (via cv2)
+    "uint8" / "float32" / "float64" / ...
+                            output dtype
+    "/<x>" / "*<x>"         divide or multiply by a constant, e.g. "/255"
+
+Each field is computed in one pass over its source, into an output buffer that is
+allocated on the first call and reused afterwards. Flips and transposes are views,
+so the frame is only read once. A field with a single source and no ops is passed
+through as is, without a copy. Output keys with "/" produce nested dicts.
+
+Since buffers are reused, the arrays returned by a call are overwritten by the next
+call. Policies that keep a window of past observations can ask for @num_buffers
+buffers per field, used in turn. Sources may have leading batch or time dimensions,
+so the same adapter also converts whole episodes for training data.
+
+Example:
+    adapter = ObsAdapter(DP_OBS_SPEC, num_buffers=n_obs_steps + 1)
+    observation = adapter(env_obs)
+"""
+import re
+
+import numpy as np
+
+# robocasa observables -> RoboTwin observation dict (as returned by TASK_ENV.get_obs)
+ROBOTWIN_OBS_SPEC = {
+    "observation/head_camera/rgb": "robot0_agentview_left_image | flip",
+    "observation/left_camera/rgb": "robot0_eye_in_hand_image | flip",
+    "observation/right_camera/rgb": "robot0_agentview_right_image | flip",
+    "joint_action/vector": "robot0_joint_pos + robot0_gripper_qpos[:1]",
+}
+
+# robocasa observables -> DP (root deploy_policy.py)
+DP_OBS_SPEC = {
+    "left_cam": "robot0_agentview_left_image | flip | chw | float64 | /255",
+    "agent_pos": "robot0_joint_pos + robot0_gripper_qpos[:1]",
+}
+
+# robocasa observables -> LeRobot state (convert_to_lerobot.py)
+LEROBOT_STATE_SPEC = {
+    "observation.state": "robot0_joint_pos + robot0_gripper_qpos[:1] | float32",
+}
+
+# RoboTwin observation dict -> ACT cameras (policy/ACT)
+ACT_CAMERA_SPEC = {
+    "head_cam": "observation/head_camera/rgb | chw | float32 | /255",
+    "left_cam": "observation/left_camera/rgb | chw | float32 | /255",
+    "right_cam": "observation/right_camera/rgb | chw | float32 | /255",
+}
+
+_SOURCE_RE = re.compile(r"^([^\[\]]+?)(?:\[([-\d:]*)\])?$")
+
+
+def parse_index(index):
+    """
+    Parses the index of a source, e.g. "0", ":1" or "4:12", into a slice. Integer
+    indices become length-1 slices so that the last axis is kept for concatenation.
+    """
+    if index is None:
+        return None
+    if ":" not in index:
+        i = int(index)
+        return slice(i, i + 1 if i != -1 else None)
+    parts = [int(p) if p != "" else None for p in index.split(":")]
+    return slice(*parts)
+
+
+def parse_field(expr):
+    """
+    Parses a field expression (see module docstring).
+
+    Returns:
+        sources ([(str, slice)]): source keys and indices
+        ops (dict): flip, chw, size, dtype and scale (as an (op, value) pair)
+    """
+    parts = [p.strip() for p in expr.split("|")]
+    sources = []
+    for source in parts[0].split("+"):
+        match = _SOURCE_RE.match(source.strip())
+        if match is None:
+            raise ValueError("Invalid source {} in field {}".format(source, expr))
+        sources.append((match.group(1).strip(), parse_index(match.group(2))))
+
+    ops = dict(flip=False, chw=False, size=None, dtype=None, scale=None)
+    for op in parts[1:]:
+        if op == "flip":
+            ops["flip"] = True
+        elif op == "chw":
+            ops["chw"] = True
+        elif op.startswith("resize:"):
+            h, w = op[len("resize:") :].split("x")
+            ops["size"] = (int(h), int(w))
+        elif op[0] in "/*":
+            ops["scale"] = (op[0], float(op[1:]))
+        else:
+            try:
+                ops["dtype"] = np.dtype(op)
+            except TypeError:
+                raise ValueError("Unknown op {} in field {}".format(op, expr))
+    is_image = ops["flip"] or ops["chw"] or ops["size"] is not None
+    if is_image and len(sources) > 1:
+        raise ValueError("Image ops need a single source in field {}".format(expr))
+    return sources, ops
+
+
+def lookup(obs, key):
+    """
+    Returns obs[key], walking nested dicts for keys with "/".
+    """
+    try:
+        return obs[key]
+    except KeyError:
+        if "/" not in key:
+            raise
+    value = obs
+    for part in key.split("/"):
+        value = value[part]
+    return value
+
+
+class _Field:
+    def __init__(self, expr, num_buffers):
+        self.expr = expr
+        self.sources, self.ops = parse_field(expr)
+        self.num_buffers = num_buffers
+        self.passthrough = len(self.sources) == 1 and not any(
+            v not in (False, None) for v in self.ops.values()
+        )
+        self._buffers = []
+        self._resized = None
+        self._next = 0
+
+    def _buffer(self, shape, dtype):
+        if len(self._buffers) == 0 or self._buffers[0].shape != shape:
+            self._buffers = [
+                np.empty(shape, dtype=dtype) for _ in range(self.num_buffers)
+            ]
+            self._next = 0
+        buf = self._buffers[self._next]
+        self._next = (self._next + 1) % self.num_buffers
+        return buf
+
+    def _resize(self, image):
+        import cv2
+
+        h, w = self.ops["size"]
+        shape = image.shape[:-3] + (h, w, image.shape[-1])
+        if self._resized is None or self._resized.shape != shape:
+            self._resized = np.empty(shape, dtype=image.dtype)
+        image = np.ascontiguousarray(image)
+        for idx in np.ndindex(*image.shape[:-3]):
+            dst = self._resized[idx]
+            if dst.shape[-1] == 1:
+                # cv2 works on single channel images without the channel axis
+                dst = dst[..., 0]
+            cv2.resize(image[idx], (w, h), dst=dst)
+        return self._resized
+
+    def __call__(self, obs):
+        parts = []
+        for key, index in self.sources:
+            value = np.asarray(lookup(obs, key))
+            parts.append(value if index is None else value[..., index])
+        if self.passthrough:
+            return parts[0]
+
+        ops = self.ops
+        dtype = ops["dtype"] if ops["dtype"] is not None else parts[0].dtype
+        if len(parts) > 1:
+            shape = parts[0].shape[:-1] + (sum(p.shape[-1] for p in parts),)
+            if ops["dtype"] is None:
+                dtype = np.result_type(*parts)
+            buf = self._buffer(shape, dtype)
+            np.concatenate(parts, axis=-1, out=buf, casting="unsafe")
+            if ops["scale"] is not None:
+                self._scale(buf, buf)
+            return buf
+
+        view = parts[0]
+        if ops["size"] is not None:
+            view = self._resize(view)
+        if ops["flip"]:
+            view = view[..., ::-1, :, :]
+        if ops["chw"]:
+            view = np.moveaxis(view, -1, -3)
+        buf = self._buffer(view.shape, dtype)
+        if ops["scale"] is not None:
+            self._scale(view, buf)
+        else:
+            np.copyto(buf, view, casting="unsafe")
+        return buf
+
+    def _scale(self, src, out):
+        op, value = self.ops["scale"]
+        ufunc = np.divide if op == "/" else np.multiply
+        ufunc(src, value, out=out, dtype=out.dtype, casting="unsafe")
+
+
+class ObsAdapter:
+    """
+    Maps observations to the keys, layout and dtype expected by a policy, following a
+    spec of field expressions (see module docstring).
+    """
+
+    def __init__(self, spec, num_buffers=1):
+        """
+        Args:
+            spec (dict): output key -> field expression
+            num_buffers (int): number of output buffers per field, used in turn. The
+                arrays returned by a call stay valid for the next @num_buffers - 1
+                calls.
+        """
+        assert num_buffers >= 1
+        self.spec = dict(spec)
+        self.fields = {k: _Field(expr, num_buffers) for k, expr in self.spec.items()}
+
+    @property
+    def sources(self):
+        """
+        Source keys read by the adapter, e.g. to only load those from a dataset.
+        """
+        keys = []
+        for field in self.fields.values():
+            for key, _ in field.sources:
+                if key not in keys:
+                    keys.append(key)
+        return keys
+
+    def __call__(self, obs):
+        """
+        Args:
+            obs (dict): observation (nested dicts and h5py groups are supported)
+
+        Returns:
+            out (dict): policy observation, nested for output keys with "/"
+        """
+        out = dict()
+        for key, field in self.fields.items():
+            value = field(obs)
+            node = out
+            parts = key.split("/")
+            for part in parts[:-1]:
+                node = node.setdefault(part, dict())
+            node[parts[-1]] = value
+        return out
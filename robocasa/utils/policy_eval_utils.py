@@ -0,0 +1,576 @@
+"""
+Vectorized evaluation of RoboTwin-style policies on robocasa kitchen envs.
+
+The policies under policy/ expose get_model(usr_args), eval(TASK_ENV, model,
+observation) and reset_model(model). Here every env runs in its own worker process.
+A policy can declare batch support by also exposing
+
+    get_actions(model, observations, instructions) -> [action chunk per observation]
+
+In that case the observations of all running envs go to the policy in a single
+call per step. The action chunks are then sent back to their workers, which execute
+them in parallel. When an episode ends, its worker starts the next pending episode
+and the other envs keep going. A batch policy must not keep per-env state between
+calls. Policies without get_actions are run one episode at a time through their own
+eval(), with a proxy TASK_ENV that forwards to a worker.
+
+Success, episode length and timing are recorded per episode, and summarized per
+(task, layout, style).
+"""
+import os
+import time
+import traceback
+import multiprocessing as mp
+from collections import OrderedDict
+
+import numpy as np
+
+from robocasa.utils.obs_adapter_utils import ObsAdapter, ROBOTWIN_OBS_SPEC
+
+ROBOTWIN_CAMERAS = ("head_camera", "left_camera", "right_camera")
+
+
+class KitchenTaskEnv:
+    """
+    RoboTwin-style TASK_ENV on top of a robocasa kitchen env, with joint position
+    control of the PandaOmron arm. Observations are built from the robocasa
+    observables by an ObsAdapter, by default into the RoboTwin layout with images in
+    "observation/<camera>/rgb" and the arm joints plus the gripper in
+    "joint_action/vector". The cameras to render are the "<camera>_image" sources of
+    the spec.
+    """
+
+    def __init__(
+        self,
+        env_name,
+        layout_id=None,
+        style_id=None,
+        obs_spec=ROBOTWIN_OBS_SPEC,
+        camera_height=240,
+        camera_width=320,
+        step_lim=500,
+        robots="PandaOmron",
+        controller=None,
+        num_obs_buffers=1,
+    ):
+        """
+        Args:
+            env_name (str): robocasa task name
+            layout_id (int): kitchen layout, None for any
+            style_id (int): kitchen style, None for any
+            obs_spec (dict): ObsAdapter spec from robocasa observables to the
+                observations returned by get_obs
+            camera_height (int): height of rendered images
+            camera_width (int): width of rendered images
+            step_lim (int): maximum number of actions per episode
+            robots (str): robot to use
+            controller (str): controller config, defaults to PandaOmron joint position
+                control
+            num_obs_buffers (int): number of get_obs results that stay valid, for
+                callers that keep past observations without copying them
+        """
+        import robosuite
+        from robosuite.controllers import load_composite_controller_config
+
+        if controller is None:
+            controller = os.path.join(
+                os.path.dirname(robosuite.__file__),
+                "controllers/config/robots/default_pandaomron_qpos.json",
+            )
+        self.obs_adapter = ObsAdapter(obs_spec, num_buffers=num_obs_buffers)
+        camera_names = [
+            key[: -len("_image")]
+            for key in self.obs_adapter.sources
+            if key.endswith("_image")
+        ]
+        self.step_lim = step_lim
+        self.env = robosuite.make(
+            env_name=env_name,
+            robots=robots,
+            controller_configs=load_composite_controller_config(controller=controller),
+            camera_names=camera_names,
+            camera_heights=camera_height,
+            camera_widths=camera_width,
+            has_renderer=False,
+            has_offscreen_renderer=True,
+            ignore_done=True,
+            use_object_obs=False,
+            use_camera_obs=True,
+            camera_depths=False,
+            layout_ids=layout_id,
+            style_ids=style_id,
+            translucent_robot=False,
+        )
+        self._obs = None
+        self.take_action_cnt = 0
+        self.eval_success = False
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.env.rng = np.random.default_rng(seed)
+        self._obs = self.env.reset()
+        self.take_action_cnt = 0
+        self.eval_success = False
+
+    def get_obs(self):
+        return self.obs_adapter(self._obs)
+
+    def get_instruction(self):
+        return self.env.get_ep_meta().get("lang", "")
+
+    def take_action(self, action):
+        if self.take_action_cnt >= self.step_lim or self.eval_success:
+            return
+        action_dict = dict(right=action[:7], right_gripper=action[7:8])
+        self._obs, _, _, _ = self.env.step(
+            self.env.robots[0].create_action_vector(action_dict)
+        )
+        self.take_action_cnt += 1
+        self.eval_success = bool(self.env._check_success())
+
+    def close(self):
+        self.env.close()
+
+
+class DummyTaskEnv:
+    """
+    CPU-only stand-in for KitchenTaskEnv. The env succeeds once the first action
+    entries add up to a target that depends on the seed, so runs are deterministic.
+    """
+
+    def __init__(
+        self,
+        env_name,
+        layout_id=None,
+        style_id=None,
+        cameras=ROBOTWIN_CAMERAS,
+        camera_height=32,
+        camera_width=32,
+        step_lim=50,
+        action_dim=8,
+    ):
+        self.env_name = env_name
+        self.cameras = cameras
+        self.image_shape = (camera_height, camera_width, 3)
+        self.step_lim = step_lim
+        self.action_dim = action_dim
+        self.take_action_cnt = 0
+        self.eval_success = False
+
+    def reset(self, seed=None):
+        self.target = 5 + (0 if seed is None else seed % 20)
+        self.progress = 0.0
+        self.take_action_cnt = 0
+        self.eval_success = False
+
+    def get_obs(self):
+        value = min(int(self.progress), 255)
+        return dict(
+            observation={
+                name: dict(rgb=np.full(self.image_shape, value, dtype=np.uint8))
+                for name in self.cameras
+            },
+            joint_action=dict(vector=np.full(self.action_dim, self.progress)),
+        )
+
+    def get_instruction(self):
+        return "complete {}".format(self.env_name)
+
+    def take_action(self, action):
+        if self.take_action_cnt >= self.step_lim or self.eval_success:
+            return
+        self.progress += float(action[0])
+        self.take_action_cnt += 1
+        self.eval_success = self.progress >= self.target
+
+    def close(self):
+        pass
+
+
+class DummyPolicy:
+    """
+    Policy with the RoboTwin interface and batch support that always returns chunks
+    of constant actions. Records the batch size of every get_actions call.
+    """
+
+    def __init__(self, chunk_size=4, action_dim=8, action_value=1.0):
+        self.chunk_size = chunk_size
+        self.action_dim = action_dim
+        self.action_value = action_value
+
+    def get_model(self, usr_args=None):
+        self.batch_sizes = []
+        return self
+
+    def get_actions(self, model, observations, instructions):
+        self.batch_sizes.append(len(observations))
+        return [self._chunk() for _ in observations]
+
+    def eval(self, TASK_ENV, model, observation):
+        for action in self._chunk():
+            TASK_ENV.take_action(action)
+            observation = TASK_ENV.get_obs()
+        return observation
+
+    def reset_model(self, model):
+        pass
+
+    def _chunk(self):
+        return np.full((self.chunk_size, self.action_dim), self.action_value)
+
+
+def get_scene(episode):
+    return (episode["env_name"], episode.get("layout_id"), episode.get("style_id"))
+
+
+def make_episodes(env_names, layout_and_style_ids, num_episodes, seed=0):
+    """
+    Lists the episodes to evaluate, sorted by scene so that workers can reuse their
+    env across consecutive episodes.
+
+    Args:
+        env_names ([str]): tasks
+        layout_and_style_ids ([(int, int)]): kitchen scenes, (None, None) for any
+        num_episodes (int): episodes per task and scene
+        seed (int): seed of the first episode
+
+    Returns:
+        episodes ([dict]): env_name, layout_id, style_id and seed of each episode
+    """
+    episodes = []
+    for env_name in env_names:
+        for layout_id, style_id in layout_and_style_ids:
+            for i in range(num_episodes):
+                episodes.append(
+                    dict(
+                        env_name=env_name,
+                        layout_id=layout_id,
+                        style_id=style_id,
+                        seed=seed + i,
+                    )
+                )
+    return episodes
+
+
+def _worker(conn, env_fn):
+    """
+    Worker process loop. Keeps one env per scene alive and answers the commands of
+    VecTaskEnv.
+    """
+    env, scene = None, None
+    try:
+        while True:
+            cmd, data = conn.recv()
+            start = time.perf_counter()
+            if cmd == "close":
+                break
+            if cmd == "start":
+                if get_scene(data) != scene:
+                    if env is not None:
+                        env.close()
+                    scene = get_scene(data)
+                    env = env_fn(*scene)
+                env.reset(seed=data.get("seed"))
+                result = dict(instruction=env.get_instruction())
+            elif cmd == "step":
+                for action in data:
+                    if env.eval_success or env.take_action_cnt >= env.step_lim:
+                        break
+                    env.take_action(action)
+                result = dict()
+            else:
+                raise ValueError("Unknown worker command: {}".format(cmd))
+            result.update(
+                obs=env.get_obs(),
+                done=env.eval_success or env.take_action_cnt >= env.step_lim,
+                success=env.eval_success,
+                steps=env.take_action_cnt,
+                env_time=time.perf_counter() - start,
+            )
+            conn.send(("ok", result))
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        if env is not None:
+            env.close()
+        conn.close()
+
+
+class VecTaskEnv:
+    """
+    Runs one task env per worker process. Commands are sent to all the selected
+    workers before waiting on any of them, so the envs step in parallel.
+    """
+
+    def __init__(self, env_fn, num_envs, start_method="spawn"):
+        """
+        Args:
+            env_fn (callable): picklable function mapping (env_name, layout_id,
+                style_id) to a task env, called inside the workers
+            num_envs (int): number of worker processes
+            start_method (str): multiprocessing start method. Rendering contexts do
+                not survive a fork, so spawn is the default.
+        """
+        ctx = mp.get_context(start_method)
+        self.conns = []
+        self.processes = []
+        for _ in range(num_envs):
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker, args=(child_conn, env_fn), daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self.conns.append(parent_conn)
+            self.processes.append(process)
+
+    @property
+    def num_envs(self):
+        return len(self.conns)
+
+    def call(self, cmd, data_per_env):
+        """
+        Sends @cmd to the workers in @data_per_env (env index -> data) and returns
+        their results in the same order.
+        """
+        for i, data in data_per_env.items():
+            self.conns[i].send((cmd, data))
+        results = OrderedDict()
+        for i in data_per_env:
+            status, result = self.conns[i].recv()
+            if status == "error":
+                raise RuntimeError("Env worker {} failed:\n{}".format(i, result))
+            results[i] = result
+        return results
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(("close", None))
+            except (BrokenPipeError, EOFError):
+                pass
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+
+class WorkerTaskEnv:
+    """
+    TASK_ENV proxy for one worker of a VecTaskEnv, for policies that run through their
+    own eval(). Every action is a round trip to the worker.
+    """
+
+    def __init__(self, vec_env, index, state):
+        self.vec_env = vec_env
+        self.index = index
+        self._update(state)
+        self.instruction = state["instruction"]
+        self.env_time = state["env_time"]
+
+    def _update(self, state):
+        self.obs = state["obs"]
+        self.done = state["done"]
+        self.eval_success = state["success"]
+        self.take_action_cnt = state["steps"]
+
+    def get_obs(self):
+        return self.obs
+
+    def get_instruction(self):
+        return self.instruction
+
+    def take_action(self, action):
+        if self.done:
+            return
+        state = self.vec_env.call("step", {self.index: [action]})[self.index]
+        self._update(state)
+        self.env_time += state["env_time"]
+
+
+def _episode_result(episode, state, env_time, policy_time, start):
+    result = dict(episode)
+    result.update(
+        success=bool(state["success"]),
+        steps=int(state["steps"]),
+        env_time=env_time,
+        policy_time=policy_time,
+        wall_time=time.perf_counter() - start,
+    )
+    return result
+
+
+def _run_batched(vec_env, policy, model, episodes, log_fn):
+    pending = list(episodes)
+    active = OrderedDict()
+    results = []
+    num_calls = 0
+
+    def start_episodes(indices):
+        starts = OrderedDict()
+        for i in indices:
+            if len(pending) > 0:
+                starts[i] = pending.pop(0)
+        for i, state in vec_env.call("start", starts).items():
+            active[i] = dict(
+                episode=starts[i],
+                state=state,
+                env_time=state["env_time"],
+                policy_time=0.0,
+                start=time.perf_counter(),
+            )
+
+    start_episodes(range(vec_env.num_envs))
+    while len(active) > 0:
+        indices = list(active)
+        observations = [active[i]["state"]["obs"] for i in indices]
+        instructions = [active[i]["state"]["instruction"] for i in indices]
+        policy_start = time.perf_counter()
+        chunks = policy.get_actions(model, observations, instructions)
+        policy_time = time.perf_counter() - policy_start
+        num_calls += 1
+        assert len(chunks) == len(indices), "get_actions must return one chunk per obs"
+
+        states = vec_env.call("step", dict(zip(indices, chunks)))
+        finished = []
+        for i, state in states.items():
+            run = active[i]
+            state["instruction"] = run["state"]["instruction"]
+            run["state"] = state
+            run["env_time"] += state["env_time"]
+            # the batched call is shared equally by the envs in the batch
+            run["policy_time"] += policy_time / len(indices)
+            if state["done"]:
+                result = _episode_result(
+                    run["episode"],
+                    state,
+                    run["env_time"],
+                    run["policy_time"],
+                    run["start"],
+                )
+                results.append(result)
+                log_fn(result)
+                del active[i]
+                finished.append(i)
+        if len(finished) > 0:
+            start_episodes(finished)
+    return results, num_calls
+
+
+def _run_serial(vec_env, policy, model, episodes, log_fn):
+    results = []
+    num_calls = 0
+    index = 0
+    for episode in episodes:
+        start = time.perf_counter()
+        state = vec_env.call("start", {index: episode})[index]
+        task_env = WorkerTaskEnv(vec_env, index, state)
+        policy.reset_model(model)
+        policy_time = 0.0
+        while not task_env.done:
+            env_time = task_env.env_time
+            eval_start = time.perf_counter()
+            policy.eval(task_env, model, task_env.get_obs())
+            # eval() interleaves inference and env steps, so take the env time out
+            policy_time += time.perf_counter() - eval_start
+            policy_time -= task_env.env_time - env_time
+            num_calls += 1
+        result = _episode_result(
+            episode,
+            dict(success=task_env.eval_success, steps=task_env.take_action_cnt),
+            task_env.env_time,
+            policy_time,
+            start,
+        )
+        results.append(result)
+        log_fn(result)
+    return results, num_calls
+
+
+def evaluate_policy(
+    policy,
+    model,
+    env_fn,
+    episodes,
+    num_envs=4,
+    batch=None,
+    start_method="spawn",
+    log_fn=None,
+):
+    """
+    Evaluates a policy on a list of episodes with @num_envs envs in worker processes.
+
+    Args:
+        policy: module or object with get_model / eval / reset_model, and optionally
+            get_actions for batched inference
+        model: model returned by policy.get_model
+        env_fn (callable): picklable function mapping (env_name, layout_id, style_id)
+            to a task env (e.g. KitchenTaskEnv or DummyTaskEnv)
+        episodes ([dict]): episodes to run (see @make_episodes)
+        num_envs (int): number of worker processes. Without batched inference the
+            episodes run one at a time, so a single worker is used.
+        batch (bool): use batched inference. Defaults to whether the policy has
+            get_actions.
+        start_method (str): multiprocessing start method
+        log_fn (callable): if provided, called with the result of every episode as
+            soon as it ends
+
+    Returns:
+        results ([dict]): one entry per episode, in order of completion, with the
+            episode fields plus success, steps, env_time, policy_time and wall_time
+        stats (dict): overall statistics
+    """
+    if batch is None:
+        batch = hasattr(policy, "get_actions")
+    if batch and not hasattr(policy, "get_actions"):
+        raise ValueError("Batched evaluation needs a policy with get_actions")
+
+    if not batch:
+        num_envs = 1
+    if log_fn is None:
+        log_fn = lambda result: None
+
+    start = time.perf_counter()
+    vec_env = VecTaskEnv(env_fn, min(num_envs, len(episodes)), start_method)
+    try:
+        run_fn = _run_batched if batch else _run_serial
+        results, num_calls = run_fn(vec_env, policy, model, episodes, log_fn)
+    finally:
+        vec_env.close()
+
+    total_time = time.perf_counter() - start
+    total_steps = sum(r["steps"] for r in results)
+    stats = dict(
+        num_episodes=len(results),
+        success_rate=float(np.mean([r["success"] for r in results])),
+        num_policy_calls=num_calls,
+        total_time=total_time,
+        steps_per_sec=total_steps / total_time,
+        batched=batch,
+    )
+    return results, stats
+
+
+def summarize_results(results):
+    """
+    Aggregates episode results per (task, layout, style).
+
+    Returns:
+        summary (OrderedDict): scene -> num_episodes, success_rate, mean steps and
+            mean env / policy / wall time per episode
+    """
+    grouped = OrderedDict()
+    for result in results:
+        grouped.setdefault(get_scene(result), []).append(result)
+    summary = OrderedDict()
+    for scene in sorted(grouped, key=str):
+        group = grouped[scene]
+        summary[scene] = dict(
+            num_episodes=len(group),
+            success_rate=float(np.mean([r["success"] for r in group])),
+            steps=float(np.mean([r["steps"] for r in group])),
+            env_time=float(np.mean([r["env_time"] for r in group])),
+            policy_time=float(np.mean([r["policy_time"] for r in group])),
+            wall_time=float(np.mean([r["wall_time"] for r in group])),
+        )
+    return summary
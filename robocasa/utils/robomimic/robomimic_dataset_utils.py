@@ -1,10 +1,9 @@
 import os
 import h5py
 import json
-import torch
 import numpy as np
 
-import robocasa.utils.robomimic.robomimic_torch_utils as TorchUtils
+import robocasa.utils.dataset_storage_utils as StorageUtils
 
 
 def get_env_metadata_from_dataset(dataset_path):
@@ -28,7 +27,93 @@ def get_env_metadata_from_dataset(dataset_path):
     return env_meta
 
 
-def extract_action_dict(dataset):
+def read_obs_window(demo_grp, key, start=0, end=None):
+    """
+    Reads timesteps [@start, @end) of observation @key from a demo group. Image
+    streams stored with an image encoding (jpeg, png or video) are decoded, only
+    touching the frames that overlap the window. Raw datasets are sliced directly.
+
+    Args:
+        demo_grp (h5py.Group): demo group, e.g. f["data/demo_0"]
+        key (str): observation key, e.g. "robot0_agentview_left_image"
+        start (int): first timestep
+        end (int): end timestep (exclusive). If None, read until the end of the demo.
+
+    Returns:
+        obs (np.array): observations of shape [end - start, ...]
+    """
+    return StorageUtils.read_frames(demo_grp["obs/{}".format(key)], start, end)
+
+
+def load_demo_obs(demo_grp, keys=None):
+    """
+    Loads (and decodes, if needed) all timesteps of observations @keys from a demo group.
+
+    Args:
+        demo_grp (h5py.Group): demo group, e.g. f["data/demo_0"]
+        keys ([str]): observation keys. If None, load all observation keys.
+
+    Returns:
+        obs (dict): maps observation key to array of shape [T, ...]
+    """
+    if keys is None:
+        keys = list(demo_grp["obs"].keys())
+    return {k: read_obs_window(demo_grp, k) for k in keys}
+
+
+def axis_angle_to_rot_6d(axis_angle):
+    """
+    NumPy version of robomimic_torch_utils.axis_angle_to_rot_6d. Converts axis-angle
+    rotations to the 6D rotation representation (first two rows of the rotation
+    matrix), going through quaternions exactly like the torch path.
+
+    Args:
+        axis_angle (np.array): axis-angle rotations of shape (..., 3)
+
+    Returns:
+        rot_6d (np.array): 6D rotations of shape (..., 6)
+    """
+    angles = np.linalg.norm(axis_angle, axis=-1, keepdims=True)
+    half_angles = angles * 0.5
+    small_angles = np.abs(angles) < 1e-6
+    # for x small, sin(x/2) is about x/2 - (x/2)^3/6, so sin(x/2)/x is about 1/2 - (x*x)/48
+    safe_angles = np.where(small_angles, 1.0, angles).astype(angles.dtype)
+    sin_half_angles_over_angles = np.where(
+        small_angles,
+        0.5 - (angles * angles) / 48,
+        np.sin(half_angles) / safe_angles,
+    )
+    r = np.cos(half_angles)[..., 0]
+    i, j, k = np.moveaxis(axis_angle * sin_half_angles_over_angles, -1, 0)
+    two_s = 2.0 / (r * r + i * i + j * j + k * k)
+
+    rot_6d = np.stack(
+        (
+            1 - two_s * (j * j + k * k),
+            two_s * (i * j - k * r),
+            two_s * (i * k + j * r),
+            two_s * (i * j + k * r),
+            1 - two_s * (i * i + k * k),
+            two_s * (j * k - i * r),
+        ),
+        axis=-1,
+    )
+    return rot_6d.astype(axis_angle.dtype, copy=False)
+
+
+def extract_action_dict(dataset, storage=None, batch_size=1000):
+    """
+    Splits the action arrays of every demo into an "action_dict" group with position,
+    rotation (axis-angle and 6D) and gripper (and base mode) entries.
+
+    Actions of up to @batch_size demos are concatenated into one buffer and
+    converted in a single vectorized pass, then written back key by key.
+
+    Args:
+        dataset (str): path to hdf5 dataset
+        storage (StorageUtils.StorageOptions): codec and chunking for written datasets
+        batch_size (int): number of demos converted together
+    """
     # find files
     f = h5py.File(os.path.expanduser(dataset), mode="r+")
 
@@ -43,6 +128,8 @@ def extract_action_dict(dataset):
         ),
     ]
 
+    demos = list(f["data"].values())
+
     # execute
     for spec in SPECS:
         input_action_key = spec["key"]
@@ -53,37 +140,90 @@ def extract_action_dict(dataset):
         else:
             prefix = "rel_"
 
-        for demo in f["data"].values():
-            if str(input_action_key) not in demo.keys():
-                continue
-            in_action = demo[str(input_action_key)][:]
-            in_pos = in_action[:, :3].astype(np.float32)
-            in_rot = in_action[:, 3:6].astype(np.float32)
-            in_grip = in_action[:, 6:7].astype(np.float32)
+        spec_demos = [demo for demo in demos if str(input_action_key) in demo]
+        for batch_start in range(0, len(spec_demos), batch_size):
+            batch_demos = spec_demos[batch_start : batch_start + batch_size]
+            in_actions = [demo[str(input_action_key)][:] for demo in batch_demos]
+
+            # demos with the same action dim are converted together
+            for ac_dim in sorted(set(a.shape[1] for a in in_actions)):
+                group = [
+                    (demo, a)
+                    for demo, a in zip(batch_demos, in_actions)
+                    if a.shape[1] == ac_dim
+                ]
+                in_action = np.concatenate([a for _, a in group], axis=0)
+                split_inds = np.cumsum([a.shape[0] for _, a in group])[:-1]
+
+                in_rot = in_action[:, 3:6].astype(np.float32)
+                batch_action_dict = {
+                    prefix + "pos": in_action[:, :3].astype(np.float32),
+                    prefix + "rot_axis_angle": in_rot,
+                    prefix + "rot_6d": axis_angle_to_rot_6d(in_rot),
+                    "gripper": in_action[:, 6:7].astype(np.float32),
+                }
+
+                # special case: 8 dim actions mean there is a mobile base mode in the action space
+                if ac_dim == 8:
+                    batch_action_dict["base_mode"] = in_action[:, 7:8].astype(
+                        np.float32
+                    )
+
+                for key, data in batch_action_dict.items():
+                    path = "action_dict/{}".format(key)
+                    for (demo, _), demo_data in zip(group, np.split(data, split_inds)):
+                        if path in demo:
+                            del demo[path]
+                        StorageUtils.create_dataset(
+                            demo, path, demo_data, storage=storage
+                        )
 
-            rot_6d = TorchUtils.axis_angle_to_rot_6d(
-                axis_angle=torch.from_numpy(in_rot)
-            )
-            rot_6d = rot_6d.numpy().astype(np.float32)  # convert to numpy
-
-            this_action_dict = {
-                prefix + "pos": in_pos,
-                prefix + "rot_axis_angle": in_rot,
-                prefix + "rot_6d": rot_6d,
-                "gripper": in_grip,
-            }
-
-            # special case: 8 dim actions mean there is a mobile base mode in the action space
-            if in_action.shape[1] == 8:
-                this_action_dict["base_mode"] = in_action[:, 7:8].astype(np.float32)
+    f.close()
 
-            action_dict_group = demo.require_group("action_dict")
-            for key, data in this_action_dict.items():
-                if key in action_dict_group:
-                    del action_dict_group[key]
-                action_dict_group.create_dataset(key, data=data)
 
-    f.close()
+# dataset sizes for which filter keys are generated after dataset creation
+DEFAULT_FILTER_NUM_DEMOS = (
+    10,
+    20,
+    30,
+    40,
+    50,
+    60,
+    70,
+    75,
+    80,
+    90,
+    100,
+    125,
+    150,
+    200,
+    250,
+    300,
+    400,
+    500,
+    600,
+    700,
+    800,
+    900,
+    1000,
+    1500,
+    2000,
+    2500,
+    3000,
+    4000,
+    5000,
+    10000,
+)
+
+
+def _write_filter_key(f, demo_keys, key_name):
+    """
+    Writes filter key @key_name with demos @demo_keys into open hdf5 file @f.
+    """
+    k = "mask/{}".format(key_name)
+    if k in f:
+        del f[k]
+    f[k] = np.array(demo_keys, dtype="S")
 
 
 def create_hdf5_filter_key(hdf5_path, demo_keys, key_name):
@@ -119,152 +259,133 @@ def create_hdf5_filter_key(hdf5_path, demo_keys, key_name):
             ep_lengths.append(ep_data_grp.attrs["num_samples"])
 
     # store list of filtered keys under mask group
-    k = "mask/{}".format(key_name)
-    if k in f:
-        del f[k]
-    f[k] = np.array(demo_keys, dtype="S")
+    _write_filter_key(f, demo_keys, key_name)
 
     f.close()
     return ep_lengths
 
 
-def filter_dataset_size(
+def filter_dataset_sizes(
     hdf5_path, num_demos, input_filter_key=None, output_filter_key=None
 ):
-    # retrieve number of demos
-    f = h5py.File(hdf5_path, "r")
-    if input_filter_key is not None:
-        print("using filter key: {}".format(input_filter_key))
-        demos = sorted(
-            [
-                elem.decode("utf-8")
-                for elem in np.array(f["mask/{}".format(input_filter_key)])
-            ]
-        )
-    else:
-        demos = sorted(list(f["data"].keys()))
-    f.close()
-
-    # get random split
-    total_num_demos = len(demos)
-    mask = np.zeros(total_num_demos)
-    mask[:num_demos] = 1.0
-    np.random.shuffle(mask)
-    mask = mask.astype(int)
-    subset_inds = mask.nonzero()[0]
-    subset_keys = [demos[i] for i in subset_inds]
-
-    # pass mask to generate split
-    if output_filter_key is not None:
-        name = output_filter_key
-    else:
-        name = "{}_demos".format(num_demos)
+    """
+    Creates random subset filter keys of several sizes in a single pass over the file.
+    The demo list is read once and all filter keys are written while the file is
+    open, instead of reopening the file for every size.
 
-    if input_filter_key is not None:
-        name = "{}_{}".format(input_filter_key, name)
+    Args:
+        hdf5_path (str): path to hdf5 file
+        num_demos ([int]): subset sizes. A filter key named "<n>_demos" is created
+            for each size n.
+        input_filter_key (str): if provided, sample subsets from the demos in this
+            filter key instead of all demos. The filter key names are prefixed with it.
+        output_filter_key (str): if provided, use this name instead of "<n>_demos"
 
-    subset_lengths = create_hdf5_filter_key(
-        hdf5_path=hdf5_path, demo_keys=subset_keys, key_name=name
-    )
+    Returns:
+        subsets (dict): maps each created filter key name to its demo keys
+    """
+    subsets = dict()
+    with h5py.File(hdf5_path, "a") as f:
+        # retrieve demos
+        if input_filter_key is not None:
+            print("using filter key: {}".format(input_filter_key))
+            demos = sorted(
+                [
+                    elem.decode("utf-8")
+                    for elem in np.array(f["mask/{}".format(input_filter_key)])
+                ]
+            )
+        else:
+            demos = sorted(list(f["data"].keys()))
+        total_num_demos = len(demos)
 
+        for n in num_demos:
+            # get random split
+            mask = np.zeros(total_num_demos)
+            mask[:n] = 1.0
+            np.random.shuffle(mask)
+            subset_inds = mask.astype(int).nonzero()[0]
+            subset_keys = [demos[i] for i in subset_inds]
 
-def move_demo_to_new_key(f, old_demo_key, new_demo_key, delete_old_demo=True):
-    print(f"Moving {old_demo_key} -> {new_demo_key}")
+            if output_filter_key is not None:
+                name = output_filter_key
+            else:
+                name = "{}_demos".format(n)
+            if input_filter_key is not None:
+                name = "{}_{}".format(input_filter_key, name)
 
-    src_ep = f["data"][old_demo_key]
+            _write_filter_key(f, subset_keys, name)
+            subsets[name] = subset_keys
+    return subsets
 
-    if new_demo_key not in f["data"]:
-        f["data"].create_group(new_demo_key)
 
-    targ_ep = f["data"][new_demo_key]
+def filter_dataset_size(
+    hdf5_path, num_demos, input_filter_key=None, output_filter_key=None
+):
+    filter_dataset_sizes(
+        hdf5_path,
+        num_demos=[num_demos],
+        input_filter_key=input_filter_key,
+        output_filter_key=output_filter_key,
+    )
 
-    targ_ep.attrs.update(src_ep.attrs)
 
-    # write the datasets
-    for k in src_ep:
-        if isinstance(src_ep[k], h5py.Dataset):
-            targ_ep.create_dataset(k, data=np.array(src_ep[k]))
-        else:
-            for m in src_ep[k]:
-                targ_ep.create_dataset(
-                    "{}/{}".format(k, m),
-                    data=np.array(src_ep["{}/{}".format(k, m)]),
-                )
+def get_contiguous_demo_mapping(demo_keys):
+    """
+    Computes the renaming that makes demo ids contiguous (demo_0 ... demo_{N-1}),
+    by moving the demos with the highest ids into the missing ids.
 
-    # write the metadata present in attributes as well
-    for k in src_ep.attrs:
-        targ_ep.attrs[k] = src_ep.attrs[k]
+    Args:
+        demo_keys ([str]): current demo keys, e.g. ["demo_0", "demo_3", "demo_4"]
 
-    if delete_old_demo is True:
-        del f["data"][old_demo_key]
+    Returns:
+        mapping (dict): maps old demo keys to new demo keys, only for demos that move
+    """
+    demo_ids = sorted(int(demo_key.split("_")[-1]) for demo_key in demo_keys)
+    num_new_demos = len(demo_ids)
+    existing = set(demo_ids)
+    missing_demo_inds = [i for i in range(num_new_demos) if i not in existing]
+    # demos beyond the new range, highest id first, fill the holes from the bottom
+    extra_demo_inds = [i for i in reversed(demo_ids) if i >= num_new_demos]
+    assert len(missing_demo_inds) == len(extra_demo_inds)
+    return {
+        f"demo_{old_idx}": f"demo_{new_idx}"
+        for old_idx, new_idx in zip(extra_demo_inds, missing_demo_inds)
+    }
 
 
 def make_demo_ids_contiguous(dataset):
-    f = h5py.File(dataset, "a")  # edit mode
-
-    num_old_demos = max([int(demo_key.split("_")[-1]) for demo_key in f["data"]]) + 1
-    missing_demo_inds = [
-        i for i in range(num_old_demos) if f"demo_{i}" not in f["data"]
-    ]
-    num_new_demos = num_old_demos - len(missing_demo_inds)
-
-    old_idx = num_old_demos - 1
-    num_demos_changed = 0
-    while num_demos_changed < len(missing_demo_inds):
-        if f"demo_{old_idx}" not in f["data"]:
-            old_idx -= 1
-            continue
-
-        new_idx = missing_demo_inds[num_demos_changed]
-
-        if old_idx <= new_idx:
-            break
-
-        old_demo_key = f"demo_{old_idx}"
-        new_demo_key = f"demo_{new_idx}"
-
-        move_demo_to_new_key(f, old_demo_key, new_demo_key, delete_old_demo=True)
+    """
+    Renames demos in @dataset so that demo ids are contiguous. Demos are relinked
+    with hdf5 moves, so no data is copied and the cost scales with the number of
+    demos rather than the dataset size. Existing filter keys are updated to the new
+    demo keys.
 
-        old_idx -= 1
-        num_demos_changed += 1
+    Args:
+        dataset (str): path to hdf5 dataset
 
-    f.close()
+    Returns:
+        mapping (dict): maps old demo keys to new demo keys, only for demos that moved
+    """
+    with h5py.File(dataset, "a") as f:  # edit mode
+        mapping = get_contiguous_demo_mapping(list(f["data"].keys()))
+        for old_demo_key, new_demo_key in mapping.items():
+            f["data"].move(old_demo_key, new_demo_key)
+
+        # keep filter keys consistent with the new demo keys
+        if len(mapping) > 0 and "mask" in f:
+            for key_name in list(f["mask"].keys()):
+                demo_keys = [elem.decode("utf-8") for elem in f["mask"][key_name][()]]
+                if any(k in mapping for k in demo_keys):
+                    _write_filter_key(
+                        f, [mapping.get(k, k) for k in demo_keys], key_name
+                    )
+    return mapping
 
 
 def convert_to_robomimic_format(
     dataset,
-    filter_num_demos=(
-        10,
-        20,
-        30,
-        40,
-        50,
-        60,
-        70,
-        75,
-        80,
-        90,
-        100,
-        125,
-        150,
-        200,
-        250,
-        300,
-        400,
-        500,
-        600,
-        700,
-        800,
-        900,
-        1000,
-        1500,
-        2000,
-        2500,
-        3000,
-        4000,
-        5000,
-        10000,
-    ),
+    filter_num_demos=DEFAULT_FILTER_NUM_DEMOS,
     verbose=False,
 ):
     f = h5py.File(dataset, "a")  # edit mode
@@ -333,8 +454,4 @@ def convert_to_robomimic_format(
 
     # create filter keys according to number of demos
     if filter_num_demos is not None:
-        for n in filter_num_demos:
-            filter_dataset_size(
-                dataset,
-                num_demos=n,
-            )
+        filter_dataset_sizes(dataset, num_demos=filter_num_demos)
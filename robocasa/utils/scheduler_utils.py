@@ -0,0 +1,242 @@
+"""
+Scene-affinity scheduling of demonstrations across worker processes.
+
+Demos that share a scene (same layout, style, object set or model xml) are grouped
+together and each group is assigned to a single worker, so that consecutive demos
+processed by a worker reuse whatever was cached for the previous scene (compiled
+models, textures, arenas). Workers that run out of work steal whole groups from
+the queues of other workers to keep the load balanced.
+"""
+import json
+import hashlib
+import multiprocessing as mp
+from queue import Empty
+from collections import OrderedDict
+
+SCENE_KEY_MODES = ("layout", "scene", "objects", "xml")
+
+
+def get_scene_key(ep_meta, mode="scene", model_file=None):
+    """
+    Computes the key used to group demos that share a scene.
+
+    Args:
+        ep_meta (dict or str): episode metadata (or its json encoding)
+        mode (str): one of SCENE_KEY_MODES.
+            "layout": group by layout id
+            "scene": group by (layout id, style id)
+            "objects": group by (layout id, style id, object models)
+            "xml": group by hash of the model xml
+        model_file (str): model xml, only needed for mode "xml"
+
+    Returns:
+        key (tuple): hashable scene key
+    """
+    if mode == "xml":
+        assert model_file is not None, "model_file is required for xml scene keys"
+        if isinstance(model_file, bytes):
+            model_file = model_file.decode("utf-8")
+        return (hashlib.sha1(model_file.encode("utf-8")).hexdigest(),)
+
+    if isinstance(ep_meta, (str, bytes)):
+        ep_meta = json.loads(ep_meta)
+    layout_id = ep_meta.get("layout_id", None)
+    style_id = ep_meta.get("style_id", None)
+    if mode == "layout":
+        return (layout_id,)
+    if mode == "scene":
+        return (layout_id, style_id)
+    if mode == "objects":
+        objs = []
+        for cfg in ep_meta.get("object_cfgs", []):
+            info = cfg.get("info", {})
+            objs.append(str(info.get("mjcf_path", info.get("cat", cfg.get("name")))))
+        return (layout_id, style_id, tuple(sorted(objs)))
+    raise ValueError("Unknown scene key mode: {}".format(mode))
+
+
+def get_scene_keys_from_hdf5(f, demos, mode="scene"):
+    """
+    Reads the scene key of each demo in an open robomimic hdf5 file. Only episode
+    attributes are touched, no datasets are read.
+
+    Args:
+        f (h5py.File): open hdf5 file
+        demos ([str]): demo keys
+        mode (str): scene key mode (see @get_scene_key)
+
+    Returns:
+        scene_keys ([tuple]): scene key for each demo
+    """
+    scene_keys = []
+    for ep in demos:
+        attrs = f["data/{}".format(ep)].attrs
+        if mode == "xml":
+            scene_keys.append(get_scene_key(None, mode, model_file=attrs["model_file"]))
+        else:
+            scene_keys.append(get_scene_key(attrs.get("ep_meta", "{}"), mode))
+    return scene_keys
+
+
+def group_demos_by_scene(demos, scene_keys, max_group_size=None):
+    """
+    Groups demos by scene key, preserving the original demo order within a group.
+
+    Args:
+        demos ([str]): demo keys
+        scene_keys ([tuple]): scene key of each demo
+        max_group_size (int): if provided, large groups are split into chunks of at most
+            this many demos so that they can be stolen by idle workers
+
+    Returns:
+        groups ([(tuple, [str])]): list of (scene key, demos) pairs
+    """
+    assert len(demos) == len(scene_keys)
+    grouped = OrderedDict()
+    for ep, key in zip(demos, scene_keys):
+        grouped.setdefault(key, []).append(ep)
+
+    groups = []
+    for key, eps in grouped.items():
+        if max_group_size is None or max_group_size <= 0:
+            groups.append((key, eps))
+        else:
+            for i in range(0, len(eps), max_group_size):
+                groups.append((key, eps[i : i + max_group_size]))
+    return groups
+
+
+def assign_groups_to_workers(groups, num_workers):
+    """
+    Assigns scene groups to workers using longest-processing-time-first: groups are
+    handed out from largest to smallest, each to the currently least loaded worker.
+    Chunks of the same scene go to the same worker whenever that does not make it
+    the most loaded one.
+
+    Args:
+        groups ([(tuple, [str])]): output of @group_demos_by_scene
+        num_workers (int): number of workers
+
+    Returns:
+        assignment ([[(tuple, [str])]]): list of groups for each worker
+    """
+    assignment = [[] for _ in range(num_workers)]
+    loads = [0] * num_workers
+    owner = dict()
+    order = sorted(range(len(groups)), key=lambda i: -len(groups[i][1]))
+    for i in order:
+        key, eps = groups[i]
+        least = min(range(num_workers), key=lambda w: loads[w])
+        w = owner.get(key, least)
+        if loads[w] > loads[least] + len(eps):
+            w = least
+        owner.setdefault(key, w)
+        assignment[w].append((key, eps))
+        loads[w] += len(eps)
+
+    # keep chunks of the same scene adjacent inside each worker's queue
+    for w in range(num_workers):
+        first_seen = OrderedDict()
+        for key, _ in assignment[w]:
+            first_seen.setdefault(key, len(first_seen))
+        assignment[w].sort(key=lambda g: first_seen[g[0]])
+    return assignment
+
+
+class DemoScheduler:
+    """
+    Multiprocessing-safe scheduler handing out demos to worker processes.
+
+    With scene affinity, every worker owns a queue of scene groups and only steals
+    groups from other workers once its own queue is drained. Without scene affinity,
+    all workers share a single FIFO queue of individual demos. Scene switches are
+    tracked in both cases so the two modes can be compared.
+
+    The scheduler is created in the parent process and passed to workers as a
+    process argument. Each worker then calls @next_demo with its own id until it
+    returns None.
+    """
+
+    def __init__(
+        self, demos, scene_keys, num_workers, affinity=True, max_group_size=None
+    ):
+        """
+        Args:
+            demos ([str]): demo keys
+            scene_keys ([tuple]): scene key of each demo
+            num_workers (int): number of workers
+            affinity (bool): if False, demos are handed out in order from a single
+                shared queue
+            max_group_size (int): maximum number of demos in a stealable group
+        """
+        self.num_workers = num_workers
+        self.affinity = affinity
+        if self.affinity:
+            groups = group_demos_by_scene(
+                demos, scene_keys, max_group_size=max_group_size
+            )
+            assignment = assign_groups_to_workers(groups, num_workers)
+        else:
+            assignment = [[(key, [ep]) for ep, key in zip(demos, scene_keys)]]
+        self.queues = [mp.Queue() for _ in range(len(assignment))]
+        for q, worker_groups in zip(self.queues, assignment):
+            for group in worker_groups:
+                q.put(group)
+        self.num_groups = [len(worker_groups) for worker_groups in assignment]
+
+        # per-worker state, only valid inside the worker process
+        self._pending = []
+        self._pending_key = None
+        self._last_key = None
+        self.stats = dict(demos=0, scene_switches=0, steals=0, scenes=[])
+
+    def _get_group(self, worker_id, timeout=0.1):
+        """
+        Fetches the next group for @worker_id, stealing from other queues if needed.
+        """
+        own = worker_id % len(self.queues)
+        try:
+            return self.queues[own].get(timeout=timeout)
+        except Empty:
+            pass
+        # steal from the other queues, starting with the worker after this one
+        for offset in range(1, len(self.queues)):
+            victim = (own + offset) % len(self.queues)
+            try:
+                group = self.queues[victim].get(timeout=timeout)
+            except Empty:
+                continue
+            self.stats["steals"] += 1
+            return group
+        return None
+
+    def next_demo(self, worker_id):
+        """
+        Returns the next demo key for @worker_id, or None once all work is done.
+        """
+        if len(self._pending) == 0:
+            group = self._get_group(worker_id)
+            if group is None:
+                return None
+            self._pending_key, eps = group
+            self._pending = list(eps)
+
+        ep = self._pending.pop(0)
+        if self._pending_key != self._last_key or self.stats["demos"] == 0:
+            if self.stats["demos"] > 0:
+                self.stats["scene_switches"] += 1
+            self.stats["scenes"].append(self._pending_key)
+            self._last_key = self._pending_key
+        self.stats["demos"] += 1
+        return ep
+
+    def get_stats(self):
+        """
+        Returns per-worker scheduling statistics.
+        """
+        return dict(
+            demos=self.stats["demos"],
+            scene_switches=self.stats["scene_switches"],
+            num_scenes=len(set(self.stats["scenes"])),
+            steals=self.stats["steals"],
+        )
@@ -0,0 +1,75 @@
+"""
+Tests that make_demo_ids_contiguous renumbers demos without touching their data, and
+remaps the filter keys written by filter_dataset_sizes.
+"""
+import os
+import tempfile
+
+import h5py
+import numpy as np
+from termcolor import colored
+
+import robocasa.utils.robomimic.robomimic_dataset_utils as DatasetUtils
+
+
+def make_dataset(path, demo_ids):
+    with h5py.File(path, "w") as f:
+        for i in demo_ids:
+            demo_grp = f.create_group("data/demo_{}".format(i))
+            # every demo holds its original id, so it can be traced after renaming
+            demo_grp.create_dataset("actions", data=np.full((3, 7), i))
+            demo_grp.attrs["num_samples"] = 3
+
+
+def read_mask(f, key_name):
+    return [elem.decode("utf-8") for elem in f["mask/{}".format(key_name)][()]]
+
+
+def test_get_contiguous_demo_mapping():
+    mapping = DatasetUtils.get_contiguous_demo_mapping(
+        ["demo_0", "demo_2", "demo_5", "demo_7"]
+    )
+    assert mapping == {"demo_7": "demo_1", "demo_5": "demo_3"}
+    assert DatasetUtils.get_contiguous_demo_mapping(["demo_0", "demo_1"]) == dict()
+
+
+def test_make_demo_ids_contiguous():
+    np.random.seed(0)
+    demo_ids = [0, 2, 5, 7, 8, 11]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "demos.hdf5")
+        make_dataset(path, demo_ids)
+        subsets = DatasetUtils.filter_dataset_sizes(path, num_demos=[2, 4])
+        DatasetUtils.create_hdf5_filter_key(path, ["demo_0", "demo_11"], "valid")
+
+        mapping = DatasetUtils.make_demo_ids_contiguous(path)
+
+        with h5py.File(path, "r") as f:
+            assert sorted(f["data"].keys()) == [
+                "demo_{}".format(i) for i in range(len(demo_ids))
+            ]
+            # demo data and attributes moved with the demo
+            original_id = dict()
+            for demo_key, demo_grp in f["data"].items():
+                original_id[demo_key] = int(demo_grp["actions"][0, 0])
+                assert demo_grp.attrs["num_samples"] == 3
+            assert sorted(original_id.values()) == demo_ids
+            for old_key, new_key in mapping.items():
+                assert original_id[new_key] == int(old_key.split("_")[-1])
+
+            # filter keys point at the same demos under their new keys
+            expected = dict(subsets, valid=["demo_0", "demo_11"])
+            assert sorted(f["mask"].keys()) == sorted(expected.keys())
+            for key_name, old_keys in expected.items():
+                new_keys = read_mask(f, key_name)
+                assert len(new_keys) == len(old_keys)
+                assert all(k in f["data"] for k in new_keys)
+                assert sorted(original_id[k] for k in new_keys) == sorted(
+                    int(k.split("_")[-1]) for k in old_keys
+                )
+
+
+if __name__ == "__main__":
+    test_get_contiguous_demo_mapping()
+    test_make_demo_ids_contiguous()
+    print(colored("Demo ids are contiguous and filter keys are remapped", "green"))
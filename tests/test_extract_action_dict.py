@@ -0,0 +1,99 @@
+"""
+Tests for the vectorized NumPy extract_action_dict. The rotation conversion is checked
+against the per-demo torch conversion it replaced (skipped without torch) and against
+the Rodrigues formula.
+"""
+import os
+import tempfile
+
+import h5py
+import numpy as np
+import pytest
+from termcolor import colored
+
+import robocasa.utils.robomimic.robomimic_dataset_utils as DatasetUtils
+
+
+def make_dataset(path, num_demos=20, seed=0):
+    rng = np.random.default_rng(seed)
+    with h5py.File(path, "w") as f:
+        for i in range(num_demos):
+            demo_len = rng.integers(1, 200)
+            ac_dim = 8 if i % 3 else 7
+            actions = rng.uniform(-1, 1, size=(demo_len, ac_dim))
+            # include exact zero and tiny rotations to cover the small angle branch
+            actions[0, 3:6] = 0.0
+            if demo_len > 1:
+                actions[1, 3:6] = 1e-8
+            f.create_dataset("data/demo_{}/actions".format(i), data=actions)
+            f.create_dataset(
+                "data/demo_{}/actions_abs".format(i),
+                data=actions * np.pi,
+            )
+
+
+def reference_action_dict(in_action, prefix):
+    in_rot = in_action[:, 3:6].astype(np.float32)
+    action_dict = {
+        prefix + "pos": in_action[:, :3].astype(np.float32),
+        prefix + "rot_axis_angle": in_rot,
+        prefix + "rot_6d": DatasetUtils.axis_angle_to_rot_6d(in_rot),
+        "gripper": in_action[:, 6:7].astype(np.float32),
+    }
+    if in_action.shape[1] == 8:
+        action_dict["base_mode"] = in_action[:, 7:8].astype(np.float32)
+    return action_dict
+
+
+def test_axis_angle_to_rot_6d_rodrigues():
+    rng = np.random.default_rng(1)
+    axis_angle = rng.uniform(-np.pi, np.pi, size=(100, 3))
+    axis_angle[0] = 0.0
+    actual = DatasetUtils.axis_angle_to_rot_6d(axis_angle)
+    for aa, rot_6d in zip(axis_angle, actual):
+        angle = np.linalg.norm(aa)
+        axis = aa / angle if angle > 0 else np.zeros(3)
+        K = np.array(
+            [[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]]
+        )
+        R = np.eye(3) + np.sin(angle) * K + (1 - np.cos(angle)) * K @ K
+        assert np.allclose(rot_6d, R[:2].reshape(-1), atol=1e-9)
+
+
+def test_axis_angle_to_rot_6d():
+    torch = pytest.importorskip("torch")
+    import robocasa.utils.robomimic.robomimic_torch_utils as TorchUtils
+
+    rng = np.random.default_rng(0)
+    axis_angle = rng.uniform(-np.pi, np.pi, size=(1000, 3)).astype(np.float32)
+    axis_angle[:10] = 0.0
+    expected = TorchUtils.axis_angle_to_rot_6d(torch.from_numpy(axis_angle)).numpy()
+    actual = DatasetUtils.axis_angle_to_rot_6d(axis_angle)
+    assert actual.dtype == np.float32
+    assert np.allclose(actual, expected, atol=1e-6)
+
+
+def test_extract_action_dict():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "actions.hdf5")
+        make_dataset(path)
+        # small batches to exercise batching and mixed action dims within a batch
+        DatasetUtils.extract_action_dict(dataset=path, batch_size=7)
+
+        with h5py.File(path, "r") as f:
+            for demo in f["data"].values():
+                expected = reference_action_dict(demo["actions"][:], "rel_")
+                # the absolute spec runs last and owns the shared keys
+                expected.update(reference_action_dict(demo["actions_abs"][:], "abs_"))
+                assert set(demo["action_dict"].keys()) == set(expected.keys())
+                for k, v in expected.items():
+                    actual = demo["action_dict/{}".format(k)][:]
+                    assert actual.dtype == v.dtype and actual.shape == v.shape
+                    assert np.allclose(actual, v, atol=1e-6), k
+
+
+if __name__ == "__main__":
+    test_axis_angle_to_rot_6d_rodrigues()
+    test_axis_angle_to_rot_6d()
+    test_extract_action_dict()
+    print(colored("extract_action_dict matches the torch conversion", "green"))
@@ -0,0 +1,146 @@
+"""
+Round-trip test for encoded image streams in robomimic hdf5 datasets.
+
+Writes synthetic camera, mask and depth streams with each image encoding, decodes
+random frame windows with robomimic_dataset_utils.read_obs_window and checks them
+against the original frames (PSNR for lossy encodings, exact match for png, and the
+16 bit quantization error for float depth in png).
+"""
+import os
+import tempfile
+
+import h5py
+import numpy as np
+import pytest
+from termcolor import colored
+
+import robocasa.utils.dataset_storage_utils as StorageUtils
+import robocasa.utils.robomimic.robomimic_dataset_utils as DatasetUtils
+
+# minimum PSNR (dB) between original and decoded frames for lossy encodings
+MIN_PSNR = dict(jpeg=30.0, video=30.0)
+
+
+def psnr(a, b):
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    if mse == 0:
+        return float("inf")
+    return 10 * np.log10(255.0**2 / mse)
+
+
+def make_frames(num_frames=50, size=64, seed=0):
+    """
+    Smooth moving gradient frames, plus a segmentation mask and a uint16 depth stream.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.meshgrid(np.arange(size), np.arange(size), indexing="ij")
+    rgb, mask, depth = [], [], []
+    for t in range(num_frames):
+        r = 127.5 + 127.5 * np.sin(2 * np.pi * (x + t) / size)
+        g = 127.5 + 127.5 * np.cos(2 * np.pi * (y - t) / size)
+        b = 255.0 * (x + y) / (2 * size)
+        rgb.append(np.stack([r, g, b], axis=-1))
+        mask.append(((x // 8 + y // 8 + t) % 5)[..., None])
+        depth.append(
+            (1000 + 10 * x + 5 * y + t + rng.integers(0, 3, size=x.shape))[..., None]
+        )
+    return (
+        np.array(rgb, dtype=np.uint8),
+        np.array(mask, dtype=np.uint8),
+        np.array(depth, dtype=np.uint16),
+    )
+
+
+def check_round_trip(spec, key, frames, tmp_dir, window=10, num_windows=5):
+    path = os.path.join(tmp_dir, "encoded.hdf5")
+    storage = StorageUtils.StorageOptions(per_key={"obs/*": spec})
+    with h5py.File(path, "w") as f:
+        demo_grp = f.create_group("data/demo_0")
+        StorageUtils.create_dataset(
+            demo_grp, "obs/{}".format(key), frames, storage=storage
+        )
+
+    name = spec.split(":")[0]
+    rng = np.random.default_rng(0)
+    with h5py.File(path, "r") as f:
+        demo_grp = f["data/demo_0"]
+        assert StorageUtils.is_encoded(demo_grp["obs/{}".format(key)])
+        assert StorageUtils.get_num_frames(demo_grp["obs/{}".format(key)]) == len(
+            frames
+        )
+
+        # full decode
+        decoded = DatasetUtils.load_demo_obs(demo_grp, keys=[key])[key]
+        assert decoded.shape == frames.shape and decoded.dtype == frames.dtype
+
+        # random windows, including ones crossing video segment boundaries
+        for _ in range(num_windows):
+            start = rng.integers(0, len(frames) - window)
+            win = DatasetUtils.read_obs_window(demo_grp, key, start, start + window)
+            assert win.shape == (window,) + frames.shape[1:]
+            assert np.array_equal(win, decoded[start : start + window])
+
+    if name == "png" and np.issubdtype(frames.dtype, np.floating):
+        error = np.abs(decoded - frames).max()
+        assert error <= 0.5 / StorageUtils.PNG_FLOAT_SCALE + 1e-7, error
+        quality = "max error {:.2e}".format(error)
+    elif name == "png":
+        assert np.array_equal(decoded, frames), "png round trip is not lossless"
+        quality = "lossless"
+    else:
+        quality = psnr(decoded, frames)
+        assert quality >= MIN_PSNR[name], "{} PSNR {:.1f} dB below {} dB".format(
+            spec, quality, MIN_PSNR[name]
+        )
+        quality = "{:.1f} dB".format(quality)
+    os.remove(path)
+    return quality
+
+
+def test_image_encoding():
+    rgb, mask, depth = make_frames()
+    cases = [
+        ("jpeg:95", "robot0_agentview_left_image", rgb),
+        ("png", "robot0_agentview_left_image", rgb),
+        ("png", "robot0_agentview_left_segmentation_instance", mask),
+        ("png", "robot0_agentview_left_depth", depth),
+        # robosuite depth observables are float32 in [0, 1]
+        ("png", "robot0_agentview_left_depth", (depth / 4000).astype(np.float32)),
+    ]
+    if StorageUtils.av is not None:
+        cases.append(("video:h264:18:16", "robot0_agentview_left_image", rgb))
+    else:
+        print(colored("PyAV not installed, skipping video encoding", "yellow"))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for spec, key, frames in cases:
+            quality = check_round_trip(spec, key, frames, tmp_dir)
+            print(colored("{:<18} {:<45} {}".format(spec, key, quality), "green"))
+
+
+def test_png_rejects_unnormalized_floats():
+    depth = np.full((4, 8, 8, 1), 1.5, dtype=np.float32)
+    with pytest.raises(ValueError, match="png encoding quantizes float frames"):
+        StorageUtils.encode_frames(depth, "png")
+
+
+def test_raw_passthrough():
+    rgb, _, _ = make_frames(num_frames=20)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "raw.hdf5")
+        with h5py.File(path, "w") as f:
+            demo_grp = f.create_group("data/demo_0")
+            StorageUtils.create_dataset(
+                demo_grp, "obs/robot0_eye_in_hand_image", rgb, storage=None
+            )
+            win = DatasetUtils.read_obs_window(
+                demo_grp, "robot0_eye_in_hand_image", 5, 15
+            )
+            assert np.array_equal(win, rgb[5:15])
+
+
+if __name__ == "__main__":
+    test_image_encoding()
+    test_png_rejects_unnormalized_floats()
+    test_raw_passthrough()
+    print(colored("all image encoding round trips passed", "green"))
@@ -0,0 +1,68 @@
+"""
+CPU-only test of the vectorized policy evaluation harness, with the dummy policy on
+dummy envs. Checks that batched evaluation gives the same episode outcomes as running
+the policy through its eval() one episode at a time, with fewer policy calls.
+"""
+from functools import partial
+
+from termcolor import colored
+
+import robocasa.utils.policy_eval_utils as PolicyEvalUtils
+
+
+def run(batch, num_envs=3):
+    policy = PolicyEvalUtils.DummyPolicy(chunk_size=4)
+    model = policy.get_model()
+    episodes = PolicyEvalUtils.make_episodes(
+        ["TaskA", "TaskB"], [(1, 1), (2, 2)], num_episodes=3, seed=0
+    )
+    # the last seed needs more steps than the limit allows, so it fails
+    episodes[-1]["seed"] = 18
+    env_fn = partial(PolicyEvalUtils.DummyTaskEnv, step_lim=20)
+    results, stats = PolicyEvalUtils.evaluate_policy(
+        policy, model, env_fn, episodes, num_envs=num_envs, batch=batch
+    )
+    return policy, episodes, results, stats
+
+
+def key(result):
+    return (result["env_name"], result["layout_id"], result["style_id"], result["seed"])
+
+
+def test_batched_matches_serial():
+    policy, episodes, batched, batched_stats = run(batch=True)
+    _, _, serial, serial_stats = run(batch=False)
+
+    assert len(batched) == len(serial) == len(episodes)
+    serial = {key(r): r for r in serial}
+    for result in batched:
+        expected = serial[key(result)]
+        assert result["success"] == expected["success"]
+        assert result["steps"] == expected["steps"]
+
+    # seed s needs 5 + s steps, the seed 18 episode runs into the step limit
+    for result in batched:
+        if result["seed"] == 18:
+            assert not result["success"] and result["steps"] == 20
+        else:
+            assert result["success"] and result["steps"] == 5 + result["seed"]
+
+    assert len(policy.batch_sizes) == batched_stats["num_policy_calls"]
+    assert max(policy.batch_sizes) == 3
+    assert batched_stats["num_policy_calls"] < serial_stats["num_policy_calls"]
+
+
+def test_summarize_results():
+    _, _, results, stats = run(batch=True)
+    summary = PolicyEvalUtils.summarize_results(results)
+    assert len(summary) == 4
+    assert summary[("TaskA", 1, 1)]["num_episodes"] == 3
+    assert summary[("TaskA", 1, 1)]["success_rate"] == 1.0
+    assert summary[("TaskB", 2, 2)]["success_rate"] == 2 / 3
+    assert stats["success_rate"] == 11 / 12
+
+
+if __name__ == "__main__":
+    test_batched_matches_serial()
+    test_summarize_results()
+    print(colored("Batched evaluation matches serial evaluation", "green"))
@@ -0,0 +1,106 @@
+"""
+CPU-only tests of the scene-affinity demo scheduler with fake demo -> scene keys: every
+demo is handed out exactly once, scene groups respect the size cap, and idle workers
+steal groups from slow ones.
+"""
+import time
+import multiprocessing as mp
+from collections import Counter
+
+from termcolor import colored
+
+import robocasa.utils.scheduler_utils as SchedulerUtils
+
+
+def make_demos(num_demos=60, num_scenes=5):
+    demos = ["demo_{}".format(i) for i in range(num_demos)]
+    # uneven scene sizes, interleaved in demo order
+    scene_keys = [(i % num_scenes if i % 4 else 0, 1) for i in range(num_demos)]
+    return demos, scene_keys
+
+
+def run_worker(scheduler, worker_id, delay_s, results):
+    demos = []
+    while True:
+        ep = scheduler.next_demo(worker_id)
+        if ep is None:
+            break
+        demos.append(ep)
+        time.sleep(delay_s)
+    results.put((worker_id, demos, scheduler.get_stats()))
+
+
+def run_scheduler(scheduler, delays_s):
+    results = mp.Queue()
+    procs = [
+        mp.Process(target=run_worker, args=(scheduler, i, delay_s, results))
+        for i, delay_s in enumerate(delays_s)
+    ]
+    for p in procs:
+        p.start()
+    outputs = [results.get(timeout=60) for _ in procs]
+    for p in procs:
+        p.join()
+    return {worker_id: (demos, stats) for worker_id, demos, stats in outputs}
+
+
+def test_group_demos_by_scene():
+    demos, scene_keys = make_demos()
+    groups = SchedulerUtils.group_demos_by_scene(demos, scene_keys, max_group_size=4)
+    assert all(0 < len(eps) <= 4 for _, eps in groups)
+    assert sorted(ep for _, eps in groups for ep in eps) == sorted(demos)
+    key_of = dict(zip(demos, scene_keys))
+    for key, eps in groups:
+        assert all(key_of[ep] == key for ep in eps)
+        # demo order is kept within a group
+        assert eps == sorted(eps, key=demos.index)
+
+    # without a cap there is one group per scene
+    groups = SchedulerUtils.group_demos_by_scene(demos, scene_keys)
+    assert len(groups) == len(set(scene_keys))
+
+
+def test_assign_groups_to_workers():
+    demos, scene_keys = make_demos()
+    groups = SchedulerUtils.group_demos_by_scene(demos, scene_keys, max_group_size=4)
+    assignment = SchedulerUtils.assign_groups_to_workers(groups, num_workers=3)
+    assigned = [g for worker_groups in assignment for g in worker_groups]
+    assert sorted(ep for _, eps in assigned for ep in eps) == sorted(demos)
+    loads = [sum(len(eps) for _, eps in worker_groups) for worker_groups in assignment]
+    assert max(loads) - min(loads) <= 4
+
+
+def test_every_demo_scheduled_once():
+    demos, scene_keys = make_demos()
+    for affinity in [True, False]:
+        scheduler = SchedulerUtils.DemoScheduler(
+            demos, scene_keys, num_workers=3, affinity=affinity, max_group_size=4
+        )
+        outputs = run_scheduler(scheduler, delays_s=[0.0, 0.0, 0.0])
+        counts = Counter(
+            ep for worker_demos, _ in outputs.values() for ep in worker_demos
+        )
+        assert sorted(counts) == sorted(demos)
+        assert set(counts.values()) == {1}
+        assert sum(stats["demos"] for _, stats in outputs.values()) == len(demos)
+
+
+def test_work_stealing():
+    demos, scene_keys = make_demos()
+    scheduler = SchedulerUtils.DemoScheduler(
+        demos, scene_keys, num_workers=2, max_group_size=2
+    )
+    # worker 0 is slow, so worker 1 drains its own queue and steals from worker 0
+    outputs = run_scheduler(scheduler, delays_s=[0.02, 0.0])
+    assert outputs[1][1]["steals"] > 0
+    assert len(outputs[1][0]) > len(outputs[0][0])
+    counts = Counter(ep for worker_demos, _ in outputs.values() for ep in worker_demos)
+    assert sorted(counts) == sorted(demos) and set(counts.values()) == {1}
+
+
+if __name__ == "__main__":
+    test_group_demos_by_scene()
+    test_assign_groups_to_workers()
+    test_every_demo_scheduled_once()
+    test_work_stealing()
+    print(colored("Every demo is scheduled exactly once", "green"))